@@ -42,10 +42,18 @@ class GrrApiContext(object):
   ) -> Iterator[message.Message]:
     """Generates iterator pages."""
     offset = args.offset
+    # Handlers supporting page tokens don't have to skip over the results
+    # returned with previous pages, so tokens are preferred over offsets.
+    use_page_token = (not offset and
+                      "page_token" in args.DESCRIPTOR.fields_by_name)
+    page_token = ""
 
     while True:
       args_copy = utils.CopyProto(args)
-      args_copy.offset = offset
+      if use_page_token:
+        args_copy.page_token = page_token
+      else:
+        args_copy.offset = offset
       args_copy.count = self.connector.page_size
       result = self.connector.SendRequest(handler_name, args_copy)
 
@@ -62,6 +70,11 @@ class GrrApiContext(object):
         break
 
       offset += self.connector.page_size
+      if use_page_token:
+        page_token = result.next_page_token
+        # Servers that don't support page tokens never return them, in which
+        # case the remaining results are read using offsets.
+        use_page_token = bool(page_token)
 
   def SendIteratorRequest(
       self,
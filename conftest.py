@@ -136,8 +136,13 @@ def thread_leak_check(request):
   # Dummy threads are named "Dummy-*" and are never deleted, since it's
   # impossible to detect the termination of alien threads, hence we have to
   # ignore them.
+  #
+  # Threads of the blob read-ahead executor are shared by all file streams and
+  # live as long as the process does.
   thread_names = [
-      thread.name for thread in threads if not thread.name.startswith("Dummy-")
+      thread.name
+      for thread in threads
+      if not thread.name.startswith(("Dummy-", "BlobReadAhead"))
   ]
 
   allowed_thread_names = [
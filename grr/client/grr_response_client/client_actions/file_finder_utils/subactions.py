@@ -136,7 +136,10 @@ class DownloadAction(Action):
     max_size = self.opts.max_size
     chunk_size = self.opts.chunk_size
 
-    uploader = uploading.TransferStoreUploader(self.flow, chunk_size=chunk_size)
+    uploader = uploading.TransferStoreUploader(
+        self.flow,
+        chunk_size=chunk_size,
+        compression_level=self.opts.compression_level)
     return uploader.UploadFilePath(filepath, amount=max_size)
 
 
@@ -5,10 +5,13 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import unicode_literals
 
+import collections
+from concurrent import futures
 import hashlib
 import zlib
 
 from grr_response_client import streaming
+from grr_response_core import config
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib.rdfvalues import client_fs as rdf_client_fs
 from grr_response_core.lib.rdfvalues import protodict as rdf_protodict
@@ -19,24 +22,42 @@ class TransferStoreUploader(object):
 
   Input is divided into chunks, then these chunks are compressed (using zlib)
   and then they are uploaded to the transfer store (a well-known flow).
+
+  Compression and hashing of chunks is done by a small pool of worker threads
+  while the action thread keeps reading the following chunks and sending the
+  processed ones, so all of these steps overlap. Both `zlib` and `hashlib`
+  release the GIL while processing large buffers.
   """
 
   DEFAULT_CHUNK_SIZE = 512 * 1024
 
   _TRANSFER_STORE_SESSION_ID = rdfvalue.SessionID(flow_name="TransferStore")
 
-  def __init__(self, action, chunk_size=None):
+  def __init__(self,
+               action,
+               chunk_size=None,
+               compression_level=zlib.Z_DEFAULT_COMPRESSION,
+               threads=None):
     """Initializes the uploader.
 
     Args:
       action: A parent action that creates the uploader. Used to communicate
         with the parent flow.
       chunk_size: A number of (uncompressed) bytes per a chunk.
+      compression_level: A zlib compression level of uploaded chunks. If 0,
+        chunks are uploaded uncompressed.
+      threads: A number of threads compressing and hashing chunks. If 0, chunks
+        are processed on the calling thread. Defaults to
+        `Client.upload_threads`.
     """
     chunk_size = chunk_size or self.DEFAULT_CHUNK_SIZE
+    if threads is None:
+      threads = config.CONFIG["Client.upload_threads"]
 
     self._action = action
     self._streamer = streaming.Streamer(chunk_size=chunk_size)
+    self._compression_level = compression_level
+    self._threads = threads
 
   def UploadFilePath(self, filepath, offset=0, amount=None):
     """Uploads chunks of a file on a given path to the transfer store flow.
@@ -69,13 +90,40 @@ class TransferStoreUploader(object):
         self._streamer.StreamFile(fd, offset=offset, amount=amount))
 
   def _UploadChunkStream(self, chunk_stream):
-    chunks = []
-    for chunk in chunk_stream:
-      chunks.append(self._UploadChunk(chunk))
+    if self._threads > 0:
+      chunks = self._UploadChunksPipelined(chunk_stream)
+    else:
+      chunks = [self._UploadChunk(chunk) for chunk in chunk_stream]
 
     return rdf_client_fs.BlobImageDescriptor(
         chunks=chunks, chunk_size=self._streamer.chunk_size)
 
+  def _UploadChunksPipelined(self, chunk_stream):
+    """Uploads chunks processing them in a pool of worker threads.
+
+    Args:
+      chunk_stream: An iterator over chunks to upload.
+
+    Returns:
+      A list of `BlobImageChunkDescriptor` objects in the order of chunks.
+    """
+    chunks = []
+    # To bound the memory usage, only a couple of chunks per worker are allowed
+    # to be in flight. Chunks are sent in order as soon as they are ready.
+    max_pending = self._threads * 2
+    pending = collections.deque()
+
+    with futures.ThreadPoolExecutor(max_workers=self._threads) as pool:
+      for chunk in chunk_stream:
+        pending.append(pool.submit(self._ProcessChunk, chunk))
+        if len(pending) >= max_pending:
+          chunks.append(self._SendChunk(*pending.popleft().result()))
+
+      while pending:
+        chunks.append(self._SendChunk(*pending.popleft().result()))
+
+    return chunks
+
   def _UploadChunk(self, chunk):
     """Uploads a single chunk to the transfer store flow.
 
@@ -85,18 +133,50 @@ class TransferStoreUploader(object):
     Returns:
       A `BlobImageChunkDescriptor` object.
     """
-    blob = _CompressedDataBlob(chunk)
+    return self._SendChunk(*self._ProcessChunk(chunk))
+
+  def _ProcessChunk(self, chunk):
+    """Compresses and hashes a single chunk.
+
+    This method is safe to call from worker threads.
+
+    Args:
+      chunk: A chunk to process.
+
+    Returns:
+      A tuple with the chunk, its `DataBlob` and its SHA-256 digest.
+    """
+    blob = _CompressedDataBlob(chunk, self._compression_level)
+    digest = hashlib.sha256(chunk.data).digest()
+    return chunk, blob, digest
+
+  def _SendChunk(self, chunk, blob, digest):
+    """Sends a processed chunk to the transfer store flow.
 
+    Args:
+      chunk: A chunk to send.
+      blob: A `DataBlob` with the (compressed) chunk data.
+      digest: A SHA-256 digest of the chunk data.
+
+    Returns:
+      A `BlobImageChunkDescriptor` object.
+    """
     self._action.ChargeBytesToSession(len(chunk.data))
     self._action.SendReply(blob, session_id=self._TRANSFER_STORE_SESSION_ID)
+    # Worker threads run within the client process, their CPU time counts
+    # towards the action CPU limit checked here.
+    self._action.Progress()
 
     return rdf_client_fs.BlobImageChunkDescriptor(
-        digest=hashlib.sha256(chunk.data).digest(),
-        offset=chunk.offset,
-        length=len(chunk.data))
+        digest=digest, offset=chunk.offset, length=len(chunk.data))
+
 
+def _CompressedDataBlob(chunk, compression_level=zlib.Z_DEFAULT_COMPRESSION):
+  if compression_level == 0:
+    return rdf_protodict.DataBlob(
+        data=chunk.data,
+        compression=rdf_protodict.DataBlob.CompressionType.UNCOMPRESSED)
 
-def _CompressedDataBlob(chunk):
   return rdf_protodict.DataBlob(
-      data=zlib.compress(chunk.data),
+      data=zlib.compress(chunk.data, compression_level),
       compression=rdf_protodict.DataBlob.CompressionType.ZCOMPRESSION)
@@ -7,12 +7,14 @@ from __future__ import unicode_literals
 import collections
 import hashlib
 import io
+import os
 import zlib
 
 from absl.testing import absltest
 import mock
 
 from grr_response_client.client_actions.file_finder_utils import uploading
+from grr_response_core.lib.rdfvalues import protodict as rdf_protodict
 from grr_response_core.lib.util import temp
 
 
@@ -135,6 +137,75 @@ class UploaderTest(absltest.TestCase):
       self.assertEqual(blobdesc.chunks[2].length, 1)
       self.assertEqual(blobdesc.chunks[2].digest, Sha256(b"6"))
 
+  def testManyChunksInParallel(self):
+    data = os.urandom(1024)
+
+    with temp.AutoTempFilePath() as temp_filepath:
+      with io.open(temp_filepath, "wb") as temp_file:
+        temp_file.write(data)
+
+      serial_action = FakeAction()
+      serial_uploader = uploading.TransferStoreUploader(
+          serial_action, chunk_size=10, threads=0)
+      serial_blobdesc = serial_uploader.UploadFilePath(temp_filepath)
+
+      parallel_action = FakeAction()
+      parallel_uploader = uploading.TransferStoreUploader(
+          parallel_action, chunk_size=10, threads=4)
+      parallel_blobdesc = parallel_uploader.UploadFilePath(temp_filepath)
+
+    self.assertEqual(parallel_blobdesc, serial_blobdesc)
+    self.assertEqual(parallel_action.messages, serial_action.messages)
+    self.assertEqual(parallel_action.charged_bytes, 1024)
+
+    self.assertLen(parallel_blobdesc.chunks, 103)
+    for idx, chunk in enumerate(parallel_blobdesc.chunks):
+      self.assertEqual(chunk.offset, idx * 10)
+      self.assertEqual(chunk.digest, Sha256(data[idx * 10:idx * 10 + 10]))
+
+  def testProgressIsReportedForEveryChunk(self):
+    action = FakeAction()
+    uploader = uploading.TransferStoreUploader(action, chunk_size=3, threads=2)
+
+    with temp.AutoTempFilePath() as temp_filepath:
+      with io.open(temp_filepath, "wb") as temp_file:
+        temp_file.write(b"1234567890")
+
+      uploader.UploadFilePath(temp_filepath)
+
+    self.assertEqual(action.Progress.call_count, 4)
+
+  def testCompressionLevel(self):
+    action = FakeAction()
+    uploader = uploading.TransferStoreUploader(
+        action, chunk_size=6, compression_level=1)
+
+    with temp.AutoTempFilePath() as temp_filepath:
+      with io.open(temp_filepath, "wb") as temp_file:
+        temp_file.write(b"foobar")
+
+      uploader.UploadFilePath(temp_filepath)
+
+    self.assertLen(action.messages, 1)
+    self.assertEqual(action.messages[0].item.data, zlib.compress(b"foobar", 1))
+
+  def testNoCompression(self):
+    action = FakeAction()
+    uploader = uploading.TransferStoreUploader(
+        action, chunk_size=6, compression_level=0)
+
+    with temp.AutoTempFilePath() as temp_filepath:
+      with io.open(temp_filepath, "wb") as temp_file:
+        temp_file.write(b"foobar")
+
+      blobdesc = uploader.UploadFilePath(temp_filepath)
+
+    self.assertLen(action.messages, 1)
+    self.assertEqual(action.messages[0].item.data, b"foobar")
+    self.assertEqual(action.messages[0].item.compression,
+                     rdf_protodict.DataBlob.CompressionType.UNCOMPRESSED)
+    self.assertEqual(blobdesc.chunks[0].digest, Sha256(b"foobar"))
+
   def testIncorrectFile(self):
     action = FakeAction()
     uploader = uploading.TransferStoreUploader(action, chunk_size=10)
@@ -135,7 +135,9 @@ class DownloadAction(Action):
     chunk_size = self._opts.chunk_size
 
     uploader = uploading.TransferStoreUploader(
-        self._action, chunk_size=chunk_size)
+        self._action,
+        chunk_size=chunk_size,
+        compression_level=self._opts.compression_level)
     return uploader.UploadFile(fd, amount=max_size)
 
 
@@ -6,12 +6,19 @@ from __future__ import division
 from __future__ import unicode_literals
 
 import hashlib
+import itertools
 import os
+import queue
 import stat as stat_mode
+import threading
 
 from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
 
 from grr_response_client import actions
+from grr_response_core import config
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib.rdfvalues import protodict as rdf_protodict
 from grr_response_core.lib.rdfvalues import timeline as rdf_timeline
@@ -21,6 +28,10 @@ from grr_response_core.lib.util import statx
 # Indicates whether the timeline action will also collect file birth time.
 BTIME_SUPPORT: bool = statx.BTIME_SUPPORT
 
+# A number of timeline entries that the walker collects before handing them
+# over to the serializer.
+WALK_BATCH_SIZE = 1024
+
 
 class Timeline(actions.ActionPlugin):
   """A client action for timeline collection."""
@@ -34,20 +45,31 @@ class Timeline(actions.ActionPlugin):
     """Executes the client action."""
     result = rdf_timeline.TimelineResult()
 
-    entries = Walk(args.root)
-    for entry_batch in rdf_timeline.TimelineEntry.SerializeStream(entries):
-      entry_batch_blob = rdf_protodict.DataBlob(data=entry_batch)
-      self.SendReply(entry_batch_blob, session_id=self._TRANSFER_STORE_ID)
+    walk_batches = WalkBatches(
+        args.root, threads=config.CONFIG["Client.timeline_walk_threads"])
+    try:
+      entries = itertools.chain.from_iterable(walk_batches)
+      for entry_batch in rdf_timeline.TimelineEntry.SerializeStream(entries):
+        entry_batch_blob = rdf_protodict.DataBlob(data=entry_batch)
+        self.SendReply(entry_batch_blob, session_id=self._TRANSFER_STORE_ID)
 
-      entry_batch_blob_id = hashlib.sha256(entry_batch).digest()
-      result.entry_batch_blob_ids.append(entry_batch_blob_id)
+        entry_batch_blob_id = hashlib.sha256(entry_batch).digest()
+        result.entry_batch_blob_ids.append(entry_batch_blob_id)
 
-      self.Progress()
+        # Walker threads run within this process, so their CPU time is
+        # accounted for by the usual client action CPU limit checks here.
+        self.Progress()
+    finally:
+      # Makes sure that walker threads are stopped if the action is aborted.
+      walk_batches.close()
 
     self.SendReply(result)
 
 
-def Walk(root: bytes) -> Iterator[rdf_timeline.TimelineEntry]:
+def Walk(
+    root: bytes,
+    threads: int = 1,
+) -> Iterator[rdf_timeline.TimelineEntry]:
   """Walks the filesystem collecting stat information.
 
   This method will recursively descend to all sub-folders and sub-sub-folders
@@ -57,37 +79,231 @@ def Walk(root: bytes) -> Iterator[rdf_timeline.TimelineEntry]:
 
   Args:
     root: A path to the root folder at which the recursion should start.
+    threads: A number of threads walking independent subtrees concurrently. If
+      greater than one, entries are not yielded in the depth-first order.
 
-  Returns:
-    An iterator over timeline entries with stat information about each file.
+  Yields:
+    Timeline entries with stat information about each file.
+  """
+  for batch in WalkBatches(root, threads=threads):
+    for entry in batch:
+      yield entry
+
+
+def WalkBatches(
+    root: bytes,
+    threads: int = 1,
+    batch_size: int = WALK_BATCH_SIZE,
+) -> Iterator[List[rdf_timeline.TimelineEntry]]:
+  """Walks the filesystem collecting stat information in batches.
+
+  See `Walk` for the details of the traversal. Instead of recursing with nested
+  generators, the walk keeps an explicit stack (or, with multiple threads, a
+  queue) of directories, so its cost does not grow with the depth of the tree.
+  Every entry is stat-ed exactly once.
+
+  Args:
+    root: A path to the root folder at which the recursion should start.
+    threads: A number of threads walking independent subtrees concurrently.
+    batch_size: A maximum number of entries in a single batch.
+
+  Yields:
+    Lists of timeline entries with stat information about each file.
   """
   try:
     dev = os.lstat(root).st_dev
   except OSError:
-    return iter([])
+    return
 
-  def Recurse(path: bytes) -> Iterator[rdf_timeline.TimelineEntry]:
-    """Performs the recursive walk over the file hierarchy."""
-    try:
-      stat = statx.Get(path)
-    except OSError:
-      return
+  stat = _Stat(root, dev)
+  if stat is None:
+    return
+  root_entry, is_subdir = stat
 
-    yield rdf_timeline.TimelineEntry.FromStatx(path, stat)
+  if threads > 1 and is_subdir:
+    walk = _WalkParallel(root, dev, threads, batch_size)
+  else:
+    walk = _WalkSequential(root, dev, is_subdir, batch_size)
 
-    # We want to recurse only to folders on the same device.
-    if not stat_mode.S_ISDIR(stat.mode) or stat.dev != dev:
-      return
+  yield [root_entry]
+  # Delegating makes closing this generator close the walk right away, which
+  # stops the walker threads.
+  yield from walk
+
+
+def _Stat(
+    path: bytes,
+    dev: int,
+) -> Optional[Tuple[rdf_timeline.TimelineEntry, bool]]:
+  """Stats the path.
+
+  Args:
+    path: A path to the file to stat.
+    dev: An identifier of the device the walk is restricted to.
+
+  Returns:
+    A timeline entry for the path and a flag indicating whether the walk should
+    descend into it or `None` if the path could not be stat-ed.
+  """
+  try:
+    stat = statx.Get(path)
+  except OSError:
+    return None
+
+  # We want to recurse only to folders on the same device.
+  is_subdir = stat_mode.S_ISDIR(stat.mode) and stat.dev == dev
+  return rdf_timeline.TimelineEntry.FromStatx(path, stat), is_subdir
+
+
+def _ListDir(path: bytes) -> List[bytes]:
+  """Returns paths of all children of the given folder."""
+  # `scandir` yields entries with the path already joined, so we can avoid the
+  # `os.path.join` call for each of the (possibly millions of) children.
+  try:
+    with os.scandir(path) as entries:
+      return [entry.path for entry in entries]
+  except OSError:
+    return []
 
-    try:
-      childnames = os.listdir(path)
-    except OSError:
-      childnames = []
 
-    # TODO(hanuszczak): Implement more efficient auto-batcher instead of having
-    # multi-level iterators.
-    for childname in childnames:
-      for entry in Recurse(os.path.join(path, childname)):
-        yield entry
+def _WalkSequential(
+    root: bytes,
+    dev: int,
+    is_subdir: bool,
+    batch_size: int,
+) -> Iterator[List[rdf_timeline.TimelineEntry]]:
+  """Walks the children of the root in the depth-first order."""
+  if not is_subdir:
+    return
 
-  return Recurse(root)
+  batch = []
+  # Only the (cheap) child paths are kept on the stack, children are stat-ed
+  # lazily just before being yielded.
+  stack = [iter(_ListDir(root))]
+  while stack:
+    path = next(stack[-1], None)
+    if path is None:
+      stack.pop()
+      continue
+
+    stat = _Stat(path, dev)
+    if stat is None:
+      continue
+    entry, is_subdir = stat
+
+    batch.append(entry)
+    if len(batch) >= batch_size:
+      yield batch
+      batch = []
+
+    if is_subdir:
+      stack.append(iter(_ListDir(path)))
+
+  if batch:
+    yield batch
+
+
+def _WalkParallel(
+    root: bytes,
+    dev: int,
+    threads: int,
+    batch_size: int,
+) -> Iterator[List[rdf_timeline.TimelineEntry]]:
+  """Walks the children of the root with multiple threads.
+
+  Every thread takes a folder from the shared queue, stats its children and
+  puts the child folders back to the queue for other threads to pick up.
+
+  Args:
+    root: A path to the root folder at which the recursion should start.
+    dev: An identifier of the device the walk is restricted to.
+    threads: A number of walker threads to run.
+    batch_size: A maximum number of entries in a single batch.
+
+  Yields:
+    Lists of timeline entries, in no particular order.
+  """
+  dirpaths = queue.Queue()
+  # The output queue is bounded, so that walker threads do not get too far
+  # ahead of the consumer.
+  batches = queue.Queue(maxsize=threads * 2)
+  stop = threading.Event()
+
+  lock = threading.Lock()
+  # A number of folders that have been queued but not fully processed yet.
+  pending = [1]
+
+  def Put(item) -> bool:
+    while not stop.is_set():
+      try:
+        batches.put(item, timeout=0.1)
+        return True
+      except queue.Full:
+        continue
+    return False
+
+  def Work() -> None:
+    """Processes folders until the whole tree is walked."""
+    while True:
+      dirpath = dirpaths.get()
+      if dirpath is None:
+        return
+
+      try:
+        batch = []
+        for path in _ListDir(dirpath):
+          if stop.is_set():
+            return
+
+          stat = _Stat(path, dev)
+          if stat is None:
+            continue
+          entry, is_subdir = stat
+
+          batch.append(entry)
+          if len(batch) >= batch_size:
+            if not Put(batch):
+              return
+            batch = []
+
+          if is_subdir:
+            with lock:
+              pending[0] += 1
+            dirpaths.put(path)
+
+        if batch and not Put(batch):
+          return
+      except Exception as error:  # pylint: disable=broad-except
+        Put(error)
+        return
+
+      with lock:
+        pending[0] -= 1
+        done = pending[0] == 0
+
+      if done:
+        Put(None)
+
+  dirpaths.put(root)
+
+  workers = []
+  for idx in range(threads):
+    worker = threading.Thread(name="TimelineWalker{}".format(idx), target=Work)
+    worker.daemon = True
+    worker.start()
+    workers.append(worker)
+
+  try:
+    while True:
+      batch = batches.get()
+      if batch is None:
+        break
+      if isinstance(batch, Exception):
+        raise batch
+      yield batch
+  finally:
+    stop.set()
+    for _ in workers:
+      dirpaths.put(None)
+    for worker in workers:
+      worker.join()
@@ -11,16 +11,19 @@ import os
 import platform
 import random
 import stat as stat_mode
+import threading
 import time
 from typing import Text
 
 from absl.testing import absltest
+import mock
 
 from grr_response_client.client_actions import timeline
 from grr_response_core.lib.rdfvalues import timeline as rdf_timeline
 from grr_response_core.lib.util import temp
 from grr.test_lib import client_test_lib
 from grr.test_lib import skip
+from grr.test_lib import test_lib
 from grr.test_lib import testing_startup
 
 
@@ -50,6 +53,25 @@ class TimelineTest(client_test_lib.EmptyActionTest):
       for blob in results[:-1]:
         self.assertIn(hashlib.sha256(blob.data).digest(), blob_ids)
 
+  def testRunWithMultipleThreads(self):
+    with temp.AutoTempDirPath(remove_non_empty=True) as temp_dirpath:
+      for idx in range(8):
+        temp_subdirpath = os.path.join(temp_dirpath, "foo{}".format(idx))
+        os.mkdir(temp_subdirpath)
+        for jdx in range(8):
+          _Touch(os.path.join(temp_subdirpath, "bar{}".format(jdx)))
+
+      args = rdf_timeline.TimelineArgs()
+      args.root = temp_dirpath.encode("utf-8")
+
+      with test_lib.ConfigOverrider({"Client.timeline_walk_threads": 4}):
+        results = self.RunAction(timeline.Timeline, args)
+
+      entries = list(
+          rdf_timeline.TimelineEntry.DeserializeStream(
+              blob.data for blob in results[:-1]))
+      self.assertLen(entries, 1 + 8 + 8 * 8)
+
 
 class WalkTest(absltest.TestCase):
 
@@ -192,6 +214,77 @@ class WalkTest(absltest.TestCase):
       now_ns = time.time_ns()
       self.assertBetween(entries[1].btime_ns, 0, now_ns)
 
+  def testDeepNesting(self):
+    with temp.AutoTempDirPath(remove_non_empty=True) as root_dirpath:
+      dirpaths = [root_dirpath]
+      for _ in range(128):
+        dirpaths.append(os.path.join(dirpaths[-1], "a"))
+        os.mkdir(dirpaths[-1])
+      _Touch(os.path.join(root_dirpath, "b"))
+
+      entries = list(timeline.Walk(root_dirpath.encode("utf-8")))
+      paths = [_.path.decode("utf-8") for _ in entries]
+      self.assertCountEqual(paths, dirpaths + [os.path.join(root_dirpath, "b")])
+      # Entries are yielded in the depth-first order.
+      self.assertEqual([_ for _ in paths if _ in dirpaths], dirpaths)
+
+  def testMultipleThreads(self):
+    with temp.AutoTempDirPath(remove_non_empty=True) as root_dirpath:
+      paths = [root_dirpath]
+      for name in ["foo", "bar", "baz"]:
+        dirpath = os.path.join(root_dirpath, name)
+        os.makedirs(os.path.join(dirpath, "quux"))
+        paths.extend([dirpath, os.path.join(dirpath, "quux")])
+        for idx in range(3):
+          filepath = os.path.join(dirpath, "quux", "norf{}".format(idx))
+          _Touch(filepath)
+          paths.append(filepath)
+
+      entries = list(timeline.Walk(root_dirpath.encode("utf-8"), threads=4))
+      self.assertEqual(entries[0].path, root_dirpath.encode("utf-8"))
+      self.assertCountEqual([_.path.decode("utf-8") for _ in entries], paths)
+
+  def testBatches(self):
+    with temp.AutoTempDirPath(remove_non_empty=True) as dirpath:
+      for idx in range(10):
+        _Touch(os.path.join(dirpath, "foo{}".format(idx)))
+
+      batches = list(timeline.WalkBatches(dirpath.encode("utf-8"),
+                                          batch_size=4))
+      self.assertEqual([len(batch) for batch in batches], [1, 4, 4, 2])
+
+  def testStopsThreadsWhenClosed(self):
+    with temp.AutoTempDirPath(remove_non_empty=True) as dirpath:
+      for idx in range(64):
+        os.mkdir(os.path.join(dirpath, "foo{}".format(idx)))
+
+      threads_before = threading.active_count()
+
+      # Keeps a reference to the inner walk, so that the threads are not
+      # stopped by garbage collection of the walk.
+      walks = []
+
+      def CloseWalks():
+        for walk in walks:
+          walk.close()
+
+      self.addCleanup(CloseWalks)
+
+      def WalkParallel(*args, **kwargs):
+        walks.append(walk_parallel(*args, **kwargs))
+        return walks[-1]
+
+      walk_parallel = timeline._WalkParallel  # pylint: disable=protected-access
+      with mock.patch.object(timeline, "_WalkParallel", WalkParallel):
+        batches = timeline.WalkBatches(
+            dirpath.encode("utf-8"), threads=4, batch_size=1)
+        next(batches)
+        next(batches)
+        batches.close()
+
+      self.assertLen(walks, 1)
+      self.assertEqual(threading.active_count(), threads_before)
+
   def testIncorrectPath(self):
     not_existing_path = os.path.join("some", "not", "existing", "path")
 
@@ -115,6 +115,16 @@ config_lib.DEFINE_float(
     "Exceeding this will result in aborting the current "
     "client action and restarting.")
 
+config_lib.DEFINE_integer(
+    "Client.timeline_walk_threads", 1,
+    "A number of threads the timeline action uses to walk independent "
+    "subtrees of the filesystem concurrently.")
+
+config_lib.DEFINE_integer(
+    "Client.upload_threads", 2,
+    "A number of threads compressing and hashing chunks of files uploaded to "
+    "the server. If 0, chunks are processed serially on the action thread.")
+
 config_lib.DEFINE_string(
     name="Client.tempfile_prefix",
     help="Prefix to use for temp files created by the GRR client.",
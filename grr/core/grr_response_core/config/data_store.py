@@ -7,6 +7,7 @@ from __future__ import division
 from __future__ import unicode_literals
 
 from grr_response_core.lib import config_lib
+from grr_response_core.lib import rdfvalue
 
 config_lib.DEFINE_integer("Datastore.maximum_blob_size", 512 * 1024,
                           "Maximum blob size we may store in the datastore.")
@@ -26,6 +27,21 @@ config_lib.DEFINE_bool(
 
 config_lib.DEFINE_bool("Database.aff4_enabled", False, "Deprecated.")
 
+config_lib.DEFINE_string(
+    "Database.wakeup_socket_directory",
+    default="",
+    help="Directory for Unix sockets used to wake up message handler and flow "
+    "processing loops of all GRR processes on this host when new requests are "
+    "written. If empty, only loops of the writing process are woken up.")
+
+config_lib.DEFINE_semantic_value(
+    rdfvalue.Duration,
+    "Database.wakeup_socket_poll_interval",
+    default="1m",
+    help="Maximum time message handler and flow processing loops wait for new "
+    "requests when wakeup sockets are used. Requests written on other hosts "
+    "and delayed requests are picked up within this interval.")
+
 config_lib.DEFINE_string(
     "Datastore.location",
     default="%(Config.prefix)/var/grr-datastore",
@@ -91,6 +107,41 @@ config_lib.DEFINE_integer(
     help="The maximum number of open connections to keep available in the pool."
 )
 
+config_lib.DEFINE_integer(
+    "Mysql.conn_pool_min",
+    default=5,
+    help="The number of open connections that are kept in the pool even if "
+    "they are idle.")
+
+config_lib.DEFINE_semantic_value(
+    rdfvalue.Duration,
+    "Mysql.conn_pool_max_idle_time",
+    default="10m",
+    help="Connections that stay idle in the pool for longer than this are "
+    "closed (as long as Mysql.conn_pool_min connections remain open).")
+
+config_lib.DEFINE_semantic_value(
+    rdfvalue.Duration,
+    "Mysql.conn_max_age",
+    default="1h",
+    help="Connections older than this are closed instead of being returned to "
+    "the pool.")
+
+config_lib.DEFINE_semantic_value(
+    rdfvalue.Duration,
+    "Mysql.conn_liveness_check_interval",
+    default="30s",
+    help="Connections that stayed idle in the pool for longer than this are "
+    "pinged before being handed out, so that connections closed by the server "
+    "are not used.")
+
+config_lib.DEFINE_bool(
+    "Mysql.flow_processing_request_wakeup",
+    default=True,
+    help="If true, flow processing requests written by a process wake up the "
+    "flow processing loop immediately instead of waiting for the next poll. "
+    "See Database.wakeup_socket_directory for waking up other processes.")
+
 config_lib.DEFINE_string(
     "Mysql.migrations_dir", "%(grr_response_server/databases/mysql_migrations@"
     "grr-response-server|resource)", "Folder with MySQL migrations files.")
@@ -126,8 +177,6 @@ config_lib.DEFINE_string(
 config_lib.DEFINE_string(
     "Mysql.database_password", default="", help="Deprecated.")
 
-config_lib.DEFINE_integer("Mysql.conn_pool_min", 5, help="Deprecated.")
-
 config_lib.DEFINE_integer("Mysql.max_connect_wait", 600, help="Deprecated.")
 
 config_lib.DEFINE_integer(
@@ -148,3 +197,20 @@ config_lib.DEFINE_string(
     "DualBlobStore.secondary_implementation", "",
     "Class name of the blob storage to use as secondary backend (writing, not "
     "reading)")
+
+# CachingBlobStore blob storage proxy
+config_lib.DEFINE_string(
+    "CachingBlobStore.delegate_implementation", "",
+    "Class name of the blob storage to cache reads from.")
+
+config_lib.DEFINE_integer(
+    "CachingBlobStore.memory_cache_size", 256 * 1024 * 1024,
+    "Maximum total size, in bytes, of blobs cached in memory.")
+
+config_lib.DEFINE_string(
+    "CachingBlobStore.disk_cache_directory", "",
+    "Directory to cache blobs in. If empty, blobs are only cached in memory.")
+
+config_lib.DEFINE_integer(
+    "CachingBlobStore.disk_cache_size", 10 * 1024 * 1024 * 1024,
+    "Maximum total size, in bytes, of blobs cached on disk.")
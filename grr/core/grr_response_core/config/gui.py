@@ -143,6 +143,18 @@ config_lib.DEFINE_bool(
     "bundles being present. AdminUI.headless=True should be used to run "
     "the AdminUI as an API endpoint only.")
 
+config_lib.DEFINE_integer(
+    "AdminUI.vfs_listing_cache_max_items", 20000,
+    "Maximum total number of files in the VFS directory listings kept in "
+    "memory by each AdminUI process. Cached listings are invalidated whenever "
+    "the client's VFS is written to. Set to 0 to disable caching.")
+
+config_lib.DEFINE_integer(
+    "AdminUI.export_conversion_processes", 0,
+    "Number of worker processes used by each AdminUI process to convert flow "
+    "and hunt results when exporting them with instant output plugins. If 0, "
+    "results are converted on the request thread.")
+
 # Configuration requirements for Cloud IAP Setup.
 config_lib.DEFINE_string(
     "AdminUI.google_cloud_project_id", None,
@@ -43,6 +43,12 @@ config_lib.DEFINE_integer(
     "Worker.queue_shards", 5, "Queue notifications will be sharded across "
     "this number of datastore subjects.")
 
+config_lib.DEFINE_integer(
+    "Worker.flow_responses_page_size", 10000,
+    "Responses to flow requests with more responses than this are read from "
+    "the data store in pages of this size while the state method iterates "
+    "them, instead of all at once. 0 means responses are never paged.")
+
 config_lib.DEFINE_list("Frontend.well_known_flows", [], "Unused, Deprecated.")
 
 # Smtp settings.
@@ -125,10 +131,43 @@ config_lib.DEFINE_integer(
     "Maximum time messages remain valid within the "
     "system.")
 
+config_lib.DEFINE_integer(
+    "Frontend.decoder_processes", 0,
+    "Number of worker processes used to decrypt, decompress and parse "
+    "incoming message bundles. If 0, bundles are decoded on the request "
+    "thread. The individual messages are still parsed on the request thread, "
+    "so this only pays off with Server.lazy_struct_decoding_enabled or "
+    "Server.protobuf_backend_enabled.")
+
+config_lib.DEFINE_integer(
+    "Frontend.cipher_cache_size", 50000,
+    "Maximum number of session ciphers the frontend keeps per direction "
+    "(ciphers received from clients and ciphers used to encrypt messages to "
+    "clients).")
+
+config_lib.DEFINE_semantic_value(
+    rdfvalue.Duration, "Frontend.cipher_cache_ttl", default="1h",
+    help="Maximum age of a cached session cipher. Once a cipher expires, the "
+    "frontend negotiates a new session with the client, paying the RSA cost "
+    "again.")
+
 config_lib.DEFINE_bool(
     "Server.initialized", False, "True once config_updater initialize has been "
     "run at least once.")
 
+config_lib.DEFINE_bool(
+    "Server.protobuf_backend_enabled", False,
+    "If True, RDFProtoStructs backed by a protobuf are parsed and serialized "
+    "by the protobuf library instead of the pure Python codec. Fields are only "
+    "converted to RDFValues when accessed.")
+
+config_lib.DEFINE_bool(
+    "Server.lazy_struct_decoding_enabled", False,
+    "If True, serialized RDFProtoStructs are only split into fields when they "
+    "are accessed, and structs that are not modified are written back using "
+    "the bytes they were read from. Malformed data is only reported on "
+    "access.")
+
 config_lib.DEFINE_string("Server.ip_resolver_class", "IPResolver",
                          "The ip resolver class to use.")
 
@@ -195,6 +234,21 @@ config_lib.DEFINE_integer(
     10000000,
     help="The number of bytes allowed for unbounded reads from a file object")
 
+config_lib.DEFINE_integer(
+    "Server.blob_read_ahead_blobs", 10,
+    help="Number of blobs read ahead in the background when streaming "
+    "collected files. If 0, blobs are only read when needed.")
+
+config_lib.DEFINE_integer(
+    "Server.blob_read_ahead_size", 32 * 1024 * 1024,
+    help="Maximum number of bytes read ahead in the background when "
+    "streaming collected files.")
+
+config_lib.DEFINE_integer(
+    "Server.blob_read_ahead_threads", 4,
+    help="Number of threads reading blobs ahead, shared by all streamed "
+    "files. Every thread may use a blob store database connection.")
+
 # Data retention policies.
 config_lib.DEFINE_semantic_value(
     rdfvalue.Duration,
@@ -271,6 +325,61 @@ config_lib.DEFINE_integer(
     "If the average network usage per client becomes "
     "greater than this limit, the hunt gets stopped.")
 
+config_lib.DEFINE_bool(
+    "Hunt.queue_output_plugin_results",
+    default=False,
+    help="If true, hunt results are not processed by the hunt's output plugins "
+    "while the flow is processed. Instead, they are queued and processed in "
+    "batches by a dedicated handler loop and thread pool of the workers, so "
+    "that slow output plugins don't delay flow processing.")
+
+config_lib.DEFINE_integer(
+    "Hunt.output_plugin_max_attempts",
+    default=5,
+    help="Number of times queued hunt results are processed by an output "
+    "plugin before they are dropped. Failed attempts are retried with "
+    "exponential backoff starting at Hunt.output_plugin_retry_delay.")
+
+config_lib.DEFINE_semantic_value(
+    rdfvalue.Duration,
+    "Hunt.output_plugin_retry_delay",
+    default="1m",
+    help="Delay before queued hunt results that an output plugin failed to "
+    "process are retried for the first time. The delay doubles with every "
+    "attempt.")
+
+config_lib.DEFINE_semantic_value(
+    rdfvalue.Duration,
+    "Hunt.output_plugin_lease_time",
+    default="1h",
+    help="How long a worker leases queued hunt results for processing with "
+    "output plugins. Results are processed again by another worker if "
+    "processing takes longer than this, so it should be well above the "
+    "slowest expected output plugin flush.")
+
+config_lib.DEFINE_semantic_value(
+    rdfvalue.Duration,
+    "Foreman.rules_cache_ttl",
+    default="10s",
+    help="For how long foreman rules read from the database are cached "
+    "in-process before being re-read. New hunts may take up to this long to "
+    "be picked up by a frontend. Set to 0 to disable caching.")
+
+config_lib.DEFINE_integer(
+    "Export.client_metadata_cache_size", 10000,
+    "Number of clients whose export metadata (hostname, OS, labels, etc.) is "
+    "kept in memory by each server process for export converters and output "
+    "plugins. Set to 0 to disable caching.")
+
+config_lib.DEFINE_semantic_value(
+    rdfvalue.Duration,
+    "Export.client_metadata_cache_ttl",
+    default="5m",
+    help="For how long cached client export metadata is kept. Cached "
+    "metadata is checked against the client info version in the database on "
+    "every use, so new snapshots and label changes show up in exported data "
+    "right away. Set to 0 to disable caching.")
+
 # Fleetspeak server-side integration flags.
 config_lib.DEFINE_string(
     "Server.fleetspeak_message_listen_address", "",
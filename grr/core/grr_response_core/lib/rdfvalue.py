@@ -78,6 +78,11 @@ class RDFValue(metaclass=RDFValueMetaclass):  # pylint: disable=invalid-metaclas
   RDFValues are serialized to and from the data store.
   """
 
+  # Primitive values are allocated in very large numbers, so subclasses that
+  # only wrap a primitive value declare __slots__ and have no instance __dict__.
+  # Other subclasses get a __dict__ as usual.
+  __slots__ = ("_prev_hash",)
+
   # This is how the attribute will be serialized to the data store. It must
   # indicate both the type emitted by SerializeToWireFormat() and expected by
   # FromWireFormat()
@@ -87,7 +92,6 @@ class RDFValue(metaclass=RDFValueMetaclass):  # pylint: disable=invalid-metaclas
   context_help_url = None
 
   _value = None
-  _prev_hash = None
 
   # Mark as dirty each time we modify this object.
   dirty = False
@@ -177,7 +181,7 @@ RDFValue.classes["RDFBool"] = bool
 class RDFPrimitive(RDFValue):
   """An immutable RDFValue that wraps a primitive value (e.g. int)."""
 
-  _primitive_value = None
+  __slots__ = ("_primitive_value",)
 
   def __init__(self, initializer):
     super().__init__()
@@ -393,6 +397,8 @@ class HashDigest(RDFBytes):
 class RDFInteger(RDFPrimitive):
   """Represent an integer."""
 
+  __slots__ = ()
+
   protobuf_type = "integer"
 
   @staticmethod
@@ -445,8 +451,15 @@ class RDFInteger(RDFPrimitive):
   def __index__(self):
     return self._value
 
+  def __eq__(self, other):
+    if isinstance(other, RDFInteger):
+      return self._primitive_value == other._primitive_value  # pylint: disable=protected-access
+    return self._primitive_value == other
+
   def __lt__(self, other):
-    return self._value < other
+    if isinstance(other, RDFInteger):
+      return self._primitive_value < other._primitive_value  # pylint: disable=protected-access
+    return self._primitive_value < other
 
   def __and__(self, other):
     return self._value & other
@@ -493,12 +506,15 @@ class RDFInteger(RDFPrimitive):
     return self._value.__floordiv__(other)
 
   def __hash__(self):
-    return hash(self._value)
+    return hash(self._primitive_value)
 
 
 @functools.total_ordering
 class RDFDatetime(RDFPrimitive):
   """A date and time internally stored in MICROSECONDS."""
+
+  __slots__ = ()
+
   converter = 1000000
   protobuf_type = "unsigned_integer"
 
@@ -687,19 +703,25 @@ class RDFDatetime(RDFPrimitive):
     return self.FromSecondsSinceEpoch(seconds)
 
   def __hash__(self):
-    return hash(self._value)
+    return hash(self._primitive_value)
 
+  # Values of the same class share the converter, so comparing them does not
+  # need any conversion.
   def __eq__(self, other):
-    if isinstance(other, RDFDatetime):
+    if other.__class__ is self.__class__:
+      return self._primitive_value == other._primitive_value  # pylint: disable=protected-access
+    elif isinstance(other, RDFDatetime):
       return self.AsMicrosecondsSinceEpoch() == other.AsMicrosecondsSinceEpoch()
     else:
-      return self._value == other
+      return self._primitive_value == other
 
   def __lt__(self, other):
-    if isinstance(other, RDFDatetime):
+    if other.__class__ is self.__class__:
+      return self._primitive_value < other._primitive_value  # pylint: disable=protected-access
+    elif isinstance(other, RDFDatetime):
       return self.AsMicrosecondsSinceEpoch() < other.AsMicrosecondsSinceEpoch()
     else:
-      return self._value < other
+      return self._primitive_value < other
 
   def __int__(self):
     return self._value
@@ -707,6 +729,9 @@ class RDFDatetime(RDFPrimitive):
 
 class RDFDatetimeSeconds(RDFDatetime):
   """A DateTime class which is stored in whole seconds."""
+
+  __slots__ = ()
+
   converter = 1
 
 
@@ -729,6 +754,9 @@ class Duration(RDFPrimitive):
   The duration is stored as non-negative integer, guaranteeing microsecond
   precision up to MAX_UINT64 microseconds (584k years).
   """
+
+  __slots__ = ()
+
   protobuf_type = "unsigned_integer"
 
   _DIVIDERS = collections.OrderedDict(
@@ -841,16 +869,19 @@ class Duration(RDFPrimitive):
 
   def __lt__(self, other):
     if isinstance(other, Duration):
-      return self.microseconds < other.microseconds
+      return self._primitive_value < other._primitive_value  # pylint: disable=protected-access
     else:
       return NotImplemented
 
   def __eq__(self, other):
     if isinstance(other, Duration):
-      return self.microseconds == other.microseconds
+      return self._primitive_value == other._primitive_value  # pylint: disable=protected-access
     else:
       return NotImplemented
 
+  def __hash__(self):
+    return hash(self._primitive_value)
+
   def __abs__(self):
     return self
 
@@ -904,7 +935,7 @@ class Duration(RDFPrimitive):
 
   @property
   def microseconds(self):
-    return self._value
+    return self._primitive_value
 
   @classmethod
   def FromHumanReadable(cls, string: Text):
@@ -951,6 +982,8 @@ class DurationSeconds(Duration):
   simple. For most uses, please prefer `Duration` directly.
   """
 
+  __slots__ = ()
+
   def __init__(self, initializer: Any = None):
     if isinstance(initializer, (int, RDFInteger)):
       initializer = int(initializer) * SECONDS
@@ -989,6 +1022,9 @@ class ByteSize(RDFInteger):
   Binary units (powers of 2): Ki, Mi, Gi
   SI units (powers of 10): k, m, g
   """
+
+  __slots__ = ()
+
   protobuf_type = "unsigned_integer"
 
   DIVIDERS = dict((
@@ -38,6 +38,17 @@ class RDFValueTest(absltest.TestCase):
     self.assertEqual(str(rdfvalue.RDFInteger(1)), "1")
     self.assertEqual(str(rdfvalue.RDFString(long_string)), long_string)
 
+  def testPrimitivesHaveNoInstanceDict(self):
+    for value in [
+        rdfvalue.RDFInteger(1),
+        rdfvalue.ByteSize(1024),
+        rdfvalue.RDFDatetime(1),
+        rdfvalue.RDFDatetimeSeconds(1),
+        rdfvalue.Duration(1),
+        rdfvalue.DurationSeconds(1),
+    ]:
+      self.assertFalse(hasattr(value, "__dict__"), type(value))
+
   # TODO(hanuszczak): Current implementation of `repr` for RDF values is broken
   # and not in line with Python guidelines. For example, `repr` should be
   # unambiguous whereas current implementation will trim long representations
@@ -110,6 +121,14 @@ class RDFIntegerTest(absltest.TestCase):
     with self.assertRaises(ValueError):
       rdfvalue.RDFInteger.FromHumanReadable(u"12A")
 
+  def testComparison(self):
+    self.assertEqual(rdfvalue.RDFInteger(3), rdfvalue.ByteSize(3))
+    self.assertEqual(rdfvalue.RDFInteger(3), 3)
+    self.assertEqual(
+        sorted([rdfvalue.RDFInteger(3),
+                rdfvalue.RDFInteger(1),
+                rdfvalue.ByteSize(2)]), [1, 2, 3])
+
 
 class RDFDateTimeTest(absltest.TestCase):
 
@@ -276,6 +295,12 @@ MAX_UINT64 = 18446744073709551615
 
 class DurationTest(absltest.TestCase):
 
+  def testHash(self):
+    self.assertEqual(
+        hash(rdfvalue.Duration.From(1, rdfvalue.MINUTES)),
+        hash(rdfvalue.DurationSeconds.From(60, rdfvalue.SECONDS)))
+    self.assertLen({rdfvalue.Duration(1), rdfvalue.Duration(1)}, 1)
+
   def testInitializationFromMicroseconds(self):
     for i in [0, 1, 7, 60, 1337, MAX_UINT64]:
       val = rdfvalue.Duration.From(i, rdfvalue.MICROSECONDS)
@@ -5,13 +5,23 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import unicode_literals
 
+import contextlib
+import time
+import tracemalloc
 from typing import Text
 
 from absl import app
 
+from grr_response_core.lib import rdfvalue
 from grr_response_core.lib import type_info
 from grr_response_core.lib.rdfvalues import client as rdf_client
+from grr_response_core.lib.rdfvalues import client_fs as rdf_client_fs
+from grr_response_core.lib.rdfvalues import flows as rdf_flows
+from grr_response_core.lib.rdfvalues import paths as rdf_paths
+from grr_response_core.lib.rdfvalues import protodict as rdf_protodict
 from grr_response_core.lib.rdfvalues import structs as rdf_structs
+from grr_response_core.lib.rdfvalues import timeline as rdf_timeline
+from grr_response_server.rdfvalues import flow_objects as rdf_flow_objects
 from grr_response_proto import jobs_pb2
 from grr_response_proto import knowledge_base_pb2
 from grr.test_lib import benchmark_test_lib
@@ -345,6 +355,348 @@ class RDFValueBenchmark(benchmark_test_lib.AverageMicroBenchmarks):
     self.TimeIt(ProtoDecodeEncode)
 
 
+@contextlib.contextmanager
+def _ProtobufBackend(enabled):
+  previous = rdf_structs.IsProtobufBackendEnabled()
+  rdf_structs.EnableProtobufBackend(enabled)
+  try:
+    yield
+  finally:
+    rdf_structs.EnableProtobufBackend(previous)
+
+
+def _StatEntry(i):
+  return rdf_client_fs.StatEntry(
+      pathspec=rdf_paths.PathSpec(
+          path="/usr/lib/python3/dist-packages/file%d.py" % i,
+          pathtype=rdf_paths.PathSpec.PathType.OS),
+      st_mode=0o100644,
+      st_ino=1234567 + i,
+      st_dev=2049,
+      st_nlink=1,
+      st_uid=1000,
+      st_gid=1000,
+      st_size=4096 + i,
+      st_atime=rdfvalue.RDFDatetimeSeconds(1580000000 + i),
+      st_mtime=rdfvalue.RDFDatetimeSeconds(1570000000 + i),
+      st_ctime=rdfvalue.RDFDatetimeSeconds(1570000000 + i))
+
+
+def _GrrMessage(i):
+  return rdf_flows.GrrMessage(
+      session_id="aff4:/C.1234567890abcdef/flows/F:ABCDEF12",
+      name="ListDirectory",
+      request_id=1,
+      response_id=i,
+      source="C.1234567890abcdef",
+      payload=_StatEntry(i))
+
+
+class ProtobufBackendBenchmark(benchmark_test_lib.AverageMicroBenchmarks):
+  """Compares the pure Python codec with the protobuf library backend."""
+
+  REPEATS = 1000
+  units = "us"
+
+  # Messages of the kinds that dominate frontend, worker and datastore traffic.
+  CORPUS = {
+      "StatEntry": _StatEntry(0),
+      "GrrMessage": _GrrMessage(0),
+      "MessageList":
+          rdf_flows.MessageList(job=[_GrrMessage(i) for i in range(100)]),
+      "Dict":
+          rdf_protodict.Dict({
+              "name": "foo",
+              "size": 42,
+              "paths": ["/foo", "/bar", "/baz"],
+              "stat": _StatEntry(0),
+          }),
+  }
+
+  def _TimeBothBackends(self, callback, name, repetitions=None):
+    for enabled in [False, True]:
+      with _ProtobufBackend(enabled):
+        self.TimeIt(
+            callback,
+            "%s (%s)" % (name, "protobuf" if enabled else "pure"),
+            repetitions=repetitions)
+
+  def _Repetitions(self, name):
+    return self.REPEATS // 50 if name == "MessageList" else self.REPEATS
+
+  def testBackendsProduceEqualStructs(self):
+    for value in self.CORPUS.values():
+      for serialize_enabled in [False, True]:
+        with _ProtobufBackend(serialize_enabled):
+          data = value.SerializeToBytes()
+
+        for parse_enabled in [False, True]:
+          with _ProtobufBackend(parse_enabled):
+            self.assertEqual(value.FromSerializedBytes(data), value)
+
+  def testDecode(self):
+    """Benchmarks parsing without accessing any fields."""
+    for name, value in self.CORPUS.items():
+      data = value.SerializeToBytes()
+      cls = value.__class__
+
+      def Decode():
+        return cls.FromSerializedBytes(data)  # pylint: disable=cell-var-from-loop
+
+      self._TimeBothBackends(
+          Decode, "Decode %s" % name, repetitions=self._Repetitions(name))
+
+  def testDecodeAndCompare(self):
+    """Benchmarks parsing and accessing all the fields."""
+    for name, value in self.CORPUS.items():
+      data = value.SerializeToBytes()
+      cls = value.__class__
+
+      def DecodeAndCompare():
+        return cls.FromSerializedBytes(data) == value  # pylint: disable=cell-var-from-loop
+
+      self._TimeBothBackends(
+          DecodeAndCompare,
+          "Decode and compare %s" % name,
+          repetitions=self._Repetitions(name))
+
+  def testEncode(self):
+    """Benchmarks serializing freshly created structs."""
+
+    def EncodeStatEntry():
+      return len(_StatEntry(0).SerializeToBytes())
+
+    def EncodeGrrMessage():
+      return len(_GrrMessage(0).SerializeToBytes())
+
+    self._TimeBothBackends(EncodeStatEntry, "Encode StatEntry")
+    self._TimeBothBackends(EncodeGrrMessage, "Encode GrrMessage")
+
+  def testDecodeEncode(self):
+    """Benchmarks passing structs through without accessing them."""
+    for name, value in self.CORPUS.items():
+      data = value.SerializeToBytes()
+      cls = value.__class__
+
+      def DecodeEncode():
+        return len(cls.FromSerializedBytes(data).SerializeToBytes())  # pylint: disable=cell-var-from-loop
+
+      self._TimeBothBackends(
+          DecodeEncode,
+          "Decode and encode %s" % name,
+          repetitions=self._Repetitions(name))
+
+
+@contextlib.contextmanager
+def _LazyDecoding(enabled):
+  previous = rdf_structs.IsLazyDecodingEnabled()
+  rdf_structs.EnableLazyDecoding(enabled)
+  try:
+    yield
+  finally:
+    rdf_structs.EnableLazyDecoding(previous)
+
+
+def _FlowResult(i):
+  return rdf_flow_objects.FlowResult(
+      client_id="C.1234567890abcdef",
+      flow_id="ABCDEF12",
+      hunt_id="ABCDEF12",
+      timestamp=rdfvalue.RDFDatetime(1570000000000000 + i),
+      tag="tag:%d" % i,
+      payload=_StatEntry(i))
+
+
+class LazyDecodingBenchmark(benchmark_test_lib.MicroBenchmarks):
+  """Compares eager and lazy decoding of serialized structs."""
+
+  REPEATS = 100
+  BATCH_SIZE = 100
+  units = "us"
+
+  def setUp(self):
+    super().setUp(["Peak memory (KiB)"], ["<20"])
+
+    self.messages = [_GrrMessage(i).SerializeToBytes()
+                     for i in range(self.BATCH_SIZE)]
+    self.results = [_FlowResult(i).SerializeToBytes()
+                    for i in range(self.BATCH_SIZE)]
+
+  def _TimeBothModes(self, callback, name):
+    """Times a callback processing a batch of messages in both modes."""
+    for enabled in [False, True]:
+      with _LazyDecoding(enabled):
+        tracemalloc.start()
+        callback()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        start = time.time()
+        for _ in range(self.REPEATS):
+          callback()
+        time_taken = (time.time() - start) / self.REPEATS / self.BATCH_SIZE
+
+      self.AddResult("%s (%s)" % (name, "lazy" if enabled else "eager"),
+                     time_taken, self.REPEATS, "%.1f" % (peak / 1024))
+
+  def testGrrMessageRouting(self):
+    """Benchmarks reading the routing fields of messages and passing them on."""
+
+    def Route():
+      return [
+          (msg.session_id, msg.request_id, msg.SerializeToBytes())
+          for msg in map(rdf_flows.GrrMessage.FromSerializedBytes,
+                         self.messages)
+      ]
+
+    self._TimeBothModes(Route, "Route GrrMessage")
+
+  def testGrrMessagePayloadType(self):
+    """Benchmarks reading the payload type of messages."""
+
+    def PayloadType():
+      return [
+          rdf_flows.GrrMessage.FromSerializedBytes(data).args_rdf_name
+          for data in self.messages
+      ]
+
+    self._TimeBothModes(PayloadType, "Payload type of GrrMessage")
+
+  def testFlowResultTypeFiltering(self):
+    """Benchmarks filtering results by payload type."""
+
+    def Filter():
+      return [
+          result for result in map(rdf_flow_objects.FlowResult
+                                   .FromSerializedBytes, self.results)
+          if result.payload.__class__ is rdf_client_fs.StatEntry
+      ]
+
+    self._TimeBothModes(Filter, "Filter FlowResult by type")
+
+  def testFlowResultCopy(self):
+    """Benchmarks reading results and writing them back with a new tag."""
+
+    def Retag():
+      output = []
+      for data in self.results:
+        result = rdf_flow_objects.FlowResult.FromSerializedBytes(data)
+        result.tag = "retagged"
+        output.append(result.SerializeToBytes())
+      return output
+
+    self._TimeBothModes(Retag, "Retag FlowResult")
+
+  def testFullAccess(self):
+    """Benchmarks decoding all the fields, the worst case for lazy decoding."""
+
+    def Compare():
+      return [
+          rdf_flow_objects.FlowResult.FromSerializedBytes(data) == result
+          for data, result in zip(self.results, self.expected)
+      ]
+
+    self.expected = [
+        rdf_flow_objects.FlowResult.FromSerializedBytes(data)
+        for data in self.results
+    ]
+    self._TimeBothModes(Compare, "Compare FlowResult")
+
+
+class PrimitivesBenchmark(benchmark_test_lib.MicroBenchmarks):
+  """Benchmarks building and sorting large numbers of primitive RDFValues."""
+
+  # Timelines and recursive file listings have millions of entries, set this to
+  # a few millions for representative memory numbers.
+  COUNT = 100000
+  units = "s"
+
+  def setUp(self):
+    super().setUp(["Peak memory (MiB)"], ["<20"])
+
+  def _Run(self, callback, name):
+    """Runs a callback once timed and once with allocations traced."""
+    start = time.time()
+    callback()
+    time_taken = time.time() - start
+
+    tracemalloc.start()
+    result = callback()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    self.AddResult(name, time_taken, self.COUNT, "%.1f" % (peak / 1024**2))
+
+  def testTimeline(self):
+    """Benchmarks sorting timeline entries by modification time."""
+    entries = [
+        rdf_timeline.TimelineEntry(
+            path=b"/foo/bar/%d" % i,
+            size=i * 4096,
+            mtime_ns=(1570000000 + (i * 7919) % self.COUNT) * 10**9)
+        for i in range(self.COUNT)
+    ]
+
+    def SortTimeline():
+      rows = [(rdfvalue.RDFDatetime.FromMicrosecondsSinceEpoch(
+          entry.mtime_ns // 1000), rdfvalue.ByteSize(entry.size), entry.path)
+              for entry in entries]
+      rows.sort()
+      return rows
+
+    self._Run(SortTimeline, "Sort timeline entries")
+
+  def testStatEntries(self):
+    """Benchmarks building StatEntries and sorting them by modification time."""
+
+    def SortStatEntries():
+      stat_entries = [
+          rdf_client_fs.StatEntry(
+              st_mode=0o100644,
+              st_size=i * 4096,
+              st_atime=rdfvalue.RDFDatetimeSeconds(1570000000 + i),
+              st_mtime=rdfvalue.RDFDatetimeSeconds(1570000000 +
+                                                   (i * 7919) % self.COUNT),
+              st_ctime=rdfvalue.RDFDatetimeSeconds(1570000000 + i))
+          for i in range(self.COUNT)
+      ]
+      stat_entries.sort(key=lambda stat_entry: stat_entry.st_mtime)
+      return stat_entries
+
+    self._Run(SortStatEntries, "Sort StatEntries")
+
+  def testDurations(self):
+    """Benchmarks building and sorting Durations."""
+
+    def SortDurations():
+      durations = [
+          rdfvalue.Duration.From((i * 7919) % self.COUNT, rdfvalue.SECONDS)
+          for i in range(self.COUNT)
+      ]
+      durations.sort()
+      return durations
+
+    self._Run(SortDurations, "Sort Durations")
+
+  def testEnums(self):
+    """Benchmarks decoding enum fields."""
+    data = [
+        rdf_paths.PathSpec(
+            path="/foo/%d" % i,
+            pathtype=rdf_paths.PathSpec.PathType.OS).SerializeToBytes()
+        for i in range(self.COUNT)
+    ]
+
+    def DecodeEnums():
+      return [
+          rdf_paths.PathSpec.FromSerializedBytes(item).pathtype
+          for item in data
+      ]
+
+    self._Run(DecodeEnums, "Decode enums")
+
+
 def main(argv):
   # Run the full test suite
   test_lib.main(argv)
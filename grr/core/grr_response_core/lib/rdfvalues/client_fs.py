@@ -106,6 +106,9 @@ class Volumes(rdf_protodict.RDFValueArray):
 
 class StatMode(rdfvalue.RDFInteger):
   """The mode of a file."""
+
+  __slots__ = ()
+
   protobuf_type = "unsigned_integer"
 
   def __str__(self) -> Text:
@@ -159,12 +162,16 @@ class StatMode(rdfvalue.RDFInteger):
 class StatExtFlagsOsx(rdfvalue.RDFInteger):
   """Extended file attributes for Mac (set by `chflags`)."""
 
+  __slots__ = ()
+
   protobuf_type = "unsigned_integer_32"
 
 
 class StatExtFlagsLinux(rdfvalue.RDFInteger):
   """Extended file attributes as reported by `lsattr`."""
 
+  __slots__ = ()
+
   protobuf_type = "unsigned_integer_32"
 
 
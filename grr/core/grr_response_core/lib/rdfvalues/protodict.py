@@ -177,6 +177,9 @@ class Dict(rdf_structs.RDFProtoStruct):
       KeyValue,
   ]
 
+  # The mapping in self._values is built from the raw data on SetRawData.
+  supports_lazy_decoding = False
+
   _values = None
 
   def __init__(self, initializer=None, **kwargs):
@@ -13,6 +13,7 @@ import struct
 from typing import ByteString, Iterator, Optional, Sequence, Text, Type, TypeVar, cast
 
 from google.protobuf import any_pb2
+from google.protobuf import message as pb_message
 from google.protobuf import wrappers_pb2
 from google.protobuf import text_format
 from grr_response_core.lib import rdfvalue
@@ -253,6 +254,9 @@ def _SerializeEntries(entries):
     if wire_format is None or (python_format and
                                type_descriptor.IsDirty(python_format)):
       wire_format = type_descriptor.ConvertToWireFormat(python_format)
+    elif wire_format.__class__ is _PrimitiveValue:
+      wire_format = type_descriptor.ConvertPrimitiveToWireFormat(
+          wire_format.value)
 
     precondition.AssertIterableType(wire_format, bytes)
     output.extend(wire_format)
@@ -313,6 +317,211 @@ if _semantic:
   SplitBuffer = _semantic.split_buffer
 # pylint: enable=invalid-name
 
+# Whether RDFProtoStructs defined from a generated protobuf class are parsed
+# and serialized by the protobuf library. See EnableProtobufBackend().
+_protobuf_backend_enabled = False
+
+
+def EnableProtobufBackend(enabled: bool = True) -> None:
+  """Enables or disables the protobuf library backend for RDFProtoStructs.
+
+  When enabled, RDFProtoStructs that are defined from a generated protobuf
+  class (see RDFProtoStruct.protobuf) are parsed and serialized using that
+  class instead of the pure Python codec in this module. Parsed fields are
+  still converted to their semantic types lazily, on first access.
+
+  The backend is only faster with the C++ (or upb) implementation of the
+  protobuf library. Fields are serialized ordered by field number rather than
+  by name, so the serialized form of a struct differs from the one produced by
+  the pure Python codec (but both parse into equal structs).
+
+  Args:
+    enabled: Whether the backend should be used.
+  """
+  global _protobuf_backend_enabled
+  _protobuf_backend_enabled = enabled
+
+
+def IsProtobufBackendEnabled() -> bool:
+  return _protobuf_backend_enabled
+
+
+# Whether serialized RDFStructs are only split into fields when a field is
+# accessed. See EnableLazyDecoding().
+_lazy_decoding_enabled = False
+
+
+def EnableLazyDecoding(enabled: bool = True) -> None:
+  """Enables or disables lazy decoding of serialized RDFStructs.
+
+  When enabled, RDFStruct.FromSerializedBytes only keeps the serialized data.
+  The data is split into fields when the struct is first accessed, and
+  embedded structs are only split when they are accessed themselves. Structs
+  that were not modified since they were parsed serialize to the exact bytes
+  they were parsed from, without encoding any of their fields.
+
+  Malformed data is reported when the struct is first accessed rather than
+  when it is parsed.
+
+  Args:
+    enabled: Whether serialized structs should be decoded lazily.
+  """
+  global _lazy_decoding_enabled
+  _lazy_decoding_enabled = enabled
+
+
+def IsLazyDecodingEnabled() -> bool:
+  return _lazy_decoding_enabled
+
+
+class _PrimitiveValue(object):
+  """A raw field value read from a generated protobuf message.
+
+  Used in place of the wire format in the raw data of structs parsed by the
+  protobuf library backend. The value is converted into the python format on
+  first access, just like the wire format.
+  """
+
+  __slots__ = ("value",)
+
+  def __init__(self, value):
+    self.value = value
+
+  def __deepcopy__(self, memo):
+    return _PrimitiveValue(copy.deepcopy(self.value, memo))
+
+
+def _ConvertFromWireFormat(type_descriptor, wire_format, container):
+  """Converts a wire format or a primitive value into the python format."""
+  if wire_format.__class__ is _PrimitiveValue:
+    return type_descriptor.ConvertFromPrimitive(
+        wire_format.value, container=container)
+  return type_descriptor.ConvertFromWireFormat(wire_format, container=container)
+
+
+def _ReadPrimitiveProtoIntoObject(proto, value_obj):
+  """Stores fields of a generated protobuf message in the raw data of a struct.
+
+  Args:
+    proto: A message of value_obj's protobuf class.
+    value_obj: An RDFProtoStruct that supports the protobuf library backend.
+
+  Returns:
+    False if the message has unknown fields which can't be represented as
+    primitive values, True otherwise.
+  """
+  if proto.UnknownFields():
+    return False
+
+  raw_data = value_obj.GetRawData()
+  type_infos_by_field_number = value_obj.type_infos_by_field_number
+  for field, value in proto.ListFields():
+    type_descriptor = type_infos_by_field_number[field.number]
+    raw_data[type_descriptor.name] = (None, _PrimitiveValue(value),
+                                      type_descriptor)
+
+  value_obj.SetRawData(raw_data)
+  return True
+
+
+def _ReadIntoObjectWithProtobufBackend(buff, value_obj):
+  """Parses a serialized struct using the protobuf library.
+
+  Args:
+    buff: Serialized struct.
+    value_obj: An RDFProtoStruct that supports the protobuf library backend.
+
+  Returns:
+    True if the struct was parsed. False if it has to be parsed by the pure
+    Python codec instead.
+  """
+  try:
+    proto = value_obj.protobuf.FromString(buff)
+  except pb_message.DecodeError:
+    # Let the pure Python codec report the error.
+    return False
+
+  return _ReadPrimitiveProtoIntoObject(proto, value_obj)
+
+
+def _MergeWireFormatIntoPrimitiveProto(wire_format, proto):
+  proto.MergeFromString(b"".join(wire_format))
+
+
+def _MergeStructIntoPrimitiveProto(value_obj, proto):
+  """Merges fields of a struct into a generated protobuf message."""
+  if (value_obj.SupportsProtobufBackend() and
+      value_obj.protobuf.DESCRIPTOR.full_name == proto.DESCRIPTOR.full_name):
+    _MergeEntriesIntoPrimitiveProto(value_obj.GetRawData().values(), proto)
+  else:
+    proto.MergeFromString(
+        _SerializeEntries(_GetOrderedEntries(value_obj.GetRawData())))
+
+
+def _AppendToPrimitiveProtoList(python_format, wire_format, type_descriptor,
+                                container, proto):
+  """Appends an element of a repeated field to a generated protobuf message."""
+  if python_format is None:
+    if wire_format.__class__ is _PrimitiveValue:
+      container.extend([wire_format.value])
+    else:
+      _MergeWireFormatIntoPrimitiveProto(wire_format, proto)
+  elif type_descriptor.__class__ is ProtoEmbedded:
+    _MergeStructIntoPrimitiveProto(python_format, container.add())
+  elif type_descriptor.__class__ is ProtoDynamicAnyValueEmbedded:
+    _MergeWireFormatIntoPrimitiveProto(
+        type_descriptor.ConvertToWireFormat(python_format), proto)
+  else:
+    try:
+      container.append(type_descriptor.ConvertToPrimitive(python_format))
+    except (TypeError, ValueError):
+      _MergeWireFormatIntoPrimitiveProto(
+          type_descriptor.ConvertToWireFormat(python_format), proto)
+
+
+def _MergeEntriesIntoPrimitiveProto(entries, proto):
+  """Merges raw data entries of a struct into a generated protobuf message."""
+  for python_format, wire_format, type_descriptor in entries:
+    # Unknown fields are stored in the wire format.
+    if type_descriptor is None:
+      _MergeWireFormatIntoPrimitiveProto(wire_format, proto)
+      continue
+
+    name = type_descriptor.name
+    if python_format is None:
+      if wire_format.__class__ is not _PrimitiveValue:
+        _MergeWireFormatIntoPrimitiveProto(wire_format, proto)
+      elif type_descriptor.__class__ is ProtoList:
+        getattr(proto, name).extend(wire_format.value)
+      elif isinstance(wire_format.value, pb_message.Message):
+        getattr(proto, name).CopyFrom(wire_format.value)
+      else:
+        setattr(proto, name, wire_format.value)
+
+    elif type_descriptor.__class__ is ProtoList:
+      container = getattr(proto, name)
+      for item_python_format, item_wire_format in python_format.wrapped_list:
+        _AppendToPrimitiveProtoList(item_python_format, item_wire_format,
+                                    type_descriptor.delegate, container, proto)
+
+    elif type_descriptor.__class__ is ProtoEmbedded:
+      nested_proto = getattr(proto, name)
+      nested_proto.SetInParent()
+      _MergeStructIntoPrimitiveProto(python_format, nested_proto)
+
+    elif type_descriptor.__class__ is ProtoDynamicAnyValueEmbedded:
+      _MergeWireFormatIntoPrimitiveProto(
+          type_descriptor.ConvertToWireFormat(python_format), proto)
+
+    else:
+      try:
+        setattr(proto, name, type_descriptor.ConvertToPrimitive(python_format))
+      except (TypeError, ValueError):
+        # Values which the protobuf library refuses (e.g. undefined enum
+        # values) are merged in their wire format.
+        _MergeWireFormatIntoPrimitiveProto(
+            type_descriptor.ConvertToWireFormat(python_format), proto)
+
 
 class ProtoType(type_info.TypeInfoObject):
   """A specific type descriptor for protobuf fields.
@@ -381,6 +590,10 @@ class ProtoType(type_info.TypeInfoObject):
     self.tag = self.field_number << 3 | self.wire_type
     self.encoded_tag = VarintEncode(self.tag)
 
+  # Whether fields of this type can be parsed and serialized by the protobuf
+  # library backend (see EnableProtobufBackend()).
+  supports_protobuf_backend = False
+
   def IsDirty(self, unused_python_format):
     """Return and clear the dirty state of the python object."""
     return False
@@ -434,6 +647,29 @@ class ProtoType(type_info.TypeInfoObject):
     """
     raise NotImplementedError
 
+  def ConvertFromPrimitive(self, value, container=None):
+    """Convert a field value of a generated protobuf message to python format.
+
+    This is the protobuf library backend counterpart of ConvertFromWireFormat().
+
+    Args:
+      value: A field value as returned by the generated protobuf message.
+      container: The protobuf that contains this field.
+
+    Returns:
+      The parameter encoded in the python format representation.
+    """
+    _ = container
+    return value
+
+  def ConvertToPrimitive(self, value):
+    """Convert a python format value to a generated protobuf field value."""
+    return value
+
+  def ConvertPrimitiveToWireFormat(self, value):
+    """Convert a field value of a generated protobuf message to wire format."""
+    return self.ConvertToWireFormat(self.ConvertFromPrimitive(value))
+
   def _FormatDescriptionComment(self):
     result = "".join(["\n  // %s\n" % x for x in self.description.splitlines()])
     return result
@@ -479,6 +715,7 @@ class ProtoString(ProtoType):
   """A string encoded in a protobuf."""
 
   wire_type = WIRETYPE_LENGTH_DELIMITED
+  supports_protobuf_backend = True
 
   # This descriptor describes unicode strings.
   type = rdfvalue.RDFString
@@ -541,6 +778,7 @@ class ProtoBinary(ProtoType):
   """A binary string encoded in a protobuf."""
 
   wire_type = WIRETYPE_LENGTH_DELIMITED
+  supports_protobuf_backend = True
 
   # This descriptor describes strings.
   type = rdfvalue.RDFBytes
@@ -587,6 +825,7 @@ class ProtoUnsignedInteger(ProtoType):
   """An unsigned VarInt encoded in the protobuf."""
 
   wire_type = WIRETYPE_VARINT
+  supports_protobuf_backend = True
 
   # This descriptor describes integers.
   type = rdfvalue.RDFInteger
@@ -721,6 +960,8 @@ class EnumNamedValue(rdfvalue.RDFPrimitive):
   Enums are just integers, except when printed they have a name.
   """
 
+  __slots__ = ()
+
   protobuf_type = "integer"
 
   def __init__(self,
@@ -859,14 +1100,23 @@ class ProtoEnum(ProtoSignedInteger):
     self.enum = self.enum_container.enum_dict
     self.reverse_enum = self.enum_container.reverse_enum
 
+    # Enum values are immutable, so decoded fields share the values of the
+    # container instead of allocating new ones.
+    self._values_by_id = {int(v): v for v in self.enum.values()}
+
     # Ensure the default is a valid enum value.
     if default is not None:
       self.default = self.Validate(default)
 
+  def _FromInt(self, value):
+    result = self._values_by_id.get(value)
+    if result is None:
+      result = EnumNamedValue(value, name=self.reverse_enum.get(value))
+    return result
+
   def GetDefault(self, container=None):
     _ = container
-    return EnumNamedValue(
-        self.default, name=self.reverse_enum.get(self.default))
+    return self._FromInt(self.default)
 
   def Validate(self, value, **_):
     """Check that value is a valid enum."""
@@ -909,8 +1159,13 @@ class ProtoEnum(ProtoSignedInteger):
     return (self.encoded_tag, b"", SignedVarintEncode(int(value)))
 
   def ConvertFromWireFormat(self, value, container=None):
-    value = SignedVarintReader(value[2], 0)[0]
-    return EnumNamedValue(value, name=self.reverse_enum.get(value))
+    return self._FromInt(SignedVarintReader(value[2], 0)[0])
+
+  def ConvertFromPrimitive(self, value, container=None):
+    return self._FromInt(value)
+
+  def ConvertToPrimitive(self, value):
+    return int(value)
 
 
 class ProtoBoolean(ProtoEnum):
@@ -943,6 +1198,12 @@ class ProtoBoolean(ProtoEnum):
   def ConvertToWireFormat(self, value):
     return super(ProtoBoolean, self).ConvertToWireFormat(bool(value))
 
+  def ConvertFromPrimitive(self, value, container=None):
+    return bool(value)
+
+  def ConvertToPrimitive(self, value):
+    return bool(value)
+
 
 class ProtoEmbedded(ProtoType):
   """A field may be embedded as a serialized protobuf.
@@ -956,6 +1217,7 @@ class ProtoEmbedded(ProtoType):
   """
 
   wire_type = WIRETYPE_LENGTH_DELIMITED
+  supports_protobuf_backend = True
 
   # When we access a nested protobuf we automatically create it and assign it to
   # the owner protobuf.
@@ -989,6 +1251,9 @@ class ProtoEmbedded(ProtoType):
 
   def ConvertFromWireFormat(self, value, container=None):
     """The wire format is simply a string."""
+    if _lazy_decoding_enabled:
+      return self.type.FromSerializedBytes(value[2])
+
     result = self.type()
     ReadIntoObject(value[2], 0, result)
 
@@ -996,7 +1261,23 @@ class ProtoEmbedded(ProtoType):
 
   def ConvertToWireFormat(self, value):
     """Encode the nested protobuf into wire format."""
-    output = _SerializeEntries(_GetOrderedEntries(value.GetRawData()))
+    output = value._GetUnmodifiedBytes()  # pylint: disable=protected-access
+    if output is None:
+      output = _SerializeEntries(_GetOrderedEntries(value.GetRawData()))
+    return (self.encoded_tag, VarintEncode(len(output)), output)
+
+  def ConvertFromPrimitive(self, value, container=None):
+    """The primitive value is a generated protobuf message."""
+    result = self.type()
+    if not (result.SupportsProtobufBackend() and
+            result.protobuf.DESCRIPTOR.full_name == value.DESCRIPTOR.full_name
+            and _ReadPrimitiveProtoIntoObject(value, result)):
+      ReadIntoObject(value.SerializeToString(), 0, result)
+
+    return result
+
+  def ConvertPrimitiveToWireFormat(self, value):
+    output = value.SerializeToString()
     return (self.encoded_tag, VarintEncode(len(output)), output)
 
   def LateBind(self, target=None):
@@ -1026,15 +1307,7 @@ class ProtoEmbedded(ProtoType):
 
   def IsDirty(self, proto):
     """Return and clear the dirty state of the python object."""
-    if proto.dirty:
-      return True
-
-    for python_format, _, type_descriptor in proto.GetRawData().values():
-      if python_format is not None and type_descriptor.IsDirty(python_format):
-        proto.dirty = True
-        return True
-
-    return False
+    return proto._IsModified()  # pylint: disable=protected-access
 
   def GetDefault(self, container=None):
     """When a nested proto is accessed, default to an empty one."""
@@ -1073,6 +1346,7 @@ class ProtoDynamicEmbedded(ProtoType):
   """An embedded field which has a dynamic type."""
 
   wire_type = WIRETYPE_LENGTH_DELIMITED
+  supports_protobuf_backend = True
 
   set_default_on_access = True
 
@@ -1101,6 +1375,15 @@ class ProtoDynamicEmbedded(ProtoType):
     data = serialization.ToBytes(value)
     return (self.encoded_tag, VarintEncode(len(data)), data)
 
+  def ConvertFromPrimitive(self, value, container=None):
+    return serialization.FromBytes(self._type(container), value)
+
+  def ConvertToPrimitive(self, value):
+    return serialization.ToBytes(value)
+
+  def ConvertPrimitiveToWireFormat(self, value):
+    return (self.encoded_tag, VarintEncode(len(value)), value)
+
   def Validate(self, value, container=None):
     if self._type is None:
       return value
@@ -1153,6 +1436,19 @@ class ProtoDynamicAnyValueEmbedded(ProtoDynamicEmbedded):
     """The wire format is an AnyValue message."""
     result = AnyValue()
     ReadIntoObject(value[2], 0, result)
+    return self._ConvertFromAnyValue(result, container)
+
+  def ConvertFromPrimitive(self, value, container=None):
+    """The primitive value is a google.protobuf.Any message."""
+    result = AnyValue(type_url=value.type_url, value=value.value)
+    return self._ConvertFromAnyValue(result, container)
+
+  def ConvertPrimitiveToWireFormat(self, value):
+    output = value.SerializeToString()
+    return (self.encoded_tag, VarintEncode(len(output)), output)
+
+  def _ConvertFromAnyValue(self, result, container):
+    """Unpacks the value stored in an AnyValue."""
     if self._type is not None:
       converted_value = self._type(container)
     else:
@@ -1265,9 +1561,11 @@ class RepeatedFieldHelper(collections.Sequence, object):
     if self.dirty:
       return True
 
-    # If any of the items is dirty we are also dirty.
-    for item in self.wrapped_list:
-      if self.type_descriptor.IsDirty(item[0]):
+    # If any of the items is dirty we are also dirty. Items that were not
+    # decoded yet can't be dirty.
+    for python_format, _ in self.wrapped_list:
+      if (python_format is not None and
+          self.type_descriptor.IsDirty(python_format)):
         self.dirty = True
         return True
 
@@ -1323,8 +1621,8 @@ class RepeatedFieldHelper(collections.Sequence, object):
 
     python_format, wire_format = self.wrapped_list[item]
     if python_format is None:
-      python_format = self.type_descriptor.ConvertFromWireFormat(
-          wire_format, container=self.container)
+      python_format = _ConvertFromWireFormat(self.type_descriptor, wire_format,
+                                             self.container)
 
       self.wrapped_list[item] = (python_format, wire_format)
 
@@ -1441,6 +1739,10 @@ class ProtoList(ProtoType):
 
     return result
 
+  @property
+  def supports_protobuf_backend(self):
+    return self.delegate.supports_protobuf_backend
+
   def ConvertFromWireFormat(self, value, container=None):
     result = RepeatedFieldHelper(type_descriptor=self.delegate)
     for wire_format in SplitBuffer(value[2]):
@@ -1448,6 +1750,20 @@ class ProtoList(ProtoType):
 
     return result
 
+  def ConvertFromPrimitive(self, value, container=None):
+    """The primitive value is a repeated field container."""
+    wrapped_list = [(None, _PrimitiveValue(item)) for item in value]
+    return RepeatedFieldHelper(
+        wrapped_list=wrapped_list,
+        type_descriptor=self.delegate,
+        container=container)
+
+  def ConvertPrimitiveToWireFormat(self, value):
+    output = b"".join(
+        b"".join(self.delegate.ConvertPrimitiveToWireFormat(item))
+        for item in value)
+    return b"", b"", output
+
   def ConvertToWireFormat(self, value):
     """Convert to the wire format.
 
@@ -1529,6 +1845,7 @@ class ProtoRDFValue(ProtoType):
 
   type = None
   wire_type = WIRETYPE_LENGTH_DELIMITED
+  supports_protobuf_backend = True
 
   _PROTO_DATA_STORE_LOOKUP = dict(
       bytes=ProtoBinary,
@@ -1637,6 +1954,12 @@ class ProtoRDFValue(ProtoType):
     return self.primitive_desc.ConvertToWireFormat(
         value.SerializeToWireFormat())
 
+  def ConvertFromPrimitive(self, value, container=None):
+    return self.type(value)
+
+  def ConvertToPrimitive(self, value):
+    return value.SerializeToWireFormat()
+
   def Copy(self, field_number=None):
     """Returns descriptor copy, optionally changing field number."""
     new_args = self._kwargs.copy()
@@ -1746,9 +2069,17 @@ class RDFStruct(rdfvalue.RDFValue, metaclass=RDFStructMetaclass):  # pylint: dis
   # Mark as dirty each time we modify this object.
   dirty = False
 
-  # Stores the raw data here.
+  # Stores the raw data here. None if the struct was parsed lazily and was not
+  # split into fields yet.
   _data = None
 
+  # The bytes a lazily parsed struct was parsed from.
+  _serialized = None
+
+  # Structs that keep state derived from their raw data (see SetRawData) must
+  # be split into fields when they are parsed.
+  supports_lazy_decoding = True
+
   def __init__(self, initializer=None, **kwargs):
     super().__init__()
 
@@ -1802,9 +2133,13 @@ class RDFStruct(rdfvalue.RDFValue, metaclass=RDFStructMetaclass):  # pylint: dis
   def Clear(self):
     """Clear all the fields."""
     self._data = {}
+    self.dirty = True
 
   def HasField(self, field_name):
     """Checks if the field exists."""
+    if self._data is None:
+      self._Split()
+
     return field_name in self._data
 
   def _CopyRawData(self):
@@ -1819,6 +2154,9 @@ class RDFStruct(rdfvalue.RDFValue, metaclass=RDFStructMetaclass):  # pylint: dis
     # If it is, someone else might have changed the subobject and the
     # serialization is not accurate anymore. This is indicated by the dirty
     # flag. Type_infos can be just copied by reference.
+    if self._data is None:
+      self._Split()
+
     for name, (obj, serialized, t_info) in self._data.items():
       if serialized is None:
         obj = copy.copy(obj)
@@ -1834,18 +2172,74 @@ class RDFStruct(rdfvalue.RDFValue, metaclass=RDFStructMetaclass):  # pylint: dis
       new_raw_data[name] = (obj, serialized, t_info)
     return new_raw_data
 
+  def _CopyLazily(self):
+    """Copies a struct that was not split into fields yet."""
+    result = self.__class__()
+    result._data = None  # pylint: disable=protected-access
+    result._serialized = self._serialized  # pylint: disable=protected-access
+    return result
+
   def Copy(self: T) -> T:
     """Make an efficient copy of this protobuf."""
+    if self._data is None:
+      return self._CopyLazily()
+
     result = self.__class__()
     result.SetRawData(self._CopyRawData())
     return result
 
   def __deepcopy__(self, memo):
+    if self._data is None:
+      return self._CopyLazily()
+
     result = self.__class__()
     result.SetRawData(copy.deepcopy(self._data, memo))
 
     return result
 
+  def _Split(self):
+    """Splits the data of a lazily parsed struct into fields."""
+    self._data = {}
+    try:
+      if not (_protobuf_backend_enabled and self.SupportsProtobufBackend() and
+              _ReadIntoObjectWithProtobufBackend(self._serialized, self)):
+        ReadIntoObject(self._serialized, 0, self)
+    except:
+      # Keep the struct unsplit so that every access reports the error.
+      self._data = None
+      raise
+
+    # Splitting does not modify the struct.
+    self.dirty = False
+
+  def _IsModified(self):
+    """Checks whether the struct was modified since it was created or parsed."""
+    if self.dirty:
+      return True
+
+    # Structs that were not split into fields can't have modified fields.
+    if self._data is None:
+      return False
+
+    for python_format, _, type_descriptor in self._data.values():
+      if python_format is not None and type_descriptor.IsDirty(python_format):
+        self.dirty = True
+        return True
+
+    return False
+
+  def _GetUnmodifiedBytes(self):
+    """Returns the bytes the struct was lazily parsed from, if still valid.
+
+    Returns:
+      The serialized struct, or None if the struct was not parsed lazily or was
+      modified since.
+    """
+    if self._serialized is None or self._IsModified():
+      return None
+
+    return self._serialized
+
   def GetRawData(self):
     """Retrieves the raw python representation of the object.
 
@@ -1854,6 +2248,9 @@ class RDFStruct(rdfvalue.RDFValue, metaclass=RDFStructMetaclass):  # pylint: dis
     Returns:
       the raw python object representation (a dict).
     """
+    if self._data is None:
+      self._Split()
+
     return self._data
 
   def ListSetFields(self):
@@ -1862,6 +2259,9 @@ class RDFStruct(rdfvalue.RDFValue, metaclass=RDFStructMetaclass):  # pylint: dis
     Yields:
       a tuple of (type_descriptor, value) for each field which is set.
     """
+    if self._data is None:
+      self._Split()
+
     for type_descriptor in self.type_infos:
       if type_descriptor.name in self._data:
         yield type_descriptor, self.Get(type_descriptor.name)
@@ -1870,14 +2270,70 @@ class RDFStruct(rdfvalue.RDFValue, metaclass=RDFStructMetaclass):  # pylint: dis
     self._data = data
     self.dirty = True
 
+  @classmethod
+  def SupportsProtobufBackend(cls):
+    """Checks whether the protobuf library backend can handle this struct.
+
+    The backend is only supported for structs defined from a generated protobuf
+    class whose fields all map one-to-one to type descriptors supported by
+    the backend.
+
+    Returns:
+      True if the struct can be parsed and serialized by the backend.
+    """
+    supported = cls.__dict__.get("_supports_protobuf_backend")
+    if supported is not None:
+      return supported
+
+    # Do not cache the result until all fields are bound.
+    if cls.late_bound_type_infos:
+      return False
+
+    supported = cls.protobuf is not None
+    if supported:
+      fields = cls.protobuf.DESCRIPTOR.fields_by_number
+      supported = len(fields) == len(cls.type_infos_by_field_number)
+      for type_descriptor in cls.type_infos:
+        field = fields.get(type_descriptor.field_number)
+        if (field is None or field.name != type_descriptor.name or
+            not type_descriptor.supports_protobuf_backend):
+          supported = False
+          break
+
+    cls._supports_protobuf_backend = supported
+    return supported
+
   def SerializeToBytes(self):
+    serialized = self._GetUnmodifiedBytes()
+    if serialized is not None:
+      return serialized
+
+    if _protobuf_backend_enabled and self.SupportsProtobufBackend():
+      proto = self.protobuf()
+      _MergeEntriesIntoPrimitiveProto(self.GetRawData().values(), proto)
+      return proto.SerializeToString()
+
+    if self._data is None:
+      self._Split()
+
     return _SerializeEntries(_GetOrderedEntries(self._data))
 
   @classmethod
   def FromSerializedBytes(cls, value: bytes):
     precondition.AssertType(value, bytes)
     instance = cls()
-    ReadIntoObject(value, 0, instance)
+
+    # Structs whose constructor sets fields are merged with the parsed data
+    # right away.
+    if (_lazy_decoding_enabled and cls.supports_lazy_decoding and
+        not instance.dirty and not instance._data):  # pylint: disable=protected-access
+      instance._data = None  # pylint: disable=protected-access
+      instance._serialized = value  # pylint: disable=protected-access
+      return instance
+
+    if not (_protobuf_backend_enabled and cls.SupportsProtobufBackend() and
+            _ReadIntoObjectWithProtobufBackend(value, instance)):
+      ReadIntoObject(value, 0, instance)
     instance.dirty = True
     return instance
 
@@ -1916,8 +2372,8 @@ class RDFStruct(rdfvalue.RDFValue, metaclass=RDFStructMetaclass):  # pylint: dis
     for k, (python_format, wire_format,
             type_descriptor) in sorted(self.GetRawData().items()):
       if python_format is None:
-        python_format = type_descriptor.ConvertFromWireFormat(
-            wire_format, container=self)
+        python_format = _ConvertFromWireFormat(type_descriptor, wire_format,
+                                               self)
 
       # Skip printing of unknown fields.
       if isinstance(k, str):
@@ -1992,6 +2448,9 @@ class RDFStruct(rdfvalue.RDFValue, metaclass=RDFStructMetaclass):  # pylint: dis
     Returns:
       The attribute's value, or the attribute's type's default value, if unset.
     """
+    if self._data is None:
+      self._Split()
+
     entry = self._data.get(attr)
     # We dont have this field, try the defaults.
     if entry is None:
@@ -2011,8 +2470,7 @@ class RDFStruct(rdfvalue.RDFValue, metaclass=RDFStructMetaclass):  # pylint: dis
 
     # Decode on demand and cache for next time.
     if python_format is None:
-      python_format = type_descriptor.ConvertFromWireFormat(
-          wire_format, container=self)
+      python_format = _ConvertFromWireFormat(type_descriptor, wire_format, self)
 
       self._data[attr] = (python_format, wire_format, type_descriptor)
 
@@ -2194,6 +2652,8 @@ class RDFProtoStruct(RDFStruct):
         return value
 
   def __bool__(self):
+    if self._data is None:
+      return bool(self._serialized)
     return bool(self._data)
 
   # TODO: Remove after support for Python 2 is dropped.
@@ -2261,6 +2721,7 @@ class RDFProtoStruct(RDFStruct):
 
     cls.type_infos.Append(field_desc)
     cls.late_bound_type_infos.pop(field_desc.name, None)
+    cls._supports_protobuf_backend = None
 
     # Add direct accessors only if the class does not already have them.
     if not hasattr(cls, field_desc.name):
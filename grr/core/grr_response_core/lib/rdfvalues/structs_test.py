@@ -965,6 +965,142 @@ class GenericRDFProtoTest(test_lib.GRRBaseTest):
     sample = rdf_flows.GrrStatus()
     self.assertEqual(sample.status, rdf_flows.GrrStatus.ReturnedStatus.OK)
 
+  def testDecodedEnumsAreShared(self):
+    data = rdf_paths.PathSpec(pathtype="TSK").SerializeToBytes()
+    pathtype = rdf_paths.PathSpec.FromSerializedBytes(data).pathtype
+    self.assertIs(pathtype, rdf_paths.PathSpec.PathType.TSK)
+
+
+class ProtobufBackendTest(test_lib.GRRBaseTest):
+
+  def setUp(self):
+    super(ProtobufBackendTest, self).setUp()
+    previous = rdf_structs.IsProtobufBackendEnabled()
+    rdf_structs.EnableProtobufBackend()
+    self.addCleanup(rdf_structs.EnableProtobufBackend, previous)
+
+  def _StatEntry(self):
+    return rdf_client_fs.StatEntry(
+        pathspec=rdf_paths.PathSpec(
+            path="/foo/bar", pathtype=rdf_paths.PathSpec.PathType.OS),
+        st_mode=0o100644,
+        st_size=42,
+        st_mtime=rdfvalue.RDFDatetimeSeconds(1570000000),
+        registry_type=rdf_client_fs.StatEntry.RegistryType.REG_SZ)
+
+  def testSupportsProtobufBackend(self):
+    self.assertTrue(rdf_paths.PathSpec.SupportsProtobufBackend())
+    self.assertTrue(rdf_flows.GrrMessage.SupportsProtobufBackend())
+    # Structs without a protobuf can only use the pure Python codec.
+    self.assertFalse(TestStruct.SupportsProtobufBackend())
+
+  def testRoundTripMatchesPureCodec(self):
+    stat_entry = self._StatEntry()
+    message = rdf_flows.GrrMessage(
+        session_id="aff4:/C.1234567890abcdef/flows/F:ABCDEF12",
+        request_id=1,
+        response_id=2,
+        payload=stat_entry)
+
+    data = message.SerializeToBytes()
+    parsed = rdf_flows.GrrMessage.FromSerializedBytes(data)
+    self.assertEqual(parsed, message)
+    self.assertEqual(parsed.payload, stat_entry)
+    self.assertEqual(parsed.payload.pathspec.path, "/foo/bar")
+    self.assertEqual(parsed.payload.registry_type,
+                     rdf_client_fs.StatEntry.RegistryType.REG_SZ)
+
+    rdf_structs.EnableProtobufBackend(False)
+    self.assertEqual(rdf_flows.GrrMessage.FromSerializedBytes(data), message)
+    self.assertEqual(
+        rdf_flows.GrrMessage.FromSerializedBytes(
+            message.SerializeToBytes()), parsed)
+
+  def testUnknownFieldsArePreserved(self):
+    # Field number 1000, wire type varint, value 1.
+    unknown_field = b"\xc0\x3e\x01"
+    data = self._StatEntry().SerializeToBytes() + unknown_field
+
+    parsed = rdf_client_fs.StatEntry.FromSerializedBytes(data)
+    self.assertEqual(parsed.st_size, 42)
+    self.assertIn(unknown_field, parsed.SerializeToBytes())
+
+  def testStructsWithoutProtobufUsePureCodec(self):
+    sample = TestStruct(foobar="foo", int=5, repeated=["a", "b"])
+    parsed = TestStruct.FromSerializedBytes(sample.SerializeToBytes())
+    self.assertEqual(parsed, sample)
+
+
+class LazyDecodingTest(test_lib.GRRBaseTest):
+
+  def setUp(self):
+    super(LazyDecodingTest, self).setUp()
+    previous = rdf_structs.IsLazyDecodingEnabled()
+    rdf_structs.EnableLazyDecoding()
+    self.addCleanup(rdf_structs.EnableLazyDecoding, previous)
+
+  def _SerializedMessage(self):
+    return rdf_flows.GrrMessage(
+        session_id="aff4:/C.1234567890abcdef/flows/F:ABCDEF12",
+        request_id=1,
+        payload=rdf_client_fs.StatEntry(
+            pathspec=rdf_paths.PathSpec(
+                path="/foo/bar", pathtype=rdf_paths.PathSpec.PathType.OS),
+            st_size=42)).SerializeToBytes()
+
+  def testFieldsAreDecodedOnAccess(self):
+    data = self._SerializedMessage()
+    message = rdf_flows.GrrMessage.FromSerializedBytes(data)
+
+    self.assertEqual(message.request_id, 1)
+    self.assertEqual(message.payload.pathspec.path, "/foo/bar")
+    self.assertEqual(message.payload.st_size, 42)
+
+  def testUnmodifiedStructsSerializeToParsedBytes(self):
+    # Field order of the pure Python codec is not canonical, so reading and
+    # writing back a struct does not normally reproduce the input bytes.
+    data = b"".join(reversed(list(
+        b"".join(field) for field in rdf_structs.SplitBuffer(
+            self._SerializedMessage()))))
+
+    message = rdf_flows.GrrMessage.FromSerializedBytes(data)
+    self.assertIs(message.SerializeToBytes(), data)
+
+    self.assertEqual(message.payload.pathspec.path, "/foo/bar")
+    self.assertIs(message.SerializeToBytes(), data)
+
+  def testModifiedStructsAreSerialized(self):
+    data = self._SerializedMessage()
+
+    message = rdf_flows.GrrMessage.FromSerializedBytes(data)
+    message.request_id = 2
+    self.assertEqual(
+        rdf_flows.GrrMessage.FromSerializedBytes(
+            message.SerializeToBytes()).request_id, 2)
+
+  def testEmbeddedStructsAreDecodedLazily(self):
+    stat_entry = rdf_client_fs.StatEntry(
+        pathspec=rdf_paths.PathSpec(path="/foo/bar"), st_size=42)
+    data = stat_entry.SerializeToBytes()
+
+    parsed = rdf_client_fs.StatEntry.FromSerializedBytes(data)
+    parsed.pathspec.path = "/foo/baz"
+    self.assertEqual(
+        rdf_client_fs.StatEntry.FromSerializedBytes(
+            parsed.SerializeToBytes()).pathspec.path, "/foo/baz")
+
+    parsed = rdf_client_fs.StatEntry.FromSerializedBytes(data)
+    self.assertEqual(parsed.st_size, 42)
+    self.assertEqual(parsed.Copy(), stat_entry)
+
+  def testMalformedDataIsReportedOnAccess(self):
+    message = rdf_flows.GrrMessage.FromSerializedBytes(b"\xff")
+
+    with self.assertRaises(ValueError):
+      _ = message.session_id
+    with self.assertRaises(ValueError):
+      _ = message.session_id
+
 
 class EnumNamedValueTest(absltest.TestCase):
 
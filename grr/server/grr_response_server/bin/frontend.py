@@ -278,7 +278,8 @@ class GRRHTTPServer(socketserver.ThreadingMixIn, http_server.HTTPServer):
           max_queue_size=config.CONFIG["Frontend.max_queue_size"],
           message_expiry_time=config.CONFIG["Frontend.message_expiry_time"],
           max_retransmission_time=config
-          .CONFIG["Frontend.max_retransmission_time"])
+          .CONFIG["Frontend.max_retransmission_time"],
+          decoder_processes=config.CONFIG["Frontend.decoder_processes"])
     self.server_cert = config.CONFIG["Frontend.certificate"]
 
     (address, _) = server_address
@@ -293,6 +294,7 @@ class GRRHTTPServer(socketserver.ThreadingMixIn, http_server.HTTPServer):
 
   def Shutdown(self):
     self.shutdown()
+    self.frontend.Shutdown()
 
 
 def CreateServer(frontend=None):
@@ -338,6 +340,8 @@ def main(argv):
     httpd.serve_forever()
   except KeyboardInterrupt:
     print("Caught keyboard interrupt, stopping")
+  finally:
+    httpd.frontend.Shutdown()
 
 
 if __name__ == "__main__":
@@ -12,6 +12,7 @@ import mock
 
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib.rdfvalues import client_stats as rdf_client_stats
+from grr_response_core.lib.rdfvalues import flows as rdf_flows
 from grr_response_core.lib.rdfvalues import protodict as rdf_protodict
 from grr_response_server import data_store
 from grr_response_server import foreman
@@ -19,10 +20,12 @@ from grr_response_server import worker_lib
 from grr_response_server.rdfvalues import objects as rdf_objects
 from grr.test_lib import action_mocks
 from grr.test_lib import flow_test_lib
+from grr.test_lib import stats_test_lib
 from grr.test_lib import test_lib
 
 
-class GrrWorkerTest(flow_test_lib.FlowTestsBaseclass):
+class GrrWorkerTest(stats_test_lib.StatsTestMixin,
+                    flow_test_lib.FlowTestsBaseclass):
   """Tests the GRR Worker."""
 
   def testMessageHandlers(self):
@@ -79,8 +82,101 @@ class GrrWorkerTest(flow_test_lib.FlowTestsBaseclass):
     self.assertEqual(client_mock.storage["cpulimit"], [1000, 980, 960])
     self.assertEqual(client_mock.storage["networklimit"], [10000, 9000, 8000])
 
+  def testFlowProcessingRequestsForFlowInProgressAreCoalesced(self):
+    worker_obj = worker_lib.GRRWorker()
+
+    request = rdf_flows.FlowProcessingRequest(
+        client_id="C.1234567890123456", flow_id="12345678")
+    other_request = rdf_flows.FlowProcessingRequest(
+        client_id="C.1234567890123456", flow_id="ABCDEF12")
+
+    cycle_started = threading.Event()
+    resume = threading.Event()
+    cycles = []
+
+    def ProcessFlowCycle(client_id, flow_id, require_progress):
+      cycles.append((flow_id, require_progress))
+      if len(cycles) == 1:
+        cycle_started.set()
+        resume.wait(10)
+
+    with mock.patch.object(
+        worker_obj, "_ProcessFlowCycle", side_effect=ProcessFlowCycle):
+      thread = threading.Thread(
+          target=worker_obj.ProcessFlow, args=(request,))
+      thread.start()
+      self.assertTrue(cycle_started.wait(10))
+
+      with self.assertStatsCounterDelta(
+          2, worker_lib.FLOW_PROCESSING_COALESCED_REQUESTS):
+        with self.assertStatsCounterDelta(
+            3, worker_lib.FLOW_PROCESSING_SAVED_DB_ROUND_TRIPS):
+          worker_obj.ProcessFlow(request)
+          worker_obj.ProcessFlow(request)
+          # Requests for other flows are processed independently.
+          worker_obj.ProcessFlow(other_request)
+
+          resume.set()
+          thread.join()
+
+    self.assertEqual(cycles, [("12345678", True), ("ABCDEF12", True),
+                              ("12345678", False)])
+    self.assertEqual(data_store.REL_DB.ReadFlowProcessingRequests(), [])
+
+  def testFailedFlowProcessingDoesNotBlockLaterRequests(self):
+    worker_obj = worker_lib.GRRWorker()
+    request = rdf_flows.FlowProcessingRequest(
+        client_id="C.1234567890123456", flow_id="12345678")
+
+    with mock.patch.object(
+        worker_obj, "_ProcessFlowCycle", side_effect=ValueError()) as cycle:
+      with self.assertRaises(ValueError):
+        worker_obj.ProcessFlow(request)
+      with self.assertRaises(ValueError):
+        worker_obj.ProcessFlow(request)
+
+    self.assertEqual(cycle.call_count, 2)
+
+  def testCoalescedRequestsAreRequeuedIfProcessingFails(self):
+    worker_obj = worker_lib.GRRWorker()
+    request = rdf_flows.FlowProcessingRequest(
+        client_id="C.1234567890123456", flow_id="12345678")
+
+    cycle_started = threading.Event()
+    resume = threading.Event()
+
+    def ProcessFlowCycle(client_id, flow_id, require_progress):
+      del client_id, flow_id, require_progress  # Unused.
+      cycle_started.set()
+      resume.wait(10)
+      raise ValueError()
+
+    with mock.patch.object(
+        worker_obj, "_ProcessFlowCycle", side_effect=ProcessFlowCycle):
+      thread = threading.Thread(
+          target=self._ProcessFlowIgnoringErrors, args=(worker_obj, request))
+      thread.start()
+      self.assertTrue(cycle_started.wait(10))
+
+      worker_obj.ProcessFlow(request)
+      worker_obj.ProcessFlow(request)
+
+      resume.set()
+      thread.join()
+
+    requests = data_store.REL_DB.ReadFlowProcessingRequests()
+    self.assertLen(requests, 1)
+    self.assertEqual(requests[0].client_id, request.client_id)
+    self.assertEqual(requests[0].flow_id, request.flow_id)
+
+  def _ProcessFlowIgnoringErrors(self, worker_obj, request):
+    try:
+      worker_obj.ProcessFlow(request)
+    except ValueError:
+      pass
+
   def testForemanMessageHandler(self):
-    with mock.patch.object(foreman.Foreman, "AssignTasksToClient") as instr:
+    with mock.patch.object(foreman.Foreman, "AssignTasksToClients") as instr:
       # Send a message to the Foreman.
       client_id = "C.1100110011001100"
 
@@ -106,7 +202,7 @@ class GrrWorkerTest(flow_test_lib.FlowTestsBaseclass):
         # Make sure there are no leftover requests.
         self.assertEqual(data_store.REL_DB.ReadMessageHandlerRequests(), [])
 
-        instr.assert_called_once_with(client_id)
+        instr.assert_called_once_with([client_id])
       finally:
         data_store.REL_DB.UnregisterMessageHandler(timeout=60)
 
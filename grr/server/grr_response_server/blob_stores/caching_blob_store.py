@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+# Lint as: python3
+"""A BlobStore proxy that caches blobs read from another BlobStore."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+import collections
+import logging
+import os
+import tempfile
+import threading
+from typing import Dict, Iterable, Optional, Text
+
+from grr_response_core import config
+from grr_response_core.lib.util import precondition
+from grr_response_core.stats import metrics
+from grr_response_server import blob_store
+from grr_response_server.rdfvalues import objects as rdf_objects
+
+BLOB_CACHE_HITS = metrics.Counter(
+    "blob_cache_hits", fields=[("cache_type", str)])
+BLOB_CACHE_MISSES = metrics.Counter("blob_cache_misses")
+BLOB_CACHE_EVICTIONS = metrics.Counter(
+    "blob_cache_evictions", fields=[("cache_type", str)])
+
+_MEMORY = "memory"
+_DISK = "disk"
+
+
+class _MemoryCache(object):
+  """A thread-safe LRU cache of blobs, bounded by the total size of blobs."""
+
+  def __init__(self, max_size: int):
+    self._max_size = max_size
+    self._size = 0
+    self._blobs = collections.OrderedDict()
+    self._lock = threading.Lock()
+
+  def Get(self, blob_id: rdf_objects.BlobID) -> Optional[bytes]:
+    with self._lock:
+      data = self._blobs.get(blob_id)
+      if data is not None:
+        self._blobs.move_to_end(blob_id)
+      return data
+
+  def Contains(self, blob_id: rdf_objects.BlobID) -> bool:
+    with self._lock:
+      return blob_id in self._blobs
+
+  def Put(self, blob_id: rdf_objects.BlobID, data: bytes) -> None:
+    # Blobs that would evict the whole cache are not worth caching.
+    if len(data) > self._max_size:
+      return
+
+    with self._lock:
+      if blob_id in self._blobs:
+        self._blobs.move_to_end(blob_id)
+        return
+
+      self._blobs[blob_id] = data
+      self._size += len(data)
+
+      while self._size > self._max_size:
+        _, evicted = self._blobs.popitem(last=False)
+        self._size -= len(evicted)
+        BLOB_CACHE_EVICTIONS.Increment(fields=[_MEMORY])
+
+
+class _DiskCache(object):
+  """A thread-safe LRU cache of blobs stored as files in a directory.
+
+  Every blob is stored in its own file named after the hex representation of
+  its BlobID. Blob files found in the directory on startup are reused.
+  """
+
+  def __init__(self, directory: Text, max_size: int):
+    self._directory = directory
+    self._max_size = max_size
+    self._size = 0
+    # Maps the hex BlobID of each cached blob to its size.
+    self._blob_sizes = collections.OrderedDict()
+    self._lock = threading.Lock()
+
+    os.makedirs(directory, exist_ok=True)
+
+    # Blobs found on disk are considered least recently used in the order of
+    # their last access time.
+    entries = []
+    for entry in os.scandir(directory):
+      if entry.is_file() and not entry.name.startswith("."):
+        stat = entry.stat()
+        entries.append((stat.st_atime, entry.name, stat.st_size))
+
+    for _, name, size in sorted(entries):
+      self._blob_sizes[name] = size
+      self._size += size
+
+    with self._lock:
+      self._EvictIfNeeded()
+
+  def _Path(self, name: Text) -> Text:
+    return os.path.join(self._directory, name)
+
+  def _EvictIfNeeded(self) -> None:
+    while self._size > self._max_size:
+      name, size = self._blob_sizes.popitem(last=False)
+      self._size -= size
+      BLOB_CACHE_EVICTIONS.Increment(fields=[_DISK])
+      try:
+        os.remove(self._Path(name))
+      except OSError as e:
+        logging.warning("Failed to remove cached blob %s: %s", name, e)
+
+  def _Forget(self, name: Text) -> None:
+    with self._lock:
+      size = self._blob_sizes.pop(name, None)
+      if size is not None:
+        self._size -= size
+
+  def Get(self, blob_id: rdf_objects.BlobID) -> Optional[bytes]:
+    """Returns the cached blob contents or None if blob_id is not cached."""
+    name = blob_id.AsHexString()
+    with self._lock:
+      if name not in self._blob_sizes:
+        return None
+      self._blob_sizes.move_to_end(name)
+
+    try:
+      with open(self._Path(name), "rb") as fd:
+        data = fd.read()
+    except OSError as e:
+      logging.warning("Failed to read cached blob %s: %s", name, e)
+      self._Forget(name)
+      return None
+
+    # Files on disk may get truncated or corrupted, blobs are content
+    # addressed so they are easy to verify.
+    if rdf_objects.BlobID.FromBlobData(data) != blob_id:
+      logging.warning("Cached blob %s is corrupted, discarding.", name)
+      self._Forget(name)
+      return None
+
+    return data
+
+  def Contains(self, blob_id: rdf_objects.BlobID) -> bool:
+    with self._lock:
+      return blob_id.AsHexString() in self._blob_sizes
+
+  def Put(self, blob_id: rdf_objects.BlobID, data: bytes) -> None:
+    """Stores a blob in the cache."""
+    if len(data) > self._max_size:
+      return
+
+    name = blob_id.AsHexString()
+    with self._lock:
+      if name in self._blob_sizes:
+        return
+
+    # Write to a temporary file first so that readers never see partially
+    # written blobs.
+    try:
+      fd, tmp_path = tempfile.mkstemp(dir=self._directory, prefix=".")
+      with os.fdopen(fd, "wb") as tmp_file:
+        tmp_file.write(data)
+      os.replace(tmp_path, self._Path(name))
+    except OSError as e:
+      logging.warning("Failed to cache blob %s on disk: %s", name, e)
+      return
+
+    with self._lock:
+      if name not in self._blob_sizes:
+        self._blob_sizes[name] = len(data)
+        self._size += len(data)
+        self._EvictIfNeeded()
+
+
+class CachingBlobStore(blob_store.BlobStore):
+  """A BlobStore proxy that caches blobs read from another BlobStore.
+
+  Blobs are content addressed and never change once written, so blobs read
+  from the delegate can be cached without invalidation. Read blobs are kept in a
+  size-bounded in-memory LRU cache and, optionally, a size-bounded on-disk LRU
+  cache. Writes go directly to the delegate and do not populate the caches:
+  most written blobs are never read again.
+  """
+
+  def __init__(self,
+               delegate: Optional[Text] = None,
+               memory_cache_size: Optional[int] = None,
+               disk_cache_directory: Optional[Text] = None,
+               disk_cache_size: Optional[int] = None):
+    """Instantiates a new CachingBlobStore and the BlobStore it delegates to.
+
+    Args:
+      delegate: The class name of the blob store implementation to cache.
+      memory_cache_size: Maximum total size of blobs cached in memory, in bytes.
+      disk_cache_directory: Directory to cache blobs in. If empty, no blobs are
+        cached on disk.
+      disk_cache_size: Maximum total size of blobs cached on disk, in bytes.
+    """
+    if delegate is None:
+      delegate = config.CONFIG["CachingBlobStore.delegate_implementation"]
+    if memory_cache_size is None:
+      memory_cache_size = config.CONFIG["CachingBlobStore.memory_cache_size"]
+    if disk_cache_directory is None:
+      disk_cache_directory = config.CONFIG[
+          "CachingBlobStore.disk_cache_directory"]
+    if disk_cache_size is None:
+      disk_cache_size = config.CONFIG["CachingBlobStore.disk_cache_size"]
+
+    precondition.AssertType(delegate, Text)
+    precondition.AssertType(memory_cache_size, int)
+    precondition.AssertType(disk_cache_size, int)
+
+    try:
+      cls = blob_store.REGISTRY[delegate]
+    except KeyError:
+      raise ValueError("No blob store %s found." % delegate)
+    self._delegate = cls()
+
+    self._memory_cache = _MemoryCache(memory_cache_size)
+    if disk_cache_directory:
+      self._disk_cache = _DiskCache(disk_cache_directory, disk_cache_size)
+    else:
+      self._disk_cache = None
+
+  def _ReadCached(self, blob_id: rdf_objects.BlobID) -> Optional[bytes]:
+    data = self._memory_cache.Get(blob_id)
+    if data is not None:
+      BLOB_CACHE_HITS.Increment(fields=[_MEMORY])
+      return data
+
+    if self._disk_cache is not None:
+      data = self._disk_cache.Get(blob_id)
+      if data is not None:
+        BLOB_CACHE_HITS.Increment(fields=[_DISK])
+        self._memory_cache.Put(blob_id, data)
+        return data
+
+    return None
+
+  def WriteBlobs(self,
+                 blob_id_data_map: Dict[rdf_objects.BlobID, bytes]) -> None:
+    """Creates or overwrites blobs."""
+    self._delegate.WriteBlobs(blob_id_data_map)
+
+  def ReadBlobs(self, blob_ids: Iterable[rdf_objects.BlobID]
+               ) -> Dict[rdf_objects.BlobID, Optional[bytes]]:
+    """Reads all blobs, specified by blob_ids, returning their contents."""
+    result = {}
+    missing_ids = []
+    for blob_id in blob_ids:
+      data = self._ReadCached(blob_id)
+      if data is None:
+        missing_ids.append(blob_id)
+      else:
+        result[blob_id] = data
+
+    if not missing_ids:
+      return result
+
+    BLOB_CACHE_MISSES.Increment(len(missing_ids))
+    for blob_id, data in self._delegate.ReadBlobs(missing_ids).items():
+      result[blob_id] = data
+      # Missing blobs are not cached, they might get written later.
+      if data is not None:
+        self._memory_cache.Put(blob_id, data)
+        if self._disk_cache is not None:
+          self._disk_cache.Put(blob_id, data)
+
+    return result
+
+  def CheckBlobsExist(self, blob_ids: Iterable[rdf_objects.BlobID]
+                     ) -> Dict[rdf_objects.BlobID, bool]:
+    """Checks if blobs for the given identifiers already exist."""
+    result = {}
+    unknown_ids = []
+    for blob_id in blob_ids:
+      if (self._memory_cache.Contains(blob_id) or
+          (self._disk_cache is not None and
+           self._disk_cache.Contains(blob_id))):
+        result[blob_id] = True
+      else:
+        unknown_ids.append(blob_id)
+
+    if unknown_ids:
+      result.update(self._delegate.CheckBlobsExist(unknown_ids))
+
+    return result
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# Lint as: python3
+"""Tests for the caching blob store proxy."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+
+from absl import app
+import mock
+
+from grr_response_server import blob_store
+from grr_response_server import blob_store_test_mixin
+from grr_response_server.blob_stores import caching_blob_store
+from grr_response_server.databases import mem_blobs
+from grr_response_server.rdfvalues import objects as rdf_objects
+from grr.test_lib import test_lib
+
+
+class DelegateBlobStore(mem_blobs.InMemoryBlobStore):
+  pass
+
+
+def _BlobIdAndData(i, size=10):
+  data = ((b"%d-" % i) * size)[:size]
+  return rdf_objects.BlobID.FromBlobData(data), data
+
+
+class CachingBlobStoreTestMixin(blob_store_test_mixin.BlobStoreTestMixin):
+
+  memory_cache_size = 1024
+  disk_cache_size = 1024
+
+  def _CreateCachingBlobStore(self, disk_cache_directory=""):
+    with mock.patch.object(blob_store, "REGISTRY",
+                           {"DelegateBlobStore": DelegateBlobStore}):
+      return caching_blob_store.CachingBlobStore(
+          "DelegateBlobStore",
+          memory_cache_size=self.memory_cache_size,
+          disk_cache_directory=disk_cache_directory,
+          disk_cache_size=self.disk_cache_size)
+
+  @property
+  def delegate(self):
+    return self.blob_store.delegate._delegate
+
+  def _WriteBlobs(self, count, size=10):
+    blobs = dict(_BlobIdAndData(i, size=size) for i in range(count))
+    self.blob_store.WriteBlobs(blobs)
+    return blobs
+
+
+class CachingBlobStoreTest(CachingBlobStoreTestMixin, test_lib.GRRBaseTest):
+
+  def CreateBlobStore(self):
+    return self._CreateCachingBlobStore(), None
+
+  def testRepeatedReadsAreServedFromMemory(self):
+    blobs = self._WriteBlobs(3)
+
+    with mock.patch.object(
+        self.delegate, "ReadBlobs",
+        wraps=self.delegate.ReadBlobs) as read_mock:
+      with self.assertStatsCounterDelta(
+          3, caching_blob_store.BLOB_CACHE_MISSES):
+        self.assertEqual(self.blob_store.ReadBlobs(list(blobs)), blobs)
+
+      with self.assertStatsCounterDelta(
+          6, caching_blob_store.BLOB_CACHE_HITS, fields=["memory"]):
+        self.assertEqual(self.blob_store.ReadBlobs(list(blobs)), blobs)
+        for blob_id, data in blobs.items():
+          self.assertEqual(self.blob_store.ReadBlob(blob_id), data)
+
+      read_mock.assert_called_once()
+
+  def testOnlyMissingBlobsAreReadFromDelegate(self):
+    blobs = self._WriteBlobs(3)
+    blob_ids = list(blobs)
+    self.blob_store.ReadBlob(blob_ids[0])
+
+    with mock.patch.object(
+        self.delegate, "ReadBlobs",
+        wraps=self.delegate.ReadBlobs) as read_mock:
+      self.assertEqual(self.blob_store.ReadBlobs(blob_ids), blobs)
+
+    read_mock.assert_called_once_with(blob_ids[1:])
+
+  def testNonExistentBlobsAreNotCached(self):
+    blob_id, data = _BlobIdAndData(0)
+    self.assertIsNone(self.blob_store.ReadBlob(blob_id))
+
+    self.blob_store.WriteBlobs({blob_id: data})
+    self.assertEqual(self.blob_store.ReadBlob(blob_id), data)
+
+  def testLeastRecentlyUsedBlobsAreEvicted(self):
+    # 1024 bytes of cache fit 10 blobs of 100 bytes.
+    blobs = self._WriteBlobs(11, size=100)
+    blob_ids = list(blobs)
+
+    self.blob_store.ReadBlobs(blob_ids[:10])
+    # Mark the first blob as recently used.
+    self.blob_store.ReadBlob(blob_ids[0])
+
+    with self.assertStatsCounterDelta(
+        1, caching_blob_store.BLOB_CACHE_EVICTIONS, fields=["memory"]):
+      self.blob_store.ReadBlob(blob_ids[10])
+
+    with mock.patch.object(
+        self.delegate, "ReadBlobs",
+        wraps=self.delegate.ReadBlobs) as read_mock:
+      self.blob_store.ReadBlobs([blob_ids[0], blob_ids[1]])
+
+    read_mock.assert_called_once_with([blob_ids[1]])
+
+  def testBlobsLargerThanCacheAreNotCached(self):
+    blob_id, data = _BlobIdAndData(0, size=2048)
+    self.blob_store.WriteBlobs({blob_id: data})
+
+    with self.assertStatsCounterDelta(2, caching_blob_store.BLOB_CACHE_MISSES):
+      self.assertEqual(self.blob_store.ReadBlob(blob_id), data)
+      self.assertEqual(self.blob_store.ReadBlob(blob_id), data)
+
+  def testCheckBlobsExistSkipsDelegateForCachedBlobs(self):
+    blobs = self._WriteBlobs(2)
+    blob_ids = list(blobs)
+    self.blob_store.ReadBlob(blob_ids[0])
+    missing_id, _ = _BlobIdAndData(42)
+
+    with mock.patch.object(
+        self.delegate, "CheckBlobsExist",
+        wraps=self.delegate.CheckBlobsExist) as check_mock:
+      self.assertEqual(
+          self.blob_store.CheckBlobsExist(blob_ids + [missing_id]), {
+              blob_ids[0]: True,
+              blob_ids[1]: True,
+              missing_id: False
+          })
+
+    check_mock.assert_called_once_with([blob_ids[1], missing_id])
+
+
+class CachingBlobStoreWithDiskCacheTest(CachingBlobStoreTestMixin,
+                                        test_lib.GRRBaseTest):
+
+  memory_cache_size = 100
+
+  def CreateBlobStore(self):
+    self.cache_dir = os.path.join(self.temp_dir, "blob_cache")
+    bs = self._CreateCachingBlobStore(disk_cache_directory=self.cache_dir)
+    return bs, None
+
+  def testBlobsEvictedFromMemoryAreServedFromDisk(self):
+    blobs = self._WriteBlobs(3, size=100)
+    blob_ids = list(blobs)
+    self.blob_store.ReadBlobs(blob_ids)
+
+    with mock.patch.object(self.delegate, "ReadBlobs") as read_mock:
+      with self.assertStatsCounterDelta(
+          2, caching_blob_store.BLOB_CACHE_HITS, fields=["disk"]):
+        self.assertEqual(self.blob_store.ReadBlobs(blob_ids[:2]),
+                         {blob_id: blobs[blob_id] for blob_id in blob_ids[:2]})
+
+    read_mock.assert_not_called()
+
+  def testDiskCacheIsReusedByNewInstances(self):
+    blobs = self._WriteBlobs(3)
+    self.blob_store.ReadBlobs(list(blobs))
+
+    new_store = self._CreateCachingBlobStore(
+        disk_cache_directory=self.cache_dir)
+    with mock.patch.object(new_store._delegate, "ReadBlobs") as read_mock:
+      self.assertEqual(new_store.ReadBlobs(list(blobs)), blobs)
+
+    read_mock.assert_not_called()
+
+  def testDiskCacheIsBoundedBySize(self):
+    blobs = self._WriteBlobs(20, size=100)
+
+    with self.assertStatsCounterDelta(
+        10, caching_blob_store.BLOB_CACHE_EVICTIONS, fields=["disk"]):
+      self.blob_store.ReadBlobs(list(blobs))
+
+    self.assertLen(os.listdir(self.cache_dir), 10)
+
+  def testCorruptedCachedBlobsAreReadFromDelegate(self):
+    blob_id, data = _BlobIdAndData(0, size=100)
+    other_id, other_data = _BlobIdAndData(1, size=100)
+    self.blob_store.WriteBlobs({blob_id: data, other_id: other_data})
+    self.blob_store.ReadBlob(blob_id)
+    # Evict blob_id from the memory cache.
+    self.blob_store.ReadBlob(other_id)
+
+    with open(os.path.join(self.cache_dir, blob_id.AsHexString()), "wb") as fd:
+      fd.write(b"corrupted")
+
+    self.assertEqual(self.blob_store.ReadBlob(blob_id), data)
+
+
+def main(argv):
+  test_lib.main(argv)
+
+
+if __name__ == "__main__":
+  app.run(main)
@@ -7,6 +7,7 @@ from __future__ import unicode_literals
 
 from grr_response_core.lib.util import compatibility
 from grr_response_server import blob_store
+from grr_response_server.blob_stores import caching_blob_store
 from grr_response_server.blob_stores import db_blob_store
 from grr_response_server.blob_stores import dual_blob_store
 from grr_response_server.databases import mem_blobs
@@ -14,6 +15,9 @@ from grr_response_server.databases import mem_blobs
 
 def RegisterBlobStores():
   """Registers all BlobStore implementations in blob_store.REGISTRY."""
+  blob_store.REGISTRY[compatibility.GetName(
+      caching_blob_store.CachingBlobStore)] = (
+          caching_blob_store.CachingBlobStore)
   blob_store.REGISTRY[compatibility.GetName(
       db_blob_store.DbBlobStore)] = db_blob_store.DbBlobStore
   blob_store.REGISTRY[compatibility.GetName(
@@ -14,6 +14,7 @@ from grr_response_core.lib import communicator
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib import type_info
 from grr_response_core.lib import utils
+from grr_response_core.lib.rdfvalues import crypto as rdf_crypto
 from grr_response_core.lib.rdfvalues import flows as rdf_flows
 from grr_response_core.stats import metrics
 
@@ -25,6 +26,8 @@ GRR_AUTHENTICATED_MESSAGES = metrics.Counter("grr_authenticated_messages")
 GRR_UNAUTHENTICATED_MESSAGES = metrics.Counter("grr_unauthenticated_messages")
 GRR_ENCRYPTED_CIPHER_CACHE = metrics.Counter(
     "grr_encrypted_cipher_cache", fields=[("type", str)])
+GRR_DESTINATION_CIPHER_CACHE = metrics.Counter(
+    "grr_destination_cipher_cache", fields=[("type", str)])
 
 
 Error = communicator.Error
@@ -41,24 +44,149 @@ class UnknownClientCertError(DecodingError):
     super().__init__(message)
 
 
+def _ParsePackedMessageList(plain):
+  try:
+    return rdf_flows.PackedMessageList.FromSerializedBytes(plain)
+  except rdfvalue.DecodeError as e:
+    raise DecryptionError(e)
+
+
+def _DecompressMessageListData(packed_message_list):
+  """Returns the decompressed, serialized MessageList of a PackedMessageList."""
+  compression = packed_message_list.compression
+  if compression == rdf_flows.PackedMessageList.CompressionType.UNCOMPRESSED:
+    return packed_message_list.message_list
+
+  elif compression == rdf_flows.PackedMessageList.CompressionType.ZCOMPRESSION:
+    try:
+      return zlib.decompress(packed_message_list.message_list)
+    except zlib.error as e:
+      raise DecodingError("Failed to decompress: %s" % e)
+
+  else:
+    raise DecodingError("Compression scheme not supported")
+
+
+def _ParseMessageList(data):
+  try:
+    return rdf_flows.MessageList.FromSerializedBytes(data)
+  except rdfvalue.DecodeError:
+    raise DecodingError("RDFValue parsing failed.")
+
+
+def DecodePayload(cipher_key, packet_iv, encrypted):
+  """Decrypts, decompresses and parses the payload of a ClientCommunication.
+
+  This function only depends on its (picklable) arguments and only returns
+  primitive values, so it can be run in a decoder worker process, see
+  frontend_lib.MessageDecoderPool. The PackedMessageList and the MessageList
+  are parsed (and thereby validated) here, only the GrrMessages are handed
+  back, serialized. Its results are turned into rdfvalues with
+  ParseDecodedPayload.
+
+  Args:
+    cipher_key: The raw bytes of the symmetric session key.
+    packet_iv: The raw bytes of the per packet IV.
+    encrypted: The encrypted, serialized PackedMessageList.
+
+  Returns:
+    A tuple (timestamp, source, messages) of the PackedMessageList timestamp in
+    microseconds since epoch (or None), its source (or None) and a list of
+    serialized GrrMessages.
+
+  Raises:
+    DecryptionError: If the payload can not be decrypted.
+    DecodingError: If the payload can not be decompressed or parsed.
+  """
+  key = rdf_crypto.EncryptionKey(cipher_key)
+  iv = rdf_crypto.EncryptionKey(packet_iv)
+  plain = rdf_crypto.AES128CBCCipher(key, iv).Decrypt(encrypted)
+  packed_message_list = _ParsePackedMessageList(plain)
+  message_list = _ParseMessageList(
+      _DecompressMessageListData(packed_message_list))
+
+  timestamp = None
+  if packed_message_list.HasField("timestamp"):
+    timestamp = packed_message_list.timestamp.AsMicrosecondsSinceEpoch()
+  source = None
+  if packed_message_list.HasField("source"):
+    source = str(packed_message_list.source)
+
+  return timestamp, source, [msg.SerializeToBytes() for msg in message_list.job]
+
+
+def ParseDecodedPayload(timestamp, source, messages):
+  """Turns the results of DecodePayload into rdfvalues.
+
+  The returned PackedMessageList only holds the header fields needed to verify
+  the message signature, its payload was already consumed by DecodePayload.
+  The GrrMessages are parsed on the calling thread, which is cheap only if
+  lazy struct decoding or the protobuf backend is enabled.
+
+  Args:
+    timestamp: The PackedMessageList timestamp in microseconds since epoch or
+      None.
+    source: The PackedMessageList source or None.
+    messages: A list of serialized GrrMessages.
+
+  Returns:
+    A tuple (packed_message_list, message_list) of rdfvalues.
+
+  Raises:
+    DecodingError: If a GrrMessage can not be parsed.
+  """
+  packed_message_list = rdf_flows.PackedMessageList()
+  if timestamp is not None:
+    packed_message_list.timestamp = (
+        rdfvalue.RDFDatetime.FromMicrosecondsSinceEpoch(timestamp))
+  if source is not None:
+    packed_message_list.source = source
+
+  try:
+    jobs = [rdf_flows.GrrMessage.FromSerializedBytes(msg) for msg in messages]
+  except rdfvalue.DecodeError:
+    raise DecodingError("RDFValue parsing failed.")
+
+  return packed_message_list, rdf_flows.MessageList(job=jobs)
+
+
 class Communicator(metaclass=abc.ABCMeta):
   """A class responsible for encoding and decoding comms."""
   server_name = None
   common_name = None
 
-  def __init__(self, certificate=None, private_key=None):
+  def __init__(self,
+               certificate=None,
+               private_key=None,
+               cipher_cache_size=50000,
+               cipher_cache_ttl=None):
     """Creates a communicator.
 
     Args:
        certificate: Our own certificate.
        private_key: Our own private key.
+       cipher_cache_size: Maximum number of ciphers kept in each of the
+         received and destination cipher caches.
+       cipher_cache_ttl: An rdfvalue.Duration, the maximum age of a cached
+         cipher. Defaults to one hour.
     """
     self.private_key = private_key
     self.certificate = certificate
     self._ClearServerCipherCache()
 
-    # A cache for encrypted ciphers
-    self.encrypted_cipher_cache = utils.FastStore(max_size=50000)
+    if cipher_cache_ttl is None:
+      cipher_cache_ttl = rdfvalue.Duration.From(1, rdfvalue.HOURS)
+    max_age = cipher_cache_ttl.ToFractional(rdfvalue.SECONDS)
+
+    # A cache for encrypted ciphers received from remote ends.
+    self.encrypted_cipher_cache = utils.AgeBasedCache(
+        max_size=cipher_cache_size, max_age=max_age)
+
+    # A cache of ciphers used to encrypt messages, keyed by destination. Reusing
+    # a cipher avoids the RSA encryption and signing of a fresh session key on
+    # every message bundle. Each packet still gets its own IV.
+    self.destination_cipher_cache = utils.AgeBasedCache(
+        max_size=cipher_cache_size, max_age=max_age)
 
   @abc.abstractmethod
   def _GetRemotePublicKey(self, server_name):
@@ -97,6 +225,22 @@ class Communicator(metaclass=abc.ABCMeta):
     self.server_cipher_age = rdfvalue.RDFDatetime.Now()
     return self.server_cipher
 
+  def _GetDestinationCipher(self, destination):
+    """Returns a (possibly cached) cipher for encrypting to destination."""
+    cache_key = str(destination)
+    try:
+      cipher = self.destination_cipher_cache.Get(cache_key)
+      GRR_DESTINATION_CIPHER_CACHE.Increment(fields=["hits"])
+      return cipher
+    except KeyError:
+      GRR_DESTINATION_CIPHER_CACHE.Increment(fields=["misses"])
+
+    remote_public_key = self._GetRemotePublicKey(destination)
+    cipher = communicator.Cipher(self.common_name, self.private_key,
+                                 remote_public_key)
+    self.destination_cipher_cache.Put(cache_key, cipher)
+    return cipher
+
   def EncodeMessages(self,
                      message_list,
                      result,
@@ -127,9 +271,7 @@ class Communicator(metaclass=abc.ABCMeta):
       raise RuntimeError(
           "Unsupported api version: %s, expected 3." % api_version)
 
-    remote_public_key = self._GetRemotePublicKey(destination)
-    cipher = communicator.Cipher(self.common_name, self.private_key,
-                                 remote_public_key)
+    cipher = self._GetDestinationCipher(destination)
 
     # Make a nonce for this transaction
     if timestamp is None:
@@ -198,25 +340,27 @@ class Communicator(metaclass=abc.ABCMeta):
     Raises:
       DecodingError: If decompression fails.
     """
-    compression = packed_message_list.compression
-    if compression == rdf_flows.PackedMessageList.CompressionType.UNCOMPRESSED:
-      data = packed_message_list.message_list
+    return _ParseMessageList(_DecompressMessageListData(packed_message_list))
 
-    elif (compression ==
-          rdf_flows.PackedMessageList.CompressionType.ZCOMPRESSION):
-      try:
-        data = zlib.decompress(packed_message_list.message_list)
-      except zlib.error as e:
-        raise DecodingError("Failed to decompress: %s" % e)
-    else:
-      raise DecodingError("Compression scheme not supported")
+  def _DecodePayload(self, cipher, response_comms):
+    """Decrypts and decompresses the payload of response_comms.
 
-    try:
-      result = rdf_flows.MessageList.FromSerializedBytes(data)
-    except rdfvalue.DecodeError:
-      raise DecodingError("RDFValue parsing failed.")
+    Args:
+      cipher: The cipher belonging to the remote end.
+      response_comms: A ClientCommunication rdfvalue.
 
-    return result
+    Returns:
+      A tuple (packed_message_list, message_list) of rdfvalues.
+
+    Raises:
+      DecryptionError: If the payload can not be decrypted.
+      DecodingError: If the payload can not be decompressed or parsed.
+    """
+    # Decrypt the message with the per packet IV.
+    plain = cipher.Decrypt(response_comms.encrypted, response_comms.packet_iv)
+    packed_message_list = _ParsePackedMessageList(plain)
+    message_list = self.DecompressMessageList(packed_message_list)
+    return packed_message_list, message_list
 
   def DecodeMessages(self, response_comms):
     """Extract and verify server message.
@@ -262,15 +406,8 @@ class Communicator(metaclass=abc.ABCMeta):
         # We don't know who we are talking to.
         remote_public_key = None
 
-    # Decrypt the message with the per packet IV.
-    plain = cipher.Decrypt(response_comms.encrypted, response_comms.packet_iv)
-    try:
-      packed_message_list = rdf_flows.PackedMessageList.FromSerializedBytes(
-          plain)
-    except rdfvalue.DecodeError as e:
-      raise DecryptionError(e)
-
-    message_list = self.DecompressMessageList(packed_message_list)
+    packed_message_list, message_list = self._DecodePayload(
+        cipher, response_comms)
 
     # Are these messages authenticated?
     # pyformat: disable
@@ -640,6 +640,42 @@ class Database(metaclass=abc.ABCMeta):
         client sent a foreman message to the server.
     """
 
+  def MultiWriteClientMetadata(self,
+                               client_ids,
+                               first_seen=None,
+                               last_ping=None,
+                               last_clock=None,
+                               last_foreman=None):
+    """Writes the same metadata values for a list of clients.
+
+    Updates one or more client metadata fields for all the given clients. Any
+    of the data fields can be left as None, and in this case are not changed.
+    If all of them are None (or no client ids are given), nothing is written.
+
+    Args:
+      client_ids: A collection of GRR client id strings, e.g.
+        ["C.ea3b2b71840d6fa7", "C.ea3b2b71840d6fa8"]
+      first_seen: An rdfvalue.Datetime, indicating the first time the clients
+        contacted the server.
+      last_ping: An rdfvalue.Datetime, indicating the last time the clients
+        contacted the server.
+      last_clock: An rdfvalue.Datetime, indicating the last client clock time
+        reported to the server.
+      last_foreman: An rdfvalue.Datetime, indicating the last time that the
+        clients sent a foreman message to the server.
+    """
+    if (first_seen is None and last_ping is None and last_clock is None and
+        last_foreman is None):
+      return
+
+    for client_id in client_ids:
+      self.WriteClientMetadata(
+          client_id,
+          first_seen=first_seen,
+          last_ping=last_ping,
+          last_clock=last_clock,
+          last_foreman=last_foreman)
+
   def DeleteClient(self, client_id):
     """Deletes a client with all associated metadata.
 
@@ -741,6 +777,24 @@ class Database(metaclass=abc.ABCMeta):
       A map from client ids to `ClientFullInfo` instance.
     """
 
+  @abc.abstractmethod
+  def MultiReadClientInfoVersions(self, client_ids):
+    """Reads opaque versions of the full information of given clients.
+
+    A version changes every time a new snapshot of the client is written, its
+    labels change or its first seen time is written, so data derived from these
+    (e.g. exported client metadata) can be cached for as long as it stays the
+    same.
+
+    Args:
+      client_ids: a collection of GRR client ids, e.g. ["C.ea3b2b71840d6fa7",
+        "C.ea3b2b71840d6fa8"]
+
+    Returns:
+      A map from client ids to integers identifying the current state of the
+      client's information. Clients that were never written map to 0.
+    """
+
   def ReadClientFullInfo(self, client_id):
     """Reads full client information for a single client.
 
@@ -1312,6 +1366,77 @@ class Database(metaclass=abc.ABCMeta):
         if snapshot:
           yield snapshot
 
+  def IterateFlowResults(self,
+                         client_id,
+                         flow_id,
+                         with_tag=None,
+                         with_type=None,
+                         with_substring=None,
+                         batch_size=1000):
+    """Iterates over all results of a given flow.
+
+    Args:
+      client_id: The client id on which the flow is running.
+      flow_id: The id of the flow to read results for.
+      with_tag: (Optional) Only results having specified tag will be returned.
+      with_type: (Optional) Only results of a specified type will be returned.
+      with_substring: (Optional) Only results having the specified string as a
+        substring in their serialized form will be returned.
+      batch_size: Always reads <batch_size> results at a time.
+
+    Yields:
+      FlowResult values sorted by timestamp in ascending order.
+    """
+    page_token = None
+    while True:
+      results, page_token = self.ReadFlowResultsPage(
+          client_id,
+          flow_id,
+          batch_size,
+          page_token=page_token,
+          with_tag=with_tag,
+          with_type=with_type,
+          with_substring=with_substring)
+      for result in results:
+        yield result
+
+      if page_token is None:
+        break
+
+  def IterateHuntResults(self,
+                         hunt_id,
+                         with_tag=None,
+                         with_type=None,
+                         with_substring=None,
+                         batch_size=1000):
+    """Iterates over all results of a given hunt.
+
+    Args:
+      hunt_id: The id of the hunt to read results for.
+      with_tag: (Optional) Only results having specified tag will be returned.
+      with_type: (Optional) Only results of a specified type will be returned.
+      with_substring: (Optional) Only results having the specified string as a
+        substring in their serialized form will be returned.
+      batch_size: Always reads <batch_size> results at a time.
+
+    Yields:
+      FlowResult values sorted by timestamp in ascending order.
+    """
+    page_token = None
+    while True:
+      results, page_token = self.ReadHuntResultsPage(
+          hunt_id,
+          batch_size,
+          page_token=page_token,
+          with_tag=with_tag,
+          with_type=with_type,
+          with_substring=with_substring)
+      for result in results:
+        yield result
+
+      if page_token is None:
+        break
+
   @abc.abstractmethod
   def ReadPathInfo(self, client_id, path_type, components, timestamp=None):
     """Retrieves a path info record for a given path.
@@ -1412,6 +1537,21 @@ class Database(metaclass=abc.ABCMeta):
         instances.
     """
 
+  @abc.abstractmethod
+  def ReadPathInfosVersion(self, client_id: Text) -> int:
+    """Reads an opaque version of the path infos of a given client.
+
+    The version changes every time path infos of the client are written, so
+    data derived from path infos can be cached for as long as it stays the
+    same.
+
+    Args:
+      client_id: An id of the client of interest.
+
+    Returns:
+      An integer identifying the current state of the client's path infos.
+    """
+
   @abc.abstractmethod
   def ReadPathInfosHistories(
       self,
@@ -1580,6 +1720,9 @@ class Database(metaclass=abc.ABCMeta):
   def WriteMessageHandlerRequests(self, requests):
     """Writes a list of message handler requests to the database.
 
+    Requests that have `leased_until` set are not leased by message handlers
+    before that time, which allows to delay their processing.
+
     Args:
       requests: List of objects.MessageHandlerRequest.
     """
@@ -2069,19 +2212,54 @@ class Database(metaclass=abc.ABCMeta):
   def ReadFlowRequestsReadyForProcessing(self,
                                          client_id,
                                          flow_id,
-                                         next_needed_request=None):
+                                         next_needed_request=None,
+                                         max_responses_per_request=None):
     """Reads all requests for a flow that can be processed by the worker.
 
     Args:
       client_id: The client id on which this flow is running.
       flow_id: The id of the flow to read requests for.
       next_needed_request: The next request id that the flow needs to process.
+      max_responses_per_request: If set, only the status is read for requests
+        expecting more responses than this. The other responses to such
+        requests have to be read using ReadFlowResponsesForRequest.
 
     Returns:
       A dict mapping flow request id to tuples (request,
       sorted list of responses for the request).
     """
 
+  @abc.abstractmethod
+  def ReadFlowResponsesForRequest(self, client_id, flow_id, request_id,
+                                  min_response_id, count):
+    """Reads a page of responses to a single flow request.
+
+    Args:
+      client_id: The client id on which this flow is running.
+      flow_id: The id of the flow the request belongs to.
+      request_id: The id of the request to read responses for.
+      min_response_id: The smallest response id to read.
+      count: Maximum number of responses to read.
+
+    Returns:
+      A list of FlowResponse, FlowStatus and FlowIterator objects, sorted by
+      response id.
+    """
+
+  @abc.abstractmethod
+  def CountFlowResponsesForRequest(self, client_id, flow_id, request_id):
+    """Counts responses to a single flow request.
+
+    Args:
+      client_id: The client id on which this flow is running.
+      flow_id: The id of the flow the request belongs to.
+      request_id: The id of the request to count responses of.
+
+    Returns:
+      The number of FlowResponse objects written for the request. Statuses and
+      iterators are not counted.
+    """
+
   @abc.abstractmethod
   def WriteFlowProcessingRequests(self, requests):
     """Writes a list of flow processing requests to the database.
@@ -2170,6 +2348,40 @@ class Database(metaclass=abc.ABCMeta):
       A list of FlowResult values sorted by timestamp in ascending order.
     """
 
+  @abc.abstractmethod
+  def ReadFlowResultsPage(self,
+                          client_id,
+                          flow_id,
+                          count,
+                          page_token=None,
+                          with_tag=None,
+                          with_type=None,
+                          with_substring=None):
+    """Reads a page of flow results that follow a given page token.
+
+    Unlike ReadFlowResults, the cost of reading a page doesn't depend on the
+    number of results that precede it.
+
+    Args:
+      client_id: The client id on which this flow is running.
+      flow_id: The id of the flow to read results for.
+      count: Maximum number of results to read.
+      page_token: (Optional) An opaque token returned together with the
+        previous page. When not specified, the first page is read.
+      with_tag: (Optional) When specified, should be a string. Only results
+        having specified tag will be returned.
+      with_type: (Optional) When specified, should be a string. Only results of
+        a specified type will be returned.
+      with_substring: (Optional) When specified, should be a string. Only
+        results having the specified string as a substring in their serialized
+        form will be returned.
+
+    Returns:
+      A tuple (results, next_page_token), where results is a list of FlowResult
+      values sorted by timestamp in ascending order and next_page_token is a
+      string to pass to the next call or None if there are no more results.
+    """
+
   @abc.abstractmethod
   def CountFlowResults(self, client_id, flow_id, with_tag=None, with_type=None):
     """Counts flow results of a given flow using given query options.
@@ -2520,6 +2732,57 @@ class Database(metaclass=abc.ABCMeta):
           not exist.
     """
 
+  @abc.abstractmethod
+  def WriteHuntOutputPluginRequests(self, requests):
+    """Queues hunt results for processing with the hunts' output plugins.
+
+    Requests that have `delivery_time` set are not leased before that time.
+
+    Args:
+      requests: List of rdf_flow_objects.HuntOutputPluginRequest. Their
+        request ids are assigned by the database.
+    """
+
+  @abc.abstractmethod
+  def ReadHuntOutputPluginRequests(self):
+    """Reads all queued hunt output plugin requests.
+
+    Returns:
+      A list of rdf_flow_objects.HuntOutputPluginRequest, sorted by request id.
+    """
+
+  @abc.abstractmethod
+  def AckHuntOutputPluginRequests(self, requests):
+    """Acknowledges and deletes hunt output plugin requests.
+
+    Args:
+      requests: List of rdf_flow_objects.HuntOutputPluginRequest, as passed to
+        the registered handler.
+    """
+
+  @abc.abstractmethod
+  def RegisterHuntOutputPluginRequestHandler(self, handler, lease_time,
+                                             limit=100):
+    """Registers a handler to receive hunt output plugin requests.
+
+    Args:
+      handler: Method, which will be called repeatedly with lists of leased
+        rdf_flow_objects.HuntOutputPluginRequest of a single hunt. Lists of
+        different hunts may be handled concurrently. The handler has to
+        acknowledge the requests it processed, all others are leased again once
+        their lease expires. Required.
+      lease_time: An rdfvalue.Duration indicating how long requests are leased.
+      limit: The maximum number of requests leased at once.
+    """
+
+  @abc.abstractmethod
+  def UnregisterHuntOutputPluginRequestHandler(self, timeout=None):
+    """Unregisters any registered hunt output plugin request handler.
+
+    Args:
+      timeout: A timeout in seconds for joining the handler thread.
+    """
+
   @abc.abstractmethod
   def DeleteHuntObject(self, hunt_id):
     """Deletes a hunt object with a given id.
@@ -2659,6 +2922,38 @@ class Database(metaclass=abc.ABCMeta):
       A list of FlowResult values sorted by timestamp in ascending order.
     """
 
+  @abc.abstractmethod
+  def ReadHuntResultsPage(self,
+                          hunt_id,
+                          count,
+                          page_token=None,
+                          with_tag=None,
+                          with_type=None,
+                          with_substring=None):
+    """Reads a page of hunt results that follow a given page token.
+
+    Unlike ReadHuntResults, the cost of reading a page doesn't depend on the
+    number of results that precede it.
+
+    Args:
+      hunt_id: The id of the hunt to read results for.
+      count: Maximum number of results to read.
+      page_token: (Optional) An opaque token returned together with the
+        previous page. When not specified, the first page is read.
+      with_tag: (Optional) When specified, should be a string. Only results
+        having specified tag will be returned.
+      with_type: (Optional) When specified, should be a string. Only results of
+        a specified type will be returned.
+      with_substring: (Optional) When specified, should be a string. Only
+        results having the specified string as a substring in their serialized
+        form will be returned.
+
+    Returns:
+      A tuple (results, next_page_token), where results is a list of FlowResult
+      values sorted by timestamp in ascending order and next_page_token is a
+      string to pass to the next call or None if there are no more results.
+    """
+
   @abc.abstractmethod
   def CountHuntResults(self, hunt_id, with_tag=None, with_type=None):
     """Counts hunt results of a given hunt using given query options.
@@ -2741,6 +3036,21 @@ class Database(metaclass=abc.ABCMeta):
       HuntCounters object.
     """
 
+  @abc.abstractmethod
+  def RepairHuntCounters(self, hunt_id):
+    """Recomputes hunt counters from the hunt's flows.
+
+    Implementations may maintain hunt counters incrementally instead of
+    computing them on every read. This method rebuilds such counters from
+    scratch, repairing any drift.
+
+    Args:
+      hunt_id: The id of the hunt to repair counters of.
+
+    Raises:
+      UnknownHuntError: if there's no hunt with the corresponding id.
+    """
+
   @abc.abstractmethod
   def ReadHuntClientResourcesStats(self, hunt_id):
     """Read hunt client resources stats.
@@ -2989,6 +3299,25 @@ class DatabaseValidationWrapper(Database):
         last_ip=last_ip,
         last_foreman=last_foreman)
 
+  def MultiWriteClientMetadata(self,
+                               client_ids,
+                               first_seen=None,
+                               last_ping=None,
+                               last_clock=None,
+                               last_foreman=None):
+    _ValidateClientIds(client_ids)
+    precondition.AssertOptionalType(first_seen, rdfvalue.RDFDatetime)
+    precondition.AssertOptionalType(last_ping, rdfvalue.RDFDatetime)
+    precondition.AssertOptionalType(last_clock, rdfvalue.RDFDatetime)
+    precondition.AssertOptionalType(last_foreman, rdfvalue.RDFDatetime)
+
+    return self.delegate.MultiWriteClientMetadata(
+        client_ids,
+        first_seen=first_seen,
+        last_ping=last_ping,
+        last_clock=last_clock,
+        last_foreman=last_foreman)
+
   def DeleteClient(self, client_id):
     precondition.ValidateClientId(client_id)
     return self.delegate.DeleteClient(client_id)
@@ -3016,6 +3345,10 @@ class DatabaseValidationWrapper(Database):
     return self.delegate.MultiReadClientFullInfo(
         client_ids, min_last_ping=min_last_ping)
 
+  def MultiReadClientInfoVersions(self, client_ids):
+    _ValidateClientIds(client_ids)
+    return self.delegate.MultiReadClientInfoVersions(client_ids)
+
   def ReadClientLastPings(self,
                           min_last_ping=None,
                           max_last_ping=None,
@@ -3409,6 +3742,10 @@ class DatabaseValidationWrapper(Database):
 
     return self.delegate.MultiWritePathInfos(path_infos)
 
+  def ReadPathInfosVersion(self, client_id: Text) -> int:
+    precondition.ValidateClientId(client_id)
+    return self.delegate.ReadPathInfosVersion(client_id)
+
   def InitPathInfos(self, client_id, path_infos):
     precondition.ValidateClientId(client_id)
     _ValidatePathInfos(path_infos)
@@ -3792,13 +4129,36 @@ class DatabaseValidationWrapper(Database):
   def ReadFlowRequestsReadyForProcessing(self,
                                          client_id,
                                          flow_id,
-                                         next_needed_request=None):
+                                         next_needed_request=None,
+                                         max_responses_per_request=None):
     precondition.ValidateClientId(client_id)
     precondition.ValidateFlowId(flow_id)
     if next_needed_request is None:
       raise ValueError("next_needed_request must be provided.")
+    precondition.AssertOptionalType(max_responses_per_request, int)
     return self.delegate.ReadFlowRequestsReadyForProcessing(
-        client_id, flow_id, next_needed_request=next_needed_request)
+        client_id,
+        flow_id,
+        next_needed_request=next_needed_request,
+        max_responses_per_request=max_responses_per_request)
+
+  def ReadFlowResponsesForRequest(self, client_id, flow_id, request_id,
+                                  min_response_id, count):
+    precondition.ValidateClientId(client_id)
+    precondition.ValidateFlowId(flow_id)
+    precondition.AssertType(request_id, int)
+    precondition.AssertType(min_response_id, int)
+    precondition.AssertType(count, int)
+    return self.delegate.ReadFlowResponsesForRequest(client_id, flow_id,
+                                                     request_id,
+                                                     min_response_id, count)
+
+  def CountFlowResponsesForRequest(self, client_id, flow_id, request_id):
+    precondition.ValidateClientId(client_id)
+    precondition.ValidateFlowId(flow_id)
+    precondition.AssertType(request_id, int)
+    return self.delegate.CountFlowResponsesForRequest(client_id, flow_id,
+                                                      request_id)
 
   def WriteFlowProcessingRequests(self, requests):
     precondition.AssertIterableType(requests, rdf_flows.FlowProcessingRequest)
@@ -3855,6 +4215,30 @@ class DatabaseValidationWrapper(Database):
         with_type=with_type,
         with_substring=with_substring)
 
+  def ReadFlowResultsPage(self,
+                          client_id,
+                          flow_id,
+                          count,
+                          page_token=None,
+                          with_tag=None,
+                          with_type=None,
+                          with_substring=None):
+    precondition.ValidateClientId(client_id)
+    precondition.ValidateFlowId(flow_id)
+    precondition.AssertOptionalType(page_token, Text)
+    precondition.AssertOptionalType(with_tag, Text)
+    precondition.AssertOptionalType(with_type, Text)
+    precondition.AssertOptionalType(with_substring, Text)
+
+    return self.delegate.ReadFlowResultsPage(
+        client_id,
+        flow_id,
+        count,
+        page_token=page_token,
+        with_tag=with_tag,
+        with_type=with_type,
+        with_substring=with_substring)
+
   def CountFlowResults(
       self,
       client_id,
@@ -4091,6 +4475,41 @@ class DatabaseValidationWrapper(Database):
     return self.delegate.UpdateHuntOutputPluginState(hunt_id, state_index,
                                                      update_fn)
 
+  def WriteHuntOutputPluginRequests(self, requests):
+    precondition.AssertIterableType(requests,
+                                    rdf_flow_objects.HuntOutputPluginRequest)
+    for request in requests:
+      _ValidateHuntId(request.hunt_id)
+
+    if not requests:
+      return
+
+    return self.delegate.WriteHuntOutputPluginRequests(requests)
+
+  def ReadHuntOutputPluginRequests(self):
+    return self.delegate.ReadHuntOutputPluginRequests()
+
+  def AckHuntOutputPluginRequests(self, requests):
+    precondition.AssertIterableType(requests,
+                                    rdf_flow_objects.HuntOutputPluginRequest)
+    if not requests:
+      return
+
+    return self.delegate.AckHuntOutputPluginRequests(requests)
+
+  def RegisterHuntOutputPluginRequestHandler(self, handler, lease_time,
+                                             limit=100):
+    if handler is None:
+      raise ValueError("handler must be provided")
+
+    _ValidateDuration(lease_time)
+    return self.delegate.RegisterHuntOutputPluginRequestHandler(
+        handler, lease_time, limit=limit)
+
+  def UnregisterHuntOutputPluginRequestHandler(self, timeout=None):
+    return self.delegate.UnregisterHuntOutputPluginRequestHandler(
+        timeout=timeout)
+
   def DeleteHuntObject(self, hunt_id):
     _ValidateHuntId(hunt_id)
     return self.delegate.DeleteHuntObject(hunt_id)
@@ -4170,6 +4589,26 @@ class DatabaseValidationWrapper(Database):
         with_substring=with_substring,
         with_timestamp=with_timestamp)
 
+  def ReadHuntResultsPage(self,
+                          hunt_id,
+                          count,
+                          page_token=None,
+                          with_tag=None,
+                          with_type=None,
+                          with_substring=None):
+    _ValidateHuntId(hunt_id)
+    precondition.AssertOptionalType(page_token, Text)
+    precondition.AssertOptionalType(with_tag, Text)
+    precondition.AssertOptionalType(with_type, Text)
+    precondition.AssertOptionalType(with_substring, Text)
+    return self.delegate.ReadHuntResultsPage(
+        hunt_id,
+        count,
+        page_token=page_token,
+        with_tag=with_tag,
+        with_type=with_type,
+        with_substring=with_substring)
+
   def CountHuntResults(self, hunt_id, with_tag=None, with_type=None):
     _ValidateHuntId(hunt_id)
     precondition.AssertOptionalType(with_tag, Text)
@@ -4201,6 +4640,10 @@ class DatabaseValidationWrapper(Database):
     _ValidateHuntId(hunt_id)
     return self.delegate.ReadHuntCounters(hunt_id)
 
+  def RepairHuntCounters(self, hunt_id):
+    _ValidateHuntId(hunt_id)
+    return self.delegate.RepairHuntCounters(hunt_id)
+
   def ReadHuntClientResourcesStats(self, hunt_id):
     _ValidateHuntId(hunt_id)
     return self.delegate.ReadHuntClientResourcesStats(hunt_id)
@@ -192,6 +192,44 @@ class DatabaseTestClientsMixin(object):
         rdf_client_network.NetworkAddress(human_readable_address="8.8.8.8"))
     self.assertEqual(m1.last_foreman_time, rdfvalue.RDFDatetime(220000000000))
 
+  def testMultiWriteClientMetadata(self):
+    client_id_1 = db_test_utils.InitializeClient(self.db)
+    client_id_2 = db_test_utils.InitializeClient(self.db)
+    client_id_3 = db_test_utils.InitializeClient(self.db)
+
+    self.db.WriteClientMetadata(
+        client_id_3, last_ping=rdfvalue.RDFDatetime(100000000000))
+    self.db.MultiWriteClientMetadata([client_id_1, client_id_2],
+                                     last_ping=rdfvalue.RDFDatetime(
+                                         200000000000),
+                                     last_foreman=rdfvalue.RDFDatetime(
+                                         220000000000))
+
+    res = self.db.MultiReadClientMetadata(
+        [client_id_1, client_id_2, client_id_3])
+    for client_id in [client_id_1, client_id_2]:
+      self.assertEqual(res[client_id].ping, rdfvalue.RDFDatetime(200000000000))
+      self.assertEqual(res[client_id].last_foreman_time,
+                       rdfvalue.RDFDatetime(220000000000))
+
+    self.assertEqual(res[client_id_3].ping, rdfvalue.RDFDatetime(100000000000))
+    self.assertFalse(res[client_id_3].HasField("last_foreman_time"))
+
+  def testMultiWriteClientMetadataWithEmptyList(self):
+    self.db.MultiWriteClientMetadata([],
+                                     last_foreman=rdfvalue.RDFDatetime(
+                                         220000000000))
+
+  def testMultiWriteClientMetadataWithoutValuesIsNoop(self):
+    client_id = db_test_utils.InitializeClient(self.db)
+    self.db.WriteClientMetadata(
+        client_id, last_foreman=rdfvalue.RDFDatetime(220000000000))
+
+    self.db.MultiWriteClientMetadata([client_id])
+
+    md = self.db.ReadClientMetadata(client_id)
+    self.assertEqual(md.last_foreman_time, rdfvalue.RDFDatetime(220000000000))
+
   def testClientMetadataValidatesIP(self):
     d = self.db
     client_id = "C.fc413187fefa1dcf"
@@ -1315,6 +1353,49 @@ class DatabaseTestClientsMixin(object):
     with self.assertRaises(db.UnknownClientError):
       self.db.ReadClientMetadata("C.00413187fefa1dcf")
 
+  def testMultiReadClientInfoVersionsChangesOnWrites(self):
+    client_id = db_test_utils.InitializeClient(self.db)
+    other_client_id = db_test_utils.InitializeClient(self.db)
+
+    def ReadVersion(cid=client_id):
+      return self.db.MultiReadClientInfoVersions([cid])[cid]
+
+    version = ReadVersion()
+    other_version = ReadVersion(other_client_id)
+
+    self.db.WriteClientSnapshot(rdf_objects.ClientSnapshot(client_id=client_id))
+    self.assertNotEqual(ReadVersion(), version)
+    version = ReadVersion()
+
+    snapshot = rdf_objects.ClientSnapshot(client_id=client_id)
+    snapshot.timestamp = rdfvalue.RDFDatetime.FromSecondsSinceEpoch(42)
+    self.db.WriteClientSnapshotHistory([snapshot])
+    self.assertNotEqual(ReadVersion(), version)
+    version = ReadVersion()
+
+    self.db.AddClientLabels(client_id, "owner", ["foo"])
+    self.assertNotEqual(ReadVersion(), version)
+    version = ReadVersion()
+
+    self.db.RemoveClientLabels(client_id, "owner", ["foo"])
+    self.assertNotEqual(ReadVersion(), version)
+    version = ReadVersion()
+
+    self.db.WriteClientMetadata(
+        client_id, first_seen=rdfvalue.RDFDatetime.FromSecondsSinceEpoch(1))
+    self.assertNotEqual(ReadVersion(), version)
+    version = ReadVersion()
+
+    # Pings and writes for other clients do not change the version.
+    self.db.WriteClientMetadata(client_id, last_ping=rdfvalue.RDFDatetime.Now())
+    self.assertEqual(ReadVersion(), version)
+    self.assertEqual(ReadVersion(other_client_id), other_version)
+
+  def testMultiReadClientInfoVersionsReturnsZeroForUnknownClients(self):
+    self.assertEqual(
+        self.db.MultiReadClientInfoVersions(["C.00413187fefa1dcf"]),
+        {"C.00413187fefa1dcf": 0})
+
   def testReadClientFullInfoRaisesWhenClientIsMissing(self):
     with self.assertRaises(db.UnknownClientError):
       self.db.ReadClientFullInfo("C.00413187fefa1dcf")
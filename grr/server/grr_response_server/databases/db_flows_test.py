@@ -1719,6 +1719,59 @@ class DatabaseTestFlowMixin(object):
 
     self.assertEqual(requests_for_processing[4][1], responses)
 
+  def testReadFlowRequestsReadyForProcessingReadsStatusOfLargeRequests(self):
+    client_id, flow_id = self._SetupClientAndFlow(next_request_to_process=1)
+    self._WriteRequestAndCompleteResponses(client_id, flow_id, 1, 2)
+    self._WriteRequestAndCompleteResponses(client_id, flow_id, 2, 5)
+
+    requests_for_processing = self.db.ReadFlowRequestsReadyForProcessing(
+        client_id, flow_id, next_needed_request=1, max_responses_per_request=3)
+
+    self.assertEqual(list(requests_for_processing), [1, 2])
+
+    _, small_responses = requests_for_processing[1]
+    self.assertLen(small_responses, 3)
+
+    large_request, large_responses = requests_for_processing[2]
+    self.assertEqual(large_request.nr_responses_expected, 6)
+    self.assertLen(large_responses, 1)
+    self.assertIsInstance(large_responses[0], rdf_flow_objects.FlowStatus)
+    self.assertEqual(large_responses[0].response_id, 6)
+
+  def testReadFlowResponsesForRequest(self):
+    client_id, flow_id = self._SetupClientAndFlow()
+    self._WriteRequestAndCompleteResponses(client_id, flow_id, 1, 5)
+    self._WriteRequestAndCompleteResponses(client_id, flow_id, 2, 1)
+
+    page = self.db.ReadFlowResponsesForRequest(client_id, flow_id, 1, 0, 4)
+    self.assertEqual([r.response_id for r in page], [1, 2, 3, 4])
+    self.assertTrue(all(r.request_id == 1 for r in page))
+
+    page = self.db.ReadFlowResponsesForRequest(client_id, flow_id, 1, 5, 4)
+    self.assertEqual([r.response_id for r in page], [5, 6])
+    self.assertIsInstance(page[-1], rdf_flow_objects.FlowStatus)
+
+    page = self.db.ReadFlowResponsesForRequest(client_id, flow_id, 1, 7, 4)
+    self.assertEmpty(page)
+
+  def testCountFlowResponsesForRequest(self):
+    client_id, flow_id = self._SetupClientAndFlow()
+    self._WriteRequestAndCompleteResponses(client_id, flow_id, 1, 5)
+    self._WriteRequestAndCompleteResponses(client_id, flow_id, 2, 1)
+
+    self.db.WriteFlowResponses([
+        rdf_flow_objects.FlowIterator(
+            client_id=client_id, flow_id=flow_id, request_id=1, response_id=7)
+    ])
+
+    # Neither the status nor the iterator are counted.
+    self.assertEqual(
+        self.db.CountFlowResponsesForRequest(client_id, flow_id, 1), 5)
+    self.assertEqual(
+        self.db.CountFlowResponsesForRequest(client_id, flow_id, 2), 1)
+    self.assertEqual(
+        self.db.CountFlowResponsesForRequest(client_id, flow_id, 3), 0)
+
   def testFlowProcessingRequestsQueue(self):
     flow_ids = []
     for _ in range(5):
@@ -1752,6 +1805,38 @@ class DatabaseTestFlowMixin(object):
 
     self.assertCountEqual(requests, got)
 
+  def testFlowProcessingRequestsQueueWithManyRequests(self):
+    # More requests than flow processing workers can handle at once.
+    client_id = None
+    requests = []
+    for _ in range(120):
+      client_id, flow_id = self._SetupClientAndFlow(client_id=client_id)
+      requests.append(
+          rdf_flows.FlowProcessingRequest(client_id=client_id, flow_id=flow_id))
+
+    request_queue = queue.Queue()
+
+    def Callback(request):
+      self.db.AckFlowProcessingRequests([request])
+      request_queue.put(request)
+
+    self.db.RegisterFlowProcessingHandler(Callback)
+    self.addCleanup(self.db.UnregisterFlowProcessingHandler)
+
+    self.db.WriteFlowProcessingRequests(requests)
+
+    got = []
+    while len(got) < len(requests):
+      try:
+        l = request_queue.get(True, timeout=6)
+      except queue.Empty:
+        self.fail("Timed out waiting for messages, expected %d, got %d" %
+                  (len(requests), len(got)))
+      got.append(l)
+
+    self.assertCountEqual(requests, got)
+    self.assertEmpty(self.db.ReadFlowProcessingRequests())
+
   def testFlowProcessingRequestsQueueWithDelay(self):
     flow_ids = []
     for _ in range(5):
@@ -2138,6 +2223,60 @@ class DatabaseTestFlowMixin(object):
                             rdf_objects.SerializedValueOfUnrecognizedType)
       self.assertEqual(r.payload.type_name, type_name)
 
+  def _ReadAllFlowResultsPages(self, client_id, flow_id, count, **kwargs):
+    results = []
+    page_token = None
+    while True:
+      page, page_token = self.db.ReadFlowResultsPage(
+          client_id, flow_id, count, page_token=page_token, **kwargs)
+      self.assertLessEqual(len(page), count)
+      results.extend(page)
+      if page_token is None:
+        return results
+
+  def testReadFlowResultsPageReadsAllResultsInOrder(self):
+    client_id, flow_id = self._SetupClientAndFlow()
+    # All results written at once share the same timestamp.
+    self._WriteFlowResults(self._SampleResults(client_id, flow_id))
+    self._WriteFlowResults(
+        self._SampleResults(client_id, flow_id), multiple_timestamps=True)
+
+    expected = self.db.ReadFlowResults(client_id, flow_id, 0, 100)
+    self.assertLen(expected, 20)
+    for count in [1, 3, 10, 20, 100]:
+      results = self._ReadAllFlowResultsPages(client_id, flow_id, count)
+      self.assertEqual([r.payload for r in results],
+                       [r.payload for r in expected])
+
+  def testReadFlowResultsPageCorrectlyAppliesFilters(self):
+    client_id, flow_id = self._SetupClientAndFlow()
+    sample_results = self._WriteFlowResults(
+        self._SampleResults(client_id, flow_id), multiple_timestamps=True)
+
+    results = self._ReadAllFlowResultsPages(
+        client_id, flow_id, 2, with_tag="tag_1")
+    self.assertEqual([i.payload for i in results], [sample_results[1].payload])
+
+    results = self._ReadAllFlowResultsPages(
+        client_id,
+        flow_id,
+        2,
+        with_type=compatibility.GetName(rdf_client.ClientInformation))
+    self.assertFalse(results)
+
+    results = self._ReadAllFlowResultsPages(
+        client_id, flow_id, 2, with_substring="manufacturer_2")
+    self.assertEqual([i.payload for i in results], [sample_results[2].payload])
+
+  def testIterateFlowResultsYieldsAllResults(self):
+    client_id, flow_id = self._SetupClientAndFlow()
+    sample_results = self._WriteFlowResults(
+        self._SampleResults(client_id, flow_id), multiple_timestamps=True)
+
+    results = list(self.db.IterateFlowResults(client_id, flow_id, batch_size=3))
+    self.assertEqual([r.payload for r in results],
+                     [r.payload for r in sample_results])
+
   def testCountFlowResultsReturnsCorrectResultsCount(self):
     client_id, flow_id = self._SetupClientAndFlow()
     sample_results = self._WriteFlowResults(
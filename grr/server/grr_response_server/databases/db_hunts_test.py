@@ -6,6 +6,7 @@ from __future__ import division
 from __future__ import unicode_literals
 
 import collections
+import queue
 import random
 
 from grr_response_core.lib import rdfvalue
@@ -354,6 +355,97 @@ class DatabaseTestHuntMixin(object):
     res = self.db.ReadHuntOutputPluginsStates(hunt_obj.hunt_id)
     self.assertEqual(res, [])
 
+  def _MakeHuntOutputPluginRequest(self, hunt_id, num_results=1, **kwargs):
+    return rdf_flow_objects.HuntOutputPluginRequest(
+        hunt_id=hunt_id,
+        client_id="C.1234567890123456",
+        flow_id=hunt_id,
+        results=[
+            rdf_flow_objects.FlowResult(payload=rdf_client.ClientSummary())
+            for _ in range(num_results)
+        ],
+        **kwargs)
+
+  def testWritingAndReadingHuntOutputPluginRequestsWorks(self):
+    hunt_id = rdf_hunt_objects.RandomHuntId()
+    requests = [
+        self._MakeHuntOutputPluginRequest(hunt_id, num_results=i + 1)
+        for i in range(3)
+    ]
+    self.db.WriteHuntOutputPluginRequests(requests)
+    # Writing the same requests again queues them once more.
+    self.db.WriteHuntOutputPluginRequests(requests)
+
+    read = self.db.ReadHuntOutputPluginRequests()
+    self.assertLen(read, 6)
+    self.assertLen(set(r.request_id for r in read), 6)
+    self.assertEqual([len(r.results) for r in read], [1, 2, 3, 1, 2, 3])
+    for r in read:
+      self.assertEqual(r.hunt_id, hunt_id)
+      self.assertIsNone(r.leased_until)
+
+  def testAckHuntOutputPluginRequestsDeletesRequests(self):
+    hunt_id = rdf_hunt_objects.RandomHuntId()
+    self.db.WriteHuntOutputPluginRequests(
+        [self._MakeHuntOutputPluginRequest(hunt_id) for _ in range(3)])
+
+    read = self.db.ReadHuntOutputPluginRequests()
+    self.db.AckHuntOutputPluginRequests(read[:2])
+
+    self.assertEqual(self.db.ReadHuntOutputPluginRequests(), read[2:])
+
+  def testHuntOutputPluginRequestsAreLeasedGroupedByHunt(self):
+    hunt_id_1 = rdf_hunt_objects.RandomHuntId()
+    hunt_id_2 = rdf_hunt_objects.RandomHuntId()
+    self.db.WriteHuntOutputPluginRequests([
+        self._MakeHuntOutputPluginRequest(hunt_id_1),
+        self._MakeHuntOutputPluginRequest(hunt_id_2),
+        self._MakeHuntOutputPluginRequest(hunt_id_1),
+    ])
+
+    leased = queue.Queue()
+    self.db.RegisterHuntOutputPluginRequestHandler(
+        leased.put, rdfvalue.Duration.From(5, rdfvalue.MINUTES))
+    try:
+      got = [leased.get(True, timeout=6), leased.get(True, timeout=6)]
+    finally:
+      self.db.UnregisterHuntOutputPluginRequestHandler()
+
+    got_by_hunt = {requests[0].hunt_id: requests for requests in got}
+    self.assertLen(got_by_hunt[hunt_id_1], 2)
+    self.assertLen(got_by_hunt[hunt_id_2], 1)
+    for requests in got:
+      for r in requests:
+        self.assertEqual(r.hunt_id, requests[0].hunt_id)
+        self.assertGreater(r.leased_until, rdfvalue.RDFDatetime.Now())
+
+    # Leased requests stay queued until they are acknowledged.
+    self.assertLen(self.db.ReadHuntOutputPluginRequests(), 3)
+
+  def testDelayedHuntOutputPluginRequestsAreNotLeasedBeforeTheirTime(self):
+    hunt_id = rdf_hunt_objects.RandomHuntId()
+    delivery_time = rdfvalue.RDFDatetime.Now() + rdfvalue.Duration.From(
+        1, rdfvalue.HOURS)
+    self.db.WriteHuntOutputPluginRequests([
+        self._MakeHuntOutputPluginRequest(
+            hunt_id, num_results=1, delivery_time=delivery_time),
+        self._MakeHuntOutputPluginRequest(hunt_id, num_results=2),
+    ])
+
+    read = self.db.ReadHuntOutputPluginRequests()
+    self.assertEqual(read[0].delivery_time, delivery_time)
+
+    leased = queue.Queue()
+    self.db.RegisterHuntOutputPluginRequestHandler(
+        leased.put, rdfvalue.Duration.From(5, rdfvalue.MINUTES))
+    try:
+      got = leased.get(True, timeout=6)
+      self.assertEqual([len(r.results) for r in got], [2])
+      with self.assertRaises(queue.Empty):
+        leased.get(True, timeout=0.5)
+    finally:
+      self.db.UnregisterHuntOutputPluginRequestHandler()
+
   def testReadingHuntOutputStatesForUnknownHuntRaises(self):
     with self.assertRaises(db.UnknownHuntError):
       self.db.ReadHuntOutputPluginsStates(rdf_hunt_objects.RandomHuntId())
@@ -898,6 +990,78 @@ class DatabaseTestHuntMixin(object):
                             rdf_objects.SerializedValueOfUnrecognizedType)
       self.assertEqual(r.payload.type_name, type_name)
 
+  def _ReadAllHuntResultsPages(self, hunt_id, count, **kwargs):
+    results = []
+    page_token = None
+    while True:
+      page, page_token = self.db.ReadHuntResultsPage(
+          hunt_id, count, page_token=page_token, **kwargs)
+      self.assertLessEqual(len(page), count)
+      results.extend(page)
+      if page_token is None:
+        return results
+
+  def testReadHuntResultsPageReadsAllResultsInOrder(self):
+    hunt_obj = rdf_hunt_objects.Hunt(description="foo")
+    self.db.WriteHuntObject(hunt_obj)
+
+    for _ in range(3):
+      client_id, flow_id = self._SetupHuntClientAndFlow(
+          hunt_id=hunt_obj.hunt_id)
+      sample_results = self._SampleTwoTypeHuntResults(
+          client_id=client_id, flow_id=flow_id, hunt_id=hunt_obj.hunt_id)
+      # Results written at once share the same timestamp.
+      self.db.WriteFlowResults(sample_results)
+
+    expected = self.db.ReadHuntResults(hunt_obj.hunt_id, 0, 1000)
+    self.assertLen(expected, 30)
+    for count in [1, 4, 10, 30, 100]:
+      results = self._ReadAllHuntResultsPages(hunt_obj.hunt_id, count)
+      self.assertCountEqual([r.payload for r in results],
+                            [r.payload for r in expected])
+      self.assertEqual([r.timestamp for r in results],
+                       [r.timestamp for r in expected])
+      for r in results:
+        self.assertEqual(r.hunt_id, hunt_obj.hunt_id)
+
+  def testReadHuntResultsPageCorrectlyAppliesFilters(self):
+    hunt_obj = rdf_hunt_objects.Hunt(description="foo")
+    self.db.WriteHuntObject(hunt_obj)
+
+    client_id, flow_id = self._SetupHuntClientAndFlow(hunt_id=hunt_obj.hunt_id)
+    sample_results = self._SampleTwoTypeHuntResults(
+        client_id=client_id, flow_id=flow_id, hunt_id=hunt_obj.hunt_id)
+    self._WriteHuntResults(sample_results)
+
+    results = self._ReadAllHuntResultsPages(
+        hunt_obj.hunt_id, 2, with_tag="tag_1")
+    self.assertEqual([i.payload for i in results],
+                     [i.payload for i in sample_results if i.tag == "tag_1"])
+
+    results = self._ReadAllHuntResultsPages(
+        hunt_obj.hunt_id,
+        2,
+        with_type=compatibility.GetName(rdf_client.ClientCrash))
+    self.assertEqual([i.payload for i in results],
+                     [i.payload for i in sample_results[5:]])
+
+    results = self._ReadAllHuntResultsPages(
+        hunt_obj.hunt_id, 2, with_substring="manufacturer_3")
+    self.assertEqual([i.payload for i in results], [sample_results[3].payload])
+
+  def testIterateHuntResultsYieldsAllResults(self):
+    hunt_obj = rdf_hunt_objects.Hunt(description="foo")
+    self.db.WriteHuntObject(hunt_obj)
+
+    client_id, flow_id = self._SetupHuntClientAndFlow(hunt_id=hunt_obj.hunt_id)
+    sample_results = self._SampleSingleTypeHuntResults(
+        client_id=client_id, flow_id=flow_id, hunt_id=hunt_obj.hunt_id)
+    self._WriteHuntResults(sample_results)
+
+    results = list(self.db.IterateHuntResults(hunt_obj.hunt_id, batch_size=3))
+    self.assertEqual([r.payload for r in results],
+                     [r.payload for r in sample_results])
+
   def testCountHuntResultsReturnsCorrectResultsCount(self):
     hunt_obj = rdf_hunt_objects.Hunt(description="foo")
     self.db.WriteHuntObject(hunt_obj)
@@ -1394,6 +1558,67 @@ class DatabaseTestHuntMixin(object):
     self.assertAlmostEqual(usage_stats.network_bytes_sent_stats.stddev,
                            833066299, 5)
 
+  def testReadHuntCountersReflectsFlowUpdates(self):
+    hunt_obj = rdf_hunt_objects.Hunt(description="foo")
+    self.db.WriteHuntObject(hunt_obj)
+
+    client_id, flow_id = self._SetupHuntClientAndFlow(
+        flow_state=rdf_flow_objects.Flow.FlowState.RUNNING,
+        hunt_id=hunt_obj.hunt_id)
+
+    hunt_counters = self.db.ReadHuntCounters(hunt_obj.hunt_id)
+    self.assertEqual(hunt_counters.num_clients, 1)
+    self.assertEqual(hunt_counters.num_running_clients, 1)
+    self.assertEqual(hunt_counters.num_successful_clients, 0)
+
+    flow_obj = self.db.ReadFlowObject(client_id, flow_id)
+    flow_obj.cpu_time_used.user_cpu_time = 2.5
+    flow_obj.network_bytes_sent = 1024
+    self.db.UpdateFlow(client_id, flow_id, flow_obj=flow_obj)
+    self.db.UpdateFlow(
+        client_id,
+        flow_id,
+        flow_state=rdf_flow_objects.Flow.FlowState.FINISHED)
+
+    hunt_counters = self.db.ReadHuntCounters(hunt_obj.hunt_id)
+    self.assertEqual(hunt_counters.num_clients, 1)
+    self.assertEqual(hunt_counters.num_running_clients, 0)
+    self.assertEqual(hunt_counters.num_successful_clients, 1)
+    self.assertAlmostEqual(hunt_counters.total_cpu_seconds, 2.5)
+    self.assertEqual(hunt_counters.total_network_bytes_sent, 1024)
+
+    usage_stats = self.db.ReadHuntClientResourcesStats(hunt_obj.hunt_id)
+    self.assertEqual(usage_stats.user_cpu_stats.num, 1)
+    self.assertAlmostEqual(usage_stats.user_cpu_stats.sum, 2.5)
+    self.assertEqual(
+        [b.num for b in usage_stats.network_bytes_sent_stats.histogram.bins
+         if b.num], [1])
+
+  def testRepairHuntCountersKeepsCountersUnchanged(self):
+    hunt_obj = rdf_hunt_objects.Hunt(description="foo")
+    self.db.WriteHuntObject(hunt_obj)
+    self._BuildFilterConditionExpectations(hunt_obj)
+    for i in range(3):
+      self._SetupHuntClientAndFlow(
+          flow_state=rdf_flow_objects.Flow.FlowState.FINISHED,
+          cpu_time_used=rdf_client_stats.CpuSeconds(
+              user_cpu_time=1.5 * i, system_cpu_time=i),
+          network_bytes_sent=100 * i,
+          hunt_id=hunt_obj.hunt_id)
+
+    hunt_counters = self.db.ReadHuntCounters(hunt_obj.hunt_id)
+    usage_stats = self.db.ReadHuntClientResourcesStats(hunt_obj.hunt_id)
+
+    self.db.RepairHuntCounters(hunt_obj.hunt_id)
+
+    self.assertEqual(self.db.ReadHuntCounters(hunt_obj.hunt_id), hunt_counters)
+    self.assertEqual(
+        self.db.ReadHuntClientResourcesStats(hunt_obj.hunt_id), usage_stats)
+
+  def testRepairHuntCountersRaisesForUnknownHunt(self):
+    with self.assertRaises(db.UnknownHuntError):
+      self.db.RepairHuntCounters(rdf_hunt_objects.RandomHuntId())
+
   def testReadHuntFlowsStatesAndTimestampsWorksCorrectlyForMultipleFlows(self):
     hunt_obj = rdf_hunt_objects.Hunt(description="foo")
     self.db.WriteHuntObject(hunt_obj)
@@ -6,6 +6,7 @@ from __future__ import division
 from __future__ import unicode_literals
 
 import queue
+import time
 
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib import utils
@@ -87,5 +88,64 @@ class DatabaseTestHandlerMixin(object):
     got.sort(key=lambda req: req.request_id)
     self.assertEqual(requests, got)
 
+  def testMessageHandlerIsWokenUpByWrites(self):
+    leased = queue.Queue()
+    self.db.RegisterMessageHandler(
+        leased.put, rdfvalue.Duration.From(5, rdfvalue.MINUTES))
+    # Gives the handler loop time to find the queue empty and go idle.
+    time.sleep(0.1)
+
+    request = rdf_objects.MessageHandlerRequest(
+        client_id="C.1000000000000000",
+        handler_name="Testhandler",
+        request_id=42,
+        request=rdfvalue.RDFInteger(42))
+    self.db.WriteMessageHandlerRequests([request])
+
+    # New requests are delivered without waiting for the next poll.
+    try:
+      got = leased.get(True, timeout=1)
+    except queue.Empty:
+      self.fail("Handler was not woken up by the write.")
+    self.db.DeleteMessageHandlerRequests(got)
+
+    self.assertEqual([r.request_id for r in got], [42])
+
+  def testMessageHandlerRequestsCanBeDelayed(self):
+    delayed_until = rdfvalue.RDFDatetime.Now() + rdfvalue.Duration.From(
+        1, rdfvalue.HOURS)
+    requests = [
+        rdf_objects.MessageHandlerRequest(
+            client_id="C.1000000000000000",
+            handler_name="Testhandler",
+            request_id=1,
+            request=rdfvalue.RDFInteger(1),
+            leased_until=delayed_until),
+        rdf_objects.MessageHandlerRequest(
+            client_id="C.1000000000000000",
+            handler_name="Testhandler",
+            request_id=2,
+            request=rdfvalue.RDFInteger(2)),
+    ]
+    self.db.WriteMessageHandlerRequests(requests)
+
+    read = sorted(
+        self.db.ReadMessageHandlerRequests(), key=lambda req: req.request_id)
+    self.assertEqual(read[0].leased_until, delayed_until)
+    self.assertIsNone(read[1].leased_until)
+
+    leased = queue.Queue()
+    self.db.RegisterMessageHandler(
+        leased.put, rdfvalue.Duration.From(5, rdfvalue.MINUTES))
+
+    got = leased.get(True, timeout=6)
+    self.db.DeleteMessageHandlerRequests(got)
+    self.assertEqual([r.request_id for r in got], [2])
+
+    # The delayed request is not handed out before its time.
+    with self.assertRaises(queue.Empty):
+      leased.get(True, timeout=0.5)
+    self.db.DeleteMessageHandlerRequests(requests[:1])
+
 
 # This file is a test library and thus does not require a __main__ block.
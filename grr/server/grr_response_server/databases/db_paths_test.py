@@ -507,6 +507,65 @@ class DatabaseTestPathsMixin(object):
     self.assertEqual(path_infos_b[("norf", "thud")].hash_entry.sha256, b"bbb")
     self.assertEqual(path_infos_b[("quux", "blargh")].stat_entry.st_mode, 1337)
 
+  def testMultiWritePathInfosLargeBatchWithSharedAncestors(self):
+    client_id = db_test_utils.InitializeClient(self.db)
+
+    path_infos = []
+    for i in range(2500):
+      path_info = rdf_objects.PathInfo.OS(
+          components=["foo", "bar%d" % (i % 10), "baz%d" % i])
+      if i % 2:
+        path_info.stat_entry.st_size = i
+      else:
+        path_info.hash_entry.sha256 = b"%d" % i
+      path_infos.append(path_info)
+    self.db.MultiWritePathInfos({client_id: path_infos})
+
+    results = self.db.ListDescendantPathInfos(
+        client_id, rdf_objects.PathInfo.PathType.OS, components=("foo",))
+    self.assertLen(results, 2510)
+    self.assertLen([r for r in results if r.directory], 10)
+
+    result = self.db.ReadPathInfo(
+        client_id,
+        rdf_objects.PathInfo.PathType.OS,
+        components=("foo", "bar3", "baz2493"))
+    self.assertEqual(result.stat_entry.st_size, 2493)
+    self.assertIsNotNone(result.last_stat_entry_timestamp)
+    self.assertIsNone(result.last_hash_entry_timestamp)
+
+    result = self.db.ReadPathInfo(
+        client_id,
+        rdf_objects.PathInfo.PathType.OS,
+        components=("foo", "bar4", "baz1234"))
+    self.assertEqual(result.hash_entry.sha256, b"1234")
+    self.assertIsNotNone(result.last_hash_entry_timestamp)
+    self.assertIsNone(result.last_stat_entry_timestamp)
+
+  def testReadPathInfosVersionChangesOnWrites(self):
+    client_id = db_test_utils.InitializeClient(self.db)
+    other_client_id = db_test_utils.InitializeClient(self.db)
+
+    version = self.db.ReadPathInfosVersion(client_id)
+    other_version = self.db.ReadPathInfosVersion(other_client_id)
+
+    self.db.WritePathInfos(client_id,
+                           [rdf_objects.PathInfo.OS(components=["foo"])])
+    self.assertNotEqual(self.db.ReadPathInfosVersion(client_id), version)
+    version = self.db.ReadPathInfosVersion(client_id)
+
+    self.db.MultiWritePathInfos(
+        {client_id: [rdf_objects.PathInfo.OS(components=["foo", "bar"])]})
+    self.assertNotEqual(self.db.ReadPathInfosVersion(client_id), version)
+    version = self.db.ReadPathInfosVersion(client_id)
+
+    # Other operations and writes for other clients do not change the version.
+    self.db.ReadPathInfo(
+        client_id, rdf_objects.PathInfo.PathType.OS, components=("foo",))
+    self.assertEqual(self.db.ReadPathInfosVersion(client_id), version)
+    self.assertEqual(self.db.ReadPathInfosVersion(other_client_id),
+                     other_version)
+
   def testReadPathInfosEmptyComponentsList(self):
     client_id = db_test_utils.InitializeClient(self.db)
     results = self.db.ReadPathInfos(client_id, rdf_objects.PathInfo.PathType.OS,
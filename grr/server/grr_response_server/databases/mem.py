@@ -26,6 +26,7 @@ from grr_response_server.databases import mem_paths
 from grr_response_server.databases import mem_signed_binaries
 from grr_response_server.databases import mem_users
 from grr_response_server.databases import mem_yara
+from grr_response_server.databases import wakeup
 from grr_response_server.rdfvalues import objects as rdf_objects
 
 
@@ -51,6 +52,9 @@ class InMemoryDB(mem_artifacts.InMemoryDBArtifactsMixin,
     super().__init__()
     self._Init()
     self.lock = threading.RLock()
+    self.message_handler_wakeup = wakeup.InProcessWakeupChannel()
+    self.flow_processing_request_wakeup = wakeup.InProcessWakeupChannel()
+    self.hunt_output_plugin_request_wakeup = wakeup.InProcessWakeupChannel()
 
   def _Init(self):
     self.artifacts = {}
@@ -58,6 +62,8 @@ class InMemoryDB(mem_artifacts.InMemoryDBArtifactsMixin,
     self.clients = {}
     self.client_action_requests = {}
     self.client_action_request_leases = {}
+    # Maps client_id to an opaque version of the client's full info.
+    self.client_info_versions = {}
     self.client_stats = collections.defaultdict(collections.OrderedDict)
     self.crash_history = {}
     self.cronjob_leases = {}
@@ -74,6 +80,8 @@ class InMemoryDB(mem_artifacts.InMemoryDBArtifactsMixin,
     # debugging experience.
     # Maps (client_id, path_type, components) to a path record.
     self.path_records = {}
+    # Maps client_id to an opaque version of the client's path infos.
+    self.path_infos_versions = {}
     # Maps (client_id, path_type, path_id) to a blob record.
     self.blob_records = {}
     self.message_handler_requests = {}
@@ -109,6 +117,11 @@ class InMemoryDB(mem_artifacts.InMemoryDBArtifactsMixin,
     self.api_audit_entries = []
     self.hunts = {}
     self.hunt_output_plugins_states = {}
+    # Maps request ids to queued HuntOutputPluginRequest rdfvalues.
+    self.hunt_output_plugin_requests = {}
+    self.hunt_output_plugin_last_request_id = 0
+    self.hunt_output_plugin_handler_thread = None
+    self.hunt_output_plugin_handler_stop = True
     self.signed_binary_references = {}
     self.client_graph_series = {}
     # Maps (client_id, creator, scheduled_flow_id) to ScheduledFlow.
@@ -117,6 +130,7 @@ class InMemoryDB(mem_artifacts.InMemoryDBArtifactsMixin,
   @utils.Synchronized
   def ClearTestDB(self):
     self.UnregisterMessageHandler()
+    self.UnregisterHuntOutputPluginRequestHandler()
     self._Init()
 
   def _AllPathIDs(self):
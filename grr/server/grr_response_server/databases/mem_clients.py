@@ -12,6 +12,7 @@ from grr_response_core.lib import utils
 from grr_response_core.lib.rdfvalues import client as rdf_client
 from grr_response_core.lib.rdfvalues import client_stats as rdf_client_stats
 from grr_response_core.lib.util import collection
+from grr_response_core.lib.util import random
 from grr_response_server import fleet_utils
 from grr_response_server.databases import db
 from grr_response_server.rdfvalues import objects as rdf_objects
@@ -58,6 +59,9 @@ class InMemoryDBClientMixin(object):
 
     self.metadatas.setdefault(client_id, {}).update(md)
 
+    if first_seen is not None:
+      self._BumpClientInfoVersion(client_id)
+
   @utils.Synchronized
   def MultiReadClientMetadata(self, client_ids):
     """Reads ClientMetadata records for a list of clients."""
@@ -100,6 +104,8 @@ class InMemoryDBClientMixin(object):
 
     snapshot.startup_info = startup_info
 
+    self._BumpClientInfoVersion(client_id)
+
   @utils.Synchronized
   def MultiReadClientSnapshot(self, client_ids):
     """Reads the latest client snapshots for a list of clients."""
@@ -144,6 +150,17 @@ class InMemoryDBClientMixin(object):
       res[client_id] = full_info
     return res
 
+  def _BumpClientInfoVersion(self, client_id):
+    self.client_info_versions[client_id] = random.UInt64()
+
+  @utils.Synchronized
+  def MultiReadClientInfoVersions(self, client_ids):
+    """Reads opaque versions of the full information of given clients."""
+    return {
+        client_id: self.client_info_versions.get(client_id, 0)
+        for client_id in client_ids
+    }
+
   @utils.Synchronized
   def ReadClientLastPings(self,
                           min_last_ping=None,
@@ -190,6 +207,8 @@ class InMemoryDBClientMixin(object):
 
       client.startup_info = startup_info
 
+    self._BumpClientInfoVersion(clients[0].client_id)
+
   @utils.Synchronized
   def ReadClientSnapshotHistory(self, client_id, timerange=None):
     """Reads the full history for a particular client."""
@@ -247,6 +266,8 @@ class InMemoryDBClientMixin(object):
     for l in labels:
       labelset.add(utils.SmartUnicode(l))
 
+    self._BumpClientInfoVersion(client_id)
+
   @utils.Synchronized
   def MultiReadClientLabels(self, client_ids):
     """Reads the user labels for a list of clients."""
@@ -267,6 +288,8 @@ class InMemoryDBClientMixin(object):
     for l in labels:
       labelset.discard(utils.SmartUnicode(l))
 
+    self._BumpClientInfoVersion(client_id)
+
   @utils.Synchronized
   def ReadAllClientLabels(self):
     """Lists all client labels known to the system."""
@@ -462,6 +485,8 @@ class InMemoryDBClientMixin(object):
 
     self.labels.pop(client_id, None)
 
+    self.client_info_versions.pop(client_id, None)
+
     self.startup_history.pop(client_id, None)
 
     self.crash_history.pop(client_id, None)
@@ -43,6 +43,10 @@ class InMemoryDBFlowMixin(object):
       cloned_request = r.Copy()
       cloned_request.timestamp = now
       flow_dict[cloned_request.request_id] = cloned_request
+      if r.leased_until:
+        leases = self.message_handler_leases.setdefault(r.handler_name, {})
+        leases[r.request_id] = r.leased_until
+    self.message_handler_wakeup.Notify()
 
   @utils.Synchronized
   def ReadMessageHandlerRequests(self):
@@ -85,6 +89,7 @@ class InMemoryDBFlowMixin(object):
     """Unregisters any registered message handler."""
     if self.handler_thread:
       self.handler_stop = True
+      self.message_handler_wakeup.Notify()
       self.handler_thread.join(timeout)
       if self.handler_thread.isAlive():
         raise RuntimeError("Message handler thread did not join in time.")
@@ -97,7 +102,8 @@ class InMemoryDBFlowMixin(object):
         if msgs:
           handler(msgs)
         else:
-          time.sleep(0.2)
+          # Polling picks up requests with expired leases.
+          self.message_handler_wakeup.Wait(0.2)
       except Exception as e:  # pylint: disable=broad-except
         logging.exception("_LeaseMessageHandlerRequests raised %s.", e)
 
@@ -520,7 +526,8 @@ class InMemoryDBFlowMixin(object):
   def ReadFlowRequestsReadyForProcessing(self,
                                          client_id,
                                          flow_id,
-                                         next_needed_request=None):
+                                         next_needed_request=None,
+                                         max_responses_per_request=None):
     """Reads all requests for a flow that can be processed by the worker."""
     request_dict = self.flow_requests.get((client_id, flow_id), {})
     response_dict = self.flow_responses.get((client_id, flow_id), {})
@@ -540,6 +547,10 @@ class InMemoryDBFlowMixin(object):
       responses = sorted(
           response_dict.get(request_id, {}).values(),
           key=lambda response: response.response_id)
+      if (max_responses_per_request and
+          request.nr_responses_expected > max_responses_per_request):
+        # The status is always the last response.
+        responses = responses[-1:]
       # Serialize/deserialize responses to better simulate the
       # real DB behavior (where serialization/deserialization is almost
       # guaranteed to be done).
@@ -554,6 +565,28 @@ class InMemoryDBFlowMixin(object):
 
     return res
 
+  @utils.Synchronized
+  def ReadFlowResponsesForRequest(self, client_id, flow_id, request_id,
+                                  min_response_id, count):
+    """Reads a page of responses to a single flow request."""
+    response_dict = self.flow_responses.get((client_id, flow_id), {})
+    responses = sorted(
+        (r for r in response_dict.get(request_id, {}).values()
+         if r.response_id >= min_response_id),
+        key=lambda response: response.response_id)
+    return [
+        r.__class__.FromSerializedBytes(r.SerializeToBytes())
+        for r in responses[:count]
+    ]
+
+  @utils.Synchronized
+  def CountFlowResponsesForRequest(self, client_id, flow_id, request_id):
+    """Counts responses to a single flow request."""
+    response_dict = self.flow_responses.get((client_id, flow_id), {})
+    return sum(
+        isinstance(r, rdf_flow_objects.FlowResponse)
+        for r in response_dict.get(request_id, {}).values())
+
   @utils.Synchronized
   def ReleaseProcessedFlow(self, flow_obj):
     """Releases a flow that the worker was processing to the database."""
@@ -600,6 +633,7 @@ class InMemoryDBFlowMixin(object):
       cloned_request.timestamp = now
       key = (r.client_id, r.flow_id)
       self.flow_processing_requests[key] = cloned_request
+    self.flow_processing_request_wakeup.Notify()
 
   @utils.Synchronized
   def ReadFlowProcessingRequests(self):
@@ -648,6 +682,7 @@ class InMemoryDBFlowMixin(object):
 
     if self.flow_handler_thread:
       self.flow_handler_stop = True
+      self.flow_processing_request_wakeup.Notify()
       self.flow_handler_thread.join(timeout)
       if self.flow_handler_thread.isAlive():
         raise RuntimeError("Flow processing handler did not join in time.")
@@ -708,7 +743,9 @@ class InMemoryDBFlowMixin(object):
         with self.lock:
           self.flow_handler_num_being_processed -= 1
 
-      time.sleep(0.2)
+      if not todo:
+        # Polling picks up delayed requests once they are due.
+        self.flow_processing_request_wakeup.Wait(0.2)
 
   @utils.Synchronized
   def _WriteFlowResultsOrErrors(self, container, items):
@@ -722,47 +759,94 @@ class InMemoryDBFlowMixin(object):
     """Writes flow results for a given flow."""
     self._WriteFlowResultsOrErrors(self.flow_results, results)
 
-  @utils.Synchronized
-  def _ReadFlowResultsOrErrors(self,
+  def _ListFlowResultsOrErrors(self,
                                container,
                                client_id,
                                flow_id,
-                               offset,
-                               count,
                                with_tag=None,
                                with_type=None,
                                with_substring=None):
-    """Reads flow results/errors of a given flow using given query options."""
-    results = sorted(
-        [x.Copy() for x in container.get((client_id, flow_id), [])],
-        key=lambda r: r.timestamp)
+    """Lists (index, item) pairs of flow results/errors matching filters."""
+    items = [
+        (index, x.Copy())
+        for index, x in enumerate(container.get((client_id, flow_id), []))
+    ]
 
     # This is done in order to pass the tests that try to deserialize
     # value of an unrecognized type.
-    for r in results:
+    for _, r in items:
       cls_name = compatibility.GetName(r.payload.__class__)
       if cls_name not in rdfvalue.RDFValue.classes:
         r.payload = rdf_objects.SerializedValueOfUnrecognizedType(
             type_name=cls_name, value=r.payload.SerializeToBytes())
 
     if with_tag is not None:
-      results = [i for i in results if i.tag == with_tag]
+      items = [(index, i) for index, i in items if i.tag == with_tag]
 
     if with_type is not None:
-      results = [
-          i for i in results
-          if compatibility.GetName(i.payload.__class__) == with_type
-      ]
+      items = [(index, i)
+               for index, i in items
+               if compatibility.GetName(i.payload.__class__) == with_type]
 
     if with_substring is not None:
       encoded_substring = with_substring.encode("utf8")
-      results = [
-          i for i in results
-          if encoded_substring in i.payload.SerializeToBytes()
-      ]
+      items = [(index, i)
+               for index, i in items
+               if encoded_substring in i.payload.SerializeToBytes()]
 
+    return items
+
+  @utils.Synchronized
+  def _ReadFlowResultsOrErrors(self,
+                               container,
+                               client_id,
+                               flow_id,
+                               offset,
+                               count,
+                               with_tag=None,
+                               with_type=None,
+                               with_substring=None):
+    """Reads flow results/errors of a given flow using given query options."""
+    items = self._ListFlowResultsOrErrors(
+        container,
+        client_id,
+        flow_id,
+        with_tag=with_tag,
+        with_type=with_type,
+        with_substring=with_substring)
+    results = sorted([i for _, i in items], key=lambda r: r.timestamp)
     return results[offset:offset + count]
 
+  def _ReadResultsPage(self, keyed_results, count, page_token):
+    """Reads a page of results that follow a given page token.
+
+    Args:
+      keyed_results: A list of (key, result) pairs, where keys are tuples
+        (timestamp in microseconds, client id, flow id, index of the result).
+      count: Maximum number of results to return.
+      page_token: A page token returned with a previous page or None.
+
+    Returns:
+      A tuple with a list of results and the next page token (or None).
+
+    Raises:
+      ValueError: If the page token is malformed.
+    """
+    if page_token:
+      try:
+        micros, client_id, flow_id, index = page_token.split(":")
+        after = (int(micros), client_id, flow_id, int(index))
+      except ValueError:
+        raise ValueError("Invalid page token: %r" % page_token)
+      keyed_results = [(k, r) for k, r in keyed_results if k > after]
+
+    page = sorted(keyed_results, key=lambda item: item[0])[:count]
+    results = [r for _, r in page]
+    if len(page) < count:
+      return results, None
+
+    return results, "%d:%s:%s:%d" % page[-1][0]
+
   def ReadFlowResults(self,
                       client_id,
                       flow_id,
@@ -782,6 +866,27 @@ class InMemoryDBFlowMixin(object):
         with_type=with_type,
         with_substring=with_substring)
 
+  @utils.Synchronized
+  def ReadFlowResultsPage(self,
+                          client_id,
+                          flow_id,
+                          count,
+                          page_token=None,
+                          with_tag=None,
+                          with_type=None,
+                          with_substring=None):
+    """Reads a page of flow results that follow a given page token."""
+    items = self._ListFlowResultsOrErrors(
+        self.flow_results,
+        client_id,
+        flow_id,
+        with_tag=with_tag,
+        with_type=with_type,
+        with_substring=with_substring)
+    keyed_results = [((r.timestamp.AsMicrosecondsSinceEpoch(), client_id,
+                       flow_id, index), r) for index, r in items]
+    return self._ReadResultsPage(keyed_results, count, page_token)
+
   @utils.Synchronized
   def CountFlowResults(self, client_id, flow_id, with_tag=None, with_type=None):
     """Counts flow results of a given flow using given query options."""
@@ -5,12 +5,15 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import unicode_literals
 
+import logging
 import sys
+import threading
 
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib import utils
 from grr_response_core.lib.rdfvalues import client_stats as rdf_client_stats
 from grr_response_core.lib.rdfvalues import stats as rdf_stats
+from grr_response_core.lib.util import collection
 from grr_response_core.lib.util import compatibility
 from grr_response_server.databases import db
 from grr_response_server.rdfvalues import flow_objects as rdf_flow_objects
@@ -105,6 +108,95 @@ class InMemoryDBHuntMixin(object):
 
     return state.plugin_state
 
+  @utils.Synchronized
+  def WriteHuntOutputPluginRequests(self, requests):
+    """Queues hunt results for processing with the hunts' output plugins."""
+    for r in requests:
+      self.hunt_output_plugin_last_request_id += 1
+      request_id = self.hunt_output_plugin_last_request_id
+
+      cloned_request = r.Copy()
+      cloned_request.request_id = request_id
+      cloned_request.leased_until = None
+      cloned_request.leased_by = None
+      self.hunt_output_plugin_requests[request_id] = cloned_request
+    self.hunt_output_plugin_request_wakeup.Notify()
+
+  @utils.Synchronized
+  def ReadHuntOutputPluginRequests(self):
+    """Reads all queued hunt output plugin requests."""
+    return [
+        self.hunt_output_plugin_requests[request_id].Copy()
+        for request_id in sorted(self.hunt_output_plugin_requests)
+    ]
+
+  @utils.Synchronized
+  def AckHuntOutputPluginRequests(self, requests):
+    """Acknowledges and deletes hunt output plugin requests."""
+    for r in requests:
+      self.hunt_output_plugin_requests.pop(r.request_id, None)
+
+  def RegisterHuntOutputPluginRequestHandler(self, handler, lease_time,
+                                             limit=100):
+    """Registers a handler to receive hunt output plugin requests."""
+    self.UnregisterHuntOutputPluginRequestHandler()
+
+    self.hunt_output_plugin_handler_stop = False
+    self.hunt_output_plugin_handler_thread = threading.Thread(
+        name="hunt_output_plugin_request_handler",
+        target=self._HuntOutputPluginRequestHandlerLoop,
+        args=(handler, lease_time, limit))
+    self.hunt_output_plugin_handler_thread.daemon = True
+    self.hunt_output_plugin_handler_thread.start()
+
+  def UnregisterHuntOutputPluginRequestHandler(self, timeout=None):
+    """Unregisters any registered hunt output plugin request handler."""
+    if self.hunt_output_plugin_handler_thread:
+      self.hunt_output_plugin_handler_stop = True
+      self.hunt_output_plugin_request_wakeup.Notify()
+      self.hunt_output_plugin_handler_thread.join(timeout)
+      if self.hunt_output_plugin_handler_thread.isAlive():
+        raise RuntimeError(
+            "Hunt output plugin request handler did not join in time.")
+      self.hunt_output_plugin_handler_thread = None
+
+  def _HuntOutputPluginRequestHandlerLoop(self, handler, lease_time, limit):
+    while not self.hunt_output_plugin_handler_stop:
+      try:
+        requests = self._LeaseHuntOutputPluginRequests(lease_time, limit)
+        if requests:
+          for hunt_requests in collection.Group(
+              requests, lambda r: r.hunt_id).values():
+            handler(hunt_requests)
+        else:
+          # Polling picks up delayed requests and requests with expired
+          # leases.
+          self.hunt_output_plugin_request_wakeup.Wait(0.2)
+      except Exception as e:  # pylint: disable=broad-except
+        logging.exception("_HuntOutputPluginRequestHandlerLoop raised %s.", e)
+
+  @utils.Synchronized
+  def _LeaseHuntOutputPluginRequests(self, lease_time, limit):
+    """Leases queued hunt output plugin requests up to the given limit."""
+    now = rdfvalue.RDFDatetime.Now()
+    expiration_time = now + lease_time
+
+    leased_requests = []
+    for request_id in sorted(self.hunt_output_plugin_requests):
+      r = self.hunt_output_plugin_requests[request_id]
+      if r.delivery_time and r.delivery_time > now:
+        continue
+      if r.leased_until and r.leased_until > now:
+        continue
+
+      r.leased_until = expiration_time
+      r.leased_by = utils.ProcessIdString()
+      leased_requests.append(r.Copy())
+      if len(leased_requests) >= limit:
+        break
+
+    return leased_requests
+
   @utils.Synchronized
   def DeleteHuntObject(self, hunt_id):
     try:
@@ -230,6 +322,37 @@ class InMemoryDBHuntMixin(object):
 
     return sorted(all_results, key=lambda x: x.timestamp)[offset:offset + count]
 
+  @utils.Synchronized
+  def ReadHuntResultsPage(self,
+                          hunt_id,
+                          count,
+                          page_token=None,
+                          with_tag=None,
+                          with_type=None,
+                          with_substring=None):
+    """Reads a page of hunt results that follow a given page token."""
+    keyed_results = []
+    for flow_obj in self._GetHuntFlows(hunt_id):
+      for index, entry in self._ListFlowResultsOrErrors(
+          self.flow_results,
+          flow_obj.client_id,
+          flow_obj.flow_id,
+          with_tag=with_tag,
+          with_type=with_type,
+          with_substring=with_substring):
+        key = (entry.timestamp.AsMicrosecondsSinceEpoch(), flow_obj.client_id,
+               flow_obj.flow_id, index)
+        keyed_results.append((key,
+                              rdf_flow_objects.FlowResult(
+                                  hunt_id=hunt_id,
+                                  client_id=flow_obj.client_id,
+                                  flow_id=flow_obj.flow_id,
+                                  timestamp=entry.timestamp,
+                                  tag=entry.tag,
+                                  payload=entry.payload)))
+
+    return self._ReadResultsPage(keyed_results, count, page_token)
+
   @utils.Synchronized
   def CountHuntResults(self, hunt_id, with_tag=None, with_type=None):
     """Counts hunt results of a given hunt using given query options."""
@@ -322,6 +445,13 @@ class InMemoryDBHuntMixin(object):
         total_cpu_seconds=total_cpu_seconds,
         total_network_bytes_sent=total_network_bytes_sent)
 
+  @utils.Synchronized
+  def RepairHuntCounters(self, hunt_id):
+    """Recomputes hunt counters from the hunt's flows."""
+    # Counters are computed on every read, there is nothing to repair.
+    if hunt_id not in self.hunts:
+      raise db.UnknownHuntError(hunt_id)
+
   @utils.Synchronized
   def ReadHuntClientResourcesStats(self, hunt_id):
     """Read/calculate hunt client resources stats."""
@@ -14,6 +14,7 @@ from typing import Text
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib import utils
 from grr_response_core.lib.util import collection
+from grr_response_core.lib.util import random
 from grr_response_server.databases import db
 from grr_response_server.rdfvalues import objects as rdf_objects
 
@@ -326,6 +327,13 @@ class InMemoryDBPathMixin(object):
       for ancestor_path_info in path_info.GetAncestors():
         self._WritePathInfo(client_id, ancestor_path_info)
 
+    if path_infos:
+      self.path_infos_versions[client_id] = random.UInt64()
+
+  @utils.Synchronized
+  def ReadPathInfosVersion(self, client_id: Text) -> int:
+    return self.path_infos_versions.get(client_id, 0)
+
   @utils.Synchronized
   def ReadPathInfosHistories(
       self,
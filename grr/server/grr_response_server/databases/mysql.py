@@ -24,6 +24,7 @@ from MySQLdb.constants import CR as mysql_conn_errors
 from MySQLdb.constants import ER as mysql_errors
 
 from grr_response_core import config
+from grr_response_core.lib import rdfvalue
 from grr_response_server import threadpool
 from grr_response_server.databases import db as db_module
 from grr_response_server.databases import mysql_artifacts
@@ -42,6 +43,7 @@ from grr_response_server.databases import mysql_signed_binaries
 from grr_response_server.databases import mysql_users
 from grr_response_server.databases import mysql_utils
 from grr_response_server.databases import mysql_yara
+from grr_response_server.databases import wakeup
 
 # Maximum size of one SQL statement, including blob and protobuf data.
 MAX_PACKET_SIZE = 20 << 21
@@ -503,23 +505,49 @@ class MysqlDB(mysql_artifacts.MySQLDBArtifactsMixin,
     _SetupDatabase(**self._connect_args)
 
     self._max_pool_size = config.CONFIG["Mysql.conn_pool_max"]
-    self.pool = mysql_pool.Pool(self._Connect, max_size=self._max_pool_size)
+    self.pool = mysql_pool.Pool(
+        self._Connect,
+        max_size=self._max_pool_size,
+        min_size=config.CONFIG["Mysql.conn_pool_min"],
+        max_idle_time=config.CONFIG["Mysql.conn_pool_max_idle_time"].ToInt(
+            rdfvalue.SECONDS),
+        max_age=config.CONFIG["Mysql.conn_max_age"].ToInt(rdfvalue.SECONDS),
+        liveness_check_interval=config.CONFIG[
+            "Mysql.conn_liveness_check_interval"].ToInt(rdfvalue.SECONDS))
 
     self.handler_thread = None
     self.handler_stop = True
+    self.message_handler_wakeup = wakeup.CreateWakeupChannel(
+        wakeup.MESSAGE_HANDLER_REQUESTS)
+    self.wakeup_socket_poll_interval = config.CONFIG[
+        "Database.wakeup_socket_poll_interval"].ToFractional(rdfvalue.SECONDS)
 
     self.flow_processing_request_handler_thread = None
     self.flow_processing_request_handler_stop = None
+    self.flow_processing_request_wakeup = wakeup.CreateWakeupChannel(
+        wakeup.FLOW_PROCESSING_REQUESTS)
+    self.flow_processing_request_wakeup_enabled = config.CONFIG[
+        "Mysql.flow_processing_request_wakeup"]
     self.flow_processing_request_handler_pool = (
         threadpool.ThreadPool.Factory(
             "flow_processing_pool", min_threads=2, max_threads=50))
     self.flow_processing_request_handler_pool.Start()
 
+    self.hunt_output_plugin_request_handler_thread = None
+    self.hunt_output_plugin_request_handler_stop = True
+    self.hunt_output_plugin_request_handler_pool = None
+    self.hunt_output_plugin_request_done = None
+    self.hunt_output_plugin_request_wakeup = wakeup.CreateWakeupChannel(
+        wakeup.HUNT_OUTPUT_PLUGIN_REQUESTS)
+
   def _Connect(self):
     return _Connect(**self._connect_args)
 
   def Close(self):
     self.pool.close()
+    self.message_handler_wakeup.Close()
+    self.flow_processing_request_wakeup.Close()
+    self.hunt_output_plugin_request_wakeup.Close()
 
   def _RunInTransaction(self,
                         function: Callable[[MySQLdb.Connection], None],
@@ -18,6 +18,7 @@ from grr_response_core.lib.rdfvalues import client as rdf_client
 from grr_response_core.lib.rdfvalues import client_network as rdf_client_network
 from grr_response_core.lib.rdfvalues import client_stats as rdf_client_stats
 from grr_response_core.lib.util import collection
+from grr_response_core.lib.util import random
 from grr_response_server import fleet_utils
 from grr_response_server.databases import db
 from grr_response_server.databases import db_utils
@@ -83,6 +84,64 @@ class MySQLDBClientMixin(object):
 
     cursor.execute(query, values)
 
+    if first_seen is not None:
+      self._BumpClientInfoVersions([values["client_id"]], cursor)
+
+  @mysql_utils.WithTransaction()
+  def MultiWriteClientMetadata(self,
+                               client_ids,
+                               first_seen=None,
+                               last_ping=None,
+                               last_clock=None,
+                               last_foreman=None,
+                               cursor=None):
+    """Writes the same metadata values for a list of clients."""
+    if not client_ids:
+      return
+
+    placeholders = ["%s"]
+    columns = ["client_id"]
+    values = []
+
+    for column, timestamp in [("first_seen", first_seen),
+                              ("last_ping", last_ping),
+                              ("last_clock", last_clock),
+                              ("last_foreman", last_foreman)]:
+      if timestamp is not None:
+        placeholders.append("FROM_UNIXTIME(%s)")
+        columns.append(column)
+        values.append(mysql_utils.RDFDatetimeToTimestamp(timestamp))
+
+    if len(columns) == 1:
+      return
+
+    row_placeholders = "({})".format(", ".join(placeholders))
+    updates = [
+        "{column} = VALUES({column})".format(column=column)
+        for column in columns[1:]
+    ]
+
+    query = """
+    INSERT INTO clients ({columns})
+    VALUES {rows}
+    ON DUPLICATE KEY UPDATE {updates}
+    """.format(
+        columns=", ".join(columns),
+        rows=", ".join([row_placeholders] * len(client_ids)),
+        updates=", ".join(updates))
+
+    args = []
+    for client_id in client_ids:
+      args.append(db_utils.ClientIDToInt(client_id))
+      args.extend(values)
+
+    cursor.execute(query, args)
+
+    if first_seen is not None:
+      self._BumpClientInfoVersions(
+          [db_utils.ClientIDToInt(client_id) for client_id in client_ids],
+          cursor)
+
   @mysql_utils.WithTransaction(readonly=True)
   def MultiReadClientMetadata(self, client_ids, cursor=None):
     """Reads ClientMetadata records for a list of clients."""
@@ -160,6 +219,7 @@ class MySQLDBClientMixin(object):
           insert_startup_query,
           (int_client_id, current_timestamp, startup_info.SerializeToBytes()))
       cursor.execute(update_query, client_info)
+      self._BumpClientInfoVersions([int_client_id], cursor)
     except MySQLdb.IntegrityError as e:
       if e.args and e.args[0] == mysql_error_constants.NO_REFERENCED_ROW_2:
         raise db.UnknownClientError(snapshot.client_id, cause=e)
@@ -301,6 +361,8 @@ class MySQLDBClientMixin(object):
          AND (last_startup_timestamp IS NULL OR
               last_startup_timestamp < FROM_UNIXTIME(%(latest_timestamp)s))
       """, base_params)
+
+      self._BumpClientInfoVersions([base_params["client_id"]], cursor)
     except MySQLdb.IntegrityError as error:
       raise db.UnknownClientError(client_id, cause=error)
 
@@ -492,6 +554,36 @@ class MySQLDBClientMixin(object):
     cursor.execute(query, values)
     return dict(self._ResponseToClientsFullInfo(cursor.fetchall()))
 
+  def _BumpClientInfoVersions(self, int_client_ids, cursor):
+    """Gives new versions to the full information of given clients."""
+    # Every write gets a new random version, so that versions read before and
+    # after the write never match (even across database restores).
+    values = sorted((int_client_id, random.UInt64())
+                    for int_client_id in set(int_client_ids))
+    query = """
+      INSERT INTO client_info_versions(client_id, version)
+      VALUES {}
+      ON DUPLICATE KEY UPDATE version = VALUES(version)
+    """.format(", ".join(["(%s, %s)"] * len(values)))
+    cursor.execute(query, list(collection.Flatten(values)))
+
+  @mysql_utils.WithTransaction(readonly=True)
+  def MultiReadClientInfoVersions(self, client_ids, cursor=None):
+    """Reads opaque versions of the full information of given clients."""
+    result = {client_id: 0 for client_id in client_ids}
+    if not client_ids:
+      return result
+
+    int_ids = [db_utils.ClientIDToInt(cid) for cid in client_ids]
+    query = """
+      SELECT client_id, version FROM client_info_versions
+       WHERE client_id IN ({})
+    """.format(", ".join(["%s"] * len(int_ids)))
+    cursor.execute(query, int_ids)
+    for int_client_id, version in cursor.fetchall():
+      result[db_utils.IntToClientID(int_client_id)] = version
+    return result
+
   def ReadClientLastPings(self,
                           min_last_ping=None,
                           max_last_ping=None,
@@ -617,6 +709,7 @@ class MySQLDBClientMixin(object):
           """.format(", ".join(["(%s, %s, %s, %s)"] * len(labels)))
     try:
       cursor.execute(query, args)
+      self._BumpClientInfoVersions([cid], cursor)
     except MySQLdb.IntegrityError as e:
       raise db.UnknownClientError(client_id, cause=e)
 
@@ -653,6 +746,11 @@ class MySQLDBClientMixin(object):
     ], labels)
     cursor.execute(query, args)
 
+    # Versions reference the clients table, so they can't be written for
+    # unknown clients (which have no labels to remove anyway).
+    if cursor.rowcount:
+      self._BumpClientInfoVersions([db_utils.ClientIDToInt(client_id)], cursor)
+
   @mysql_utils.WithTransaction(readonly=True)
   def ReadAllClientLabels(self, cursor=None):
     """Reads the user labels for a list of clients."""
@@ -21,6 +21,8 @@ from grr_response_core.lib.rdfvalues import flows as rdf_flows
 from grr_response_core.lib.util import collection
 from grr_response_core.lib.util import compatibility
 from grr_response_core.lib.util import random
+from grr_response_core.stats import metrics
+from grr_response_server import threadpool
 from grr_response_server.databases import db
 from grr_response_server.databases import db_utils
 from grr_response_server.databases import mysql_utils
@@ -29,21 +31,86 @@ from grr_response_server.rdfvalues import flow_runner as rdf_flow_runner
 from grr_response_server.rdfvalues import hunt_objects as rdf_hunt_objects
 from grr_response_server.rdfvalues import objects as rdf_objects
 
+FLOW_PROCESSING_REQUEST_LEASE_TO_START_DELAY = metrics.Event(
+    "flow_processing_request_lease_to_start_delay",
+    bins=[0, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 600])
+FLOW_PROCESSING_REQUEST_LEASE_BATCH_SIZE = metrics.Event(
+    "flow_processing_request_lease_batch_size",
+    bins=[0, 1, 2, 5, 10, 20, 50, 100, 200, 500])
+
+
+def _FlowResponseFromRow(response, status, iterator, timestamp):
+  """Creates a flow response object from a flow_responses table row."""
+  if status:
+    result = rdf_flow_objects.FlowStatus.FromSerializedBytes(status)
+  elif iterator:
+    result = rdf_flow_objects.FlowIterator.FromSerializedBytes(iterator)
+  else:
+    result = rdf_flow_objects.FlowResponse.FromSerializedBytes(response)
+  result.timestamp = mysql_utils.TimestampToRDFDatetime(timestamp)
+  return result
+
+
+def _FlowResultOrErrorFromRow(result_cls, client_id, flow_id,
+                              serialized_payload, payload_type, timestamp, tag,
+                              hunt_id_int):
+  """Creates a flow result or error from a row of its table."""
+  if payload_type in rdfvalue.RDFValue.classes:
+    payload = rdfvalue.RDFValue.classes[payload_type].FromSerializedBytes(
+        serialized_payload)
+  else:
+    payload = rdf_objects.SerializedValueOfUnrecognizedType(
+        type_name=payload_type, value=serialized_payload)
+
+  result = result_cls(
+      client_id=client_id,
+      flow_id=flow_id,
+      payload=payload,
+      timestamp=mysql_utils.TimestampToRDFDatetime(timestamp))
+
+  if hunt_id_int:
+    result.hunt_id = db_utils.IntToHuntID(hunt_id_int)
+
+  if tag:
+    result.tag = tag
+
+  return result
+
+
+def _FlowProcessingRequestPriority(request):
+  """Returns the thread pool priority of a flow processing request."""
+  # Requests without a delivery time are written when responses arrive, so a
+  # client or user is waiting for them. Delayed requests, e.g. rate limited
+  # starts of hunt flows, come in bulk and nobody waits for them in particular.
+  if request.delivery_time:
+    return threadpool.PRIORITY_LOW
+  return threadpool.PRIORITY_HIGH
+
 
 class MySQLDBFlowMixin(object):
   """MySQLDB mixin for flow handling."""
 
-  @mysql_utils.WithTransaction()
-  def WriteMessageHandlerRequests(self, requests, cursor=None):
+  def WriteMessageHandlerRequests(self, requests):
     """Writes a list of message handler requests to the database."""
+    self._WriteMessageHandlerRequests(requests)
+    # Notifying only after the transaction is committed guarantees that the
+    # woken up loops see the new requests.
+    self.message_handler_wakeup.Notify()
+
+  @mysql_utils.WithTransaction()
+  def _WriteMessageHandlerRequests(self, requests, cursor=None):
     query = ("INSERT IGNORE INTO message_handler_requests "
-             "(handlername, request_id, request) VALUES ")
+             "(handlername, request_id, request, leased_until) VALUES ")
 
     value_templates = []
     args = []
     for r in requests:
       args.extend([r.handler_name, r.request_id, r.SerializeToBytes()])
-      value_templates.append("(%s, %s, %s)")
+      if r.leased_until:
+        args.append(mysql_utils.RDFDatetimeToTimestamp(r.leased_until))
+        value_templates.append("(%s, %s, %s, FROM_UNIXTIME(%s))")
+      else:
+        value_templates.append("(%s, %s, %s, NULL)")
 
     query += ",".join(value_templates)
     cursor.execute(query, args)
@@ -94,6 +161,7 @@ class MySQLDBFlowMixin(object):
     """Unregisters any registered message handler."""
     if self.handler_thread:
       self.handler_stop = True
+      self.message_handler_wakeup.Notify()
       self.handler_thread.join(timeout)
       if self.handler_thread.isAlive():
         raise RuntimeError("Message handler thread did not join in time.")
@@ -101,14 +169,73 @@ class MySQLDBFlowMixin(object):
 
   _MESSAGE_HANDLER_POLL_TIME_SECS = 5
 
+  def _IdlePollTime(self, channel, default):
+    """Returns how long an idle handler loop waits for notifications."""
+    # Polling only matters for requests written on other hosts when all
+    # processes on this host notify each other.
+    if channel.notifies_other_processes:
+      return self.wakeup_socket_poll_interval
+    return default
+
+  @mysql_utils.WithTransaction(readonly=True)
+  def _ReadMicrosUntilNextRequestIsDue(self, table, cursor=None):
+    """Returns microseconds until a delayed or leased request becomes leasable.
+
+    Args:
+      table: A table of requests with delivery_time and leased_until columns.
+      cursor: MySQLdb cursor.
+
+    Returns:
+      An upper bound of the number of microseconds until a request that can't
+      be leased now can be leased or None if there is no such request.
+    """
+    # The difference is computed by the database so that it's not affected by
+    # clock skew between hosts. Both minimums are read from the leading column
+    # of an index (`*_by_delivery_time` and `*_by_lease`), so the query doesn't
+    # scan the table, however many delayed requests there are.
+    query = f"""
+      SELECT
+        (SELECT TIMESTAMPDIFF(MICROSECOND, NOW(6), MIN(delivery_time))
+         FROM {table}
+         WHERE delivery_time > NOW(6)),
+        (SELECT TIMESTAMPDIFF(MICROSECOND, NOW(6), MIN(leased_until))
+         FROM {table}
+         WHERE leased_until >= NOW(6))
+    """
+    cursor.execute(query)
+    micros = [int(value) for value in cursor.fetchone() if value is not None]
+    return min(micros) if micros else None
+
+  def _IdleWaitTime(self, table, poll_time, min_poll_time):
+    """Caps an idle wait at the time the next request in table is due.
+
+    Requests that are written with a delivery time in the future or whose
+    leases expire don't trigger wakeup notifications when they become
+    leasable, so idle loops must not wait past that time.
+
+    Args:
+      table: A table of requests with delivery_time and leased_until columns.
+      poll_time: The time the loop would wait otherwise, in seconds.
+      min_poll_time: The minimal time to wait, in seconds.
+
+    Returns:
+      The time to wait, in seconds.
+    """
+    micros = self._ReadMicrosUntilNextRequestIsDue(table)
+    if micros is None:
+      return poll_time
+    return max(min_poll_time, min(poll_time, micros / 1e6))
+
   def _MessageHandlerLoop(self, handler, lease_time, limit):
+    poll_time = self._IdlePollTime(self.message_handler_wakeup,
+                                   self._MESSAGE_HANDLER_POLL_TIME_SECS)
     while not self.handler_stop:
       try:
         msgs = self._LeaseMessageHandlerRequests(lease_time, limit)
         if msgs:
           handler(msgs)
         else:
-          time.sleep(self._MESSAGE_HANDLER_POLL_TIME_SECS)
+          self.message_handler_wakeup.Wait(poll_time)
       except Exception as e:  # pylint: disable=broad-except
         logging.exception("_LeaseMessageHandlerRequests raised %s.", e)
 
@@ -339,6 +466,13 @@ class MySQLDBFlowMixin(object):
     else:
       args["pending_termination"] = None
 
+    # Top-level hunt flows contribute to materialized hunt counters which are
+    # updated in the same transaction.
+    is_hunt_flow = flow_obj.parent_hunt_id and not flow_obj.parent_flow_id
+    if is_hunt_flow:
+      _, old_hunt_flow_stats = self._ReadHuntFlowStats(args["client_id"],
+                                                       args["flow_id"], cursor)
+
     try:
       cursor.execute(query, args)
     except MySQLdb.IntegrityError as e:
@@ -347,6 +481,10 @@ class MySQLDBFlowMixin(object):
       else:
         raise db.UnknownClientError(flow_obj.client_id, cause=e)
 
+    if is_hunt_flow:
+      self._UpdateHuntCountersForFlow(args["client_id"], args["flow_id"],
+                                      old_hunt_flow_stats, cursor)
+
   def _FlowObjectFromRow(self, row):
     """Generates a flow object from a database row."""
     datetime = mysql_utils.TimestampToRDFDatetime
@@ -607,16 +745,31 @@ class MySQLDBFlowMixin(object):
     if not updates:
       return
 
+    client_id_int = db_utils.ClientIDToInt(client_id)
+    flow_id_int = db_utils.FlowIDToInt(flow_id)
+
+    updates_hunt_counters = (
+        flow_obj != db.Database.unchanged or
+        flow_state != db.Database.unchanged)
+    if updates_hunt_counters:
+      hunt_id_int, old_hunt_flow_stats = self._ReadHuntFlowStats(
+          client_id_int, flow_id_int, cursor)
+      updates_hunt_counters = hunt_id_int is not None
+
     query = "UPDATE flows SET last_update=NOW(6), "
     query += ", ".join(updates)
     query += " WHERE client_id=%s AND flow_id=%s"
 
-    args.append(db_utils.ClientIDToInt(client_id))
-    args.append(db_utils.FlowIDToInt(flow_id))
+    args.append(client_id_int)
+    args.append(flow_id_int)
     updated = cursor.execute(query, args)
     if updated == 0:
       raise db.UnknownFlowError(client_id, flow_id)
 
+    if updates_hunt_counters:
+      self._UpdateHuntCountersForFlow(client_id_int, flow_id_int,
+                                      old_hunt_flow_stats, cursor)
+
   @mysql_utils.WithTransaction()
   def UpdateFlows(self,
                   client_id_flow_id_pairs,
@@ -656,13 +809,31 @@ class MySQLDBFlowMixin(object):
     query += ", ".join(templates)
     cursor.execute(query, args)
 
-  @mysql_utils.WithTransaction()
-  def WriteFlowRequests(self, requests, cursor=None):
+  def _NotifyFlowProcessingRequestsWritten(self, requests):
+    """Wakes up handler loops after flow processing requests are committed."""
+    if not self.flow_processing_request_wakeup_enabled or not requests:
+      return
+
+    # Notifying only after the transaction is committed guarantees that the
+    # woken up loops see the new requests. Delayed requests are not leased
+    # before their delivery time anyway.
+    now = rdfvalue.RDFDatetime.Now()
+    if any(not r.delivery_time or r.delivery_time <= now for r in requests):
+      self.flow_processing_request_wakeup.Notify()
+
+  def WriteFlowRequests(self, requests):
     """Writes a list of flow requests to the database."""
+    flow_processing_requests = self._WriteFlowRequests(requests)
+    self._NotifyFlowProcessingRequestsWritten(flow_processing_requests)
+
+  @mysql_utils.WithTransaction()
+  def _WriteFlowRequests(self, requests, cursor=None):
+    """Writes flow requests, returns the flow processing requests written."""
     args = []
     templates = []
     flow_keys = []
     needs_processing = {}
+    flow_processing_requests = []
 
     for r in requests:
       if r.needs_processing:
@@ -677,7 +848,6 @@ class MySQLDBFlowMixin(object):
       ])
 
     if needs_processing:
-      flow_processing_requests = []
       nr_conditions = []
       nr_args = []
       for client_id, flow_id in needs_processing:
@@ -716,6 +886,8 @@ class MySQLDBFlowMixin(object):
     except MySQLdb.IntegrityError as e:
       raise db.AtLeastOneUnknownFlowError(flow_keys, cause=e)
 
+    return flow_processing_requests
+
   def _WriteResponses(self, responses, cursor):
     """Builds the writes to store the given responses in the db."""
 
@@ -922,7 +1094,17 @@ class MySQLDBFlowMixin(object):
 
   @mysql_utils.WithTransaction()
   def _UpdateRequestsAndScheduleFPRs(self, responses, cursor=None):
-    """Updates requests and writes FlowProcessingRequests if needed."""
+    """Updates requests and writes FlowProcessingRequests if needed.
+
+    Args:
+      responses: A list of flow responses written.
+      cursor: MySQLdb cursor.
+
+    Returns:
+      A tuple (completed_requests, flow_processing_requests) with a dict of the
+      requests that got all their responses and a list of the flow processing
+      requests written.
+    """
 
     request_keys = set(
         (r.client_id, r.flow_id, r.request_id) for r in responses)
@@ -936,7 +1118,7 @@ class MySQLDBFlowMixin(object):
         request_keys, response_counts, cursor)
 
     if not completed_requests:
-      return completed_requests
+      return completed_requests, []
 
     fprs_to_write = []
     for request_key, r in completed_requests.items():
@@ -951,7 +1133,7 @@ class MySQLDBFlowMixin(object):
     if fprs_to_write:
       self._WriteFlowProcessingRequests(fprs_to_write, cursor)
 
-    return completed_requests
+    return completed_requests, fprs_to_write
 
   @db_utils.CallLoggedAndAccounted
   def WriteFlowResponses(self, responses):
@@ -964,7 +1146,9 @@ class MySQLDBFlowMixin(object):
 
       self._WriteFlowResponsesAndExpectedUpdates(batch)
 
-      completed_requests = self._UpdateRequestsAndScheduleFPRs(batch)
+      completed_requests, flow_processing_requests = (
+          self._UpdateRequestsAndScheduleFPRs(batch))
+      self._NotifyFlowProcessingRequestsWritten(flow_processing_requests)
 
       if completed_requests:
         self._DeleteClientActionRequest(completed_requests)
@@ -1017,14 +1201,8 @@ class MySQLDBFlowMixin(object):
     cursor.execute(query, args)
 
     responses = {}
-    for res, status, iterator, ts in cursor.fetchall():
-      if status:
-        response = rdf_flow_objects.FlowStatus.FromSerializedBytes(status)
-      elif iterator:
-        response = rdf_flow_objects.FlowIterator.FromSerializedBytes(iterator)
-      else:
-        response = rdf_flow_objects.FlowResponse.FromSerializedBytes(res)
-      response.timestamp = mysql_utils.TimestampToRDFDatetime(ts)
+    for row in cursor.fetchall():
+      response = _FlowResponseFromRow(*row)
       responses.setdefault(response.request_id,
                            {})[response.response_id] = response
 
@@ -1047,6 +1225,7 @@ class MySQLDBFlowMixin(object):
                                          client_id,
                                          flow_id,
                                          next_needed_request,
+                                         max_responses_per_request=None,
                                          cursor=None):
     """Reads all requests for a flow that can be processed by the worker."""
     query = ("SELECT request, needs_processing, responses_expected, "
@@ -1067,32 +1246,90 @@ class MySQLDBFlowMixin(object):
       request.timestamp = mysql_utils.TimestampToRDFDatetime(ts)
       requests[request.request_id] = request
 
+    ready_requests = []
+    while next_needed_request in requests:
+      ready_requests.append(requests[next_needed_request])
+      next_needed_request += 1
+
+    if not ready_requests:
+      return {}
+
+    # Only responses to requests that are ready are read. Requests with too
+    # many responses only get their status read, which is always the last
+    # response.
+    conditions = []
+    for req in ready_requests:
+      if (max_responses_per_request and
+          req.nr_responses_expected > max_responses_per_request):
+        conditions.append("(request_id=%s AND response_id=%s)")
+        args.extend([req.request_id, req.nr_responses_expected])
+      else:
+        conditions.append("request_id=%s")
+        args.append(req.request_id)
+
     query = ("SELECT response, status, iterator, UNIX_TIMESTAMP(timestamp) "
              "FROM flow_responses "
-             "WHERE client_id=%s AND flow_id=%s")
+             "WHERE client_id=%s AND flow_id=%s AND ({})").format(
+                 " OR ".join(conditions))
     cursor.execute(query, args)
 
     responses = {}
-    for res, status, iterator, ts in cursor.fetchall():
-      if status:
-        response = rdf_flow_objects.FlowStatus.FromSerializedBytes(status)
-      elif iterator:
-        response = rdf_flow_objects.FlowIterator.FromSerializedBytes(iterator)
-      else:
-        response = rdf_flow_objects.FlowResponse.FromSerializedBytes(res)
-      response.timestamp = mysql_utils.TimestampToRDFDatetime(ts)
+    for row in cursor.fetchall():
+      response = _FlowResponseFromRow(*row)
       responses.setdefault(response.request_id, []).append(response)
 
     res = {}
-    while next_needed_request in requests:
-      req = requests[next_needed_request]
+    for req in ready_requests:
       sorted_responses = sorted(
-          responses.get(next_needed_request, []), key=lambda r: r.response_id)
+          responses.get(req.request_id, []), key=lambda r: r.response_id)
       res[req.request_id] = (req, sorted_responses)
-      next_needed_request += 1
 
     return res
 
+  @mysql_utils.WithTransaction(readonly=True)
+  def ReadFlowResponsesForRequest(self,
+                                  client_id,
+                                  flow_id,
+                                  request_id,
+                                  min_response_id,
+                                  count,
+                                  cursor=None):
+    """Reads a page of responses to a single flow request."""
+    query = ("SELECT response, status, iterator, UNIX_TIMESTAMP(timestamp) "
+             "FROM flow_responses "
+             "WHERE client_id=%s AND flow_id=%s AND request_id=%s "
+             "AND response_id>=%s "
+             "ORDER BY response_id "
+             "LIMIT %s")
+    args = [
+        db_utils.ClientIDToInt(client_id),
+        db_utils.FlowIDToInt(flow_id), request_id, min_response_id, count
+    ]
+    cursor.execute(query, args)
+
+    return [_FlowResponseFromRow(*row) for row in cursor.fetchall()]
+
+  @mysql_utils.WithTransaction(readonly=True)
+  def CountFlowResponsesForRequest(self,
+                                   client_id,
+                                   flow_id,
+                                   request_id,
+                                   cursor=None):
+    """Counts responses to a single flow request."""
+    # Statuses and iterators are stored in their own columns, see
+    # _FlowResponseFromRow.
+    query = ("SELECT COUNT(*) "
+             "FROM flow_responses "
+             "WHERE client_id=%s AND flow_id=%s AND request_id=%s "
+             "AND IFNULL(status, '') = '' AND IFNULL(iterator, '') = ''")
+    args = [
+        db_utils.ClientIDToInt(client_id),
+        db_utils.FlowIDToInt(flow_id), request_id
+    ]
+    cursor.execute(query, args)
+    (count,) = cursor.fetchone()
+    return count
+
   @mysql_utils.WithTransaction()
   def ReleaseProcessedFlow(self, flow_obj, cursor=None):
     """Releases a flow that the worker was processing to the database."""
@@ -1154,12 +1391,25 @@ class MySQLDBFlowMixin(object):
         "user_cpu_time_used_micros":
             db_utils.SecondsToMicros(flow_obj.cpu_time_used.user_cpu_time),
     }
+
+    is_hunt_flow = flow_obj.parent_hunt_id and not flow_obj.parent_flow_id
+    if is_hunt_flow:
+      _, old_hunt_flow_stats = self._ReadHuntFlowStats(args["client_id"],
+                                                       args["flow_id"], cursor)
+
     rows_updated = cursor.execute(update_query, args)
+    if rows_updated == 1 and is_hunt_flow:
+      self._UpdateHuntCountersForFlow(args["client_id"], args["flow_id"],
+                                      old_hunt_flow_stats, cursor)
     return rows_updated == 1
 
-  @mysql_utils.WithTransaction()
-  def WriteFlowProcessingRequests(self, requests, cursor=None):
+  def WriteFlowProcessingRequests(self, requests):
     """Writes a list of flow processing requests to the database."""
+    self._WriteFlowProcessingRequestsInTransaction(requests)
+    self._NotifyFlowProcessingRequestsWritten(requests)
+
+  @mysql_utils.WithTransaction()
+  def _WriteFlowProcessingRequestsInTransaction(self, requests, cursor=None):
     self._WriteFlowProcessingRequests(requests, cursor)
 
   @mysql_utils.WithTransaction(readonly=True)
@@ -1204,7 +1454,7 @@ class MySQLDBFlowMixin(object):
     cursor.execute(query)
 
   @mysql_utils.WithTransaction()
-  def _LeaseFlowProcessingReqests(self, cursor=None):
+  def _LeaseFlowProcessingReqests(self, limit, cursor=None):
     """Leases a number of flow processing requests."""
     now = rdfvalue.RDFDatetime.Now()
     expiry = now + rdfvalue.Duration.From(10, rdfvalue.MINUTES)
@@ -1228,7 +1478,7 @@ class MySQLDBFlowMixin(object):
     args = {
         "expiry": expiry_str,
         "id": id_str,
-        "limit": 50,
+        "limit": limit,
     }
 
     updated = cursor.execute(query, args)
@@ -1262,23 +1512,86 @@ class MySQLDBFlowMixin(object):
 
     return res
 
+  # Idle polling starts at the minimal interval and backs off exponentially up
+  # to the maximal one.
+  _FLOW_REQUEST_MIN_POLL_TIME_SECS = 0.05
   _FLOW_REQUEST_POLL_TIME_SECS = 3
 
+  # The number of requests leased at once is adapted to the queue length, but
+  # never exceeds the free capacity of the flow processing thread pool.
+  _FLOW_REQUEST_MIN_LEASE_BATCH_SIZE = 1
+  _FLOW_REQUEST_MAX_LEASE_BATCH_SIZE = 50
+
+  def _FlowProcessingPoolCapacity(self):
+    """Returns the number of requests the thread pool can start right away."""
+    pool = self.flow_processing_request_handler_pool
+    return max(0, pool.max_threads - pool.busy_threads - pool.pending_tasks)
+
+  def _ProcessLeasedFlowProcessingRequest(self, handler, request, leased_at):
+    FLOW_PROCESSING_REQUEST_LEASE_TO_START_DELAY.RecordEvent(time.time() -
+                                                             leased_at)
+    handler(request)
+
+  def _WaitForFlowProcessingRequests(self, timeout):
+    """Waits until timeout expires or new requests are written."""
+    return self.flow_processing_request_wakeup.Wait(timeout)
+
   def _FlowProcessingRequestHandlerLoop(self, handler):
     """The main loop for the flow processing request queue."""
+    batch_size = self._FLOW_REQUEST_MIN_LEASE_BATCH_SIZE
+    poll_time = self._FLOW_REQUEST_MIN_POLL_TIME_SECS
+    max_poll_time = self._IdlePollTime(self.flow_processing_request_wakeup,
+                                       self._FLOW_REQUEST_POLL_TIME_SECS)
+
     while not self.flow_processing_request_handler_stop:
       try:
-        msgs = self._LeaseFlowProcessingReqests()
+        # Requests leased while all workers are busy would just sit in the
+        # thread pool queue with their leases running out, so nothing is
+        # leased until some capacity frees up.
+        capacity = self._FlowProcessingPoolCapacity()
+        if not capacity:
+          time.sleep(self._FLOW_REQUEST_MIN_POLL_TIME_SECS)
+          continue
+
+        limit = min(batch_size, capacity)
+        msgs = self._LeaseFlowProcessingReqests(limit)
+        FLOW_PROCESSING_REQUEST_LEASE_BATCH_SIZE.RecordEvent(len(msgs))
+
         if msgs:
+          leased_at = time.time()
           for m in msgs:
             self.flow_processing_request_handler_pool.AddTask(
-                target=handler, args=(m,))
+                target=self._ProcessLeasedFlowProcessingRequest,
+                args=(handler, m, leased_at),
+                name="FlowProcessingRequest",
+                priority=_FlowProcessingRequestPriority(m))
+
+          # A full batch means more requests are likely waiting.
+          if len(msgs) == limit:
+            batch_size = min(batch_size * 2,
+                             self._FLOW_REQUEST_MAX_LEASE_BATCH_SIZE)
+          else:
+            batch_size = max(len(msgs), self._FLOW_REQUEST_MIN_LEASE_BATCH_SIZE)
+          poll_time = self._FLOW_REQUEST_MIN_POLL_TIME_SECS
         else:
-          time.sleep(self._FLOW_REQUEST_POLL_TIME_SECS)
+          batch_size = self._FLOW_REQUEST_MIN_LEASE_BATCH_SIZE
+          wait_time = poll_time
+          if poll_time > self._FLOW_REQUEST_MIN_POLL_TIME_SECS:
+            wait_time = self._IdleWaitTime(
+                "flow_processing_requests", poll_time,
+                self._FLOW_REQUEST_MIN_POLL_TIME_SECS)
+          if self._WaitForFlowProcessingRequests(wait_time):
+            poll_time = self._FLOW_REQUEST_MIN_POLL_TIME_SECS
+          else:
+            poll_time = min(poll_time * 2, max_poll_time)
 
       except Exception as e:  # pylint: disable=broad-except
+        # Transient database errors (lost connections, deadlocks) must not
+        # stop flow processing in this process for good.
         logging.exception("_FlowProcessingRequestHandlerLoop raised %s.", e)
-        break
+        batch_size = self._FLOW_REQUEST_MIN_LEASE_BATCH_SIZE
+        poll_time = max_poll_time
+        self._WaitForFlowProcessingRequests(poll_time)
 
   def RegisterFlowProcessingHandler(self, handler):
     """Registers a handler to receive flow processing messages."""
@@ -1297,6 +1610,7 @@ class MySQLDBFlowMixin(object):
     """Unregisters any registered flow processing handler."""
     if self.flow_processing_request_handler_thread:
       self.flow_processing_request_handler_stop = True
+      self.flow_processing_request_wakeup.Notify()
       self.flow_processing_request_handler_thread.join(timeout)
       if self.flow_processing_request_handler_thread.isAlive():
         raise RuntimeError("Flow processing handler did not join in time.")
@@ -1379,31 +1693,12 @@ class MySQLDBFlowMixin(object):
 
     cursor.execute(query, args)
 
-    ret = []
-    for serialized_payload, payload_type, ts, tag, hid in cursor.fetchall():
-      if payload_type in rdfvalue.RDFValue.classes:
-        payload = rdfvalue.RDFValue.classes[payload_type].FromSerializedBytes(
-            serialized_payload)
-      else:
-        payload = rdf_objects.SerializedValueOfUnrecognizedType(
-            type_name=payload_type, value=serialized_payload)
-
-      timestamp = mysql_utils.TimestampToRDFDatetime(ts)
-      result = result_cls(
-          client_id=db_utils.IntToClientID(client_id_int),
-          flow_id=db_utils.IntToFlowID(flow_id_int),
-          payload=payload,
-          timestamp=timestamp)
-
-      if hid:
-        result.hunt_id = db_utils.IntToHuntID(hid)
-
-      if tag:
-        result.tag = tag
-
-      ret.append(result)
-
-    return ret
+    client_id = db_utils.IntToClientID(client_id_int)
+    flow_id = db_utils.IntToFlowID(flow_id_int)
+    return [
+        _FlowResultOrErrorFromRow(result_cls, client_id, flow_id, *row)
+        for row in cursor.fetchall()
+    ]
 
   def ReadFlowResults(self,
                       client_id,
@@ -1425,6 +1720,63 @@ class MySQLDBFlowMixin(object):
         with_type=with_type,
         with_substring=with_substring)
 
+  @mysql_utils.WithTransaction(readonly=True)
+  def ReadFlowResultsPage(self,
+                          client_id,
+                          flow_id,
+                          count,
+                          page_token=None,
+                          with_tag=None,
+                          with_type=None,
+                          with_substring=None,
+                          cursor=None):
+    """Reads a page of flow results that follow a given page token."""
+    query = """
+        SELECT payload, type, UNIX_TIMESTAMP(timestamp), tag, hunt_id,
+               result_id
+        FROM flow_results
+        FORCE INDEX (flow_results_by_client_id_flow_id_timestamp)
+        WHERE client_id = %s AND flow_id = %s """
+    client_id_int = db_utils.ClientIDToInt(client_id)
+    flow_id_int = db_utils.FlowIDToInt(flow_id)
+    args = [client_id_int, flow_id_int]
+
+    if with_tag is not None:
+      query += "AND tag = %s "
+      args.append(with_tag)
+
+    if with_type is not None:
+      query += "AND type = %s "
+      args.append(with_type)
+
+    if with_substring is not None:
+      query += "AND payload LIKE %s "
+      args.append("%{}%".format(with_substring))
+
+    if page_token:
+      condition, condition_args = mysql_utils.ResultsPageTokenCondition(
+          page_token)
+      query += "AND " + condition + " "
+      args.extend(condition_args)
+
+    query += "ORDER BY timestamp ASC, result_id ASC LIMIT %s"
+    args.append(count)
+
+    cursor.execute(query, args)
+    rows = cursor.fetchall()
+
+    client_id = db_utils.IntToClientID(client_id_int)
+    flow_id = db_utils.IntToFlowID(flow_id_int)
+    results = [
+        _FlowResultOrErrorFromRow(rdf_flow_objects.FlowResult, client_id,
+                                  flow_id, *row[:-1]) for row in rows
+    ]
+    if len(rows) < count:
+      return results, None
+
+    return results, mysql_utils.ResultsPageToken(results[-1].timestamp,
+                                                 rows[-1][-1])
+
   @mysql_utils.WithTransaction(readonly=True)
   def _CountFlowResultsOrErrors(self,
                                 table_name,
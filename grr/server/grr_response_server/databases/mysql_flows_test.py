@@ -4,9 +4,14 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import unicode_literals
 
+import time
+
 from absl import app
 from absl.testing import absltest
+import mock
+import MySQLdb
 
+from grr_response_core.lib.rdfvalues import flows as rdf_flows
 from grr_response_server.databases import db_flows_test
 from grr_response_server.databases import mysql_test
 from grr.test_lib import test_lib
@@ -15,7 +20,35 @@ from grr.test_lib import test_lib
 class MysqlFlowTest(db_flows_test.DatabaseTestFlowMixin,
                     mysql_test.MysqlTestBase, absltest.TestCase):
 
-  pass
+  def testFlowProcessingHandlerSurvivesDatabaseErrors(self):
+    client_id, flow_id = self._SetupClientAndFlow()
+
+    lease = self.db.delegate._LeaseFlowProcessingReqests
+    lease_calls = []
+
+    def LeaseFlowProcessingRequests(limit):
+      lease_calls.append(limit)
+      if len(lease_calls) == 1:
+        raise MySQLdb.OperationalError(2013, "Lost connection")
+      return lease(limit)
+
+    handler = mock.Mock()
+    with mock.patch.object(self.db.delegate, "_LeaseFlowProcessingReqests",
+                           LeaseFlowProcessingRequests):
+      self.db.RegisterFlowProcessingHandler(handler)
+      self.addCleanup(self.db.UnregisterFlowProcessingHandler)
+
+      self.db.WriteFlowProcessingRequests(
+          [rdf_flows.FlowProcessingRequest(client_id=client_id,
+                                           flow_id=flow_id)])
+
+      deadline = time.time() + 10
+      while not handler.called:
+        if time.time() > deadline:
+          self.fail("Flow processing request was not processed in time.")
+        time.sleep(0.1)
+
+    self.assertGreater(len(lease_calls), 1)
 
 
 if __name__ == "__main__":
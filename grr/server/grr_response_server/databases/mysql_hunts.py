@@ -5,12 +5,22 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import unicode_literals
 
+import bisect
+import collections
+import logging
+import math
+import threading
+
 import MySQLdb
 
 from grr_response_core.lib import rdfvalue
+from grr_response_core.lib import utils
 from grr_response_core.lib.rdfvalues import client_stats as rdf_client_stats
 from grr_response_core.lib.rdfvalues import protodict as rdf_protodict
 from grr_response_core.lib.rdfvalues import stats as rdf_stats
+from grr_response_core.lib.util import collection
+from grr_response_core.lib.util import random
+from grr_response_server import threadpool
 from grr_response_server.databases import db
 from grr_response_server.databases import db_utils
 from grr_response_server.databases import mysql_utils
@@ -43,6 +53,135 @@ _HUNT_OUTPUT_PLUGINS_STATES_COLUMNS = (
 )
 
 
+# Identifiers of histograms stored in the hunt_resource_histogram_bins table.
+_USER_CPU_HISTOGRAM = 0
+_SYSTEM_CPU_HISTOGRAM = 1
+_NETWORK_HISTOGRAM = 2
+
+_SCALED_CPU_STATS_BINS = [
+    int(1000000 * b) for b in rdf_stats.ClientResourcesStats.CPU_STATS_BINS
+]
+
+# Columns of the hunt_counters table, apart from the hunt_id.
+_HUNT_COUNTERS_COLUMNS = (
+    "num_clients",
+    "num_successful_clients",
+    "num_failed_clients",
+    "num_crashed_clients",
+    "num_running_clients",
+    "num_clients_with_results",
+    "num_results",
+    "user_cpu_time_used_micros",
+    "system_cpu_time_used_micros",
+    "network_bytes_sent",
+    "user_cpu_time_used_micros_sq",
+    "system_cpu_time_used_micros_sq",
+    "network_bytes_sent_sq",
+)
+
+# Columns of the flows table that hunt counters are derived from.
+_HUNT_FLOW_STATS_COLUMNS = (
+    "flow_state",
+    "user_cpu_time_used_micros",
+    "system_cpu_time_used_micros",
+    "network_bytes_sent",
+    "num_replies_sent",
+)
+
+_HuntFlowStats = collections.namedtuple("_HuntFlowStats",
+                                        _HUNT_FLOW_STATS_COLUMNS)
+
+# Maximum size of the requests inserted into the hunt_output_plugin_requests
+# table with a single statement.
+_HUNT_OUTPUT_PLUGIN_REQUESTS_INSERT_SIZE = 16 << 20
+
+
+def _BinIndex(bins, value):
+  """Returns the index of the StatsHistogram bin a value belongs to."""
+  # With the current StatsHistogram implementation the last bin simply takes
+  # all the values that are greater than range_max_value of the
+  # one-before-the-last bin.
+  return bisect.bisect_right(bins, value, 0, len(bins) - 1)
+
+
+def _HuntFlowCounters(flow):
+  """Computes the contribution of a single hunt flow to the hunt counters.
+
+  Unlike the STDDEV_POP and COUNT(CASE ...) aggregates used before the
+  counters were materialized, NULL resource values are counted as 0 in the
+  running stats and histograms. This is what the in-memory database does with
+  unset flow fields, and the MySQL flow writers never write NULLs.
+
+  Args:
+    flow: A _HuntFlowStats tuple. Values that are not set are treated as 0.
+
+  Returns:
+    A tuple (counters, bins) where counters is a list of values corresponding
+    to _HUNT_COUNTERS_COLUMNS and bins is a list of (histogram, bin) tuples
+    identifying histogram bins the flow falls into.
+  """
+  flow_state = int(flow.flow_state or 0)
+  user_cpu = int(flow.user_cpu_time_used_micros or 0)
+  system_cpu = int(flow.system_cpu_time_used_micros or 0)
+  network = int(flow.network_bytes_sent or 0)
+  num_replies = int(flow.num_replies_sent or 0)
+
+  flow_states = rdf_flow_objects.Flow.FlowState
+  counters = [
+      1,
+      int(flow_state == int(flow_states.FINISHED)),
+      int(flow_state == int(flow_states.ERROR)),
+      int(flow_state == int(flow_states.CRASHED)),
+      int(flow_state == int(flow_states.RUNNING)),
+      int(num_replies > 0),
+      num_replies,
+      user_cpu,
+      system_cpu,
+      network,
+      user_cpu * user_cpu,
+      system_cpu * system_cpu,
+      network * network,
+  ]
+  bins = [
+      (_USER_CPU_HISTOGRAM, _BinIndex(_SCALED_CPU_STATS_BINS, user_cpu)),
+      (_SYSTEM_CPU_HISTOGRAM, _BinIndex(_SCALED_CPU_STATS_BINS, system_cpu)),
+      (_NETWORK_HISTOGRAM,
+       _BinIndex(rdf_stats.ClientResourcesStats.NETWORK_STATS_BINS, network)),
+  ]
+  return counters, bins
+
+
+def _StdDev(count, values_sum, values_sum_sq):
+  """Computes the population standard deviation from exact integer sums."""
+  if not count:
+    return 0.0
+  # Sums are exact integers, so the variance numerator can be computed without
+  # loss of precision.
+  return math.sqrt(max(0, count * values_sum_sq - values_sum**2)) / count
+
+
+def _HuntResultFromRow(hunt_id, client_id_int, flow_id_int, unused_hunt_id_int,
+                       serialized_payload, payload_type, timestamp, tag):
+  """Creates a FlowResult from a row of the flow_results table."""
+  if payload_type in rdfvalue.RDFValue.classes:
+    payload = rdfvalue.RDFValue.classes[payload_type].FromSerializedBytes(
+        serialized_payload)
+  else:
+    payload = rdf_objects.SerializedValueOfUnrecognizedType(
+        type_name=payload_type, value=serialized_payload)
+
+  result = rdf_flow_objects.FlowResult(
+      client_id=db_utils.IntToClientID(client_id_int),
+      flow_id=db_utils.IntToFlowID(flow_id_int),
+      hunt_id=hunt_id,
+      payload=payload,
+      timestamp=mysql_utils.TimestampToRDFDatetime(timestamp))
+  if tag is not None:
+    result.tag = tag
+
+  return result
+
+
 class MySQLDBHuntMixin(object):
   """MySQLDB mixin for flow handling."""
 
@@ -147,8 +286,12 @@ class MySQLDBHuntMixin(object):
     if rows_deleted == 0:
       raise db.UnknownHuntError(hunt_id)
 
-    query = "DELETE FROM hunt_output_plugins_states WHERE hunt_id = %s"
-    cursor.execute(query, [hunt_id_int])
+    for table in [
+        "hunt_output_plugins_states", "hunt_counters",
+        "hunt_resource_histogram_bins"
+    ]:
+      query = "DELETE FROM {} WHERE hunt_id = %s".format(table)
+      cursor.execute(query, [hunt_id_int])
 
   def _HuntObjectFromRow(self, row):
     """Generates a flow object from a database row."""
@@ -432,6 +575,224 @@ class MySQLDBHuntMixin(object):
     cursor.execute(query, args)
     return state
 
+  @mysql_utils.WithTransaction()
+  def WriteHuntOutputPluginRequests(self, requests, cursor=None):
+    """Queues hunt results for processing with the hunts' output plugins."""
+    rows = []
+    for request in requests:
+      request = request.Copy()
+      request.request_id = None
+      request.leased_until = None
+      request.leased_by = None
+
+      delivery_time = None
+      if request.delivery_time:
+        delivery_time = mysql_utils.RDFDatetimeToTimestamp(
+            request.delivery_time)
+      rows.append((db_utils.HuntIDToInt(request.hunt_id),
+                   request.SerializeToBytes(), delivery_time))
+
+    # Every statement has to fit into max_allowed_packet, so requests carrying
+    # a lot of results are inserted with separate statements.
+    partitions = [[]]
+    partition_size = 0
+    for row in rows:
+      row_size = len(row[1])
+      if (partitions[-1] and
+          partition_size + row_size > _HUNT_OUTPUT_PLUGIN_REQUESTS_INSERT_SIZE):
+        partitions.append([])
+        partition_size = 0
+      partitions[-1].append(row)
+      partition_size += row_size
+
+    for partition in partitions:
+      query = ("INSERT INTO hunt_output_plugin_requests "
+               "(hunt_id, request, delivery_time) VALUES ")
+      query += ", ".join(["(%s, %s, FROM_UNIXTIME(%s))"] * len(partition))
+      args = [value for row in partition for value in row]
+      cursor.execute(query, args)
+
+  def _HuntOutputPluginRequestFromRow(self, row):
+    """Builds a HuntOutputPluginRequest object from a DB row."""
+    request_id, serialized_request, delivery_time, leased_until, leased_by = row
+    request = rdf_flow_objects.HuntOutputPluginRequest.FromSerializedBytes(
+        serialized_request)
+    request.request_id = request_id
+    request.delivery_time = mysql_utils.TimestampToRDFDatetime(delivery_time)
+    request.leased_until = mysql_utils.TimestampToRDFDatetime(leased_until)
+    request.leased_by = leased_by
+    return request
+
+  @mysql_utils.WithTransaction(readonly=True)
+  def ReadHuntOutputPluginRequests(self, cursor=None):
+    """Reads all queued hunt output plugin requests."""
+    query = ("SELECT request_id, request, UNIX_TIMESTAMP(delivery_time), "
+             "UNIX_TIMESTAMP(leased_until), leased_by "
+             "FROM hunt_output_plugin_requests "
+             "ORDER BY request_id")
+    cursor.execute(query)
+    return [
+        self._HuntOutputPluginRequestFromRow(row) for row in cursor.fetchall()
+    ]
+
+  @mysql_utils.WithTransaction()
+  def AckHuntOutputPluginRequests(self, requests, cursor=None):
+    """Acknowledges and deletes hunt output plugin requests."""
+    request_ids = sorted(set(r.request_id for r in requests))
+    query = ("DELETE FROM hunt_output_plugin_requests "
+             "WHERE request_id IN ({})".format(", ".join(["%s"] *
+                                                         len(request_ids))))
+    cursor.execute(query, request_ids)
+
+  @mysql_utils.WithTransaction()
+  def _LeaseHuntOutputPluginRequests(self, lease_time, limit, cursor=None):
+    """Leases queued hunt output plugin requests up to the given limit."""
+    expiry = rdfvalue.RDFDatetime.Now() + lease_time
+    expiry_str = mysql_utils.RDFDatetimeToTimestamp(expiry)
+    # See _LeaseFlowProcessingReqests for why a random id is appended.
+    id_str = "%s:%d" % (utils.ProcessIdString(), random.UInt16())
+
+    query = """
+      UPDATE hunt_output_plugin_requests
+      SET leased_until=FROM_UNIXTIME(%(expiry)s), leased_by=%(id)s
+      WHERE
+       (delivery_time IS NULL OR
+        delivery_time <= NOW(6)) AND
+       (leased_until IS NULL OR
+        leased_until < NOW(6))
+      ORDER BY request_id
+      LIMIT %(limit)s
+    """
+    args = {
+        "expiry": expiry_str,
+        "id": id_str,
+        "limit": limit,
+    }
+    updated = cursor.execute(query, args)
+    if updated == 0:
+      return []
+
+    query = """
+      SELECT request_id, request, UNIX_TIMESTAMP(delivery_time),
+             UNIX_TIMESTAMP(leased_until), leased_by
+      FROM hunt_output_plugin_requests
+      WHERE leased_by=%(id)s AND leased_until=FROM_UNIXTIME(%(expiry)s)
+      ORDER BY request_id
+    """
+    cursor.execute(query, args)
+    return [
+        self._HuntOutputPluginRequestFromRow(row) for row in cursor.fetchall()
+    ]
+
+  def RegisterHuntOutputPluginRequestHandler(self, handler, lease_time,
+                                             limit=100):
+    """Registers a handler to receive hunt output plugin requests."""
+    self.UnregisterHuntOutputPluginRequestHandler()
+
+    self.hunt_output_plugin_request_handler_pool = (
+        threadpool.ThreadPool.Factory(
+            "hunt_output_plugin_pool",
+            min_threads=1,
+            max_threads=self._HUNT_OUTPUT_PLUGIN_MAX_THREADS))
+    self.hunt_output_plugin_request_handler_pool.Start()
+    self.hunt_output_plugin_request_done = threading.Event()
+
+    self.hunt_output_plugin_request_handler_stop = False
+    self.hunt_output_plugin_request_handler_thread = threading.Thread(
+        name="hunt_output_plugin_request_handler",
+        target=self._HuntOutputPluginRequestHandlerLoop,
+        args=(handler, lease_time, limit))
+    self.hunt_output_plugin_request_handler_thread.daemon = True
+    self.hunt_output_plugin_request_handler_thread.start()
+
+  def UnregisterHuntOutputPluginRequestHandler(self, timeout=None):
+    """Unregisters any registered hunt output plugin request handler."""
+    if self.hunt_output_plugin_request_handler_thread:
+      self.hunt_output_plugin_request_handler_stop = True
+      self.hunt_output_plugin_request_wakeup.Notify()
+      self.hunt_output_plugin_request_done.set()
+      self.hunt_output_plugin_request_handler_thread.join(timeout)
+      if self.hunt_output_plugin_request_handler_thread.isAlive():
+        raise RuntimeError(
+            "Hunt output plugin request handler did not join in time.")
+      self.hunt_output_plugin_request_handler_thread = None
+      self.hunt_output_plugin_request_handler_pool.Stop()
+
+  # Hunts whose results are processed concurrently by a single process.
+  _HUNT_OUTPUT_PLUGIN_MAX_THREADS = 5
+  _HUNT_OUTPUT_PLUGIN_REQUEST_POLL_TIME_SECS = 5
+  _HUNT_OUTPUT_PLUGIN_REQUEST_MIN_WAIT_SECS = 0.1
+
+  def _HuntOutputPluginPoolCapacity(self):
+    """Returns the number of hunts the thread pool can start right away."""
+    pool = self.hunt_output_plugin_request_handler_pool
+    return max(0, pool.max_threads - pool.busy_threads - pool.pending_tasks)
+
+  def _ProcessLeasedHuntOutputPluginRequests(self, handler, requests):
+    try:
+      handler(requests)
+    except Exception as e:  # pylint: disable=broad-except
+      logging.exception("Hunt output plugin request handler raised %s.", e)
+    finally:
+      self.hunt_output_plugin_request_done.set()
+
+  def _StartHuntOutputPluginRequests(self, handler, hunt_requests):
+    """Processes leased requests of a single hunt in the thread pool."""
+    # Retries of failed output plugins wait for fresh results.
+    if all(r.attempt for r in hunt_requests):
+      priority = threadpool.PRIORITY_LOW
+    else:
+      priority = threadpool.PRIORITY_NORMAL
+    self.hunt_output_plugin_request_handler_pool.AddTask(
+        target=self._ProcessLeasedHuntOutputPluginRequests,
+        args=(handler, hunt_requests),
+        name="HuntOutputPluginRequests",
+        priority=priority)
+
+  def _HuntOutputPluginRequestHandlerLoop(self, handler, lease_time, limit):
+    """The main loop for the hunt output plugin request queue."""
+    poll_time = self._IdlePollTime(
+        self.hunt_output_plugin_request_wakeup,
+        self._HUNT_OUTPUT_PLUGIN_REQUEST_POLL_TIME_SECS)
+    done = self.hunt_output_plugin_request_done
+
+    # Leased requests of a single hunt each, waiting for a free thread. They
+    # are started as soon as any thread frees up, so that a slow output plugin
+    # of one hunt only holds up its own thread. Nothing else is leased while
+    # there are waiting requests, so that their leases don't run out.
+    waiting = collections.deque()
+
+    while not self.hunt_output_plugin_request_handler_stop:
+      try:
+        # Cleared before the capacity is checked, so that a task finishing
+        # right after the check is not missed.
+        done.clear()
+
+        capacity = self._HuntOutputPluginPoolCapacity()
+        while waiting and capacity:
+          self._StartHuntOutputPluginRequests(handler, waiting.popleft())
+          capacity -= 1
+
+        if not capacity:
+          done.wait(poll_time)
+          continue
+
+        requests = self._LeaseHuntOutputPluginRequests(lease_time, limit)
+        if not requests:
+          self.hunt_output_plugin_request_wakeup.Wait(
+              self._IdleWaitTime("hunt_output_plugin_requests", poll_time,
+                                 self._HUNT_OUTPUT_PLUGIN_REQUEST_MIN_WAIT_SECS))
+          continue
+
+        # Requests of different hunts are processed concurrently, fresh results
+        # before retries.
+        groups = collection.Group(requests, lambda r: r.hunt_id).values()
+        waiting.extend(
+            sorted(groups, key=lambda rs: all(r.attempt for r in rs)))
+      except Exception as e:  # pylint: disable=broad-except
+        logging.exception("_HuntOutputPluginRequestHandlerLoop raised %s.", e)
+        self.hunt_output_plugin_request_wakeup.Wait(poll_time)
+
   @mysql_utils.WithTransaction(readonly=True)
   def ReadHuntLogEntries(self,
                          hunt_id,
@@ -526,35 +887,55 @@ class MySQLDBHuntMixin(object):
 
     cursor.execute(query, args)
 
-    ret = []
-    for (
-        client_id_int,
-        flow_id_int,
-        hunt_id_int,
-        serialized_payload,
-        payload_type,
-        timestamp,
-        tag,
-    ) in cursor.fetchall():
-      if payload_type in rdfvalue.RDFValue.classes:
-        payload = rdfvalue.RDFValue.classes[payload_type].FromSerializedBytes(
-            serialized_payload)
-      else:
-        payload = rdf_objects.SerializedValueOfUnrecognizedType(
-            type_name=payload_type, value=serialized_payload)
+    return [_HuntResultFromRow(hunt_id, *row) for row in cursor.fetchall()]
 
-      result = rdf_flow_objects.FlowResult(
-          client_id=db_utils.IntToClientID(client_id_int),
-          flow_id=db_utils.IntToFlowID(flow_id_int),
-          hunt_id=hunt_id,
-          payload=payload,
-          timestamp=mysql_utils.TimestampToRDFDatetime(timestamp))
-      if tag is not None:
-        result.tag = tag
+  @mysql_utils.WithTransaction(readonly=True)
+  def ReadHuntResultsPage(self,
+                          hunt_id,
+                          count,
+                          page_token=None,
+                          with_tag=None,
+                          with_type=None,
+                          with_substring=None,
+                          cursor=None):
+    """Reads a page of hunt results that follow a given page token."""
+    query = ("SELECT client_id, flow_id, hunt_id, payload, type, "
+             "UNIX_TIMESTAMP(timestamp), tag, result_id "
+             "FROM flow_results "
+             "FORCE INDEX(flow_results_hunt_id_timestamp) "
+             "WHERE hunt_id = %s ")
+    args = [db_utils.HuntIDToInt(hunt_id)]
 
-      ret.append(result)
+    if with_tag:
+      query += "AND tag = %s "
+      args.append(with_tag)
 
-    return ret
+    if with_type:
+      query += "AND type = %s "
+      args.append(with_type)
+
+    if with_substring:
+      query += "AND payload LIKE %s "
+      args.append("%" + db_utils.EscapeWildcards(with_substring) + "%")
+
+    if page_token:
+      condition, condition_args = mysql_utils.ResultsPageTokenCondition(
+          page_token)
+      query += "AND " + condition + " "
+      args.extend(condition_args)
+
+    query += "ORDER BY timestamp ASC, result_id ASC LIMIT %s"
+    args.append(count)
+
+    cursor.execute(query, args)
+    rows = cursor.fetchall()
+
+    results = [_HuntResultFromRow(hunt_id, *row[:-1]) for row in rows]
+    if len(rows) < count:
+      return results, None
+
+    return results, mysql_utils.ResultsPageToken(results[-1].timestamp,
+                                                 rows[-1][-1])
 
   @mysql_utils.WithTransaction(readonly=True)
   def CountHuntResults(self,
@@ -662,53 +1043,31 @@ class MySQLDBHuntMixin(object):
   @mysql_utils.WithTransaction(readonly=True)
   def ReadHuntCounters(self, hunt_id, cursor=None):
     """Reads hunt counters."""
-    hunt_id_int = db_utils.HuntIDToInt(hunt_id)
-
-    query = ("SELECT flow_state, COUNT(*) "
-             "FROM flows "
-             "FORCE INDEX(flows_by_hunt) "
-             "WHERE parent_hunt_id = %s AND parent_flow_id IS NULL "
-             "GROUP BY flow_state")
-
-    cursor.execute(query, [hunt_id_int])
-    counts_by_state = dict(cursor.fetchall())
-
-    num_successful_clients = counts_by_state.get(
-        int(rdf_flow_objects.Flow.FlowState.FINISHED), 0)
-    num_failed_clients = counts_by_state.get(
-        int(rdf_flow_objects.Flow.FlowState.ERROR), 0)
-    num_crashed_clients = counts_by_state.get(
-        int(rdf_flow_objects.Flow.FlowState.CRASHED), 0)
-    num_running_clients = counts_by_state.get(
-        int(rdf_flow_objects.Flow.FlowState.RUNNING), 0)
-    num_clients = sum(counts_by_state.values())
-
     query = """
-    SELECT * FROM
-
-      (
-      SELECT COUNT(client_id)
-      FROM flows
-      FORCE INDEX(flows_by_hunt)
-      WHERE parent_hunt_id = %s AND parent_flow_id IS NULL AND
-            num_replies_sent > 0) counters,
-
-      (
-      SELECT SUM(user_cpu_time_used_micros + system_cpu_time_used_micros),
-             SUM(network_bytes_sent),
-             SUM(num_replies_sent)
-      FROM flows
-      FORCE INDEX(flows_by_hunt)
-      WHERE parent_hunt_id = %s AND parent_flow_id IS NULL) resources
+      SELECT
+        num_clients, num_successful_clients, num_failed_clients,
+        num_clients_with_results, num_crashed_clients, num_running_clients,
+        num_results, user_cpu_time_used_micros + system_cpu_time_used_micros,
+        network_bytes_sent
+      FROM hunt_counters
+      WHERE hunt_id = %s
     """
+    cursor.execute(query, [db_utils.HuntIDToInt(hunt_id)])
+    row = cursor.fetchone()
+    if row is None:
+      row = (0,) * 9
 
-    cursor.execute(query, [hunt_id_int, hunt_id_int])
     (
+        num_clients,
+        num_successful_clients,
+        num_failed_clients,
         num_clients_with_results,
-        total_cpu_seconds,
-        total_network_bytes_sent,
+        num_crashed_clients,
+        num_running_clients,
         num_results,
-    ) = cursor.fetchone()
+        total_cpu_micros,
+        total_network_bytes_sent,
+    ) = [int(value) for value in row]
 
     return db.HuntCounters(
         num_clients=num_clients,
@@ -717,27 +1076,175 @@ class MySQLDBHuntMixin(object):
         num_clients_with_results=num_clients_with_results,
         num_crashed_clients=num_crashed_clients,
         num_running_clients=num_running_clients,
-        num_results=int(num_results or 0),
-        total_cpu_seconds=db_utils.MicrosToSeconds(int(total_cpu_seconds or 0)),
-        total_network_bytes_sent=int(total_network_bytes_sent or 0))
+        num_results=num_results,
+        total_cpu_seconds=db_utils.MicrosToSeconds(total_cpu_micros),
+        total_network_bytes_sent=total_network_bytes_sent)
+
+  def _AddHuntCounters(self, hunt_id_int, counters, bins, cursor):
+    """Adds given deltas to the materialized counters of a hunt.
+
+    Args:
+      hunt_id_int: Integer id of the hunt.
+      counters: A list of deltas corresponding to _HUNT_COUNTERS_COLUMNS.
+      bins: A dict mapping (histogram, bin) tuples to deltas of bin sizes.
+      cursor: MySQL cursor for executing queries.
+    """
+    if any(counters):
+      query = """
+        INSERT INTO hunt_counters (hunt_id, {columns})
+        VALUES (%s, {values})
+        ON DUPLICATE KEY UPDATE {updates}
+      """.format(
+          columns=", ".join(_HUNT_COUNTERS_COLUMNS),
+          values=", ".join(["%s"] * len(_HUNT_COUNTERS_COLUMNS)),
+          updates=", ".join("{0} = {0} + VALUES({0})".format(column)
+                            for column in _HUNT_COUNTERS_COLUMNS))
+      cursor.execute(query, [hunt_id_int] + list(counters))
+
+    bins = [(key, delta) for key, delta in sorted(bins.items()) if delta]
+    if bins:
+      query = """
+        INSERT INTO hunt_resource_histogram_bins (hunt_id, histogram, bin, num)
+        VALUES {values}
+        ON DUPLICATE KEY UPDATE num = num + VALUES(num)
+      """.format(values=", ".join(["(%s, %s, %s, %s)"] * len(bins)))
+      args = []
+      for (histogram, bin_index), delta in bins:
+        args.extend([hunt_id_int, histogram, bin_index, delta])
+      cursor.execute(query, args)
 
-  def _BinsToQuery(self, bins, column_name):
-    """Builds an SQL query part to fetch counts corresponding to given bins."""
-    result = []
-    # With the current StatsHistogram implementation the last bin simply
-    # takes all the values that are greater than range_max_value of
-    # the one-before-the-last bin. range_max_value of the last bin
-    # is thus effectively ignored.
-    for prev_b, next_b in zip([0] + bins[:-1], bins[:-1] + [None]):
-      query = "COUNT(CASE WHEN %s >= %f" % (column_name, prev_b)
-      if next_b is not None:
-        query += " AND %s < %f" % (column_name, next_b)
+  def _UpdateHuntCounters(self, hunt_id_int, old_flow, new_flow, cursor):
+    """Updates hunt counters to reflect a change of one of the hunt's flows.
+
+    Args:
+      hunt_id_int: Integer id of the hunt.
+      old_flow: A _HuntFlowStats tuple describing the flow before the change or
+        None if the flow is new.
+      new_flow: A _HuntFlowStats tuple describing the flow after the change.
+      cursor: MySQL cursor for executing queries.
+    """
+    # All flows of a hunt update the same hunt_counters row, so its lock is
+    # contended by every flow write of a busy hunt. Callers update counters as
+    # the last statement of their transaction to hold that lock only briefly.
+    counters = [0] * len(_HUNT_COUNTERS_COLUMNS)
+    bins = collections.Counter()
+    for sign, flow in [(-1, old_flow), (1, new_flow)]:
+      if flow is None:
+        continue
+
+      flow_counters, flow_bins = _HuntFlowCounters(flow)
+      for i, value in enumerate(flow_counters):
+        counters[i] += sign * value
+      for key in flow_bins:
+        bins[key] += sign
+
+    self._AddHuntCounters(hunt_id_int, counters, bins, cursor)
+
+  def _ReadHuntFlowStats(self, client_id_int, flow_id_int, cursor):
+    """Reads and locks counter-related columns of a top-level hunt flow.
+
+    Args:
+      client_id_int: Integer id of the client.
+      flow_id_int: Integer id of the flow.
+      cursor: MySQL cursor for executing queries.
+
+    Returns:
+      A tuple (hunt_id_int, stats) where stats is a _HuntFlowStats tuple or
+      (None, None) if there is no such top-level hunt flow.
+    """
+    query = """
+      SELECT parent_hunt_id, {columns}
+      FROM flows
+      WHERE client_id = %s AND flow_id = %s AND
+            parent_hunt_id IS NOT NULL AND parent_flow_id IS NULL
+      FOR UPDATE
+    """.format(columns=", ".join(_HUNT_FLOW_STATS_COLUMNS))
+    cursor.execute(query, [client_id_int, flow_id_int])
+    row = cursor.fetchone()
+    if row is None:
+      return None, None
+    return row[0], _HuntFlowStats(*row[1:])
+
+  def _UpdateHuntCountersForFlow(self, client_id_int, flow_id_int, old_stats,
+                                 cursor):
+    """Updates hunt counters after a top-level hunt flow was written.
+
+    Args:
+      client_id_int: Integer id of the client.
+      flow_id_int: Integer id of the flow.
+      old_stats: _HuntFlowStats of the flow as read by _ReadHuntFlowStats
+        before the flow was written or None if the flow didn't exist.
+      cursor: MySQL cursor for executing queries.
+    """
+    hunt_id_int, new_stats = self._ReadHuntFlowStats(client_id_int,
+                                                     flow_id_int, cursor)
+    if hunt_id_int is not None:
+      self._UpdateHuntCounters(hunt_id_int, old_stats, new_stats, cursor)
+
+  def RepairHuntCounters(self, hunt_id):
+    """Recomputes materialized hunt counters from the flows table.
+
+    The counters are recomputed from a consistent snapshot without locking any
+    flows, and only the difference to the counters seen in that snapshot is
+    added afterwards. Flow writes committed in the meantime update the counters
+    themselves, so they are neither lost nor counted twice, and the repair
+    never holds locks that flow writes could wait for in a different order.
+
+    Args:
+      hunt_id: The id of the hunt to repair counters of.
+    """
+    hunt_id_int = db_utils.HuntIDToInt(hunt_id)
+    counters, bins = self._ReadHuntCountersDrift(hunt_id)
+    self._AddHuntCountersInTransaction(hunt_id_int, counters, bins)
+
+  @mysql_utils.WithTransaction(readonly=True)
+  def _ReadHuntCountersDrift(self, hunt_id, cursor=None):
+    """Returns deltas turning materialized counters into recomputed ones."""
+    hunt_id_int = db_utils.HuntIDToInt(hunt_id)
 
-      query += " THEN 1 END)"
+    query = "SELECT hunt_id FROM hunts WHERE hunt_id = %s"
+    if cursor.execute(query, [hunt_id_int]) == 0:
+      raise db.UnknownHuntError(hunt_id)
 
-      result.append(query)
+    query = """
+      SELECT {columns}
+      FROM flows
+      FORCE INDEX(flows_by_hunt)
+      WHERE parent_hunt_id = %s AND parent_flow_id IS NULL
+    """.format(columns=", ".join(_HUNT_FLOW_STATS_COLUMNS))
+    cursor.execute(query, [hunt_id_int])
+
+    counters = [0] * len(_HUNT_COUNTERS_COLUMNS)
+    bins = collections.Counter()
+    for row in cursor.fetchall():
+      flow_counters, flow_bins = _HuntFlowCounters(_HuntFlowStats(*row))
+      for i, value in enumerate(flow_counters):
+        counters[i] += value
+      bins.update(flow_bins)
 
-    return ", ".join(result)
+    query = "SELECT {columns} FROM hunt_counters WHERE hunt_id = %s".format(
+        columns=", ".join(_HUNT_COUNTERS_COLUMNS))
+    cursor.execute(query, [hunt_id_int])
+    row = cursor.fetchone()
+    if row is not None:
+      for i, value in enumerate(row):
+        counters[i] -= int(value)
+
+    query = """
+      SELECT histogram, bin, num
+      FROM hunt_resource_histogram_bins
+      WHERE hunt_id = %s
+    """
+    cursor.execute(query, [hunt_id_int])
+    for histogram, bin_index, num in cursor.fetchall():
+      bins[(histogram, bin_index)] -= num
+
+    return counters, bins
+
+  @mysql_utils.WithTransaction()
+  def _AddHuntCountersInTransaction(self, hunt_id_int, counters, bins,
+                                    cursor=None):
+    self._AddHuntCounters(hunt_id_int, counters, bins, cursor)
 
   @mysql_utils.WithTransaction(readonly=True)
   def ReadHuntClientResourcesStats(self, hunt_id, cursor=None):
@@ -746,75 +1253,66 @@ class MySQLDBHuntMixin(object):
 
     query = """
       SELECT
-        COUNT(*),
-        SUM(user_cpu_time_used_micros),
-        STDDEV_POP(user_cpu_time_used_micros),
-        SUM(system_cpu_time_used_micros),
-        STDDEV_POP(system_cpu_time_used_micros),
-        SUM(network_bytes_sent),
-        STDDEV_POP(network_bytes_sent),
+        num_clients,
+        user_cpu_time_used_micros, user_cpu_time_used_micros_sq,
+        system_cpu_time_used_micros, system_cpu_time_used_micros_sq,
+        network_bytes_sent, network_bytes_sent_sq
+      FROM hunt_counters
+      WHERE hunt_id = %s
     """
-
-    scaled_bins = [
-        int(1000000 * b) for b in rdf_stats.ClientResourcesStats.CPU_STATS_BINS
-    ]
-
-    query += self._BinsToQuery(scaled_bins, "(user_cpu_time_used_micros)")
-    query += ","
-    query += self._BinsToQuery(scaled_bins, "(system_cpu_time_used_micros)")
-    query += ","
-    query += self._BinsToQuery(
-        rdf_stats.ClientResourcesStats.NETWORK_STATS_BINS, "network_bytes_sent")
-
-    query += " FROM flows "
-    query += "FORCE INDEX(flows_by_hunt) "
-    query += "WHERE parent_hunt_id = %s AND parent_flow_id IS NULL"
-
     cursor.execute(query, [hunt_id_int])
-
-    response = cursor.fetchone()
-    (count, user_sum, user_stddev, system_sum, system_stddev, network_sum,
-     network_stddev) = response[:7]
+    row = cursor.fetchone()
+    if row is None:
+      row = (0,) * 7
+    (count, user_sum, user_sum_sq, system_sum, system_sum_sq, network_sum,
+     network_sum_sq) = [int(value) for value in row]
 
     stats = rdf_stats.ClientResourcesStats(
         user_cpu_stats=rdf_stats.RunningStats(
             num=count,
-            sum=db_utils.MicrosToSeconds(int(user_sum or 0)),
-            stddev=int(user_stddev or 0) / 1e6,
+            sum=db_utils.MicrosToSeconds(user_sum),
+            stddev=_StdDev(count, user_sum, user_sum_sq) / 1e6,
         ),
         system_cpu_stats=rdf_stats.RunningStats(
             num=count,
-            sum=db_utils.MicrosToSeconds(int(system_sum or 0)),
-            stddev=int(system_stddev or 0) / 1e6,
+            sum=db_utils.MicrosToSeconds(system_sum),
+            stddev=_StdDev(count, system_sum, system_sum_sq) / 1e6,
         ),
         network_bytes_sent_stats=rdf_stats.RunningStats(
             num=count,
-            sum=float(network_sum or 0),
-            stddev=float(network_stddev or 0),
+            sum=float(network_sum),
+            stddev=_StdDev(count, network_sum, network_sum_sq),
         ),
     )
 
-    offset = 7
-    stats.user_cpu_stats.histogram = rdf_stats.StatsHistogram()
-    for b_num, b_max_value in zip(
-        response[offset:], rdf_stats.ClientResourcesStats.CPU_STATS_BINS):
-      stats.user_cpu_stats.histogram.bins.append(
-          rdf_stats.StatsHistogramBin(range_max_value=b_max_value, num=b_num))
-
-    offset += len(rdf_stats.ClientResourcesStats.CPU_STATS_BINS)
-    stats.system_cpu_stats.histogram = rdf_stats.StatsHistogram()
-    for b_num, b_max_value in zip(
-        response[offset:], rdf_stats.ClientResourcesStats.CPU_STATS_BINS):
-      stats.system_cpu_stats.histogram.bins.append(
-          rdf_stats.StatsHistogramBin(range_max_value=b_max_value, num=b_num))
-
-    offset += len(rdf_stats.ClientResourcesStats.CPU_STATS_BINS)
-    stats.network_bytes_sent_stats.histogram = rdf_stats.StatsHistogram()
-    for b_num, b_max_value in zip(
-        response[offset:], rdf_stats.ClientResourcesStats.NETWORK_STATS_BINS):
-      stats.network_bytes_sent_stats.histogram.bins.append(
-          rdf_stats.StatsHistogramBin(range_max_value=b_max_value, num=b_num))
-
+    query = """
+      SELECT histogram, bin, num
+      FROM hunt_resource_histogram_bins
+      WHERE hunt_id = %s
+    """
+    cursor.execute(query, [hunt_id_int])
+    bin_sizes = {(histogram, bin_index): num
+                 for histogram, bin_index, num in cursor.fetchall()}
+
+    for histogram, running_stats, bins in [
+        (_USER_CPU_HISTOGRAM, stats.user_cpu_stats,
+         rdf_stats.ClientResourcesStats.CPU_STATS_BINS),
+        (_SYSTEM_CPU_HISTOGRAM, stats.system_cpu_stats,
+         rdf_stats.ClientResourcesStats.CPU_STATS_BINS),
+        (_NETWORK_HISTOGRAM, stats.network_bytes_sent_stats,
+         rdf_stats.ClientResourcesStats.NETWORK_STATS_BINS),
+    ]:
+      running_stats.histogram = rdf_stats.StatsHistogram()
+      for bin_index, b_max_value in enumerate(bins):
+        running_stats.histogram.bins.append(
+            rdf_stats.StatsHistogramBin(
+                range_max_value=b_max_value,
+                num=int(bin_sizes.get((histogram, bin_index), 0))))
+
+    # Worst performers are still found with a query against the flows table.
+    # The sort key is computed, so MySQL reads and sorts all flows of the hunt
+    # that used any resources. Only the histograms and running stats above come
+    # from the materialized counters.
     query = """
       SELECT
         client_id, flow_id, user_cpu_time_used_micros,
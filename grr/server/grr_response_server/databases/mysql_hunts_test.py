@@ -4,19 +4,50 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import unicode_literals
 
+import queue
+import threading
+
 from absl import app
 from absl.testing import absltest
 
+from grr_response_core.lib import rdfvalue
 from grr_response_server.databases import db_hunts_test
 from grr_response_server.databases import db_test_utils
 from grr_response_server.databases import mysql_test
+from grr_response_server.rdfvalues import hunt_objects as rdf_hunt_objects
 from grr.test_lib import test_lib
 
 
 class MysqlHuntTest(db_hunts_test.DatabaseTestHuntMixin,
                     db_test_utils.QueryTestHelpersMixin,
                     mysql_test.MysqlTestBase, absltest.TestCase):
-  pass
+
+  def testSlowHuntOutputPluginDoesNotBlockOtherHunts(self):
+    slow_hunt_id = rdf_hunt_objects.RandomHuntId()
+    hunt_id = rdf_hunt_objects.RandomHuntId()
+
+    release = threading.Event()
+    handled = queue.Queue()
+
+    def Handler(requests):
+      handled.put(requests[0].hunt_id)
+      if requests[0].hunt_id == slow_hunt_id:
+        release.wait()
+
+    self.db.RegisterHuntOutputPluginRequestHandler(
+        Handler, rdfvalue.Duration.From(5, rdfvalue.MINUTES))
+    self.addCleanup(self.db.UnregisterHuntOutputPluginRequestHandler)
+    self.addCleanup(release.set)
+
+    self.db.WriteHuntOutputPluginRequests(
+        [self._MakeHuntOutputPluginRequest(slow_hunt_id)])
+    self.assertEqual(handled.get(True, timeout=10), slow_hunt_id)
+
+    # The slow hunt is still being processed, requests of other hunts are
+    # leased and handled nonetheless.
+    self.db.WriteHuntOutputPluginRequests(
+        [self._MakeHuntOutputPluginRequest(hunt_id)])
+    self.assertEqual(handled.get(True, timeout=10), hunt_id)
 
 
 if __name__ == "__main__":
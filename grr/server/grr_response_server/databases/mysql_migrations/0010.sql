@@ -0,0 +1,89 @@
+CREATE TABLE `hunt_counters` (
+  `hunt_id` BIGINT UNSIGNED NOT NULL,
+  `num_clients` BIGINT NOT NULL DEFAULT 0,
+  `num_successful_clients` BIGINT NOT NULL DEFAULT 0,
+  `num_failed_clients` BIGINT NOT NULL DEFAULT 0,
+  `num_crashed_clients` BIGINT NOT NULL DEFAULT 0,
+  `num_running_clients` BIGINT NOT NULL DEFAULT 0,
+  `num_clients_with_results` BIGINT NOT NULL DEFAULT 0,
+  `num_results` BIGINT NOT NULL DEFAULT 0,
+  `user_cpu_time_used_micros` BIGINT NOT NULL DEFAULT 0,
+  `system_cpu_time_used_micros` BIGINT NOT NULL DEFAULT 0,
+  `network_bytes_sent` BIGINT NOT NULL DEFAULT 0,
+  `user_cpu_time_used_micros_sq` DECIMAL(65, 0) NOT NULL DEFAULT 0,
+  `system_cpu_time_used_micros_sq` DECIMAL(65, 0) NOT NULL DEFAULT 0,
+  `network_bytes_sent_sq` DECIMAL(65, 0) NOT NULL DEFAULT 0,
+  PRIMARY KEY (`hunt_id`)
+);
+
+CREATE TABLE `hunt_resource_histogram_bins` (
+  `hunt_id` BIGINT UNSIGNED NOT NULL,
+  `histogram` TINYINT UNSIGNED NOT NULL,
+  `bin` TINYINT UNSIGNED NOT NULL,
+  `num` BIGINT NOT NULL DEFAULT 0,
+  PRIMARY KEY (`hunt_id`, `histogram`, `bin`)
+);
+
+INSERT INTO hunt_counters
+SELECT
+  parent_hunt_id,
+  COUNT(*),
+  SUM(flow_state = 2),
+  SUM(flow_state = 3),
+  SUM(flow_state = 4),
+  SUM(flow_state = 1),
+  SUM(IFNULL(num_replies_sent, 0) > 0),
+  SUM(IFNULL(num_replies_sent, 0)),
+  SUM(IFNULL(user_cpu_time_used_micros, 0)),
+  SUM(IFNULL(system_cpu_time_used_micros, 0)),
+  SUM(IFNULL(network_bytes_sent, 0)),
+  SUM(CAST(IFNULL(user_cpu_time_used_micros, 0) AS DECIMAL(65, 0)) *
+      CAST(IFNULL(user_cpu_time_used_micros, 0) AS DECIMAL(65, 0))),
+  SUM(CAST(IFNULL(system_cpu_time_used_micros, 0) AS DECIMAL(65, 0)) *
+      CAST(IFNULL(system_cpu_time_used_micros, 0) AS DECIMAL(65, 0))),
+  SUM(CAST(IFNULL(network_bytes_sent, 0) AS DECIMAL(65, 0)) *
+      CAST(IFNULL(network_bytes_sent, 0) AS DECIMAL(65, 0)))
+FROM flows
+WHERE parent_hunt_id IS NOT NULL AND parent_flow_id IS NULL
+GROUP BY parent_hunt_id;
+
+INSERT INTO hunt_resource_histogram_bins
+SELECT parent_hunt_id, 0, user_cpu_bin, COUNT(*)
+FROM (
+  SELECT
+    parent_hunt_id,
+    INTERVAL(IFNULL(user_cpu_time_used_micros, 0),
+             100000, 200000, 300000, 400000, 500000, 750000, 1000000,
+             1500000, 2000000, 2500000, 3000000, 4000000, 5000000, 6000000,
+             7000000, 8000000, 9000000, 10000000, 15000000) AS user_cpu_bin
+  FROM flows
+  WHERE parent_hunt_id IS NOT NULL AND parent_flow_id IS NULL
+) AS user_cpu_bins
+GROUP BY parent_hunt_id, user_cpu_bin;
+
+INSERT INTO hunt_resource_histogram_bins
+SELECT parent_hunt_id, 1, system_cpu_bin, COUNT(*)
+FROM (
+  SELECT
+    parent_hunt_id,
+    INTERVAL(IFNULL(system_cpu_time_used_micros, 0),
+             100000, 200000, 300000, 400000, 500000, 750000, 1000000,
+             1500000, 2000000, 2500000, 3000000, 4000000, 5000000, 6000000,
+             7000000, 8000000, 9000000, 10000000, 15000000) AS system_cpu_bin
+  FROM flows
+  WHERE parent_hunt_id IS NOT NULL AND parent_flow_id IS NULL
+) AS system_cpu_bins
+GROUP BY parent_hunt_id, system_cpu_bin;
+
+INSERT INTO hunt_resource_histogram_bins
+SELECT parent_hunt_id, 2, network_bin, COUNT(*)
+FROM (
+  SELECT
+    parent_hunt_id,
+    INTERVAL(IFNULL(network_bytes_sent, 0),
+             16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768,
+             65536, 131072, 262144, 524288, 1048576) AS network_bin
+  FROM flows
+  WHERE parent_hunt_id IS NOT NULL AND parent_flow_id IS NULL
+) AS network_bins
+GROUP BY parent_hunt_id, network_bin;
@@ -0,0 +1,9 @@
+CREATE TABLE `client_path_infos_versions` (
+    `client_id` BIGINT UNSIGNED NOT NULL,
+    `version` BIGINT UNSIGNED NOT NULL,
+    PRIMARY KEY (`client_id`),
+    CONSTRAINT `client_path_infos_versions_ibfk_1`
+        FOREIGN KEY `client_path_infos_versions_ibfk_1`(`client_id`)
+        REFERENCES `clients`(`client_id`)
+        ON DELETE CASCADE
+);
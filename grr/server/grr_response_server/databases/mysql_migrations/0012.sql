@@ -0,0 +1,2 @@
+CREATE INDEX flow_results_hunt_id_timestamp
+    ON flow_results(hunt_id, timestamp);
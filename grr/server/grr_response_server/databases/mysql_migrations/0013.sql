@@ -0,0 +1,11 @@
+CREATE TABLE `hunt_output_plugin_requests` (
+    `request_id` BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+    `hunt_id` BIGINT UNSIGNED NOT NULL,
+    `request` MEDIUMBLOB NOT NULL,
+    `timestamp` TIMESTAMP(6) NOT NULL DEFAULT NOW(6),
+    `delivery_time` TIMESTAMP(6) NULL DEFAULT NULL,
+    `leased_until` TIMESTAMP(6) NULL DEFAULT NULL,
+    `leased_by` VARCHAR(128) NULL DEFAULT NULL,
+    PRIMARY KEY (`request_id`),
+    KEY `hunt_output_plugin_requests_by_lease` (`leased_until`, `leased_by`)
+);
@@ -0,0 +1,8 @@
+-- Idle request handler loops look up the earliest future delivery time to
+-- know when delayed requests become due. The earliest lease expiry is found
+-- with the existing `*_by_lease` indexes.
+CREATE INDEX `flow_processing_requests_by_delivery_time`
+    ON `flow_processing_requests`(`delivery_time`);
+
+CREATE INDEX `hunt_output_plugin_requests_by_delivery_time`
+    ON `hunt_output_plugin_requests`(`delivery_time`);
@@ -5,6 +5,7 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import unicode_literals
 
+import itertools
 from typing import Dict
 from typing import Iterable
 from typing import Optional
@@ -16,6 +17,8 @@ import MySQLdb
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib.rdfvalues import client_fs as rdf_client_fs
 from grr_response_core.lib.rdfvalues import crypto as rdf_crypto
+from grr_response_core.lib.util import collection
+from grr_response_core.lib.util import random
 from grr_response_server.databases import db
 from grr_response_server.databases import db_utils
 from grr_response_server.databases import mysql_utils
@@ -203,123 +206,168 @@ class MySQLDBPathMixin(object):
       client_ids = list(path_infos.keys())
       raise db.AtLeastOneUnknownClientError(client_ids=client_ids, cause=error)
 
+  # Rows are written using multi-row statements of at most this many rows.
+  _PATH_INFO_WRITE_BATCH_SIZE = 1000
+
+  def _BulkInsert(self, query, template, rows, cursor):
+    """Runs an INSERT query for rows, batching them into multi-row VALUES."""
+    for batch in collection.Batch(rows, self._PATH_INFO_WRITE_BATCH_SIZE):
+      values = ", ".join([template] * len(batch))
+      args = list(itertools.chain.from_iterable(batch))
+      cursor.execute(query.format(values), args)
+
+  def _UpdateLastEntryTimestamps(self, column, timestamp, entry_values,
+                                 cursor):
+    """Points paths of the written stat or hash entries to the new entries."""
+    # The column references the entries table, so it can only be updated after
+    # the entries are written.
+    keys = sorted(set(row[:3] for row in entry_values))
+    condition = "(client_id = %s AND path_type = %s AND path_id = %s)"
+    for batch in collection.Batch(keys, self._PATH_INFO_WRITE_BATCH_SIZE):
+      query = """
+        UPDATE client_paths
+        FORCE INDEX (PRIMARY)
+        SET {} = FROM_UNIXTIME(%s)
+        WHERE {}
+      """.format(column, " OR ".join([condition] * len(batch)))
+      args = [timestamp] + list(itertools.chain.from_iterable(batch))
+      cursor.execute(query, args)
+
   @mysql_utils.WithTransaction()
   def _MultiWritePathInfos(self, path_infos, cursor=None):
     """Writes a collection of path info records for specified clients."""
-    now = rdfvalue.RDFDatetime.Now()
+    now = mysql_utils.RDFDatetimeToTimestamp(rdfvalue.RDFDatetime.Now())
 
     path_info_values = []
-    parent_path_info_values = []
+    # Maps keys of all ancestors of written paths to their (path, depth).
+    # Ancestors shared by many written paths are written only once.
+    parent_path_info_values = {}
 
-    stat_entry_keys = []
     stat_entry_values = []
-
-    hash_entry_keys = []
     hash_entry_values = []
 
     for client_id, client_path_infos in path_infos.items():
-      for path_info in client_path_infos:
-        path = mysql_utils.ComponentsToPath(path_info.components)
+      client_id_int = db_utils.ClientIDToInt(client_id)
 
+      for path_info in client_path_infos:
+        path_type = int(path_info.path_type)
+        components = tuple(path_info.components)
         key = (
-            db_utils.ClientIDToInt(client_id),
-            int(path_info.path_type),
-            path_info.GetPathID().AsBytes(),
+            client_id_int,
+            path_type,
+            rdf_objects.PathID.FromComponents(components).AsBytes(),
         )
 
-        path_info_values.append(key + (mysql_utils.RDFDatetimeToTimestamp(now),
-                                       path, bool(path_info.directory),
-                                       len(path_info.components)))
+        path_info_values.append(key + (
+            now,
+            mysql_utils.ComponentsToPath(components),
+            bool(path_info.directory),
+            len(components),
+        ))
 
         if path_info.HasField("stat_entry"):
-          stat_entry_keys.extend(key)
-          stat_entry_values.append(key +
-                                   (mysql_utils.RDFDatetimeToTimestamp(now),
-                                    path_info.stat_entry.SerializeToBytes()))
+          stat_entry_values.append(
+              key + (now, path_info.stat_entry.SerializeToBytes()))
 
         if path_info.HasField("hash_entry"):
-          hash_entry_keys.extend(key)
-          hash_entry_values.append(key +
-                                   (mysql_utils.RDFDatetimeToTimestamp(now),
-                                    path_info.hash_entry.SerializeToBytes(),
-                                    path_info.hash_entry.sha256.AsBytes()))
-
-        # TODO(hanuszczak): Implement a trie in order to avoid inserting
-        # duplicated records.
-        for parent_path_info in path_info.GetAncestors():
-          path = mysql_utils.ComponentsToPath(parent_path_info.components)
-          parent_path_info_values.append((
-              db_utils.ClientIDToInt(client_id),
-              int(parent_path_info.path_type),
-              parent_path_info.GetPathID().AsBytes(),
-              path,
-              len(parent_path_info.components),
-          ))
-
-    if path_info_values:
-      query = """
-        INSERT INTO client_paths(client_id, path_type, path_id,
-                                 timestamp,
-                                 path, directory, depth)
-        VALUES (%s, %s, %s, FROM_UNIXTIME(%s), %s, %s, %s)
-        ON DUPLICATE KEY UPDATE
-          timestamp = VALUES(timestamp),
-          directory = directory OR VALUES(directory)
-      """
-      cursor.executemany(query, path_info_values)
-
-    if parent_path_info_values:
-      query = """
-        INSERT INTO client_paths(client_id, path_type, path_id, path,
-                                 directory, depth)
-        VALUES (%s, %s, %s, %s, TRUE, %s)
-        ON DUPLICATE KEY UPDATE
-          directory = TRUE,
-          timestamp = NOW(6)
-      """
-      cursor.executemany(query, parent_path_info_values)
-
-    if stat_entry_values:
-      query = """
-        INSERT INTO client_path_stat_entries(client_id, path_type, path_id,
-                                             timestamp,
-                                             stat_entry)
-        VALUES (%s, %s, %s, FROM_UNIXTIME(%s), %s)
-      """
-      cursor.executemany(query, stat_entry_values)
-
-      condition = "(client_id = %s AND path_type = %s AND path_id = %s)"
-
-      query = """
-        UPDATE client_paths
-        FORCE INDEX (PRIMARY)
-        SET last_stat_entry_timestamp = FROM_UNIXTIME(%s)
-        WHERE {}
-      """.format(" OR ".join([condition] * len(stat_entry_values)))
+          hash_entry_values.append(
+              key + (now, path_info.hash_entry.SerializeToBytes(),
+                     path_info.hash_entry.sha256.AsBytes()))
+
+        for depth in range(len(components) - 1, -1, -1):
+          parent_components = components[:depth]
+          parent_key = (
+              client_id_int,
+              path_type,
+              rdf_objects.PathID.FromComponents(parent_components).AsBytes(),
+          )
+          # Ancestors of a known ancestor are known as well.
+          if parent_key in parent_path_info_values:
+            break
+          parent_path_info_values[parent_key] = (
+              mysql_utils.ComponentsToPath(parent_components), depth)
+
+    # Writing rows in primary key order keeps index updates local. Sorting is
+    # stable, so multiple rows for the same path keep their relative order.
+    def _Key(row):
+      return row[:3]
+
+    path_info_values.sort(key=_Key)
+    stat_entry_values.sort(key=_Key)
+    hash_entry_values.sort(key=_Key)
+    parent_rows = [
+        key + value for key, value in sorted(parent_path_info_values.items())
+    ]
 
-      params = [mysql_utils.RDFDatetimeToTimestamp(now)] + stat_entry_keys
-      cursor.execute(query, params)
+    query = """
+      INSERT INTO client_paths(client_id, path_type, path_id,
+                               timestamp,
+                               path, directory, depth)
+      VALUES {}
+      ON DUPLICATE KEY UPDATE
+        timestamp = VALUES(timestamp),
+        directory = directory OR VALUES(directory)
+    """
+    template = "(%s, %s, %s, FROM_UNIXTIME(%s), %s, %s, %s)"
+    self._BulkInsert(query, template, path_info_values, cursor)
 
-    if hash_entry_values:
-      query = """
-        INSERT INTO client_path_hash_entries(client_id, path_type, path_id,
-                                             timestamp,
-                                             hash_entry, sha256)
-        VALUES (%s, %s, %s, FROM_UNIXTIME(%s), %s, %s)
-      """
-      cursor.executemany(query, hash_entry_values)
+    query = """
+      INSERT INTO client_paths(client_id, path_type, path_id, path,
+                               directory, depth)
+      VALUES {}
+      ON DUPLICATE KEY UPDATE
+        directory = TRUE,
+        timestamp = NOW(6)
+    """
+    self._BulkInsert(query, "(%s, %s, %s, %s, TRUE, %s)", parent_rows, cursor)
 
-      condition = "(client_id = %s AND path_type = %s AND path_id = %s)"
+    query = """
+      INSERT INTO client_path_stat_entries(client_id, path_type, path_id,
+                                           timestamp,
+                                           stat_entry)
+      VALUES {}
+    """
+    template = "(%s, %s, %s, FROM_UNIXTIME(%s), %s)"
+    self._BulkInsert(query, template, stat_entry_values, cursor)
+    self._UpdateLastEntryTimestamps("last_stat_entry_timestamp", now,
+                                    stat_entry_values, cursor)
 
-      query = """
-        UPDATE client_paths
-        FORCE INDEX (PRIMARY)
-        SET last_hash_entry_timestamp = FROM_UNIXTIME(%s)
-        WHERE {}
-      """.format(" OR ".join([condition] * len(hash_entry_values)))
+    query = """
+      INSERT INTO client_path_hash_entries(client_id, path_type, path_id,
+                                           timestamp,
+                                           hash_entry, sha256)
+      VALUES {}
+    """
+    template = "(%s, %s, %s, FROM_UNIXTIME(%s), %s, %s)"
+    self._BulkInsert(query, template, hash_entry_values, cursor)
+    self._UpdateLastEntryTimestamps("last_hash_entry_timestamp", now,
+                                    hash_entry_values, cursor)
+
+    # Every write gets a new random version, so that versions read before and
+    # after the write never match (even across database restores).
+    version_values = [(db_utils.ClientIDToInt(client_id), random.UInt64())
+                      for client_id, client_path_infos in path_infos.items()
+                      if client_path_infos]
+    version_values.sort()
+    query = """
+      INSERT INTO client_path_infos_versions(client_id, version)
+      VALUES {}
+      ON DUPLICATE KEY UPDATE version = VALUES(version)
+    """
+    self._BulkInsert(query, "(%s, %s)", version_values, cursor)
 
-      params = [mysql_utils.RDFDatetimeToTimestamp(now)] + hash_entry_keys
-      cursor.execute(query, params)
+  @mysql_utils.WithTransaction(readonly=True)
+  def ReadPathInfosVersion(self, client_id, cursor=None):
+    """Reads an opaque version of the path infos of a given client."""
+    query = """
+      SELECT version FROM client_path_infos_versions
+       WHERE client_id = %s
+    """
+    cursor.execute(query, [db_utils.ClientIDToInt(client_id)])
+    row = cursor.fetchone()
+    if row is None:
+      return 0
+    return row[0]
 
   @mysql_utils.WithTransaction(readonly=True)
   def ListDescendantPathInfos(self,
@@ -7,10 +7,22 @@ from __future__ import unicode_literals
 
 import logging
 import threading
-
+import time
 
 import MySQLdb
 
+from grr_response_core.stats import metrics
+
+MYSQL_POOL_CHECKOUT_LATENCY = metrics.Event(
+    "mysql_pool_checkout_latency",
+    bins=[0, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 50])
+MYSQL_POOL_CONNECTIONS_IN_USE = metrics.Gauge(
+    "mysql_pool_connections_in_use", int)
+MYSQL_POOL_WAIT_QUEUE_LENGTH = metrics.Gauge("mysql_pool_wait_queue_length",
+                                             int)
+MYSQL_POOL_CLOSED_CONNECTIONS = metrics.Counter(
+    "mysql_pool_closed_connections", fields=[("reason", str)])
+
 
 class Error(Exception):
   pass
@@ -24,6 +36,15 @@ class SemicolonNotAllowedInQueryError(Error):
   pass
 
 
+class _IdleConnection(object):
+  """An idle database connection kept in the pool."""
+
+  def __init__(self, con, created_at, idle_since):
+    self.con = con
+    self.created_at = created_at
+    self.idle_since = idle_since
+
+
 class Pool(object):
   """A Pool of database connections.
 
@@ -34,9 +55,21 @@ class Pool(object):
   Intends to be thread safe in that multiple connections can be requested and
   used by multiple threads without synchronization, but operations on each
   connection (and its associated cursors) are assumed to be serial.
+
+  Connections are created on demand, up to max_size. Connections that stay
+  idle for too long are closed as long as at least min_size connections remain
+  open, connections older than max_age are recycled and connections that have
+  been idle for a while are pinged before being handed out. All of this is done
+  on checkout and return, the pool does not run any threads of its own.
   """
 
-  def __init__(self, connect_func, max_size=10):
+  def __init__(self,
+               connect_func,
+               max_size=10,
+               min_size=0,
+               max_idle_time=None,
+               max_age=None,
+               liveness_check_interval=None):
     """Creates a ConnectionPool.
 
     Args:
@@ -44,12 +77,29 @@ class Pool(object):
        database, i.e. a MySQLdb.Connection. Should raise or block if the
        database is unavailable.
      max_size: The maximum number of simultaneous connections.
+     min_size: The number of open connections that are kept even if idle.
+     max_idle_time: The number of seconds after which idle connections are
+       closed. If None, idle connections are never closed.
+     max_age: The number of seconds after which connections are closed instead
+       of being reused. If None, connections are reused indefinitely.
+     liveness_check_interval: The number of seconds a connection can stay idle
+       before it is pinged on checkout. If None, connections are never pinged.
     """
     self.connect_func = connect_func
+    self.min_size = min_size
+    self.max_idle_time = max_idle_time
+    self.max_age = max_age
+    self.liveness_check_interval = liveness_check_interval
     self.limiter = threading.BoundedSemaphore(max_size)
-    self.idle_conns = []  # Atomic access only!!
+    # Sorted by the time connections became idle, guarded by self._lock.
+    self.idle_conns = []
     self.closed = False
 
+    self._lock = threading.Lock()
+    self._num_open = 0
+    self._num_in_use = 0
+    self._num_waiting = 0
+
   def get(self, blocking=True):
     """Gets a connection.
 
@@ -67,29 +117,128 @@ class Pool(object):
     if self.closed:
       raise PoolAlreadyClosedError("Connection pool is already closed.")
 
+    start_time = time.time()
+    with self._lock:
+      self._num_waiting += 1
+      MYSQL_POOL_WAIT_QUEUE_LENGTH.SetValue(self._num_waiting)
+    try:
+      acquired = self.limiter.acquire(blocking=blocking)
+    finally:
+      with self._lock:
+        self._num_waiting -= 1
+        MYSQL_POOL_WAIT_QUEUE_LENGTH.SetValue(self._num_waiting)
+
+    if not acquired:
+      return None
+
     # NOTE: Once we acquire capacity from the semaphore, it is essential that we
     # return it eventually. On success, this responsibility is delegated to
     # _ConnectionProxy.
-    if not self.limiter.acquire(blocking=blocking):
-      return None
-    c = None
-    # pop is atomic, but if we did a check first, it would not be atomic with
-    # the pop.
     try:
-      c = self.idle_conns.pop()
-    except IndexError:
-      # Create a connection, release the pool allocation if it fails.
-      try:
-        c = self.connect_func()
-      except Exception:
-        self.limiter.release()
-        raise
-    return _ConnectionProxy(self, c)
+      con, created_at = self._CheckOut()
+    except Exception:
+      self.limiter.release()
+      raise
+
+    with self._lock:
+      self._num_in_use += 1
+      MYSQL_POOL_CONNECTIONS_IN_USE.SetValue(self._num_in_use)
+    MYSQL_POOL_CHECKOUT_LATENCY.RecordEvent(time.time() - start_time)
+
+    return _ConnectionProxy(self, con, created_at)
+
+  def _CheckOut(self):
+    """Returns an idle connection that is still usable or a new connection."""
+    while True:
+      now = time.time()
+      with self._lock:
+        expired = self._PopExpiredIdleConnections(now)
+        idle = self.idle_conns.pop() if self.idle_conns else None
+
+      for con in expired:
+        self._CloseConnection(con, "idle")
+
+      if idle is None:
+        break
+
+      if self.max_age is not None and now - idle.created_at > self.max_age:
+        self._CloseConnection(idle.con, "age")
+        continue
+
+      if (self.liveness_check_interval is not None and
+          now - idle.idle_since > self.liveness_check_interval and
+          not _IsAlive(idle.con)):
+        self._CloseConnection(idle.con, "dead")
+        continue
+
+      return idle.con, idle.created_at
+
+    con = self.connect_func()
+    with self._lock:
+      self._num_open += 1
+    return con, time.time()
+
+  def _PopExpiredIdleConnections(self, now):
+    """Removes connections that were idle for too long, self._lock is held."""
+    if self.max_idle_time is None:
+      return []
+
+    expired = []
+    # Idle connections are appended on return, so the ones that have been idle
+    # for the longest time are at the beginning of the list.
+    while (self.idle_conns and self._num_open - len(expired) > self.min_size and
+           now - self.idle_conns[0].idle_since > self.max_idle_time):
+      expired.append(self.idle_conns.pop(0).con)
+    return expired
+
+  def _CloseConnection(self, con, reason):
+    with self._lock:
+      self._num_open -= 1
+    MYSQL_POOL_CLOSED_CONNECTIONS.Increment(fields=[reason])
+    try:
+      con.close()
+    except Exception as e:  # pylint: disable=broad-except
+      logging.warning("Failed to close a database connection: %s", e)
+
+  def _Return(self, con, created_at, errored):
+    """Returns a connection that is no longer used to the pool."""
+    try:
+      if errored:
+        self._CloseConnection(con, "error")
+      elif self.closed:
+        self._CloseConnection(con, "pool_closed")
+      elif self.max_age is not None and time.time() - created_at > self.max_age:
+        self._CloseConnection(con, "age")
+      else:
+        try:
+          con.rollback()
+        except Exception:
+          # rollback raised and the connection didn't make it into the idle
+          # list, so close it.
+          self._CloseConnection(con, "error")
+          raise
+        with self._lock:
+          self.idle_conns.append(_IdleConnection(con, created_at, time.time()))
+    finally:
+      with self._lock:
+        self._num_in_use -= 1
+        MYSQL_POOL_CONNECTIONS_IN_USE.SetValue(self._num_in_use)
+      self.limiter.release()
 
   def close(self):
     self.closed = True
-    for conn in self.idle_conns:
-      conn.close()
+    with self._lock:
+      idle_conns, self.idle_conns = self.idle_conns, []
+    for idle in idle_conns:
+      self._CloseConnection(idle.con, "pool_closed")
+
+
+def _IsAlive(con):
+  try:
+    con.ping()
+    return True
+  except Exception:  # pylint: disable=broad-except
+    return False
 
 
 class _ConnectionProxy(object):
@@ -100,9 +249,10 @@ class _ConnectionProxy(object):
   connection when it may be in an errored state.
   """
 
-  def __init__(self, pool, con):
+  def __init__(self, pool, con, created_at):
     self.con = con
     self.pool = pool
+    self.created_at = created_at
     self.errored = False
 
   def __del__(self):
@@ -112,22 +262,8 @@ class _ConnectionProxy(object):
 
   def close(self):
     if self.con:
-      try:
-        if not self.errored and not self.pool.closed:
-          try:
-            self.con.rollback()
-            # append is atomic.
-            self.pool.idle_conns.append(self.con)
-          except Exception:
-            # rollback raised and the connection didn't make it into the idle
-            # list, so close it.
-            self.con.close()
-            raise
-        else:
-          self.con.close()
-      finally:
-        self.con = None
-        self.pool.limiter.release()
+      con, self.con = self.con, None
+      self.pool._Return(con, self.created_at, self.errored)  # pylint: disable=protected-access
 
   def commit(self):
     self.con.commit()
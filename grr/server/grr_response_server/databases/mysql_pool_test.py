@@ -137,6 +137,97 @@ class TestPool(absltest.TestCase):
         # whitebox: make sure the connection did end up on the idle list
         self.assertLen(pool.idle_conns, 1)
 
+  def testIdleConnectionsAreClosed(self):
+    mocks = []
+
+    def gen_mock():
+      c = mock.MagicMock()
+      mocks.append(c)
+      return c
+
+    pool = mysql_pool.Pool(gen_mock, max_size=5, min_size=1, max_idle_time=60)
+    with test_lib.FakeTime(1000):
+      proxies = [pool.get() for _ in range(3)]
+      for p in proxies:
+        p.close()
+
+    with test_lib.FakeTime(1100):
+      pool.get().close()
+
+    # Only one connection is kept open, others were idle for too long.
+    self.assertLen(pool.idle_conns, 1)
+    self.assertEqual(sum(m.close.call_count for m in mocks), 2)
+    self.assertLen(mocks, 3)
+
+  def testOldConnectionsAreRecycled(self):
+    mocks = []
+
+    def gen_mock():
+      c = mock.MagicMock()
+      mocks.append(c)
+      return c
+
+    pool = mysql_pool.Pool(gen_mock, max_size=5, max_age=3600)
+    with test_lib.FakeTime(1000):
+      pool.get().close()
+    with test_lib.FakeTime(2000):
+      pool.get().close()
+
+    self.assertLen(mocks, 1)
+
+    with test_lib.FakeTime(5000):
+      pool.get().close()
+
+    self.assertLen(mocks, 2)
+    mocks[0].close.assert_called_once()
+
+  def testDeadConnectionsAreReplaced(self):
+    mocks = []
+
+    def gen_mock():
+      c = mock.MagicMock()
+      mocks.append(c)
+      return c
+
+    pool = mysql_pool.Pool(gen_mock, max_size=5, liveness_check_interval=30)
+    with test_lib.FakeTime(1000):
+      pool.get().close()
+
+    mocks[0].ping.side_effect = MySQLdb.OperationalError('Server gone')
+    with test_lib.FakeTime(1010):
+      pool.get().close()
+
+    # The connection has been idle for a short time, it is not checked.
+    mocks[0].ping.assert_not_called()
+    self.assertLen(mocks, 1)
+
+    with test_lib.FakeTime(1100):
+      con = pool.get()
+
+    mocks[0].ping.assert_called_once()
+    mocks[0].close.assert_called_once()
+    self.assertLen(mocks, 2)
+    self.assertIs(con.con, mocks[1])
+    con.close()
+
+  def testMetrics(self):
+    pool = mysql_pool.Pool(mock.MagicMock, max_size=2)
+
+    latency_count = mysql_pool.MYSQL_POOL_CHECKOUT_LATENCY.GetValue().count
+
+    proxies = [pool.get(), pool.get()]
+    self.assertEqual(mysql_pool.MYSQL_POOL_CONNECTIONS_IN_USE.GetValue(), 2)
+    self.assertEqual(mysql_pool.MYSQL_POOL_WAIT_QUEUE_LENGTH.GetValue(), 0)
+
+    self.assertIsNone(pool.get(blocking=False))
+    proxies[0].close()
+    self.assertEqual(mysql_pool.MYSQL_POOL_CONNECTIONS_IN_USE.GetValue(), 1)
+
+    proxies[1].close()
+    self.assertEqual(mysql_pool.MYSQL_POOL_CONNECTIONS_IN_USE.GetValue(), 0)
+    self.assertEqual(mysql_pool.MYSQL_POOL_CHECKOUT_LATENCY.GetValue().count,
+                     latency_count + 2)
+
 
 if __name__ == '__main__':
   app.run(test_lib.main)
@@ -11,9 +11,11 @@ import hashlib
 import inspect
 
 from typing import Iterable
+from typing import List
 from typing import Optional
 from typing import Sequence
 from typing import Text
+from typing import Tuple
 
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib.util import precondition
@@ -127,6 +129,38 @@ def RDFDatetimeToTimestamp(datetime: Optional[rdfvalue.RDFDatetime]
     return "%.6f" % (datetime.AsMicrosecondsSinceEpoch() / 1000000)
 
 
+def ResultsPageToken(timestamp: rdfvalue.RDFDatetime, result_id: int) -> Text:
+  """Builds a page token pointing after a row of a results table."""
+  return "%d:%d" % (timestamp.AsMicrosecondsSinceEpoch(), result_id)
+
+
+def ResultsPageTokenCondition(page_token: Text) -> Tuple[Text, List[object]]:
+  """Builds a condition selecting results table rows after a page token.
+
+  Rows are ordered by `(timestamp, result_id)`, so the condition can be
+  resolved with a range scan of an index ending with the `timestamp` column.
+
+  Args:
+    page_token: A token created with `ResultsPageToken`.
+
+  Returns:
+    A tuple with an SQL condition and a list of its arguments.
+
+  Raises:
+    ValueError: If the page token is malformed.
+  """
+  try:
+    micros, result_id = [int(part) for part in page_token.split(":")]
+  except ValueError:
+    raise ValueError("Invalid page token: %r" % page_token)
+
+  # Formatted from integers to avoid floating point rounding in comparisons.
+  timestamp = "%d.%06d" % divmod(micros, 1000000)
+  condition = ("(timestamp > FROM_UNIXTIME(%s) OR "
+               "(timestamp = FROM_UNIXTIME(%s) AND result_id > %s))")
+  return condition, [timestamp, timestamp, result_id]
+
+
 def ComponentsToPath(components: Sequence[Text]) -> Text:
   """Converts a list of path components to a canonical path representation.
 
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# Lint as: python3
+"""Benchmark measuring the throughput of MultiWritePathInfos."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import time
+
+from absl import app
+from absl import flags
+
+# pylint: disable=unused-import,g-bad-import-order
+from grr_response_server import server_plugins
+# pylint: enable=unused-import,g-bad-import-order
+
+from grr_response_core.lib.rdfvalues import client_fs as rdf_client_fs
+from grr_response_core.lib.util import random
+from grr_response_server import data_store
+from grr_response_server import server_startup
+from grr_response_server.rdfvalues import objects as rdf_objects
+
+flags.DEFINE_integer(
+    "num_paths", default=100000, help="Total number of paths to write.")
+
+flags.DEFINE_integer(
+    "batch_size",
+    default=10000,
+    help="Number of paths written with a single MultiWritePathInfos call.")
+
+flags.DEFINE_integer(
+    "files_per_directory",
+    default=100,
+    help="Number of files sharing the same parent directory.")
+
+flags.DEFINE_bool(
+    "stat_entries", default=True, help="Write a stat entry for every path.")
+
+
+def _MakePathInfo(i):
+  """Returns a path info of a file in a timeline-like directory tree."""
+  directory = i // flags.FLAGS.files_per_directory
+  path_info = rdf_objects.PathInfo.OS(components=[
+      "benchmark",
+      "dir%d" % (directory // 100),
+      "dir%d" % directory,
+      "file%d" % i,
+  ])
+  if flags.FLAGS.stat_entries:
+    path_info.stat_entry = rdf_client_fs.StatEntry(
+        st_size=i, st_mode=0o100644, st_mtime=i)
+  return path_info
+
+
+def main(argv):
+  """Main."""
+  del argv  # Unused.
+
+  server_startup.Init()
+
+  client_id = "C.%016x" % random.UInt64()
+  data_store.REL_DB.WriteClientMetadata(client_id, fleetspeak_enabled=False)
+
+  num_paths = flags.FLAGS.num_paths
+  batch_size = flags.FLAGS.batch_size
+
+  print("batch\trows\ttotal\trows/sec")
+  total_rows = 0
+  total_time = 0.0
+  for start in range(0, num_paths, batch_size):
+    path_infos = [
+        _MakePathInfo(i) for i in range(start, min(start + batch_size,
+                                                    num_paths))
+    ]
+
+    start_time = time.time()
+    data_store.REL_DB.MultiWritePathInfos({client_id: path_infos})
+    duration = time.time() - start_time
+
+    total_rows += len(path_infos)
+    total_time += duration
+    print("{batch}\t{rows}\t{duration:.2f}s\t{rps:.0f}".format(
+        batch=start // batch_size,
+        rows=len(path_infos),
+        duration=duration,
+        rps=len(path_infos) / duration))
+
+  print("Wrote {rows} paths in {total:.2f}s, {rps:.0f} rows/sec.".format(
+      rows=total_rows, total=total_time, rps=total_rows / total_time))
+
+
+if __name__ == "__main__":
+  app.run(main)
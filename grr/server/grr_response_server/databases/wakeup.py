@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# Lint as: python3
+"""Channels waking up database handler loops when new requests are written.
+
+Database implementations run background loops leasing message handler requests,
+flow processing requests and hunt output plugin requests. Instead of only
+polling the database, these loops wait on a wakeup channel that writers notify
+whenever new requests are written.
+Polling remains as a fallback for notifications that can't be delivered, e.g.
+requests written on another host.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+import abc
+import logging
+import os
+import select
+import socket
+import threading
+import time
+from typing import List, Optional, Text
+
+from grr_response_core import config
+from grr_response_core.lib.util import random
+
+MESSAGE_HANDLER_REQUESTS = "message_handler_requests"
+FLOW_PROCESSING_REQUESTS = "flow_processing_requests"
+HUNT_OUTPUT_PLUGIN_REQUESTS = "hunt_output_plugin_requests"
+
+
+class WakeupChannel(metaclass=abc.ABCMeta):
+  """A channel that wakes up a loop waiting for new requests."""
+
+  # Whether notifications reach loops running in other processes.
+  notifies_other_processes = False
+
+  @abc.abstractmethod
+  def Notify(self) -> None:
+    """Wakes up loops waiting on this channel."""
+
+  @abc.abstractmethod
+  def Wait(self, timeout: float) -> bool:
+    """Waits until the channel is notified or timeout expires.
+
+    Args:
+      timeout: Maximum number of seconds to wait.
+
+    Returns:
+      True if the channel was notified, False if timeout expired.
+    """
+
+  def Close(self) -> None:
+    """Releases resources held by the channel."""
+
+
+class InProcessWakeupChannel(WakeupChannel):
+  """A wakeup channel notifying loops of the current process only."""
+
+  def __init__(self):
+    self._condition = threading.Condition()
+    self._notified = False
+
+  def Notify(self) -> None:
+    with self._condition:
+      self._notified = True
+      self._condition.notify_all()
+
+  def Wait(self, timeout: float) -> bool:
+    with self._condition:
+      notified = self._condition.wait_for(lambda: self._notified, timeout)
+      self._notified = False
+      return notified
+
+
+class UnixSocketWakeupChannel(WakeupChannel):
+  """A wakeup channel notifying loops of all processes on the current host.
+
+  Every process waiting on the channel binds a Unix datagram socket in a shared
+  directory. Notifying the channel sends a datagram to every socket in the
+  directory, so that e.g. requests written by a frontend wake up the workers
+  running on the same host.
+  """
+
+  notifies_other_processes = True
+
+  # The list of sockets to notify is cached for this long.
+  _PEERS_REFRESH_INTERVAL_SECS = 1
+
+  def __init__(self, directory: Text, name: Text):
+    """Initializes the channel.
+
+    Args:
+      directory: Directory containing the sockets of all waiting processes.
+      name: Name of the channel, channels with different names don't notify
+        each other.
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    self._directory = directory
+    self._prefix = name + "."
+    self._lock = threading.Lock()
+    self._peers = []  # type: List[Text]
+    self._peers_refreshed_at = 0
+    self._receiver = None  # type: Optional[socket.socket]
+    self._receiver_path = None  # type: Optional[Text]
+
+    self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    self._sender.setblocking(False)
+
+  def _Peers(self) -> List[Text]:
+    with self._lock:
+      now = time.time()
+      if now - self._peers_refreshed_at > self._PEERS_REFRESH_INTERVAL_SECS:
+        self._peers = [
+            os.path.join(self._directory, name)
+            for name in os.listdir(self._directory)
+            if name.startswith(self._prefix)
+        ]
+        self._peers_refreshed_at = now
+      return self._peers
+
+  def _ForgetPeer(self, path: Text) -> None:
+    with self._lock:
+      if path in self._peers:
+        self._peers.remove(path)
+
+  def _Receiver(self) -> socket.socket:
+    """Returns the socket of this process, binding it on first use."""
+    with self._lock:
+      if self._receiver is None:
+        path = os.path.join(
+            self._directory,
+            "%s%d.%08x" % (self._prefix, os.getpid(), random.UInt32()))
+        receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        receiver.bind(path)
+        receiver.setblocking(False)
+        self._receiver = receiver
+        self._receiver_path = path
+        # Makes sure the new socket gets notified right away.
+        self._peers_refreshed_at = 0
+      return self._receiver
+
+  def Notify(self) -> None:
+    for path in self._Peers():
+      try:
+        self._sender.sendto(b"\0", path)
+      except BlockingIOError:
+        # The receiver queue is full, the waiting process is going to wake up
+        # anyway.
+        pass
+      except (ConnectionRefusedError, FileNotFoundError):
+        # Sockets of processes that are gone are cleaned up by whoever notices.
+        self._ForgetPeer(path)
+        try:
+          os.remove(path)
+        except OSError:
+          pass
+      except OSError as e:
+        logging.warning("Failed to send wakeup notification to %s: %s", path, e)
+
+  def Wait(self, timeout: float) -> bool:
+    receiver = self._Receiver()
+    readable, _, _ = select.select([receiver], [], [], timeout)
+    if not readable:
+      return False
+
+    # A single wakeup covers all the notifications received so far.
+    try:
+      while True:
+        receiver.recv(1)
+    except BlockingIOError:
+      pass
+    return True
+
+  def Close(self) -> None:
+    with self._lock:
+      if self._receiver is not None:
+        self._receiver.close()
+        self._receiver = None
+        try:
+          os.remove(self._receiver_path)
+        except OSError:
+          pass
+    self._sender.close()
+
+
+def CreateWakeupChannel(name: Text) -> WakeupChannel:
+  """Creates a wakeup channel as specified in the config.
+
+  Args:
+    name: Name of the channel, e.g. MESSAGE_HANDLER_REQUESTS.
+
+  Returns:
+    A UnixSocketWakeupChannel if Database.wakeup_socket_directory is set, an
+    InProcessWakeupChannel otherwise.
+  """
+  directory = config.CONFIG["Database.wakeup_socket_directory"]
+  if directory:
+    return UnixSocketWakeupChannel(directory, name)
+  return InProcessWakeupChannel()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# Lint as: python3
+"""Tests for database wakeup channels."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+import threading
+
+from absl import app
+
+from grr_response_server.databases import wakeup
+from grr.test_lib import test_lib
+
+
+class InProcessWakeupChannelTest(test_lib.GRRBaseTest):
+
+  def testWaitTimesOutWithoutNotification(self):
+    channel = wakeup.InProcessWakeupChannel()
+    self.assertFalse(channel.Wait(0.01))
+
+  def testNotificationsBeforeWaitAreNotLost(self):
+    channel = wakeup.InProcessWakeupChannel()
+    channel.Notify()
+    channel.Notify()
+    self.assertTrue(channel.Wait(0.01))
+    # Both notifications are covered by a single wakeup.
+    self.assertFalse(channel.Wait(0.01))
+
+  def testNotifyWakesUpWaitingThread(self):
+    channel = wakeup.InProcessWakeupChannel()
+    result = []
+    thread = threading.Thread(target=lambda: result.append(channel.Wait(10)))
+    thread.start()
+    channel.Notify()
+    thread.join(5)
+
+    self.assertEqual(result, [True])
+
+
+class UnixSocketWakeupChannelTest(test_lib.GRRBaseTest):
+
+  def setUp(self):
+    super().setUp()
+    self.socket_dir = os.path.join(self.temp_dir, "wakeup")
+
+  def _Channel(self, name="test"):
+    channel = wakeup.UnixSocketWakeupChannel(self.socket_dir, name)
+    self.addCleanup(channel.Close)
+    return channel
+
+  def testNotifyWakesUpOtherChannels(self):
+    waiting = self._Channel()
+    notifying = self._Channel()
+
+    self.assertFalse(waiting.Wait(0.01))
+    notifying.Notify()
+
+    self.assertTrue(waiting.Wait(5))
+    self.assertFalse(waiting.Wait(0.01))
+
+  def testChannelsWithDifferentNamesDoNotNotifyEachOther(self):
+    waiting = self._Channel("foo")
+    notifying = self._Channel("bar")
+
+    self.assertFalse(waiting.Wait(0.01))
+    notifying.Notify()
+
+    self.assertFalse(waiting.Wait(0.1))
+
+  def testCloseRemovesSocket(self):
+    channel = wakeup.UnixSocketWakeupChannel(self.socket_dir, "test")
+    channel.Wait(0.01)
+    self.assertLen(os.listdir(self.socket_dir), 1)
+
+    channel.Close()
+    self.assertEmpty(os.listdir(self.socket_dir))
+
+  def testStaleSocketsAreRemoved(self):
+    stale = wakeup.UnixSocketWakeupChannel(self.socket_dir, "test")
+    stale.Wait(0.01)
+    # Simulates a crashed process that didn't remove its socket.
+    stale._receiver.close()  # pylint: disable=protected-access
+
+    self._Channel().Notify()
+
+    self.assertEmpty(os.listdir(self.socket_dir))
+
+
+class CreateWakeupChannelTest(test_lib.GRRBaseTest):
+
+  def testCreatesInProcessChannelByDefault(self):
+    with test_lib.ConfigOverrider({"Database.wakeup_socket_directory": ""}):
+      channel = wakeup.CreateWakeupChannel(wakeup.MESSAGE_HANDLER_REQUESTS)
+    self.assertIsInstance(channel, wakeup.InProcessWakeupChannel)
+    self.assertFalse(channel.notifies_other_processes)
+
+  def testCreatesUnixSocketChannelIfDirectoryIsSet(self):
+    socket_dir = os.path.join(self.temp_dir, "wakeup")
+    with test_lib.ConfigOverrider(
+        {"Database.wakeup_socket_directory": socket_dir}):
+      channel = wakeup.CreateWakeupChannel(wakeup.MESSAGE_HANDLER_REQUESTS)
+    self.addCleanup(channel.Close)
+    self.assertIsInstance(channel, wakeup.UnixSocketWakeupChannel)
+    self.assertTrue(channel.notifies_other_processes)
+
+
+def main(argv):
+  test_lib.main(argv)
+
+
+if __name__ == "__main__":
+  app.run(main)
@@ -12,12 +12,15 @@ from __future__ import unicode_literals
 
 import hashlib
 import logging
+import threading
 import time
 from typing import Any
 from typing import Iterator
 from typing import Type
 
+from grr_response_core import config
 from grr_response_core.lib import rdfvalue
+from grr_response_core.lib import utils
 from grr_response_core.lib.rdfvalues import client as rdf_client
 from grr_response_core.lib.rdfvalues import client_fs as rdf_client_fs
 from grr_response_core.lib.rdfvalues import client_network as rdf_client_network
@@ -32,6 +35,7 @@ from grr_response_core.lib.registry import MetaclassRegistry
 from grr_response_core.lib.util import collection
 from grr_response_core.lib.util import compatibility
 from grr_response_core.lib.util import precondition
+from grr_response_core.stats import metrics
 from grr_response_proto import export_pb2
 from grr_response_server import data_store
 from grr_response_server import file_store
@@ -39,6 +43,9 @@ from grr_response_server.check_lib import checks
 from grr_response_server.databases import db
 from grr_response_server.flows.general import collectors as flow_collectors
 
+CLIENT_METADATA_CACHE_HITS = metrics.Counter("client_metadata_cache_hits")
+CLIENT_METADATA_CACHE_MISSES = metrics.Counter("client_metadata_cache_misses")
+
 try:
   # pylint: disable=g-import-not-at-top
   from verify_sigs import auth_data
@@ -229,6 +236,10 @@ class ExportConverter(metaclass=MetaclassRegistry):
   # Type of values that this converter accepts.
   input_rdf_type = None
 
+  # Whether the converter reads from the datastore. Export conversion worker
+  # processes have no datastore, such converters are run in the API server.
+  reads_datastore = False
+
   # Cache used for GetConvertersByValue() lookups.
   converters_cache = {}
 
@@ -996,9 +1007,8 @@ class GrrMessageConverter(ExportConverter):
 
   input_rdf_type = rdf_flows.GrrMessage
 
-  def __init__(self, *args, **kw):
-    super().__init__(*args, **kw)
-    self.cached_metadata = {}
+  # Client metadata is read by GetMetadataForClients.
+  reads_datastore = True
 
   def Convert(self, metadata, grr_message):
     """Converts GrrMessage into a set of RDFValues.
@@ -1030,27 +1040,8 @@ class GrrMessageConverter(ExportConverter):
     for metadata, msg in metadata_value_pairs:
       msg_dict.setdefault(msg.source, []).append((metadata, msg))
 
-    metadata_objects = []
-    metadata_to_fetch = []
-
-    # Open the clients we don't have metadata for and fetch metadata.
-    for client_urn in msg_dict:
-      try:
-        metadata_objects.append(self.cached_metadata[client_urn])
-      except KeyError:
-        metadata_to_fetch.append(client_urn)
-
-    if metadata_to_fetch:
-      client_ids = set(urn.Basename() for urn in metadata_to_fetch)
-      infos = data_store.REL_DB.MultiReadClientFullInfo(client_ids)
-
-      fetched_metadata = [
-          GetMetadata(client_id, info) for client_id, info in infos.items()
-      ]
-
-      for metadata in fetched_metadata:
-        self.cached_metadata[metadata.client_urn] = metadata
-      metadata_objects.extend(fetched_metadata)
+    metadata_objects = GetMetadataForClients(
+        urn.Basename() for urn in msg_dict).values()
 
     data_by_type = {}
     for metadata in metadata_objects:
@@ -1441,6 +1432,92 @@ def GetMetadata(client_id, client_full_info):
   return metadata
 
 
+_metadata_cache = None
+_metadata_cache_lock = threading.Lock()
+
+
+def _GetMetadataCache():
+  """Returns the client metadata cache or None if caching is disabled."""
+  global _metadata_cache
+
+  with _metadata_cache_lock:
+    if _metadata_cache is None:
+      size = config.CONFIG["Export.client_metadata_cache_size"]
+      ttl = config.CONFIG["Export.client_metadata_cache_ttl"]
+      if not size or not ttl:
+        return None
+      _metadata_cache = utils.AgeBasedCache(
+          max_size=size, max_age=ttl.ToFractional(rdfvalue.SECONDS))
+    return _metadata_cache
+
+
+def GetMetadataForClients(client_ids):
+  """Returns ExportedMetadata objects for given clients.
+
+  Metadata is cached process-wide and every cached entry is tagged with the
+  client info version it was derived from. Versions of all requested clients
+  are read with a single call, so that snapshot, label and first seen time
+  changes made by any process are picked up immediately. Clients missing from
+  the cache or having a stale entry are read from the database with a single
+  MultiReadClientFullInfo call.
+
+  Args:
+    client_ids: An iterable of client ids.
+
+  Returns:
+    A dict mapping client ids to ExportedMetadata objects. Clients that are not
+    present in the database are omitted. Returned objects are copies, so the
+    caller is free to modify them.
+  """
+  client_ids = set(client_ids)
+  cache = _GetMetadataCache()
+
+  versions = {}
+  if cache is not None and client_ids:
+    versions = data_store.REL_DB.MultiReadClientInfoVersions(client_ids)
+
+  cached = {}
+  client_ids_to_fetch = set()
+  for client_id in client_ids:
+    try:
+      if cache is None:
+        raise KeyError(client_id)
+      version, metadata = cache.Get(client_id)
+      if version != versions[client_id]:
+        raise KeyError(client_id)
+      cached[client_id] = metadata
+    except KeyError:
+      client_ids_to_fetch.add(client_id)
+
+  CLIENT_METADATA_CACHE_HITS.Increment(len(cached))
+  if client_ids_to_fetch:
+    CLIENT_METADATA_CACHE_MISSES.Increment(len(client_ids_to_fetch))
+    infos = data_store.REL_DB.MultiReadClientFullInfo(client_ids_to_fetch)
+    for client_id, info in infos.items():
+      metadata = GetMetadata(client_id, info)
+      # The version is read before the info, so a concurrent write can only
+      # make the entry look stale, never make a stale entry look current.
+      if cache is not None:
+        cache.Put(client_id, (versions[client_id], metadata))
+      cached[client_id] = metadata
+
+  # Cached objects are shared, so callers get copies stamped with the current
+  # time, as if the metadata was just read.
+  now = rdfvalue.RDFDatetime.Now()
+  result = {}
+  for client_id, metadata in cached.items():
+    result[client_id] = metadata.Copy()
+    result[client_id].timestamp = now
+  return result
+
+
+def FlushMetadataCache():
+  """Drops all cached client metadata."""
+  cache = _GetMetadataCache()
+  if cache is not None:
+    cache.Flush()
+
+
 def ConvertValuesWithMetadata(metadata_value_pairs, options=None):
   """Converts a set of RDFValues into a set of export-friendly RDFValues.
 
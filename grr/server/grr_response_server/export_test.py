@@ -12,6 +12,7 @@ import socket
 
 from absl import app
 from absl.testing import absltest
+import mock
 
 from grr_response_core.lib import queues
 from grr_response_core.lib import rdfvalue
@@ -1596,6 +1597,91 @@ class GetMetadataTest(test_lib.GRRBaseTest):
     self.assertEqual(metadata.cloud_instance_id, "foo/bar")
 
 
+class GetMetadataForClientsTest(test_lib.GRRBaseTest):
+
+  def setUp(self):
+    super().setUp()
+    self.client_id = "C.4815162342108107"
+    fixture_test_lib.ClientFixture(self.client_id)
+
+    export.FlushMetadataCache()
+    self.addCleanup(export.FlushMetadataCache)
+
+  def _SetHostname(self, hostname):
+    snapshot = data_store.REL_DB.ReadClientSnapshot(self.client_id)
+    snapshot.knowledge_base.fqdn = hostname
+    data_store.REL_DB.WriteClientSnapshot(snapshot)
+
+  def testReadsMetadataOfMultipleClientsInOneBatch(self):
+    other_client_id = "C.4815162342108108"
+    fixture_test_lib.ClientFixture(other_client_id)
+
+    with mock.patch.object(
+        data_store.REL_DB,
+        "MultiReadClientFullInfo",
+        wraps=data_store.REL_DB.MultiReadClientFullInfo) as read_mock:
+      result = export.GetMetadataForClients(
+          [self.client_id, other_client_id, "C.0000000000000001"])
+
+    self.assertEqual(read_mock.call_count, 1)
+    self.assertCountEqual(result, [self.client_id, other_client_id])
+    self.assertEqual(result[self.client_id].os, "Windows")
+
+  def testCachesMetadataAcrossCalls(self):
+    export.GetMetadataForClients([self.client_id])
+
+    # Pings do not affect the exported metadata.
+    data_store.REL_DB.WriteClientMetadata(
+        self.client_id, last_ping=rdfvalue.RDFDatetime.Now())
+    with mock.patch.object(
+        data_store.REL_DB,
+        "MultiReadClientFullInfo",
+        wraps=data_store.REL_DB.MultiReadClientFullInfo) as read_mock:
+      result = export.GetMetadataForClients([self.client_id])
+
+    self.assertFalse(read_mock.called)
+    self.assertEqual(result[self.client_id].os, "Windows")
+
+  def testReturnsCopiesOfCachedMetadata(self):
+    result = export.GetMetadataForClients([self.client_id])
+    result[self.client_id].source_urn = "aff4:/hunts/H:123456"
+
+    result = export.GetMetadataForClients([self.client_id])
+    self.assertFalse(result[self.client_id].source_urn)
+
+  def testCachedMetadataExpires(self):
+    with test_lib.FakeTime(rdfvalue.RDFDatetime.FromSecondsSinceEpoch(0)):
+      export.GetMetadataForClients([self.client_id])
+
+    with test_lib.FakeTime(rdfvalue.RDFDatetime.FromSecondsSinceEpoch(3600)):
+      with mock.patch.object(
+          data_store.REL_DB,
+          "MultiReadClientFullInfo",
+          wraps=data_store.REL_DB.MultiReadClientFullInfo) as read_mock:
+        export.GetMetadataForClients([self.client_id])
+
+    self.assertTrue(read_mock.called)
+
+  def testSnapshotWriteInvalidatesCachedMetadata(self):
+    self._SetHostname("foo.example.com")
+    export.GetMetadataForClients([self.client_id])
+
+    self._SetHostname("bar.example.com")
+    result = export.GetMetadataForClients([self.client_id])
+    self.assertEqual(result[self.client_id].hostname, "bar.example.com")
+
+  def testLabelChangesInvalidateCachedMetadata(self):
+    export.GetMetadataForClients([self.client_id])
+
+    data_store.REL_DB.AddClientLabels(self.client_id, "owner", ["foo"])
+    result = export.GetMetadataForClients([self.client_id])
+    self.assertEqual(result[self.client_id].user_labels, "foo")
+
+    data_store.REL_DB.RemoveClientLabels(self.client_id, "owner", ["foo"])
+    result = export.GetMetadataForClients([self.client_id])
+    self.assertFalse(result[self.client_id].user_labels)
+
+
 def main(argv):
   test_lib.main(argv)
 
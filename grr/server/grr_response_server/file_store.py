@@ -6,10 +6,13 @@ from __future__ import division
 from __future__ import unicode_literals
 
 import abc
+import bisect
 import collections
+from concurrent import futures
 import hashlib
 import io
 import os
+import threading
 from typing import Dict
 from typing import Iterable
 from typing import NamedTuple
@@ -121,10 +124,58 @@ class CompositeExternalFileStore(ExternalFileStore):
 EXTERNAL_FILE_STORE = CompositeExternalFileStore()
 
 
-# TODO(user): this is a naive implementation as it reads one chunk
-# per REL_DB call. It has to be optimized.
+_READ_AHEAD_EXECUTOR = None
+_READ_AHEAD_EXECUTOR_LOCK = threading.Lock()
+
+
+def _GetReadAheadExecutor():
+  """Returns the executor shared by read-aheads of all blob streams.
+
+  The executor is bounded by Server.blob_read_ahead_threads, so that streaming
+  many files at once does not use up the blob store's database connections.
+
+  Returns:
+    A futures.ThreadPoolExecutor.
+  """
+  global _READ_AHEAD_EXECUTOR
+
+  with _READ_AHEAD_EXECUTOR_LOCK:
+    if _READ_AHEAD_EXECUTOR is None:
+      _READ_AHEAD_EXECUTOR = futures.ThreadPoolExecutor(
+          max_workers=config.CONFIG["Server.blob_read_ahead_threads"],
+          thread_name_prefix="BlobReadAhead")
+    return _READ_AHEAD_EXECUTOR
+
+
+def _ReadBlobsInBackground(blob_ids):
+  """Reads blobs in a background thread of the shared read-ahead executor.
+
+  Args:
+    blob_ids: A list of BlobIDs to read.
+
+  Returns:
+    A futures.Future resolving to the result of BLOBS.ReadBlobs(blob_ids).
+  """
+  return _GetReadAheadExecutor().submit(data_store.BLOBS.ReadBlobs, blob_ids)
+
+
+class _ReadAheadWindow(
+    NamedTuple("_ReadAheadWindow", [("start_index", int), ("end_index", int),
+                                    ("future", futures.Future)])):
+  """Blobs [start_index, end_index) being read ahead with a single call."""
+
+  def __contains__(self, index):
+    return self.start_index <= index < self.end_index
+
+
 class BlobStream(object):
-  """File-like object for reading from blobs."""
+  """File-like object for reading from blobs.
+
+  While a window of blobs is being consumed, the next window of up to
+  Server.blob_read_ahead_blobs blobs (and no more than
+  Server.blob_read_ahead_size bytes) is fetched in the background with a single
+  BLOBS.ReadBlobs call.
+  """
 
   def __init__(self, client_path, blob_refs, hash_id):
     self._client_path = client_path
@@ -132,35 +183,91 @@ class BlobStream(object):
     self._hash_id = hash_id
 
     self._max_unbound_read = config.CONFIG["Server.max_unbound_read_size"]
+    self._read_ahead_blobs = config.CONFIG["Server.blob_read_ahead_blobs"]
+    self._read_ahead_size = config.CONFIG["Server.blob_read_ahead_size"]
 
     self._offset = 0
     self._length = self._blob_refs[-1].offset + self._blob_refs[-1].size
+    self._ref_offsets = [ref.offset for ref in self._blob_refs]
 
     self._current_ref = None
     self._current_chunk = None
 
-  def _GetChunk(self):
-    """Fetches a chunk corresponding to the current offset."""
+    # The window the current blob was read with and the one following it.
+    self._current_window = None
+    self._next_window = None
+
+  def _FindRefIndex(self):
+    """Returns the index of the blob reference covering the current offset."""
+    index = bisect.bisect_right(self._ref_offsets, self._offset) - 1
+    if index < 0:
+      return None
+
+    ref = self._blob_refs[index]
+    if self._offset >= ref.offset + ref.size:
+      return None
 
-    found_ref = None
-    for ref in self._blob_refs:
-      if self._offset >= ref.offset and self._offset < (ref.offset + ref.size):
-        found_ref = ref
+    return index
+
+  def _ReadAhead(self, start_index):
+    """Starts reading a window of blobs beginning at start_index."""
+    limit = min(start_index + self._read_ahead_blobs, len(self._blob_refs))
+
+    end_index = start_index
+    window_size = 0
+    while end_index < limit:
+      window_size += self._blob_refs[end_index].size
+      if window_size > self._read_ahead_size:
         break
+      end_index += 1
+
+    if end_index == start_index:
+      return None
 
-    if not found_ref:
+    blob_ids = [
+        ref.blob_id for ref in self._blob_refs[start_index:end_index]
+    ]
+    return _ReadAheadWindow(start_index, end_index,
+                            _ReadBlobsInBackground(blob_ids))
+
+  def _GetChunk(self):
+    """Fetches a chunk corresponding to the current offset."""
+
+    index = self._FindRefIndex()
+    if index is None:
       return None, None
 
+    found_ref = self._blob_refs[index]
+
     # If self._current_ref == found_ref, then simply return previously found
     # chunk. Otherwise, update self._current_chunk value.
     if self._current_ref != found_ref:
       self._current_ref = found_ref
 
-      data = data_store.BLOBS.ReadBlobs([found_ref.blob_id])
+      if self._next_window is not None and index in self._next_window:
+        self._current_window = self._next_window
+        self._next_window = None
+      elif self._current_window is None or index not in self._current_window:
+        # Forget about read-aheads that do not cover the index, e.g. after a
+        # seek.
+        self._current_window = None
+        self._next_window = None
+
+      if self._current_window is not None:
+        data = self._current_window.future.result()
+      else:
+        data = data_store.BLOBS.ReadBlobs([found_ref.blob_id])
+
       if data[found_ref.blob_id] is None:
         raise BlobNotFoundError(found_ref.blob_id)
       self._current_chunk = data[found_ref.blob_id]
 
+      if self._read_ahead_blobs > 0 and self._next_window is None:
+        if self._current_window is not None:
+          self._next_window = self._ReadAhead(self._current_window.end_index)
+        else:
+          self._next_window = self._ReadAhead(index + 1)
+
     return self._current_chunk, self._current_ref
 
   def Read(self, length=None):
@@ -437,6 +544,35 @@ def OpenFile(
 STREAM_CHUNKS_READ_AHEAD = 500
 
 
+def _BatchChunks(chunks, max_size):
+  """Splits chunks into batches of at most STREAM_CHUNKS_READ_AHEAD chunks.
+
+  Args:
+    chunks: An iterable of chunk tuples, the size of the chunk in bytes being
+      their last element.
+    max_size: Maximum total size of the chunks in a batch in bytes. Chunks
+      larger than max_size are put into batches of their own.
+
+  Yields:
+    Lists of chunk tuples.
+  """
+  batch = []
+  batch_size = 0
+  for chunk in chunks:
+    chunk_size = chunk[-1]
+    if batch and (len(batch) >= STREAM_CHUNKS_READ_AHEAD or
+                  batch_size + chunk_size > max_size):
+      yield batch
+      batch = []
+      batch_size = 0
+
+    batch.append(chunk)
+    batch_size += chunk_size
+
+  if batch:
+    yield batch
+
+
 class StreamedFileChunk(object):
   """An object representing a single streamed file chunk."""
 
@@ -461,6 +597,35 @@ class StreamedFileChunk(object):
     self.total_chunks = total_chunks
 
 
+def _ReadChunkBatches(batches, read_ahead):
+  """Reads the blobs of batches of chunks.
+
+  Args:
+    batches: An iterable of lists of chunk tuples, as yielded by _BatchChunks.
+    read_ahead: If True, the blobs of the next batch are read in the background
+      while the current batch is being consumed.
+
+  Yields:
+    Tuples (batch, blobs) where blobs maps BlobIDs to blob contents.
+  """
+  if not read_ahead:
+    for batch in batches:
+      yield batch, data_store.BLOBS.ReadBlobs([chunk[1] for chunk in batch])
+    return
+
+  pending = None
+  for batch in batches:
+    future = _ReadBlobsInBackground([chunk[1] for chunk in batch])
+    if pending is not None:
+      pending_batch, pending_future = pending
+      yield pending_batch, pending_future.result()
+    pending = (batch, future)
+
+  if pending is not None:
+    pending_batch, pending_future = pending
+    yield pending_batch, pending_future.result()
+
+
 def StreamFilesChunks(client_paths, max_timestamp=None, max_size=None):
   """Streams contents of given files.
 
@@ -478,6 +643,12 @@ def StreamFilesChunks(client_paths, max_timestamp=None, max_size=None):
     sequentially, their order will correspond to the client_paths order.
     Files having no content will simply be ignored.
 
+    Blobs are read in batches. Unless Server.blob_read_ahead_blobs is 0, the
+    next batch is read in the background while the current one is consumed.
+    Batches are limited to Server.blob_read_ahead_size bytes (or a single
+    chunk if it is larger), so at most two batches worth of data are held in
+    memory.
+
   Raises:
     BlobNotFoundError: if one of the blobs wasn't found while streaming.
   """
@@ -514,16 +685,19 @@ def StreamFilesChunks(client_paths, max_timestamp=None, max_size=None):
 
     cur_size = 0
     for i, ref in enumerate(blob_refs):
-      all_chunks.append((cp, ref.blob_id, i, num_blobs, ref.offset, total_size))
+      all_chunks.append(
+          (cp, ref.blob_id, i, num_blobs, ref.offset, total_size, ref.size))
 
       cur_size += ref.size
       if max_size is not None and cur_size >= max_size:
         break
 
-  for batch in collection.Batch(all_chunks, STREAM_CHUNKS_READ_AHEAD):
-    blobs = data_store.BLOBS.ReadBlobs(
-        [blob_id for cp, blob_id, i, num_blobs, offset, total_size in batch])
-    for cp, blob_id, i, num_blobs, offset, total_size in batch:
+  batches = _BatchChunks(all_chunks,
+                         config.CONFIG["Server.blob_read_ahead_size"])
+  read_ahead = config.CONFIG["Server.blob_read_ahead_blobs"] > 0
+
+  for batch, blobs in _ReadChunkBatches(batches, read_ahead):
+    for cp, blob_id, i, num_blobs, offset, total_size, _ in batch:
       blob_data = blobs[blob_id]
       if blob_data is None:
         raise BlobNotFoundError(blob_id)
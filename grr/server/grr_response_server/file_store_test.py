@@ -89,6 +89,97 @@ class BlobStreamTest(test_lib.GRRBaseTest):
       self.blob_stream = file_store.BlobStream(None, self.blob_refs, None)
       self.blob_stream.read(self.blob_size)
 
+  def testReadsEveryBlobOnceWithReadAhead(self):
+    with mock.patch.object(
+        data_store.BLOBS, "ReadBlobs",
+        wraps=data_store.BLOBS.ReadBlobs) as read_mock:
+      self.assertEqual(self.blob_stream.read(), b"".join(self.blob_data))
+
+    read_blob_ids = []
+    for args in read_mock.call_args_list:
+      read_blob_ids.extend(args[POSITIONAL_ARGS][0])
+    self.assertCountEqual(read_blob_ids,
+                          [ref.blob_id for ref in self.blob_refs])
+
+  def testReadsFollowingBlobsAhead(self):
+    with test_lib.ConfigOverrider({"Server.blob_read_ahead_blobs": 3}):
+      self.blob_stream = file_store.BlobStream(None, self.blob_refs, None)
+
+    with mock.patch.object(
+        file_store, "_ReadBlobsInBackground",
+        wraps=file_store._ReadBlobsInBackground) as read_ahead_mock:
+      self.blob_stream.read(1)
+
+    # The following blobs are read with a single call.
+    self.assertEqual(
+        [args[POSITIONAL_ARGS][0] for args in read_ahead_mock.call_args_list],
+        [[ref.blob_id for ref in self.blob_refs[1:4]]])
+
+  def testReadsNextWindowAheadWhileConsumingCurrentOne(self):
+    with test_lib.ConfigOverrider({"Server.blob_read_ahead_blobs": 3}):
+      self.blob_stream = file_store.BlobStream(None, self.blob_refs, None)
+
+    with mock.patch.object(
+        file_store, "_ReadBlobsInBackground",
+        wraps=file_store._ReadBlobsInBackground) as read_ahead_mock:
+      self.blob_stream.read(self.blob_size + 1)
+
+    self.assertEqual(
+        [args[POSITIONAL_ARGS][0] for args in read_ahead_mock.call_args_list],
+        [[ref.blob_id for ref in self.blob_refs[1:4]],
+         [ref.blob_id for ref in self.blob_refs[4:7]]])
+
+  def testReadAheadIsBoundedBySize(self):
+    with test_lib.ConfigOverrider({
+        "Server.blob_read_ahead_blobs": 5,
+        "Server.blob_read_ahead_size": self.blob_size * 2,
+    }):
+      self.blob_stream = file_store.BlobStream(None, self.blob_refs, None)
+
+    with mock.patch.object(
+        file_store, "_ReadBlobsInBackground",
+        wraps=file_store._ReadBlobsInBackground) as read_ahead_mock:
+      self.blob_stream.read(1)
+
+    self.assertEqual(
+        [args[POSITIONAL_ARGS][0] for args in read_ahead_mock.call_args_list],
+        [[ref.blob_id for ref in self.blob_refs[1:3]]])
+
+  def testReadAheadExecutorIsBounded(self):
+    with test_lib.ConfigOverrider({"Server.blob_read_ahead_threads": 2}):
+      with mock.patch.object(file_store, "_READ_AHEAD_EXECUTOR", None):
+        executor = file_store._GetReadAheadExecutor()
+        self.assertIs(file_store._GetReadAheadExecutor(), executor)
+        self.assertEqual(executor._max_workers, 2)
+        executor.shutdown()
+
+  def testReadAheadCanBeDisabled(self):
+    with test_lib.ConfigOverrider({"Server.blob_read_ahead_blobs": 0}):
+      self.blob_stream = file_store.BlobStream(None, self.blob_refs, None)
+
+    with mock.patch.object(file_store,
+                           "_ReadBlobsInBackground") as read_ahead_mock:
+      self.assertEqual(self.blob_stream.read(), b"".join(self.blob_data))
+
+    read_ahead_mock.assert_not_called()
+
+  def testSeeksWithReadAhead(self):
+    self.blob_stream.read(1)
+    self.blob_stream.seek(self.blob_size * 8)
+    self.assertEqual(self.blob_stream.read(self.blob_size), b"4" * 10)
+    self.blob_stream.seek(self.blob_size * 2)
+    self.assertEqual(self.blob_stream.read(self.blob_size), b"c" * 10)
+
+  def testRaisesIfReadAheadBlobIsMissing(self):
+    _, missing_blob_refs = vfs_test_lib.GenerateBlobRefs(self.blob_size, "0")
+    missing_blob_refs[0].offset = self.blob_size * 10
+    blob_stream = file_store.BlobStream(
+        None, self.blob_refs + missing_blob_refs, None)
+
+    blob_stream.read(self.blob_size * 10)
+    with self.assertRaises(file_store.BlobNotFoundError):
+      blob_stream.read(1)
+
 
 class AddFileWithUnknownHashTest(test_lib.GRRBaseTest):
   """Tests for AddFileWithUnknownHash."""
@@ -630,6 +721,52 @@ class StreamFilesChunksTest(test_lib.GRRBaseTest):
     self.assertEqual(chunks[0].data, blob_data[0])
     self.assertEqual(chunks[1].data, blob_data[1])
 
+  def testReadsBatchesBoundedBySize(self):
+    client_path = db.ClientPath.OS(self.client_id, ("foo", "bar"))
+    blob_data, _ = self._WriteFile(client_path, (0, 5))
+
+    with test_lib.ConfigOverrider(
+        {"Server.blob_read_ahead_size": self.blob_size * 2}):
+      with mock.patch.object(
+          data_store.BLOBS, "ReadBlobs",
+          wraps=data_store.BLOBS.ReadBlobs) as read_mock:
+        chunks = list(file_store.StreamFilesChunks([client_path]))
+
+    self.assertEqual([chunk.data for chunk in chunks], blob_data)
+    self.assertEqual(
+        [len(args[POSITIONAL_ARGS][0]) for args in read_mock.call_args_list],
+        [2, 2, 1])
+
+  def testReadsNextBatchAheadWhileConsumingCurrentOne(self):
+    client_path = db.ClientPath.OS(self.client_id, ("foo", "bar"))
+    self._WriteFile(client_path, (0, 4))
+
+    with test_lib.ConfigOverrider(
+        {"Server.blob_read_ahead_size": self.blob_size * 2}):
+      with mock.patch.object(
+          file_store, "_ReadBlobsInBackground",
+          wraps=file_store._ReadBlobsInBackground) as read_ahead_mock:
+        chunks = file_store.StreamFilesChunks([client_path])
+        next(chunks)
+        # Both batches are being read before the first chunk is consumed.
+        self.assertEqual(read_ahead_mock.call_count, 2)
+        self.assertLen(list(chunks), 3)
+
+  def testStreamsChunksWithReadAheadDisabled(self):
+    client_path = db.ClientPath.OS(self.client_id, ("foo", "bar"))
+    blob_data, _ = self._WriteFile(client_path, (0, 5))
+
+    with test_lib.ConfigOverrider({
+        "Server.blob_read_ahead_blobs": 0,
+        "Server.blob_read_ahead_size": self.blob_size * 2,
+    }):
+      with mock.patch.object(file_store,
+                             "_ReadBlobsInBackground") as read_ahead_mock:
+        chunks = list(file_store.StreamFilesChunks([client_path]))
+
+    self.assertEqual([chunk.data for chunk in chunks], blob_data)
+    read_ahead_mock.assert_not_called()
+
 
 def main(argv):
   # Run the full test suite
@@ -9,6 +9,7 @@ import logging
 import traceback
 from typing import Iterator, NamedTuple, Optional
 
+from grr_response_core import config
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib.rdfvalues import client as rdf_client
 from grr_response_core.lib.rdfvalues import flows as rdf_flows
@@ -25,6 +26,7 @@ from grr_response_server import fleetspeak_utils
 from grr_response_server import flow
 from grr_response_server import flow_responses
 from grr_response_server import hunt
+from grr_response_server import hunt_output_plugins
 from grr_response_server import notification as notification_lib
 from grr_response_server.databases import db
 from grr_response_server.rdfvalues import flow_objects as rdf_flow_objects
@@ -34,10 +36,9 @@ FLOW_STARTS = metrics.Counter("flow_starts", fields=[("flow", str)])
 FLOW_ERRORS = metrics.Counter("flow_errors", fields=[("flow", str)])
 FLOW_COMPLETIONS = metrics.Counter("flow_completions", fields=[("flow", str)])
 GRR_WORKER_STATES_RUN = metrics.Counter("grr_worker_states_run")
-HUNT_OUTPUT_PLUGIN_ERRORS = metrics.Counter(
-    "hunt_output_plugin_errors", fields=[("plugin", str)])
-HUNT_RESULTS_RAN_THROUGH_PLUGIN = metrics.Counter(
-    "hunt_results_ran_through_plugin", fields=[("plugin", str)])
+HUNT_OUTPUT_PLUGIN_ERRORS = hunt_output_plugins.HUNT_OUTPUT_PLUGIN_ERRORS
+HUNT_RESULTS_RAN_THROUGH_PLUGIN = (
+    hunt_output_plugins.HUNT_RESULTS_RAN_THROUGH_PLUGIN)
 
 
 class Error(Exception):
@@ -638,7 +639,8 @@ class FlowBase(metaclass=FlowRegistry):
     Args:
       method_name: The name of the state method to call.
       request: A RequestState protobuf.
-      responses: A list of FlowMessages responding to the request.
+      responses: A list of FlowMessages responding to the request or a
+        flow_responses.Responses object.
 
     Raises:
       FlowError: Processing time for the flow has expired.
@@ -655,7 +657,11 @@ class FlowBase(metaclass=FlowRegistry):
                       (self.rdf_flow.flow_id, self.rdf_flow.client_id))
 
     self.rdf_flow.current_state = method_name
-    if request and responses:
+    # Counting streamed responses would read all of them from the database.
+    if isinstance(responses, flow_responses.StreamedResponses):
+      logging.debug("Running %s for flow %s on %s, streamed responses.",
+                    method_name, self.rdf_flow.flow_id, client_id)
+    elif request and responses:
       logging.debug("Running %s for flow %s on %s, %d responses.", method_name,
                     self.rdf_flow.flow_id, client_id, len(responses))
     else:
@@ -670,8 +676,9 @@ class FlowBase(metaclass=FlowRegistry):
                          (self.__class__.__name__, method_name))
 
       # Prepare a responses object for the state method to use:
-      responses = flow_responses.Responses.FromResponses(
-          request=request, responses=responses)
+      if not isinstance(responses, flow_responses.Responses):
+        responses = flow_responses.Responses.FromResponses(
+            request=request, responses=responses)
 
       if responses.status is not None:
         self.SaveResourceUsage(responses.status)
@@ -717,16 +724,24 @@ class FlowBase(metaclass=FlowRegistry):
     Returns:
       The number of processed requests.
     """
+    # Responses to requests with more responses than fit in a page are streamed
+    # from the database while the state method runs.
+    page_size = config.CONFIG["Worker.flow_responses_page_size"] or None
     request_dict = data_store.REL_DB.ReadFlowRequestsReadyForProcessing(
         self.rdf_flow.client_id,
         self.rdf_flow.flow_id,
-        next_needed_request=self.rdf_flow.next_request_to_process)
+        next_needed_request=self.rdf_flow.next_request_to_process,
+        max_responses_per_request=page_size)
     if not request_dict:
       return 0
 
     processed = 0
     while self.rdf_flow.next_request_to_process in request_dict:
       request, responses = request_dict[self.rdf_flow.next_request_to_process]
+      if page_size and request.nr_responses_expected > page_size:
+        status = next((r for r in responses
+                       if isinstance(r, rdf_flow_objects.FlowStatus)), None)
+        responses = flow_responses.StreamedResponses(request, status, page_size)
       self.RunStateMethod(request.next_state, request, responses)
       self.rdf_flow.next_request_to_process += 1
       processed += 1
@@ -811,6 +826,13 @@ class FlowBase(metaclass=FlowRegistry):
   def _ProcessRepliesWithHuntOutputPlugins(self, replies):
     """Applies output plugins to hunt results."""
     hunt_obj = data_store.REL_DB.ReadHuntObject(self.rdf_flow.parent_hunt_id)
+    if hunt_output_plugins.IsQueueingEnabled():
+      if hunt_obj.output_plugins:
+        hunt_output_plugins.QueueResults(hunt_obj.hunt_id,
+                                         self.rdf_flow.client_id,
+                                         self.rdf_flow.flow_id, replies)
+      return
+
     self.rdf_flow.output_plugins = hunt_obj.output_plugins
     hunt_output_plugins_states = data_store.REL_DB.ReadHuntOutputPluginsStates(
         self.rdf_flow.parent_hunt_id)
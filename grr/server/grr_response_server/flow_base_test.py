@@ -1,11 +1,15 @@
 #!/usr/bin/env python
 from absl.testing import absltest
+import mock
 
+from grr_response_core.lib import rdfvalue
 from grr_response_core.lib.rdfvalues import client as rdf_client
 from grr_response_server import flow_base
+from grr_response_server import flow_responses
 from grr_response_server.databases import db as abstract_db
 from grr_response_server.rdfvalues import flow_objects as rdf_flow_objects
 from grr.test_lib import db_test_lib
+from grr.test_lib import test_lib
 
 
 class FlowBaseTest(absltest.TestCase):
@@ -13,6 +17,18 @@ class FlowBaseTest(absltest.TestCase):
   class Flow(flow_base.FlowBase):
     pass
 
+  class ResponsesFlow(flow_base.FlowBase):
+
+    def Process(self, responses):
+      self.received_responses = responses
+      self.received_payloads = list(responses)
+
+  class ResponsesLengthFlow(flow_base.FlowBase):
+
+    def Process(self, responses):
+      self.received_len = len(responses)
+      self.received_bool = bool(responses)
+
   @db_test_lib.WithDatabase
   def testClientInfo(self, db: abstract_db.Database):
     client_id = "C.0123456789ABCDEF"
@@ -45,6 +61,103 @@ class FlowBaseTest(absltest.TestCase):
     self.assertIsInstance(flow.client_info, rdf_client.ClientInformation)
     self.assertEmpty(flow.client_info.client_name)
 
+  def _WriteCompleteRequest(self,
+                            db,
+                            client_id,
+                            flow_id,
+                            num_responses,
+                            num_iterators=0):
+    request = rdf_flow_objects.FlowRequest(
+        client_id=client_id, flow_id=flow_id, request_id=1, next_state="Process")
+    db.WriteFlowRequests([request])
+
+    responses = [
+        rdf_flow_objects.FlowResponse(
+            client_id=client_id,
+            flow_id=flow_id,
+            request_id=1,
+            response_id=i,
+            payload=rdfvalue.RDFInteger(i))
+        for i in range(1, num_responses + 1)
+    ]
+    for i in range(num_responses + 1, num_responses + num_iterators + 1):
+      responses.append(
+          rdf_flow_objects.FlowIterator(
+              client_id=client_id, flow_id=flow_id, request_id=1,
+              response_id=i))
+    responses.append(
+        rdf_flow_objects.FlowStatus(
+            client_id=client_id,
+            flow_id=flow_id,
+            request_id=1,
+            response_id=num_responses + num_iterators + 1))
+    db.WriteFlowResponses(responses)
+
+  def _ProcessFlow(self,
+                   db,
+                   num_responses,
+                   page_size,
+                   num_iterators=0,
+                   flow_cls=ResponsesFlow):
+    client_id = "C.0123456789ABCDEF"
+    db.WriteClientMetadata(client_id, fleetspeak_enabled=False)
+
+    rdf_flow = rdf_flow_objects.Flow(
+        client_id=client_id,
+        flow_id="FEDCBA98",
+        next_request_to_process=1,
+        # Another request is outstanding so that the flow doesn't finish.
+        next_outbound_id=3)
+    db.WriteFlowObject(rdf_flow)
+    self._WriteCompleteRequest(db, client_id, rdf_flow.flow_id, num_responses,
+                               num_iterators)
+
+    flow = flow_cls(rdf_flow)
+    with test_lib.ConfigOverrider({"Worker.flow_responses_page_size": page_size}):
+      self.assertEqual(flow.ProcessAllReadyRequests(), 1)
+    return flow
+
+  @db_test_lib.WithDatabase
+  def testResponsesAreReadAtOnceIfTheyFitInPage(self, db: abstract_db.Database):
+    with mock.patch.object(
+        db, "ReadFlowResponsesForRequest",
+        wraps=db.ReadFlowResponsesForRequest) as read_mock:
+      flow = self._ProcessFlow(db, num_responses=5, page_size=10)
+
+    read_mock.assert_not_called()
+    self.assertNotIsInstance(flow.received_responses,
+                             flow_responses.StreamedResponses)
+    self.assertEqual(flow.received_payloads, list(range(1, 6)))
+
+  @db_test_lib.WithDatabase
+  def testResponsesAreStreamedIfTheyDoNotFitInPage(self,
+                                                   db: abstract_db.Database):
+    with mock.patch.object(
+        db, "ReadFlowResponsesForRequest",
+        wraps=db.ReadFlowResponsesForRequest) as read_mock:
+      flow = self._ProcessFlow(db, num_responses=25, page_size=10)
+
+    # 25 responses and a status take 3 pages of 10.
+    self.assertEqual(read_mock.call_count, 3)
+    responses = flow.received_responses
+    self.assertIsInstance(responses, flow_responses.StreamedResponses)
+    self.assertTrue(responses.success)
+    self.assertIsNotNone(responses.status)
+    self.assertEqual(flow.received_payloads, list(range(1, 26)))
+
+  @db_test_lib.WithDatabase
+  def testStreamedResponsesLengthDoesNotCountIterators(
+      self, db: abstract_db.Database):
+    flow = self._ProcessFlow(
+        db,
+        num_responses=15,
+        page_size=10,
+        num_iterators=5,
+        flow_cls=FlowBaseTest.ResponsesLengthFlow)
+
+    self.assertEqual(flow.received_len, 15)
+    self.assertTrue(flow.received_bool)
+
 
 if __name__ == "__main__":
   absltest.main()
@@ -7,6 +7,7 @@ from __future__ import unicode_literals
 
 from typing import Iterable, Iterator, Optional, TypeVar
 
+from grr_response_server import data_store
 from grr_response_server.rdfvalues import flow_objects as rdf_flow_objects
 
 
@@ -60,6 +61,51 @@ class Responses(Iterable[T]):
   __nonzero__ = __bool__
 
 
+class StreamedResponses(Responses):
+  """Responses to a request that are read from the database in pages.
+
+  Used for requests with too many responses to keep in memory at once. Only one
+  page of responses is held at any time, every iteration reads the responses
+  from the database again.
+  """
+
+  def __init__(self, request: rdf_flow_objects.FlowRequest,
+               status: Optional[rdf_flow_objects.FlowStatus], page_size: int):
+    super().__init__()
+    self.request = request
+    self.request_data = request.request_data
+    self.status = status
+    if status is not None:
+      self.success = status.status == "OK"
+    self._page_size = page_size
+    self._len = None
+
+  def __iter__(self) -> Iterator[T]:
+    min_response_id = 0
+    while True:
+      page = data_store.REL_DB.ReadFlowResponsesForRequest(
+          self.request.client_id, self.request.flow_id, self.request.request_id,
+          min_response_id, self._page_size)
+      for r in page:
+        if isinstance(r, rdf_flow_objects.FlowResponse):
+          yield r.payload
+
+      if len(page) < self._page_size:
+        return
+      min_response_id = page[-1].response_id + 1
+
+  def __len__(self) -> int:
+    # nr_responses_expected also counts the status and iterators, so the
+    # responses are counted by the database.
+    if self._len is None:
+      self._len = data_store.REL_DB.CountFlowResponsesForRequest(
+          self.request.client_id, self.request.flow_id, self.request.request_id)
+    return self._len
+
+  def __bool__(self) -> bool:
+    return len(self) > 0
+
+
 class FakeResponses(Responses):
   """An object which emulates the responses.
 
@@ -33,6 +33,12 @@ _GENERAL_FLEET_STATS_DAY_BUCKETS = frozenset([1, 2, 3, 7, 14, 30, 60])
 
 _FLEET_BREAKDOWN_DAY_BUCKETS = frozenset([1, 7, 14, 30])
 
+# Hunts created within this period get their counters repaired.
+_HUNT_COUNTERS_REPAIR_WINDOW = rdfvalue.Duration.From(30, rdfvalue.DAYS)
+
+# Number of hunts to list in a single db call when repairing hunt counters.
+_HUNT_LIST_BATCH_SIZE = 1000
+
 
 def _WriteFleetBreakdownStatsToDB(fleet_stats, report_type):
   """Saves a snapshot of client activity stats to the DB.
@@ -274,3 +280,41 @@ class PurgeClientStatsCronJob(cronjobs.SystemCronJobBase):
       total_deleted_count += deleted_count
       self.Log("Deleted %d ClientStats that expired before %s",
                total_deleted_count, end)
+
+
+class RepairHuntCountersCronJob(cronjobs.SystemCronJobBase):
+  """Recomputes counters of recent hunts from their flows.
+
+  Hunt counters may be maintained incrementally by the datastore. Recomputing
+  them periodically makes sure that any drift (e.g. caused by deleted clients)
+  doesn't persist.
+  """
+
+  frequency = rdfvalue.Duration.From(1, rdfvalue.DAYS)
+  lifetime = rdfvalue.Duration.From(20, rdfvalue.HOURS)
+
+  def Run(self):
+    created_after = rdfvalue.RDFDatetime.Now() - _HUNT_COUNTERS_REPAIR_WINDOW
+
+    hunt_ids = []
+    offset = 0
+    while True:
+      hunt_objs = data_store.REL_DB.ListHuntObjects(
+          offset, _HUNT_LIST_BATCH_SIZE, created_after=created_after)
+      hunt_ids.extend(h.hunt_id for h in hunt_objs)
+      if len(hunt_objs) < _HUNT_LIST_BATCH_SIZE:
+        break
+      offset += len(hunt_objs)
+
+    num_repaired = 0
+    for hunt_id in hunt_ids:
+      try:
+        data_store.REL_DB.RepairHuntCounters(hunt_id)
+      except db.UnknownHuntError:
+        # The hunt got deleted in the meantime.
+        continue
+      num_repaired += 1
+      self.HeartBeat()
+
+    self.Log("Repaired counters of %d hunts created after %s.", num_repaired,
+             created_after)
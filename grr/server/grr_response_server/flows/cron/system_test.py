@@ -6,6 +6,7 @@ from __future__ import division
 from __future__ import unicode_literals
 
 from absl import app
+import mock
 
 from grr_response_core import config
 from grr_response_core.lib import rdfvalue
@@ -16,6 +17,7 @@ from grr_response_server import data_store
 from grr_response_server.databases import db
 from grr_response_server.flows.cron import system
 from grr_response_server.rdfvalues import cronjobs as rdf_cronjobs
+from grr_response_server.rdfvalues import hunt_objects as rdf_hunt_objects
 from grr.test_lib import test_lib
 
 
@@ -222,6 +224,28 @@ class SystemCronJobTest(test_lib.GRRBaseTest):
 
     self._CheckLastAccessStats()
 
+  def testRepairHuntCountersRepairsRecentHuntsOnly(self):
+    with test_lib.FakeTime(rdfvalue.RDFDatetime.Now() -
+                           rdfvalue.Duration.From(60, rdfvalue.DAYS)):
+      old_hunt = rdf_hunt_objects.Hunt(description="old")
+      data_store.REL_DB.WriteHuntObject(old_hunt)
+
+    new_hunt_ids = []
+    for _ in range(3):
+      hunt_obj = rdf_hunt_objects.Hunt(description="new")
+      data_store.REL_DB.WriteHuntObject(hunt_obj)
+      new_hunt_ids.append(hunt_obj.hunt_id)
+
+    with mock.patch.object(
+        data_store.REL_DB, "RepairHuntCounters",
+        wraps=data_store.REL_DB.RepairHuntCounters) as repair_mock:
+      run = rdf_cronjobs.CronJobRun()
+      job = rdf_cronjobs.CronJob()
+      system.RepairHuntCountersCronJob(run, job).Run()
+
+    self.assertCountEqual([c[0][0] for c in repair_mock.call_args_list],
+                          new_hunt_ids)
+
   def _RunPurgeClientStats(self):
     run = rdf_cronjobs.CronJobRun()
     job = rdf_cronjobs.CronJob()
@@ -5,15 +5,25 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import unicode_literals
 
+import collections
 import logging
+import threading
 
+from grr_response_core import config
 from grr_response_core.lib import rdfvalue
+from grr_response_core.stats import metrics
 from grr_response_server import data_store
 from grr_response_server import flow
+from grr_response_server import foreman_rules
 from grr_response_server import hunt
 from grr_response_server import message_handlers
 from grr_response_server.databases import db
 
+FOREMAN_RULES_CACHE_HITS = metrics.Counter("foreman_rules_cache_hits")
+FOREMAN_RULES_CACHE_MISSES = metrics.Counter("foreman_rules_cache_misses")
+FOREMAN_CLIENTS_REJECTED_BY_INDEX = metrics.Counter(
+    "foreman_clients_rejected_by_index")
+
 
 class Error(Exception):
   pass
@@ -23,6 +33,236 @@ class UnknownHuntTypeError(Error):
   pass
 
 
+_OS_FAMILIES = ("Windows", "Linux", "Darwin")
+
+
+def _GetOsFamily(os_name):
+  """Returns the family ("Windows", "Linux", "Darwin") of an OS or None."""
+  if not os_name:
+    return None
+
+  for family in _OS_FAMILIES:
+    if os_name.startswith(family):
+      return family
+
+  return None
+
+
+def _GetRuleOsFamilies(os_rule):
+  """Returns the set of OS families a `ForemanOsClientRule` fires for."""
+  families = set()
+  if os_rule.os_windows:
+    families.add("Windows")
+  if os_rule.os_linux:
+    families.add("Linux")
+  if os_rule.os_darwin:
+    families.add("Darwin")
+  return frozenset(families)
+
+
+class CompiledForemanRule(object):
+  """A foreman rule together with its pre-analyzed client rule set.
+
+  Attributes:
+    rule: The underlying `ForemanCondition`.
+    os_families: A frozenset of OS families the rule can possibly fire for or
+      None if the rule does not constrain the OS.
+    label_rules: A list of `ForemanLabelClientRule` objects that can be checked
+      using only the client labels or None if the rule can't be prefiltered by
+      labels.
+    label_quantifier: `all` or `any`, depending on how `label_rules` have to be
+      combined.
+  """
+
+  def __init__(self, rule):
+    self.rule = rule
+    self.os_families = None
+    self.label_rules = None
+    self.label_quantifier = all
+
+    rule_set = rule.client_rule_set
+    client_rules = [r.UnionCast() for r in rule_set.rules]
+    os_rules = [
+        r for r in client_rules
+        if isinstance(r, foreman_rules.ForemanOsClientRule)
+    ]
+    label_rules = [
+        r for r in client_rules
+        if isinstance(r, foreman_rules.ForemanLabelClientRule)
+    ]
+
+    match_mode = rule_set.match_mode
+    if match_mode == foreman_rules.ForemanClientRuleSet.MatchMode.MATCH_ALL:
+      # Every rule in the set is a necessary condition.
+      for os_rule in os_rules:
+        families = _GetRuleOsFamilies(os_rule)
+        if self.os_families is None:
+          self.os_families = families
+        else:
+          self.os_families &= families
+      if label_rules:
+        self.label_rules = label_rules
+    elif client_rules:
+      # With MATCH_ANY the set can only be narrowed down if all of its rules
+      # are of the same indexable type.
+      if len(os_rules) == len(client_rules):
+        self.os_families = frozenset().union(
+            *[_GetRuleOsFamilies(r) for r in os_rules])
+      elif len(label_rules) == len(client_rules):
+        self.label_rules = label_rules
+        self.label_quantifier = any
+
+  @property
+  def hunt_id(self):
+    return self.rule.hunt_id
+
+  @property
+  def creation_time(self):
+    return self.rule.creation_time
+
+  @property
+  def expiration_time(self):
+    return self.rule.expiration_time
+
+  def MatchesOsFamily(self, os_family):
+    """Checks whether the rule can possibly fire for a given OS family."""
+    return self.os_families is None or os_family in self.os_families
+
+  def MatchesLabelNames(self, label_names):
+    """Checks whether the rule can possibly fire given client's labels."""
+    if self.label_rules is None:
+      return True
+
+    return self.label_quantifier(
+        r.EvaluateLabelNames(label_names) for r in self.label_rules)
+
+  def Evaluate(self, client_info):
+    return self.rule.Evaluate(client_info)
+
+
+class ForemanRulesIndex(object):
+  """An index of compiled foreman rules.
+
+  Rules are indexed by the OS family they can fire for and are pre-analyzed
+  for label constraints, so that most of the clients that can't match any rule
+  are rejected without evaluating rule sets one after another (and, if all the
+  relevant rules have label constraints, without reading full client info).
+  """
+
+  def __init__(self, rules):
+    self.rules = [CompiledForemanRule(rule) for rule in rules]
+    self.fingerprint = self.Fingerprint(rules)
+
+    if self.rules:
+      self.latest_creation_time = max(r.creation_time for r in self.rules)
+    else:
+      self.latest_creation_time = None
+
+    self._rules_by_os_family = {None: []}
+    for family in _OS_FAMILIES:
+      self._rules_by_os_family[family] = []
+    for rule in self.rules:
+      for family, family_rules in self._rules_by_os_family.items():
+        if rule.MatchesOsFamily(family):
+          family_rules.append(rule)
+
+  @staticmethod
+  def Fingerprint(rules):
+    """Returns a value identifying a set of rules for cache invalidation."""
+    return frozenset(
+        (r.hunt_id, r.creation_time, r.expiration_time) for r in rules)
+
+  def __len__(self):
+    return len(self.rules)
+
+  def GetRulesForOs(self, os_name):
+    """Returns rules that can possibly fire for a client with a given OS."""
+    return self._rules_by_os_family[_GetOsFamily(os_name)]
+
+  def GetRelevantRules(self, last_foreman_run, now):
+    """Returns rules that have to be checked for a client.
+
+    Args:
+      last_foreman_run: Creation time of the latest rule checked for the client.
+      now: Current time.
+
+    Returns:
+      A tuple (relevant_rules, expired_rules_found).
+    """
+    relevant_rules = []
+    expired_rules = False
+
+    for rule in self.rules:
+      if rule.expiration_time < now:
+        expired_rules = True
+        continue
+      if rule.creation_time <= last_foreman_run:
+        continue
+
+      relevant_rules.append(rule)
+
+    return relevant_rules, expired_rules
+
+  def CanFilterByLabels(self, rules):
+    """Checks if client labels are enough to reject a client for all rules."""
+    return all(rule.label_rules is not None for rule in rules)
+
+  def FilterRulesByLabelNames(self, rules, label_names):
+    return [rule for rule in rules if rule.MatchesLabelNames(label_names)]
+
+  def FilterRulesByClientInfo(self, rules, client_info):
+    """Returns rules that can possibly fire for a given client."""
+    os_name = client_info.last_snapshot.knowledge_base.os
+    os_rules = set(self.GetRulesForOs(os_name))
+    label_names = [label.name for label in client_info.labels]
+    return [
+        rule for rule in rules
+        if rule in os_rules and rule.MatchesLabelNames(label_names)
+    ]
+
+
+class ForemanRulesCache(object):
+  """A process-wide cache of foreman rules.
+
+  Foreman rules are re-read from the database at most once every
+  `Foreman.rules_cache_ttl`. The compiled rules index is only rebuilt when the
+  set of rules (identified by their hunt ids, creation and expiration times)
+  changes.
+  """
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._index = None
+    self._fetch_time = None
+
+  def Get(self):
+    """Returns an up-to-date `ForemanRulesIndex`."""
+    ttl = config.CONFIG["Foreman.rules_cache_ttl"]
+    now = rdfvalue.RDFDatetime.Now()
+
+    with self._lock:
+      if self._index is not None and now - self._fetch_time < ttl:
+        FOREMAN_RULES_CACHE_HITS.Increment()
+        return self._index
+
+      FOREMAN_RULES_CACHE_MISSES.Increment()
+      rules = data_store.REL_DB.ReadAllForemanRules()
+      if (self._index is None or
+          self._index.fingerprint != ForemanRulesIndex.Fingerprint(rules)):
+        self._index = ForemanRulesIndex(rules)
+      self._fetch_time = now
+
+      return self._index
+
+  def Flush(self):
+    with self._lock:
+      self._index = None
+      self._fetch_time = None
+
+
+RULES_CACHE = ForemanRulesCache()
+
+
 # TODO(amoser): Now that Foreman rules are directly stored in the db,
 # consider removing this class altogether once the AFF4 Foreman has
 # been removed.
@@ -81,6 +321,31 @@ class Foreman(object):
 
     return actions_count
 
+  def _RunActionOnClients(self, rule, client_ids):
+    """Runs rule's actions on a batch of clients.
+
+    Args:
+      rule: Rule which actions are to be executed.
+      client_ids: Ids of clients where rule's actions are to be executed.
+
+    Returns:
+      A tuple (number of actions started, ids of clients that were left out
+      because the hunt reached its client limit).
+    """
+    try:
+      started_client_ids, truncated_client_ids = hunt.StartHuntFlowOnClients(
+          client_ids, rule.hunt_id)
+    # There could be all kinds of errors we don't know about when starting the
+    # hunt so we catch everything here.
+    except Exception as e:  # pylint: disable=broad-except
+      logging.exception("Failure running foreman action %s on clients: %s",
+                        rule.hunt_id, e)
+      return 0, []
+
+    logging.info("Foreman: Started hunt %s on %d clients.", rule.hunt_id,
+                 len(started_client_ids))
+    return len(started_client_ids), truncated_client_ids
+
   def _GetLastForemanRunTime(self, client_id):
     md = data_store.REL_DB.ReadClientMetadata(client_id)
     return md.last_foreman_time or rdfvalue.RDFDatetime(0)
@@ -97,46 +362,149 @@ class Foreman(object):
     Returns:
       Number of assigned tasks.
     """
-    rules = data_store.REL_DB.ReadAllForemanRules()
-    if not rules:
+    index = RULES_CACHE.Get()
+    if not index:
       return 0
 
     last_foreman_run = self._GetLastForemanRunTime(client_id)
 
-    latest_rule_creation_time = max(rule.creation_time for rule in rules)
-
-    if latest_rule_creation_time <= last_foreman_run:
+    if index.latest_creation_time <= last_foreman_run:
       return 0
 
     # Update the latest checked rule on the client.
-    self._SetLastForemanRunTime(client_id, latest_rule_creation_time)
+    self._SetLastForemanRunTime(client_id, index.latest_creation_time)
 
-    relevant_rules = []
-    expired_rules = False
+    now = rdfvalue.RDFDatetime.Now()
+    relevant_rules, expired_rules = index.GetRelevantRules(last_foreman_run, now)
+
+    actions_count = 0
+    if relevant_rules:
+      # If every relevant rule is constrained by labels, the (cheap) client
+      # labels are enough to reject most of the clients.
+      if index.CanFilterByLabels(relevant_rules):
+        label_names = [
+            label.name
+            for label in data_store.REL_DB.ReadClientLabels(client_id)
+        ]
+        relevant_rules = index.FilterRulesByLabelNames(relevant_rules,
+                                                       label_names)
+
+      if relevant_rules:
+        client_data = data_store.REL_DB.ReadClientFullInfo(client_id)
+        if client_data is None:
+          return
+
+        relevant_rules = index.FilterRulesByClientInfo(relevant_rules,
+                                                       client_data)
+        for rule in relevant_rules:
+          if rule.Evaluate(client_data):
+            actions_count += self._RunAction(rule, client_id)
+
+      if not relevant_rules:
+        FOREMAN_CLIENTS_REJECTED_BY_INDEX.Increment()
+
+    if expired_rules:
+      data_store.REL_DB.RemoveExpiredForemanRules()
+      RULES_CACHE.Flush()
+
+    return actions_count
+
+  def AssignTasksToClients(self, client_ids):
+    """Examines our rules and starts up flows for a batch of clients.
+
+    This is a bulk version of AssignTasksToClient: client metadata, labels
+    and full info are read for all the clients at once, all rules are
+    evaluated against all the clients in one pass and the hunt flows are
+    started per hunt in batches.
+
+    The latest checked rule is only recorded for the clients once the flows
+    are started. Clients left out because a hunt reached its client limit
+    keep their previous value, so they are not excluded from the hunt for
+    good if its limit is raised.
+
+    Args:
+      client_ids: A list of ids of clients for tasks to be assigned.
+
+    Returns:
+      Number of assigned tasks.
+    """
+    index = RULES_CACHE.Get()
+    if not index or not client_ids:
+      return 0
+
+    metadatas = data_store.REL_DB.MultiReadClientMetadata(client_ids)
+    last_foreman_runs = {}
+    for client_id, md in metadatas.items():
+      last_foreman_run = md.last_foreman_time or rdfvalue.RDFDatetime(0)
+      if index.latest_creation_time > last_foreman_run:
+        last_foreman_runs[client_id] = last_foreman_run
+
+    if not last_foreman_runs:
+      return 0
 
     now = rdfvalue.RDFDatetime.Now()
+    expired_rules = False
+    rules_by_client_id = {}
+    for client_id, last_foreman_run in last_foreman_runs.items():
+      relevant_rules, expired = index.GetRelevantRules(last_foreman_run, now)
+      expired_rules = expired_rules or expired
+      if relevant_rules:
+        rules_by_client_id[client_id] = relevant_rules
+
+    label_filtered_client_ids = [
+        client_id for client_id, rules in rules_by_client_id.items()
+        if index.CanFilterByLabels(rules)
+    ]
+    if label_filtered_client_ids:
+      labels = data_store.REL_DB.MultiReadClientLabels(
+          label_filtered_client_ids)
+      for client_id in label_filtered_client_ids:
+        label_names = [label.name for label in labels.get(client_id, [])]
+        rules_by_client_id[client_id] = index.FilterRulesByLabelNames(
+            rules_by_client_id[client_id], label_names)
+
+    client_ids_to_read = [
+        client_id for client_id, rules in rules_by_client_id.items() if rules
+    ]
+    if client_ids_to_read:
+      full_infos = data_store.REL_DB.MultiReadClientFullInfo(client_ids_to_read)
+    else:
+      full_infos = {}
+
+    client_ids_by_rule = collections.OrderedDict()
+    for client_id, rules in rules_by_client_id.items():
+      client_data = full_infos.get(client_id)
+      if client_data is not None:
+        rules = index.FilterRulesByClientInfo(rules, client_data)
+      else:
+        rules = []
 
-    for rule in rules:
-      if rule.expiration_time < now:
-        expired_rules = True
-        continue
-      if rule.creation_time <= last_foreman_run:
+      if not rules:
+        FOREMAN_CLIENTS_REJECTED_BY_INDEX.Increment()
         continue
 
-      relevant_rules.append(rule)
+      for rule in rules:
+        if rule.Evaluate(client_data):
+          client_ids_by_rule.setdefault(rule, []).append(client_id)
 
     actions_count = 0
-    if relevant_rules:
-      client_data = data_store.REL_DB.ReadClientFullInfo(client_id)
-      if client_data is None:
-        return
-
-      for rule in relevant_rules:
-        if rule.Evaluate(client_data):
-          actions_count += self._RunAction(rule, client_id)
+    truncated_client_ids = set()
+    for rule, matching_client_ids in client_ids_by_rule.items():
+      count, truncated = self._RunActionOnClients(rule, matching_client_ids)
+      actions_count += count
+      truncated_client_ids.update(truncated)
+
+    # Update the latest checked rule on the clients.
+    checked_client_ids = [
+        client_id for client_id in last_foreman_runs
+        if client_id not in truncated_client_ids
+    ]
+    data_store.REL_DB.MultiWriteClientMetadata(
+        checked_client_ids, last_foreman=index.latest_creation_time)
 
     if expired_rules:
       data_store.REL_DB.RemoveExpiredForemanRules()
+      RULES_CACHE.Flush()
 
     return actions_count
 
@@ -147,10 +515,9 @@ class ForemanMessageHandler(message_handlers.MessageHandler):
   handler_name = "ForemanHandler"
 
   def ProcessMessages(self, msgs):
-    # TODO(amoser): The foreman reads the rules from the database for each
-    # client. In the old implementation we used to have a cache. If this is a
-    # performance hit, lets consider putting the cache back.
-
-    foreman_obj = Foreman()
+    client_ids = []
     for msg in msgs:
-      foreman_obj.AssignTasksToClient(msg.client_id)
+      if msg.client_id not in client_ids:
+        client_ids.append(msg.client_id)
+
+    Foreman().AssignTasksToClients(client_ids)
@@ -55,6 +55,17 @@ class ForemanLabelClientRule(ForemanClientRuleBase):
   protobuf = jobs_pb2.ForemanLabelClientRule
 
   def Evaluate(self, client_info):
+    return self.EvaluateLabelNames([label.name for label in client_info.labels])
+
+  def EvaluateLabelNames(self, client_label_names):
+    """Evaluates the rule against a list of client label names.
+
+    Args:
+      client_label_names: A list of label names assigned to the client.
+
+    Returns:
+      A bool value of the evaluation.
+    """
     if self.match_mode == ForemanLabelClientRule.MatchMode.MATCH_ALL:
       quantifier = all
     elif self.match_mode == ForemanLabelClientRule.MatchMode.MATCH_ANY:
@@ -66,8 +77,6 @@ class ForemanLabelClientRule(ForemanClientRuleBase):
     else:
       raise ValueError("Unexpected match mode value: %s" % self.match_mode)
 
-    client_label_names = [label.name for label in client_info.labels]
-
     return quantifier((name in client_label_names) for name in self.label_names)
 
   def Validate(self):
@@ -6,6 +6,7 @@ from __future__ import division
 from __future__ import unicode_literals
 
 from absl import app
+import mock
 
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib import utils
@@ -13,14 +14,21 @@ from grr_response_server import data_store
 from grr_response_server import foreman
 from grr_response_server import foreman_rules
 from grr_response_server import hunt
+from grr_response_server.rdfvalues import objects as rdf_objects
+from grr.test_lib import stats_test_lib
 from grr.test_lib import test_lib
 
 
-class ForemanTests(test_lib.GRRBaseTest):
+class ForemanTests(stats_test_lib.StatsTestMixin, test_lib.GRRBaseTest):
   """Tests the Foreman."""
 
   clients_started = []
 
+  def setUp(self):
+    super().setUp()
+    foreman.RULES_CACHE.Flush()
+    self.addCleanup(foreman.RULES_CACHE.Flush)
+
   def StartHuntFlowOnClient(self, client_id, hunt_id):
     # Keep a record of all the clients
     self.clients_started.append((hunt_id, client_id))
@@ -222,6 +230,270 @@ class ForemanTests(test_lib.GRRBaseTest):
         rules = data_store.REL_DB.ReadAllForemanRules()
         self.assertLen(rules, num_rules)
 
+  def _WriteRule(self, hunt_id, client_rules, match_mode=None):
+    now = rdfvalue.RDFDatetime.Now()
+    rule = foreman_rules.ForemanCondition(
+        creation_time=now,
+        expiration_time=now + rdfvalue.Duration.From(1, rdfvalue.HOURS),
+        description="Test rule",
+        hunt_id=hunt_id)
+    rule.client_rule_set = foreman_rules.ForemanClientRuleSet(
+        rules=client_rules)
+    if match_mode is not None:
+      rule.client_rule_set.match_mode = match_mode
+    data_store.REL_DB.WriteForemanRule(rule)
+
+  def _LabelRule(self, *label_names):
+    return foreman_rules.ForemanClientRule(
+        rule_type=foreman_rules.ForemanClientRule.Type.LABEL,
+        label=foreman_rules.ForemanLabelClientRule(label_names=label_names))
+
+  def _OsRule(self, **kwargs):
+    return foreman_rules.ForemanClientRule(
+        rule_type=foreman_rules.ForemanClientRule.Type.OS,
+        os=foreman_rules.ForemanOsClientRule(**kwargs))
+
+  def testRulesAreCachedWithinTtl(self):
+    client_ids = self.SetupClients(3, system="Windows")
+    self._WriteRule("11111111", [self._OsRule(os_windows=True)])
+
+    with test_lib.ConfigOverrider(
+        {"Foreman.rules_cache_ttl": rdfvalue.Duration.From(1, rdfvalue.HOURS)}):
+      with utils.Stubber(hunt, "StartHuntFlowOnClient",
+                         self.StartHuntFlowOnClient):
+        with mock.patch.object(
+            data_store.REL_DB,
+            "ReadAllForemanRules",
+            wraps=data_store.REL_DB.ReadAllForemanRules) as read_mock:
+          with self.assertStatsCounterDelta(1,
+                                            foreman.FOREMAN_RULES_CACHE_MISSES):
+            with self.assertStatsCounterDelta(
+                2, foreman.FOREMAN_RULES_CACHE_HITS):
+              self.clients_started = []
+              foreman_obj = foreman.Foreman()
+              for client_id in client_ids:
+                foreman_obj.AssignTasksToClient(client_id)
+
+    self.assertEqual(read_mock.call_count, 1)
+    self.assertLen(self.clients_started, 3)
+
+  def testRulesAreRereadAfterTtl(self):
+    client_id = self.SetupClient(0, system="Windows")
+    self._WriteRule("11111111", [self._OsRule(os_linux=True)])
+
+    with test_lib.ConfigOverrider(
+        {"Foreman.rules_cache_ttl": rdfvalue.Duration.From(1, rdfvalue.MINUTES)}):
+      with utils.Stubber(hunt, "StartHuntFlowOnClient",
+                         self.StartHuntFlowOnClient):
+        self.clients_started = []
+        foreman_obj = foreman.Foreman()
+        with test_lib.FakeTime(rdfvalue.RDFDatetime.Now()):
+          foreman_obj.AssignTasksToClient(client_id)
+          self.assertEmpty(self.clients_started)
+
+          self._WriteRule("22222222", [self._OsRule(os_windows=True)])
+          # The new rule is not visible before the cache expires.
+          foreman_obj.AssignTasksToClient(client_id)
+          self.assertEmpty(self.clients_started)
+
+        with test_lib.FakeTime(rdfvalue.RDFDatetime.Now() +
+                               rdfvalue.Duration.From(2, rdfvalue.MINUTES)):
+          foreman_obj.AssignTasksToClient(client_id)
+          self.assertEqual(self.clients_started, [("22222222", client_id)])
+
+  def testClientIsRejectedByLabelsWithoutReadingFullInfo(self):
+    client_id = self.SetupClient(0)
+    data_store.REL_DB.AddClientLabels(client_id, "GRR", ["bar"])
+    self._WriteRule("11111111", [self._LabelRule("foo")])
+    self._WriteRule("22222222", [self._LabelRule("foo"), self._OsRule()])
+
+    with utils.Stubber(hunt, "StartHuntFlowOnClient",
+                       self.StartHuntFlowOnClient):
+      with mock.patch.object(data_store.REL_DB,
+                             "ReadClientFullInfo") as read_mock:
+        with self.assertStatsCounterDelta(
+            1, foreman.FOREMAN_CLIENTS_REJECTED_BY_INDEX):
+          self.clients_started = []
+          foreman.Foreman().AssignTasksToClient(client_id)
+
+    self.assertFalse(read_mock.called)
+    self.assertEmpty(self.clients_started)
+
+  def testClientIsMatchedByLabels(self):
+    client_id = self.SetupClient(0)
+    data_store.REL_DB.AddClientLabels(client_id, "GRR", ["foo"])
+    self._WriteRule("11111111", [self._LabelRule("foo")])
+    self._WriteRule("22222222", [self._LabelRule("bar")])
+
+    with utils.Stubber(hunt, "StartHuntFlowOnClient",
+                       self.StartHuntFlowOnClient):
+      self.clients_started = []
+      foreman.Foreman().AssignTasksToClient(client_id)
+
+    self.assertEqual(self.clients_started, [("11111111", client_id)])
+
+  def testMatchAnyRuleSetIsNotPrefilteredByOs(self):
+    client_id = self.SetupClient(0, system="Linux")
+    data_store.REL_DB.AddClientLabels(client_id, "GRR", ["foo"])
+    self._WriteRule(
+        "11111111", [self._OsRule(os_windows=True),
+                     self._LabelRule("foo")],
+        match_mode=foreman_rules.ForemanClientRuleSet.MatchMode.MATCH_ANY)
+
+    with utils.Stubber(hunt, "StartHuntFlowOnClient",
+                       self.StartHuntFlowOnClient):
+      self.clients_started = []
+      foreman.Foreman().AssignTasksToClient(client_id)
+
+    self.assertEqual(self.clients_started, [("11111111", client_id)])
+
+  def StartHuntFlowOnClients(self, client_ids, hunt_id):
+    for client_id in client_ids:
+      self.clients_started.append((hunt_id, client_id))
+    return client_ids, []
+
+  def testAssignTasksToClientsEvaluatesAllRules(self):
+    client_ids = [
+        self.SetupClient(1, system="Windows XP"),
+        self.SetupClient(2, system="Linux"),
+        self.SetupClient(3, system="Windows 7"),
+    ]
+    data_store.REL_DB.AddClientLabels(client_ids[1], "GRR", ["foo"])
+    self._WriteRule("11111111", [self._OsRule(os_windows=True)])
+    self._WriteRule("22222222", [self._LabelRule("foo")])
+
+    with utils.Stubber(hunt, "StartHuntFlowOnClients",
+                       self.StartHuntFlowOnClients):
+      self.clients_started = []
+      foreman_obj = foreman.Foreman()
+      self.assertEqual(foreman_obj.AssignTasksToClients(client_ids), 3)
+      self.assertCountEqual(self.clients_started, [
+          ("11111111", client_ids[0]),
+          ("11111111", client_ids[2]),
+          ("22222222", client_ids[1]),
+      ])
+
+      # Run again - This should not fire since it did already.
+      self.clients_started = []
+      self.assertEqual(foreman_obj.AssignTasksToClients(client_ids), 0)
+      self.assertEmpty(self.clients_started)
+
+  def testAssignTasksToClientsUsesBatchedReads(self):
+    client_ids = self.SetupClients(5, system="Windows")
+    self._WriteRule("11111111", [self._OsRule(os_windows=True)])
+
+    with utils.Stubber(hunt, "StartHuntFlowOnClients",
+                       self.StartHuntFlowOnClients):
+      with mock.patch.object(
+          data_store.REL_DB,
+          "MultiReadClientFullInfo",
+          wraps=data_store.REL_DB.MultiReadClientFullInfo) as read_mock:
+        with mock.patch.object(data_store.REL_DB,
+                               "ReadClientFullInfo") as single_read_mock:
+          self.clients_started = []
+          foreman.Foreman().AssignTasksToClients(client_ids)
+
+    self.assertEqual(read_mock.call_count, 1)
+    self.assertFalse(single_read_mock.called)
+    self.assertCountEqual(self.clients_started,
+                          [("11111111", client_id) for client_id in client_ids])
+
+  def testAssignTasksToClientsUpdatesLastForemanTime(self):
+    client_ids = self.SetupClients(2)
+    self._WriteRule("11111111", [self._LabelRule("foo")])
+    rule = data_store.REL_DB.ReadAllForemanRules()[0]
+
+    with utils.Stubber(hunt, "StartHuntFlowOnClients",
+                       self.StartHuntFlowOnClients):
+      with self.assertStatsCounterDelta(
+          2, foreman.FOREMAN_CLIENTS_REJECTED_BY_INDEX):
+        foreman.Foreman().AssignTasksToClients(client_ids)
+
+    mds = data_store.REL_DB.MultiReadClientMetadata(client_ids)
+    for client_id in client_ids:
+      self.assertEqual(mds[client_id].last_foreman_time, rule.creation_time)
+
+  def testAssignTasksToClientsIgnoresUnknownClients(self):
+    client_id = self.SetupClient(0, system="Windows")
+    self._WriteRule("11111111", [self._OsRule(os_windows=True)])
+
+    with utils.Stubber(hunt, "StartHuntFlowOnClients",
+                       self.StartHuntFlowOnClients):
+      self.clients_started = []
+      foreman.Foreman().AssignTasksToClients([client_id, "C.1234567890123456"])
+
+    self.assertEqual(self.clients_started, [("11111111", client_id)])
+
+  def testForemanMessageHandlerProcessesClientsInBulk(self):
+    client_ids = self.SetupClients(2)
+    msgs = [
+        rdf_objects.MessageHandlerRequest(
+            client_id=client_id, handler_name="ForemanHandler")
+        for client_id in client_ids + client_ids
+    ]
+
+    with mock.patch.object(foreman.Foreman, "AssignTasksToClients") as bulk:
+      foreman.ForemanMessageHandler().ProcessMessages(msgs)
+
+    bulk.assert_called_once_with(client_ids)
+
+
+class ForemanRulesIndexTest(test_lib.GRRBaseTest):
+  """Tests for the compiled foreman rules index."""
+
+  def _MakeRule(self, hunt_id, client_rules, match_mode=None):
+    now = rdfvalue.RDFDatetime.Now()
+    rule_set = foreman_rules.ForemanClientRuleSet(rules=client_rules)
+    if match_mode is not None:
+      rule_set.match_mode = match_mode
+    return foreman_rules.ForemanCondition(
+        creation_time=now,
+        expiration_time=now + rdfvalue.Duration.From(1, rdfvalue.HOURS),
+        hunt_id=hunt_id,
+        client_rule_set=rule_set)
+
+  def _OsRule(self, **kwargs):
+    return foreman_rules.ForemanClientRule(
+        rule_type=foreman_rules.ForemanClientRule.Type.OS,
+        os=foreman_rules.ForemanOsClientRule(**kwargs))
+
+  def testRulesAreIndexedByOs(self):
+    index = foreman.ForemanRulesIndex([
+        self._MakeRule("W", [self._OsRule(os_windows=True)]),
+        self._MakeRule("LD", [self._OsRule(os_linux=True, os_darwin=True)]),
+        self._MakeRule("ANY", []),
+    ])
+
+    def HuntIds(os_name):
+      return sorted(r.hunt_id for r in index.GetRulesForOs(os_name))
+
+    self.assertEqual(HuntIds("Windows 7"), ["ANY", "W"])
+    self.assertEqual(HuntIds("Linux"), ["ANY", "LD"])
+    self.assertEqual(HuntIds("Darwin"), ["ANY", "LD"])
+    self.assertEqual(HuntIds("Plan9"), ["ANY"])
+    self.assertEqual(HuntIds(""), ["ANY"])
+
+  def testConflictingOsRulesMatchNothing(self):
+    index = foreman.ForemanRulesIndex([
+        self._MakeRule(
+            "X",
+            [self._OsRule(os_windows=True),
+             self._OsRule(os_linux=True)]),
+    ])
+
+    for os_name in ["Windows", "Linux", "Darwin", ""]:
+      self.assertEmpty(index.GetRulesForOs(os_name))
+
+  def testFingerprintChangesWithRules(self):
+    rule = self._MakeRule("W", [self._OsRule(os_windows=True)])
+    fingerprint = foreman.ForemanRulesIndex.Fingerprint([rule])
+    self.assertEqual(fingerprint,
+                     foreman.ForemanRulesIndex.Fingerprint([rule.Copy()]))
+
+    rule.creation_time += rdfvalue.Duration.From(1, rdfvalue.SECONDS)
+    self.assertNotEqual(fingerprint,
+                        foreman.ForemanRulesIndex.Fingerprint([rule]))
+
 
 def main(argv):
   # Run the full test suite
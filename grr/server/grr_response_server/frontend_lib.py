@@ -5,9 +5,13 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import unicode_literals
 
+from concurrent import futures
 import logging
+import multiprocessing
+import threading
 import time
 
+from grr_response_core import config
 from grr_response_core.lib import queues
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib.rdfvalues import client as rdf_client
@@ -47,16 +51,111 @@ FRONTEND_REQUEST_LATENCY = metrics.Event(
     "frontend_request_latency", fields=[("source", str)])
 GRR_FRONTENDSERVER_HANDLE_TIME = metrics.Event("grr_frontendserver_handle_time")
 GRR_FRONTENDSERVER_HANDLE_NUM = metrics.Counter("grr_frontendserver_handle_num")
+GRR_FRONTENDSERVER_DECODE_QUEUE_DEPTH = metrics.Gauge(
+    "grr_frontendserver_decode_queue_depth", int)
+GRR_FRONTENDSERVER_DECODE_LATENCY = metrics.Event(
+    "grr_frontendserver_decode_latency")
 GRR_MESSAGES_SENT = metrics.Counter("grr_messages_sent")
 GRR_UNIQUE_CLIENTS = metrics.Counter("grr_unique_clients")
 
 
+def _GetDecoderProcessContext():
+  """Returns a multiprocessing context for decoder worker processes.
+
+  The frontend is multi-threaded and holds open datastore connections, so
+  worker processes must not be forked from it: a forked child could inherit
+  locks held by other threads at fork time.
+  """
+  if "forkserver" in multiprocessing.get_all_start_methods():
+    return multiprocessing.get_context("forkserver")
+  return multiprocessing.get_context("spawn")
+
+
+class MessageDecoderPool(object):
+  """Decodes message payloads in a pool of processes.
+
+  Decrypting, decompressing and parsing message bundles is CPU bound. Handing
+  this work to worker processes lets a single frontend make use of all cores
+  of the machine. The workers parse the PackedMessageList and the MessageList
+  and return the serialized GrrMessages, which are parsed on the calling
+  thread. That is only cheap with lazy struct decoding or the protobuf backend
+  enabled, otherwise the pool mostly adds IPC overhead.
+
+  Everything that needs the server private key or the datastore (cipher
+  negotiation, signature and replay checks) stays on the calling thread.
+  """
+
+  def __init__(self, num_processes):
+    self._executor = futures.ProcessPoolExecutor(
+        max_workers=num_processes, mp_context=_GetDecoderProcessContext())
+    self._lock = threading.Lock()
+    self._queue_depth = 0
+
+  def _UpdateQueueDepth(self, delta):
+    with self._lock:
+      self._queue_depth += delta
+      GRR_FRONTENDSERVER_DECODE_QUEUE_DEPTH.SetValue(self._queue_depth)
+
+  def Decode(self, cipher_key, packet_iv, encrypted):
+    """Decodes a payload in one of the worker processes.
+
+    Args:
+      cipher_key: The symmetric session key (an rdf_crypto.EncryptionKey).
+      packet_iv: The per packet IV (an rdf_crypto.EncryptionKey).
+      encrypted: The encrypted, serialized PackedMessageList.
+
+    Returns:
+      A tuple (packed_message_list, message_list) of rdfvalues.
+
+    Raises:
+      communicator.DecryptionError: If the payload can not be decrypted.
+      communicator.DecodingError: If the payload can not be decompressed or
+        parsed.
+    """
+    start_time = time.time()
+    self._UpdateQueueDepth(1)
+    try:
+      future = self._executor.submit(communicator.DecodePayload,
+                                     cipher_key.RawBytes(),
+                                     packet_iv.RawBytes(), encrypted)
+      timestamp, source, messages = future.result()
+    finally:
+      self._UpdateQueueDepth(-1)
+      GRR_FRONTENDSERVER_DECODE_LATENCY.RecordEvent(time.time() - start_time)
+
+    return communicator.ParseDecodedPayload(timestamp, source, messages)
+
+  def Shutdown(self):
+    self._executor.shutdown(wait=True)
+
+
 class ServerCommunicator(communicator.Communicator):
   """A communicator which stores certificates using the relational db."""
 
-  def __init__(self, certificate, private_key):
-    super().__init__(certificate=certificate, private_key=private_key)
+  def __init__(self, certificate, private_key, decoder_pool=None):
+    """Creates a communicator.
+
+    Args:
+      certificate: Our own certificate.
+      private_key: Our own private key.
+      decoder_pool: An optional MessageDecoderPool. If given, payloads are
+        decrypted, decompressed and parsed in its worker processes.
+    """
+    super().__init__(
+        certificate=certificate,
+        private_key=private_key,
+        cipher_cache_size=config.CONFIG["Frontend.cipher_cache_size"],
+        cipher_cache_ttl=config.CONFIG["Frontend.cipher_cache_ttl"])
     self.common_name = self.certificate.GetCN()
+    self.decoder_pool = decoder_pool
+
+  def _DecodePayload(self, cipher, response_comms):
+    if self.decoder_pool is None:
+      return super()._DecodePayload(cipher, response_comms)
+
+    return self.decoder_pool.Decode(cipher.cipher.key,
+                                    response_comms.packet_iv,
+                                    response_comms.encrypted)
 
   def _GetRemotePublicKey(self, common_name):
     remote_client_id = common_name.Basename()
@@ -180,14 +279,22 @@ class FrontEndServer(object):
                private_key,
                max_queue_size=50,
                message_expiry_time=120,
-               max_retransmission_time=10):
+               max_retransmission_time=10,
+               decoder_processes=0):
     # Identify ourselves as the server.
     self.token = access_control.ACLToken(
         username="GRRFrontEnd", reason="Implied.")
     self.token.supervisor = True
 
+    if decoder_processes > 0:
+      self.decoder_pool = MessageDecoderPool(decoder_processes)
+    else:
+      self.decoder_pool = None
+
     self._communicator = ServerCommunicator(
-        certificate=certificate, private_key=private_key)
+        certificate=certificate,
+        private_key=private_key,
+        decoder_pool=self.decoder_pool)
 
     self.message_expiry_time = message_expiry_time
     self.max_retransmission_time = max_retransmission_time
@@ -198,6 +305,11 @@ class FrontEndServer(object):
     self.unauth_allowed_session_id = rdfvalue.SessionID(
         queue=queues.ENROLLMENT, flow_name="Enrol")
 
+  def Shutdown(self):
+    """Stops the decoder worker processes, if any."""
+    if self.decoder_pool is not None:
+      self.decoder_pool.Shutdown()
+
   @GRR_FRONTENDSERVER_HANDLE_NUM.Counted()
   @GRR_FRONTENDSERVER_HANDLE_TIME.Timed()
   def HandleMessageBundles(self, request_comms, response_comms):
@@ -394,6 +394,89 @@ class ClientCommsTest(stats_test_lib.StatsTestMixin,
     self.assertEqual(decoded_messages[0].auth_state,
                      rdf_flows.GrrMessage.AuthorizationState.DESYNCHRONIZED)
 
+  def _ServerEncode(self, num_messages=1):
+    message_list = rdf_flows.MessageList()
+    for i in range(num_messages):
+      message_list.job.Append(
+          session_id=rdfvalue.SessionID(
+              base="aff4:/flows", queue=queues.FLOWS, flow_name=i + 1),
+          name="OMG it's a string")
+
+    # The client expects the server to echo the nonce of its last request.
+    self.client_communicator.timestamp = 1000000
+
+    result = rdf_flows.ClientCommunication()
+    self.server_communicator.EncodeMessages(
+        message_list,
+        result,
+        destination=self.client_communicator.common_name,
+        timestamp=self.client_communicator.timestamp)
+    return result
+
+  def testServerCipherIsReusedForTheSameDestination(self):
+    self._MakeClientRecord()
+
+    with mock.patch.object(
+        self.server_communicator,
+        "_GetRemotePublicKey",
+        wraps=self.server_communicator._GetRemotePublicKey) as get_key_mock:
+      with self.assertStatsCounterDelta(
+          1, communicator.GRR_DESTINATION_CIPHER_CACHE, fields=["misses"]):
+        with self.assertStatsCounterDelta(
+            2, communicator.GRR_DESTINATION_CIPHER_CACHE, fields=["hits"]):
+          results = [self._ServerEncode(num_messages=i) for i in range(1, 4)]
+
+      self.assertEqual(get_key_mock.call_count, 1)
+
+    # The session key is shared, but every packet gets a fresh IV.
+    self.assertLen(set(r.encrypted_cipher for r in results), 1)
+    self.assertLen(set(r.packet_iv.SerializeToBytes() for r in results), 3)
+
+    # The client can still decode every one of the packets.
+    for i, result in enumerate(results):
+      messages, source, _ = self.client_communicator.DecodeMessages(result)
+      self.assertEqual(source, self.server_communicator.common_name)
+      self.assertLen(messages, i + 1)
+
+  def testServerCipherCacheExpires(self):
+    self._MakeClientRecord()
+
+    with test_lib.ConfigOverrider({"Frontend.cipher_cache_ttl": "10m"}):
+      self._SetupCommunicator()
+
+    now = rdfvalue.RDFDatetime.Now()
+    with test_lib.FakeTime(now):
+      first = self._ServerEncode()
+
+    with test_lib.FakeTime(now + rdfvalue.Duration.From(9, rdfvalue.MINUTES)):
+      second = self._ServerEncode()
+
+    with test_lib.FakeTime(now + rdfvalue.Duration.From(11, rdfvalue.MINUTES)):
+      third = self._ServerEncode()
+
+    self.assertEqual(first.encrypted_cipher, second.encrypted_cipher)
+    self.assertNotEqual(first.encrypted_cipher, third.encrypted_cipher)
+
+  def testReceivedCipherCacheExpires(self):
+    self._MakeClientRecord()
+
+    with test_lib.ConfigOverrider({"Frontend.cipher_cache_ttl": "10m"}):
+      self._SetupCommunicator()
+
+    now = rdfvalue.RDFDatetime.Now()
+    with test_lib.FakeTime(now):
+      self.ClientServerCommunicate()
+
+    with test_lib.FakeTime(now + rdfvalue.Duration.From(9, rdfvalue.MINUTES)):
+      with self.assertStatsCounterDelta(
+          1, communicator.GRR_ENCRYPTED_CIPHER_CACHE, fields=["hits"]):
+        self.server_communicator.DecryptMessage(self.cipher_text)
+
+    with test_lib.FakeTime(now + rdfvalue.Duration.From(11, rdfvalue.MINUTES)):
+      with self.assertStatsCounterDelta(
+          1, communicator.GRR_ENCRYPTED_CIPHER_CACHE, fields=["misses"]):
+        self.server_communicator.DecryptMessage(self.cipher_text)
+
   def testX509Verify(self):
     """X509 Verify can have several failure paths."""
 
@@ -515,6 +598,71 @@ class ClientCommsTest(stats_test_lib.StatsTestMixin,
     self.assertLen(list(self.ClientServerCommunicate()), 10)
 
 
+class ClientCommsWithDecoderPoolTest(ClientCommsTest):
+  """Runs the communicator tests with payloads decoded in worker processes."""
+
+  def setUp(self):
+    self.decoder_pool = frontend_lib.MessageDecoderPool(2)
+    self.addCleanup(self.decoder_pool.Shutdown)
+    super(ClientCommsWithDecoderPoolTest, self).setUp()
+
+  def _SetupCommunicator(self):
+    self.server_communicator = frontend_lib.ServerCommunicator(
+        certificate=self.server_certificate,
+        private_key=self.server_private_key,
+        decoder_pool=self.decoder_pool)
+
+  def testPayloadIsDecodedInPool(self):
+    self._MakeClientRecord()
+
+    latency = frontend_lib.GRR_FRONTENDSERVER_DECODE_LATENCY
+    count_before = latency.GetValue().count
+    with mock.patch.object(
+        rdf_flows.PackedMessageList,
+        "FromSerializedBytes",
+        wraps=rdf_flows.PackedMessageList.FromSerializedBytes) as packed_mock:
+      with mock.patch.object(
+          rdf_flows.MessageList,
+          "FromSerializedBytes",
+          wraps=rdf_flows.MessageList.FromSerializedBytes) as list_mock:
+        self.ClientServerCommunicate()
+
+    # The message bundle was decompressed and parsed in a worker process, not
+    # in this one.
+    packed_mock.assert_not_called()
+    list_mock.assert_not_called()
+    self.assertEqual(latency.GetValue().count, count_before + 1)
+    self.assertEqual(
+        frontend_lib.GRR_FRONTENDSERVER_DECODE_QUEUE_DEPTH.GetValue(), 0)
+
+  def testDecodingErrorsArePropagated(self):
+    self._MakeClientRecord()
+    self.ClientServerCommunicate()
+
+    response_comms = rdf_flows.ClientCommunication.FromSerializedBytes(
+        self.cipher_text)
+    response_comms.encrypted = b"corrupted" * 16
+    with self.assertRaises(communicator.DecodingError):
+      self.server_communicator.DecodeMessages(response_comms)
+
+  def testWorkerProcessesAreNotForked(self):
+    # pylint: disable=protected-access
+    start_method = frontend_lib._GetDecoderProcessContext().get_start_method()
+    # pylint: enable=protected-access
+    self.assertIn(start_method, ["forkserver", "spawn"])
+
+  def testFrontEndServerShutsDownDecoderPool(self):
+    with mock.patch.object(frontend_lib.MessageDecoderPool,
+                           "Shutdown") as shutdown_mock:
+      server = frontend_lib.FrontEndServer(
+          certificate=config.CONFIG["Frontend.certificate"],
+          private_key=config.CONFIG["PrivateKeys.server_key"],
+          decoder_processes=1)
+      server.Shutdown()
+
+    shutdown_mock.assert_called_once()
+
+
 class HTTPClientTests(client_action_test_lib.WithAllClientActionsMixin,
                       test_lib.GRRBaseTest):
   """Test the http communicator."""
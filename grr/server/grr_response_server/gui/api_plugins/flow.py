@@ -447,6 +447,9 @@ class ApiListFlowResultsHandler(api_call_handler_base.ApiCallHandler):
   result_type = ApiListFlowResultsResult
 
   def Handle(self, args, context=None):
+    if args.HasField("page_token"):
+      return self._HandlePage(args)
+
     results = data_store.REL_DB.ReadFlowResults(
         str(args.client_id),
         str(args.flow_id),
@@ -461,6 +464,27 @@ class ApiListFlowResultsHandler(api_call_handler_base.ApiCallHandler):
     return ApiListFlowResultsResult(
         items=wrapped_items, total_count=total_count)
 
+  def _HandlePage(self, args):
+    """Reads a page of results following the page token in the args."""
+    results, next_page_token = data_store.REL_DB.ReadFlowResultsPage(
+        str(args.client_id),
+        str(args.flow_id),
+        args.count or db.MAX_COUNT,
+        page_token=args.page_token or None,
+        with_substring=args.filter or None,
+        with_tag=args.with_tag or None)
+
+    result = ApiListFlowResultsResult(
+        items=[ApiFlowResult().InitFromFlowResult(r) for r in results])
+    # Counting all results is as expensive as reading them, so the total count
+    # is only returned with the first page.
+    if not args.page_token:
+      result.total_count = data_store.REL_DB.CountFlowResults(
+          str(args.client_id), str(args.flow_id))
+    if next_page_token is not None:
+      result.next_page_token = next_page_token
+    return result
+
 
 class ApiListParsedFlowResultsArgs(rdf_structs.RDFProtoStruct):
   """An RDF wrapper for the arguments of the method for parsing flow results."""
@@ -1238,23 +1262,14 @@ class ApiGetExportedFlowResultsHandler(api_call_handler_base.ApiCallHandler):
 
     def FetchFn(type_name):
       """Fetches all flow results of a given type."""
-      offset = 0
-      while True:
-        results = data_store.REL_DB.ReadFlowResults(
-            client_id,
-            flow_id,
-            offset=offset,
-            count=self._RESULTS_PAGE_SIZE,
-            with_type=type_name)
-        if not results:
-          break
-
-        for r in results:
-          msg = r.AsLegacyGrrMessage()
-          msg.source = client_id
-          yield msg
-
-        offset += self._RESULTS_PAGE_SIZE
+      for r in data_store.REL_DB.IterateFlowResults(
+          client_id,
+          flow_id,
+          with_type=type_name,
+          batch_size=self._RESULTS_PAGE_SIZE):
+        msg = r.AsLegacyGrrMessage()
+        msg.source = client_id
+        yield msg
 
     content_generator = instant_output_plugin.ApplyPluginToTypedCollection(
         plugin, types, FetchFn)
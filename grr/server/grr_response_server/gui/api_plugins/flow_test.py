@@ -407,6 +407,37 @@ class ApiListFlowResultsHandlerTest(test_lib.GRRBaseTest):
             with_tag="non-existing"))
     self.assertEmpty(result.items)
 
+  def testPagesThroughResultsWithPageTokens(self):
+    result = self.handler.Handle(
+        flow_plugin.ApiListFlowResultsArgs(
+            client_id=self.client_id,
+            flow_id=self.flow_id,
+            count=1,
+            page_token=""))
+    self.assertLen(result.items, 1)
+    self.assertEqual(result.items[0].tag, "tag:foo")
+    self.assertEqual(result.total_count, 2)
+    self.assertTrue(result.next_page_token)
+
+    result = self.handler.Handle(
+        flow_plugin.ApiListFlowResultsArgs(
+            client_id=self.client_id,
+            flow_id=self.flow_id,
+            count=1,
+            page_token=result.next_page_token))
+    self.assertLen(result.items, 1)
+    self.assertEqual(result.items[0].tag, "tag:bar")
+    self.assertFalse(result.HasField("total_count"))
+
+    result = self.handler.Handle(
+        flow_plugin.ApiListFlowResultsArgs(
+            client_id=self.client_id,
+            flow_id=self.flow_id,
+            count=1,
+            page_token=result.next_page_token))
+    self.assertEmpty(result.items)
+    self.assertFalse(result.HasField("next_page_token"))
+
 
 class ApiListParsedFlowResultsHandlerTest(absltest.TestCase):
 
@@ -521,6 +521,9 @@ class ApiListHuntResultsHandler(api_call_handler_base.ApiCallHandler):
   result_type = ApiListHuntResultsResult
 
   def Handle(self, args, context=None):
+    if args.HasField("page_token"):
+      return self._HandlePage(args)
+
     results = data_store.REL_DB.ReadHuntResults(
         str(args.hunt_id),
         args.offset,
@@ -533,6 +536,24 @@ class ApiListHuntResultsHandler(api_call_handler_base.ApiCallHandler):
         items=[ApiHuntResult().InitFromFlowResult(r) for r in results],
         total_count=total_count)
 
+  def _HandlePage(self, args):
+    """Reads a page of results following the page token in the args."""
+    results, next_page_token = data_store.REL_DB.ReadHuntResultsPage(
+        str(args.hunt_id),
+        args.count or db.MAX_COUNT,
+        page_token=args.page_token or None,
+        with_substring=args.filter or None)
+
+    result = ApiListHuntResultsResult(
+        items=[ApiHuntResult().InitFromFlowResult(r) for r in results])
+    # Counting all results is as expensive as reading them, so the total count
+    # is only returned with the first page.
+    if not args.page_token:
+      result.total_count = data_store.REL_DB.CountHuntResults(str(args.hunt_id))
+    if next_page_token is not None:
+      result.next_page_token = next_page_token
+    return result
+
 
 class ApiListHuntCrashesArgs(rdf_structs.RDFProtoStruct):
   protobuf = hunt_pb2.ApiListHuntCrashesArgs
@@ -1441,23 +1462,11 @@ class ApiGetExportedHuntResultsHandler(api_call_handler_base.ApiCallHandler):
 
     def FetchFn(type_name):
       """Fetches all hunt results of a given type."""
-      offset = 0
-      while True:
-        results = data_store.REL_DB.ReadHuntResults(
-            hunt_id,
-            offset=offset,
-            count=self._RESULTS_PAGE_SIZE,
-            with_type=type_name)
-
-        if not results:
-          break
-
-        for r in results:
-          msg = r.AsLegacyGrrMessage()
-          msg.source_urn = source_urn
-          yield msg
-
-        offset += self._RESULTS_PAGE_SIZE
+      for r in data_store.REL_DB.IterateHuntResults(
+          hunt_id, with_type=type_name, batch_size=self._RESULTS_PAGE_SIZE):
+        msg = r.AsLegacyGrrMessage()
+        msg.source_urn = source_urn
+        yield msg
 
     content_generator = instant_output_plugin.ApplyPluginToTypedCollection(
         plugin, types, FetchFn)
@@ -8,6 +8,7 @@ from __future__ import unicode_literals
 import itertools
 import os
 import re
+import threading
 import zipfile
 
 
@@ -21,6 +22,7 @@ from grr_response_core.lib.rdfvalues import structs as rdf_structs
 from grr_response_core.lib.util import compatibility
 from grr_response_core.lib.util import context as context_lib
 from grr_response_core.lib.util.compat import csv
+from grr_response_core.stats import metrics
 from grr_response_proto.api import vfs_pb2
 from grr_response_server import data_store
 from grr_response_server import data_store_utils
@@ -38,6 +40,9 @@ from grr_response_server.rdfvalues import objects as rdf_objects
 # Files can only be accessed if their first path component is from this list.
 _ROOT_FILES_ALLOWLIST = ["fs", "registry", "temp"]
 
+VFS_LISTING_CACHE_HITS = metrics.Counter("vfs_listing_cache_hits")
+VFS_LISTING_CACHE_MISSES = metrics.Counter("vfs_listing_cache_misses")
+
 
 def ValidateVfsPath(path):
   """Validates a VFS path."""
@@ -433,32 +438,76 @@ class ApiListFilesHandler(api_call_handler_base.ApiCallHandler):
 
     path_type, components = rdf_objects.ParseCategorizedPath(args.file_path)
 
+    items = self._GetChildren(args.client_id.ToString(), path_type, components,
+                              args.timestamp)
+
+    if args.directories_only:
+      items = [item for item in items if item.is_directory]
+
+    # TODO(hanuszczak): Instead of getting the whole list from the database and
+    # then filtering the results we should do the filtering directly in the
+    # database query.
+    if args.filter:
+      pattern = re.compile(args.filter, re.IGNORECASE)
+      is_matching = lambda item: pattern.search(item.name)
+      items = list(filter(is_matching, items))
+
+    if args.count:
+      items = items[args.offset:args.offset + args.count]
+    else:
+      items = items[args.offset:]
+
+    # Cached items are shared between requests and must not be modified.
+    return ApiListFilesResult(items=[item.Copy() for item in items])
+
+  def _GetChildren(self, client_id, path_type, components, timestamp):
+    """Returns children of a given path sorted by path, using the cache."""
+    cache = _GetListingCache()
+    if cache is None:
+      return self._ListChildren(client_id, path_type, components, timestamp)
+
+    # Any write of the client's path infos changes the version, so a cached
+    # listing is valid as long as the version it was computed for is current.
+    version = data_store.REL_DB.ReadPathInfosVersion(client_id)
+    key = (client_id, path_type, tuple(components), timestamp)
+    try:
+      cached_version, items = cache.Get(key)
+    except KeyError:
+      cached_version, items = None, None
+
+    if cached_version == version:
+      VFS_LISTING_CACHE_HITS.Increment()
+      return items
+
+    VFS_LISTING_CACHE_MISSES.Increment()
+    items = self._ListChildren(client_id, path_type, components, timestamp)
+    cache.Put(key, (version, items))
+    return items
+
+  def _ListChildren(self, client_id, path_type, components, timestamp):
+    """Reads children of a given path from the database, sorted by path."""
     child_path_infos = data_store.REL_DB.ListChildPathInfos(
-        client_id=args.client_id.ToString(),
+        client_id=client_id,
         path_type=path_type,
         components=components,
-        timestamp=args.timestamp)
+        timestamp=timestamp)
+
+    if path_type == rdf_objects.PathInfo.PathType.OS:
+      prefix = "fs/os/"
+    elif path_type == rdf_objects.PathInfo.PathType.TSK:
+      prefix = "fs/tsk/"
+    elif path_type == rdf_objects.PathInfo.PathType.NTFS:
+      prefix = "fs/ntfs/"
+    elif path_type == rdf_objects.PathInfo.PathType.REGISTRY:
+      prefix = "registry/"
+    elif path_type == rdf_objects.PathInfo.PathType.TEMP:
+      prefix = "temp/"
 
     items = []
 
     for child_path_info in child_path_infos:
-      if args.directories_only and not child_path_info.directory:
-        continue
-
       child_item = ApiFile()
       child_item.name = child_path_info.basename
-
-      if path_type == rdf_objects.PathInfo.PathType.OS:
-        prefix = "fs/os/"
-      elif path_type == rdf_objects.PathInfo.PathType.TSK:
-        prefix = "fs/tsk/"
-      elif path_type == rdf_objects.PathInfo.PathType.NTFS:
-        prefix = "fs/ntfs/"
-      elif path_type == rdf_objects.PathInfo.PathType.REGISTRY:
-        prefix = "registry/"
-      elif path_type == rdf_objects.PathInfo.PathType.TEMP:
-        prefix = "temp/"
-
       child_item.path = prefix + "/".join(child_path_info.components)
 
       # TODO(hanuszczak): `PathInfo#directory` tells us whether given path has
@@ -475,22 +524,64 @@ class ApiListFilesHandler(api_call_handler_base.ApiCallHandler):
 
       items.append(child_item)
 
-    # TODO(hanuszczak): Instead of getting the whole list from the database and
-    # then filtering the results we should do the filtering directly in the
-    # database query.
-    if args.filter:
-      pattern = re.compile(args.filter, re.IGNORECASE)
-      is_matching = lambda item: pattern.search(item.name)
-      items = list(filter(is_matching, items))
-
     items.sort(key=lambda item: item.path)
+    return items
 
-    if args.count:
-      items = items[args.offset:args.offset + args.count]
-    else:
-      items = items[args.offset:]
 
-    return ApiListFilesResult(items=items)
+class _ListingCache(utils.FastStore):
+  """A cache of directory listings bounded by the total number of files.
+
+  Cached values are (version, items) tuples. Bounding the number of listings
+  would not bound memory use, since a single listing can hold many thousands of
+  files. Listings with more files than the whole cache can hold are not cached.
+  """
+
+  def __init__(self, max_items):
+    super().__init__(max_size=max_items)
+    self._num_items = 0
+
+  @utils.Synchronized
+  def KillObject(self, obj):
+    _, items = obj
+    self._num_items -= len(items)
+
+  @utils.Synchronized
+  def Expire(self):
+    while self._num_items > self._limit:
+      node = self._age.PopLeft()
+      self._hash.pop(node.key, None)
+      self.KillObject(node.data)
+
+  @utils.Synchronized
+  def Pop(self, key):
+    obj = super().Pop(key)
+    if obj is not None:
+      self.KillObject(obj)
+    return obj
+
+  @utils.Synchronized
+  def Put(self, key, obj):
+    self.Pop(key)
+    _, items = obj
+    self._num_items += len(items)
+    return super().Put(key, obj)
+
+
+_listing_cache = None
+_listing_cache_lock = threading.Lock()
+
+
+def _GetListingCache():
+  """Returns the directory listing cache or None if caching is disabled."""
+  global _listing_cache
+
+  with _listing_cache_lock:
+    if _listing_cache is None:
+      max_items = config.CONFIG["AdminUI.vfs_listing_cache_max_items"]
+      if not max_items:
+        return None
+      _listing_cache = _ListingCache(max_items)
+    return _listing_cache
 
 
 class ApiGetFileTextArgs(rdf_structs.RDFProtoStruct):
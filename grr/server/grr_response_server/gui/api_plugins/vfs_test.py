@@ -259,6 +259,64 @@ class ApiListFilesHandlerTest(api_test_lib.ApiCallHandlerTest, VfsTestMixin):
     result = self.handler.Handle(args, context=self.context)
     self.assertEmpty(result.items)
 
+  def testHandlerServesRepeatedListingsFromCache(self):
+    fixture_test_lib.ClientFixture(self.client_id)
+    args = vfs_plugin.ApiListFilesArgs(
+        client_id=self.client_id, file_path=self.file_path)
+
+    with mock.patch.object(
+        data_store.REL_DB,
+        "ListChildPathInfos",
+        wraps=data_store.REL_DB.ListChildPathInfos) as list_mock:
+      first = self.handler.Handle(args, context=self.context)
+      second = self.handler.Handle(args, context=self.context)
+
+    self.assertEqual(list_mock.call_count, 1)
+    self.assertEqual(first, second)
+
+    # Paging and filtering is done on the cached listing.
+    args.offset = 1
+    args.count = 2
+    result = self.handler.Handle(args, context=self.context)
+    self.assertEqual(result.items, first.items[1:3])
+
+  def testHandlerCacheIsInvalidatedByPathInfoWrites(self):
+    fixture_test_lib.ClientFixture(self.client_id)
+    args = vfs_plugin.ApiListFilesArgs(
+        client_id=self.client_id, file_path=self.file_path)
+    result = self.handler.Handle(args, context=self.context)
+    self.assertLen(result.items, 4)
+
+    data_store.REL_DB.WritePathInfos(
+        self.client_id,
+        [rdf_objects.PathInfo.OS(components=["etc", "new_file"])])
+
+    result = self.handler.Handle(args, context=self.context)
+    self.assertLen(result.items, 5)
+    self.assertIn("fs/os/etc/new_file", [item.path for item in result.items])
+
+  def testListingCacheIsBoundedByNumberOfFiles(self):
+    cache = vfs_plugin._ListingCache(max_items=5)
+
+    cache.Put("a", (1, ["x", "y"]))
+    cache.Put("b", (1, ["x", "y"]))
+    cache.Put("c", (1, ["x", "y"]))
+    self.assertNotIn("a", cache)
+    self.assertIn("b", cache)
+    self.assertIn("c", cache)
+
+    # Replacing a listing releases the files of the old one.
+    cache.Put("c", (2, ["x"]))
+    cache.Put("d", (1, ["x", "y"]))
+    self.assertIn("b", cache)
+    self.assertEqual(cache.Get("c"), (2, ["x"]))
+    self.assertIn("d", cache)
+
+    # Listings larger than the whole cache are not kept.
+    cache.Put("e", (1, ["x"] * 6))
+    self.assertNotIn("e", cache)
+    self.assertEmpty(cache)
+
   def testRoot(self):
     args = vfs_plugin.ApiListFilesArgs(client_id=self.client_id, file_path="/")
     result = self.handler.Handle(args, context=self.context)
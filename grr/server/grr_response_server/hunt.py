@@ -5,6 +5,8 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import unicode_literals
 
+import logging
+
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib import registry
 from grr_response_core.lib.util import cache
@@ -369,11 +371,13 @@ def StartHuntFlowOnClient(client_id, hunt_id):
 
   hunt_obj = data_store.REL_DB.ReadHuntObject(hunt_id)
   hunt_obj = CompleteHuntIfExpirationTimeReached(hunt_obj)
-  # There may be a little race between foreman rules being removed and
-  # foreman scheduling a client on an (already) paused hunt. Making sure
-  # we don't lose clients in such a race by accepting clients for paused
-  # hunts.
-  if not rdf_hunt_objects.IsHuntSuitableForFlowProcessing(hunt_obj.hunt_state):
+  # Foreman rules are cached by frontends (see `Foreman.rules_cache_ttl`), so
+  # a rule of a hunt that was paused (e.g. because it reached its client
+  # limit) or stopped may still match clients for a while after the rule was
+  # removed. New clients are therefore only accepted by started hunts. Clients
+  # rejected this way are offered the hunt again when it's restarted, since
+  # restarting writes a new foreman rule.
+  if hunt_obj.hunt_state != hunt_obj.HuntState.STARTED:
     return
 
   if hunt_obj.args.hunt_type == hunt_obj.args.HuntType.STANDARD:
@@ -422,3 +426,105 @@ def StartHuntFlowOnClient(client_id, hunt_id):
   else:
     raise UnknownHuntTypeError("Can't determine hunt type when starting "
                                "hunt %s on client %s." % (client_id, hunt_id))
+
+
+def StartHuntFlowOnClients(client_ids, hunt_id):
+  """Starts flows corresponding to a given hunt on a batch of clients.
+
+  This is a bulk version of StartHuntFlowOnClient: the hunt object is read
+  and checked once for the whole batch. If the hunt has a client limit, the
+  batch is truncated so that the limit is not exceeded. Clients that already
+  have a flow with the hunt's id are skipped and errors on individual clients
+  are logged, so that they don't prevent the hunt from being started on the
+  rest of the batch.
+
+  Args:
+    client_ids: A list of client ids to start the hunt on.
+    hunt_id: An id of the hunt to start.
+
+  Returns:
+    A tuple (started_client_ids, truncated_client_ids): client ids on which
+    the hunt flow was started and client ids that were not considered because
+    the hunt reached its client limit.
+  """
+  if not client_ids:
+    return [], []
+
+  hunt_obj = data_store.REL_DB.ReadHuntObject(hunt_id)
+  hunt_obj = CompleteHuntIfExpirationTimeReached(hunt_obj)
+  # See the comment in StartHuntFlowOnClient.
+  if hunt_obj.hunt_state != hunt_obj.HuntState.STARTED:
+    return [], []
+
+  if hunt_obj.args.hunt_type == hunt_obj.args.HuntType.VARIABLE:
+    raise NotImplementedError()
+  elif hunt_obj.args.hunt_type != hunt_obj.args.HuntType.STANDARD:
+    raise UnknownHuntTypeError("Can't determine hunt type when starting "
+                               "hunt %s on clients %s." % (hunt_id, client_ids))
+
+  hunt_args = hunt_obj.args.standard
+  flow_cls = registry.FlowRegistry.FlowClassByName(hunt_args.flow_name)
+  flow_args = hunt_args.flow_args if hunt_args.HasField("flow_args") else None
+
+  truncated_client_ids = []
+  if hunt_obj.client_limit:
+    # Unlike in StartHuntFlowOnClient, a whole batch of clients could overshoot
+    # the limit, so we check the exact number of hunt's clients here.
+    num_clients = data_store.REL_DB.CountHuntFlows(hunt_id)
+    num_clients_left = max(0, hunt_obj.client_limit - num_clients)
+    truncated_client_ids = client_ids[num_clients_left:]
+    client_ids = client_ids[:num_clients_left]
+  else:
+    num_clients = None
+
+  if hunt_obj.client_rate > 0:
+    if num_clients is None:
+      num_clients = _GetNumClients(hunt_obj.hunt_id)
+    num_clients_diff = max(0, num_clients - hunt_obj.num_clients_at_start_time)
+
+  started_client_ids = []
+  for client_id in client_ids:
+    if hunt_obj.client_rate > 0:
+      next_client_due_msecs = int(
+          (num_clients_diff + len(started_client_ids)) / hunt_obj.client_rate *
+          60e6)
+      start_at = rdfvalue.RDFDatetime.FromMicrosecondsSinceEpoch(
+          hunt_obj.last_start_time.AsMicrosecondsSinceEpoch() +
+          next_client_due_msecs)
+    else:
+      start_at = None
+
+    try:
+      flow.StartFlow(
+          client_id=client_id,
+          creator=hunt_obj.creator,
+          cpu_limit=hunt_obj.per_client_cpu_limit,
+          network_bytes_limit=hunt_obj.per_client_network_bytes_limit,
+          flow_cls=flow_cls,
+          flow_args=flow_args,
+          start_at=start_at,
+          parent_hunt_id=hunt_id)
+    except flow.CanNotStartFlowWithExistingIdError:
+      logging.info("Ignoring hunt %s on client %s: was started here before",
+                   hunt_id, client_id)
+      continue
+    # There could be all kinds of errors we don't know about when starting the
+    # hunt so we catch everything here.
+    except Exception as e:  # pylint: disable=broad-except
+      logging.exception("Failure starting hunt %s on client %s: %s", hunt_id,
+                        client_id, e)
+      continue
+
+    started_client_ids.append(client_id)
+
+  # Flows started concurrently by other frontends are not accounted for here,
+  # just like in StartHuntFlowOnClient, where the number of hunt's clients is
+  # cached.
+  if hunt_obj.client_limit:
+    if num_clients + len(started_client_ids) >= hunt_obj.client_limit:
+      try:
+        PauseHunt(hunt_id)
+      except OnlyStartedHuntCanBePausedError:
+        pass
+
+  return started_client_ids, truncated_client_ids
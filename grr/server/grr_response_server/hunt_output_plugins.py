@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+# Lint as: python3
+"""Queued processing of hunt results with hunt output plugins.
+
+Instead of running hunt output plugins while a hunt flow is processed, its
+replies can be written to the hunt output plugin requests queue. Workers lease
+them in batches with their own handler loop and thread pool, process results of
+many flows of the same hunt with a single output plugin flush and retry failed
+output plugins with exponential backoff.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+import logging
+import time
+
+from grr_response_core import config
+from grr_response_core.lib import rdfvalue
+from grr_response_core.lib.util import collection
+from grr_response_core.stats import metrics
+from grr_response_server import access_control
+from grr_response_server import data_store
+from grr_response_server.databases import db
+from grr_response_server.rdfvalues import flow_objects as rdf_flow_objects
+
+HUNT_OUTPUT_PLUGIN_ERRORS = metrics.Counter(
+    "hunt_output_plugin_errors", fields=[("plugin", str)])
+HUNT_RESULTS_RAN_THROUGH_PLUGIN = metrics.Counter(
+    "hunt_results_ran_through_plugin", fields=[("plugin", str)])
+HUNT_OUTPUT_PLUGIN_LAG = metrics.Event(
+    "hunt_output_plugin_lag",
+    fields=[("plugin", str)],
+    bins=[1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, 7200, 21600])
+HUNT_OUTPUT_PLUGIN_FLUSH_LATENCY = metrics.Event(
+    "hunt_output_plugin_flush_latency",
+    fields=[("plugin", str)],
+    bins=[0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50])
+HUNT_OUTPUT_PLUGIN_RETRIES = metrics.Counter(
+    "hunt_output_plugin_retries", fields=[("plugin", str)])
+HUNT_OUTPUT_PLUGIN_DROPPED_RESULTS = metrics.Counter(
+    "hunt_output_plugin_dropped_results", fields=[("plugin", str)])
+HUNT_OUTPUT_PLUGIN_REQUEST_ERRORS = metrics.Counter(
+    "hunt_output_plugin_request_errors")
+
+# Results of a flow are split into requests of at most this many bytes, so
+# that every request fits into a single database row.
+MAX_REQUEST_SIZE = 4 << 20
+
+
+def IsQueueingEnabled():
+  """Returns True if hunt results are processed from the queue."""
+  return config.CONFIG["Hunt.queue_output_plugin_results"]
+
+
+def _SplitResults(results):
+  """Splits results into lists of at most MAX_REQUEST_SIZE bytes."""
+  batches = [[]]
+  batch_size = 0
+  for result in results:
+    result_size = len(result.SerializeToBytes())
+    if batches[-1] and batch_size + result_size > MAX_REQUEST_SIZE:
+      batches.append([])
+      batch_size = 0
+    batches[-1].append(result)
+    batch_size += result_size
+  return batches
+
+
+def QueueResults(hunt_id, client_id, flow_id, results):
+  """Queues results of a hunt flow for processing with output plugins.
+
+  Args:
+    hunt_id: An id of the hunt the results belong to.
+    client_id: An id of the client the results were collected on.
+    flow_id: An id of the flow that produced the results.
+    results: A list of `FlowResult` objects.
+  """
+  now = rdfvalue.RDFDatetime.Now()
+  requests = []
+  for batch in _SplitResults(results):
+    requests.append(
+        rdf_flow_objects.HuntOutputPluginRequest(
+            hunt_id=hunt_id,
+            client_id=client_id,
+            flow_id=flow_id,
+            results=batch,
+            timestamp=now))
+  data_store.REL_DB.WriteHuntOutputPluginRequests(requests)
+
+
+def ProcessRequests(requests):
+  """The callback for the hunt output plugin requests queue.
+
+  Requests are acknowledged once they are processed or once their retries are
+  queued. If that fails, they are processed again when their lease expires.
+
+  Args:
+    requests: A list of leased `HuntOutputPluginRequest` objects.
+  """
+  for hunt_id, hunt_requests in collection.Group(requests,
+                                                 lambda r: r.hunt_id).items():
+    try:
+      retries = _ProcessHuntRequests(hunt_id, hunt_requests)
+    except Exception as e:  # pylint: disable=broad-except
+      logging.exception("Failed to process %d output plugin requests of hunt "
+                        "%s: %s", len(hunt_requests), hunt_id, e)
+      HUNT_OUTPUT_PLUGIN_REQUEST_ERRORS.Increment()
+      retries = []
+      for request in hunt_requests:
+        retry = _MakeRetry(request, list(request.output_plugin_indices), [])
+        if retry is not None:
+          retries.append(retry)
+
+    now = rdfvalue.RDFDatetime.Now()
+    for request in hunt_requests:
+      if request.leased_until and request.leased_until < now:
+        logging.warning(
+            "Lease of output plugin request %d of hunt %s expired while it "
+            "was processed, it might have been processed twice.",
+            request.request_id, hunt_id)
+
+    data_store.REL_DB.WriteHuntOutputPluginRequests(retries)
+    data_store.REL_DB.AckHuntOutputPluginRequests(hunt_requests)
+
+
+def _ProcessHuntRequests(hunt_id, requests):
+  """Processes requests of a single hunt, returns requests to retry."""
+  try:
+    hunt_obj = data_store.REL_DB.ReadHuntObject(hunt_id)
+  except db.UnknownHuntError:
+    logging.warning("Dropping output plugin results of unknown hunt %s.",
+                    hunt_id)
+    return []
+
+  plugins_states = data_store.REL_DB.ReadHuntOutputPluginsStates(hunt_id)
+
+  # Indices of output plugins that failed to process each request.
+  failed_indices = [[] for _ in requests]
+  for index, state in enumerate(plugins_states):
+    positions = [
+        i for i, r in enumerate(requests)
+        if not r.output_plugin_indices or index in r.output_plugin_indices
+    ]
+    if not positions:
+      continue
+
+    if not _ProcessWithPlugin(hunt_obj, index, state,
+                              [requests[i] for i in positions]):
+      for i in positions:
+        failed_indices[i].append(index)
+
+  retries = []
+  for request, indices in zip(requests, failed_indices):
+    if indices:
+      plugin_names = [
+          plugins_states[i].plugin_descriptor.plugin_name for i in indices
+      ]
+      retry = _MakeRetry(request, indices, plugin_names)
+      if retry is not None:
+        retries.append(retry)
+  return retries
+
+
+def _ProcessWithPlugin(hunt_obj, index, state, requests):
+  """Processes requests with a single output plugin of a hunt.
+
+  Args:
+    hunt_obj: A `Hunt` object the requests belong to.
+    index: An index of the output plugin within the hunt.
+    state: An `OutputPluginState` of the output plugin.
+    requests: A list of `HuntOutputPluginRequest` objects.
+
+  Returns:
+    True if the plugin processed the results successfully, False otherwise.
+  """
+  plugin_descriptor = state.plugin_descriptor
+  plugin_name = plugin_descriptor.plugin_name
+  results = [result for request in requests for result in request.results]
+
+  start_time = time.time()
+  try:
+    plugin_cls = plugin_descriptor.GetPluginClass()
+    plugin = plugin_cls(
+        source_urn=rdfvalue.RDFURN("hunts").Add(hunt_obj.hunt_id),
+        args=plugin_descriptor.plugin_args,
+        token=access_control.ACLToken(username=hunt_obj.creator))
+
+    # TODO(user): refactor output plugins to use FlowResponse
+    # instead of GrrMessage.
+    plugin.ProcessResponses(state.plugin_state,
+                            [r.AsLegacyGrrMessage() for r in results])
+    plugin.Flush(state.plugin_state)
+  except Exception as e:  # pylint: disable=broad-except
+    logging.exception("Plugin %s failed to process %d replies of hunt %s.",
+                      plugin_descriptor, len(results), hunt_obj.hunt_id)
+    HUNT_OUTPUT_PLUGIN_ERRORS.Increment(fields=[plugin_name])
+    _WriteLogEntries(index, requests, error=e)
+    return False
+
+  HUNT_OUTPUT_PLUGIN_FLUSH_LATENCY.RecordEvent(
+      time.time() - start_time, fields=[plugin_name])
+
+  # The results are exported at this point. Retrying them because of a failure
+  # below would export them again, so such failures are only logged.
+  try:
+    # Only do the REL_DB call if the plugin state has actually changed.
+    s = state.plugin_state.Copy()
+    plugin.UpdateState(s)
+    if s != state.plugin_state:
+
+      def UpdateFn(plugin_state):
+        plugin.UpdateState(plugin_state)
+        return plugin_state
+
+      data_store.REL_DB.UpdateHuntOutputPluginState(hunt_obj.hunt_id, index,
+                                                    UpdateFn)
+  except Exception:  # pylint: disable=broad-except
+    logging.exception("Failed to update the state of plugin %s of hunt %s.",
+                      plugin_descriptor, hunt_obj.hunt_id)
+
+  _WriteLogEntries(index, requests)
+
+  HUNT_RESULTS_RAN_THROUGH_PLUGIN.Increment(len(results), fields=[plugin_name])
+  now = rdfvalue.RDFDatetime.Now()
+  for request in requests:
+    lag = now - request.timestamp
+    HUNT_OUTPUT_PLUGIN_LAG.RecordEvent(
+        lag.ToFractional(rdfvalue.SECONDS), fields=[plugin_name])
+
+  return True
+
+
+def _WriteLogEntries(index, requests, error=None):
+  """Writes an output plugin log entry for every processed flow."""
+  log_entry_type = rdf_flow_objects.FlowOutputPluginLogEntry.LogEntryType
+  entries = []
+  for request in requests:
+    entry = rdf_flow_objects.FlowOutputPluginLogEntry(
+        client_id=request.client_id,
+        flow_id=request.flow_id,
+        hunt_id=request.hunt_id,
+        output_plugin_id="%d" % index)
+    if error is None:
+      entry.log_entry_type = log_entry_type.LOG
+      entry.message = "Processed %d replies." % len(request.results)
+    else:
+      entry.log_entry_type = log_entry_type.ERROR
+      entry.message = "Error while processing %d replies: %s" % (len(
+          request.results), str(error))
+    entries.append(entry)
+
+  # Log entries are informational, failing to write them must not cause the
+  # results to be processed again.
+  try:
+    data_store.REL_DB.WriteFlowOutputPluginLogEntries(entries)
+  except Exception:  # pylint: disable=broad-except
+    logging.exception("Failed to write output plugin log entries.")
+
+
+def _MakeRetry(request, indices, plugin_names):
+  """Returns a delayed retry of a request or None if attempts ran out.
+
+  Args:
+    request: A `HuntOutputPluginRequest` that failed.
+    indices: Indices of the output plugins to retry. If empty, all output
+      plugins of the hunt are retried.
+    plugin_names: Names of the output plugins to retry, used for metrics.
+
+  Returns:
+    A `HuntOutputPluginRequest` to queue or None.
+  """
+  attempt = request.attempt + 1
+  if attempt >= config.CONFIG["Hunt.output_plugin_max_attempts"]:
+    logging.error(
+        "Dropping %d replies of flow %s on %s after %d failed attempts of "
+        "output plugins %s.", len(request.results), request.flow_id,
+        request.client_id, attempt, ", ".join(plugin_names) or "(all)")
+    for plugin_name in plugin_names:
+      HUNT_OUTPUT_PLUGIN_DROPPED_RESULTS.Increment(
+          len(request.results), fields=[plugin_name])
+    return None
+
+  for plugin_name in plugin_names:
+    HUNT_OUTPUT_PLUGIN_RETRIES.Increment(fields=[plugin_name])
+
+  retry = request.Copy()
+  retry.request_id = None
+  retry.leased_until = None
+  retry.leased_by = None
+  retry.output_plugin_indices = indices
+  retry.attempt = attempt
+  delay = config.CONFIG["Hunt.output_plugin_retry_delay"] * 2**(attempt - 1)
+  retry.delivery_time = rdfvalue.RDFDatetime.Now() + delay
+  return retry
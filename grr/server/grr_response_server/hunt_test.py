@@ -25,6 +25,7 @@ from grr_response_server import flow_base
 from grr_response_server import foreman
 from grr_response_server import foreman_rules
 from grr_response_server import hunt
+from grr_response_server import hunt_output_plugins
 from grr_response_server.flows.general import file_finder
 from grr_response_server.flows.general import processes
 from grr_response_server.flows.general import transfer
@@ -541,6 +542,148 @@ class HuntTest(stats_test_lib.StatsTestMixin,
             args=self.GetFileHuntArgs(),
             output_plugins=[plugin_descriptor])
 
+  def _ReadQueuedOutputPluginRequests(self):
+    return data_store.REL_DB.ReadHuntOutputPluginRequests()
+
+  def testQueuedOutputPluginResultsAreProcessedInBatches(self):
+    hunt_test_lib.DummyHuntOutputPlugin.num_calls = 0
+    hunt_test_lib.DummyHuntOutputPlugin.num_responses = 0
+
+    plugin_descriptor = rdf_output_plugin.OutputPluginDescriptor(
+        plugin_name="DummyHuntOutputPlugin")
+    with test_lib.ConfigOverrider({"Hunt.queue_output_plugin_results": True}):
+      hunt_id, _ = self._CreateAndRunHunt(
+          num_clients=5,
+          client_mock=hunt_test_lib.SampleHuntMock(failrate=-1),
+          client_rule_set=foreman_rules.ForemanClientRuleSet(),
+          client_rate=0,
+          args=self.GetFileHuntArgs(),
+          output_plugins=[plugin_descriptor])
+
+    # Results are not processed while the hunt flows are processed.
+    self.assertEqual(hunt_test_lib.DummyHuntOutputPlugin.num_calls, 0)
+    requests = self._ReadQueuedOutputPluginRequests()
+    self.assertLen(requests, 5)
+
+    with self.assertStatsCounterDelta(
+        5,
+        hunt_output_plugins.HUNT_RESULTS_RAN_THROUGH_PLUGIN,
+        fields=["DummyHuntOutputPlugin"]):
+      hunt_output_plugins.ProcessRequests(requests)
+
+    # Results of all flows are processed with a single plugin run.
+    self.assertEqual(hunt_test_lib.DummyHuntOutputPlugin.num_calls, 1)
+    self.assertEqual(hunt_test_lib.DummyHuntOutputPlugin.num_responses, 5)
+    self.assertEmpty(self._ReadQueuedOutputPluginRequests())
+
+    logs = data_store.REL_DB.ReadHuntOutputPluginLogEntries(
+        hunt_id,
+        output_plugin_id="0",
+        offset=0,
+        count=sys.maxsize,
+        with_type=rdf_flow_objects.FlowOutputPluginLogEntry.LogEntryType.LOG)
+    self.assertLen(logs, 5)
+
+  def testQueuedOutputPluginFailuresAreRetriedWithBackoff(self):
+    hunt_test_lib.DummyHuntOutputPlugin.num_calls = 0
+
+    failing_plugin_descriptor = rdf_output_plugin.OutputPluginDescriptor(
+        plugin_name="FailingDummyHuntOutputPlugin")
+    plugin_descriptor = rdf_output_plugin.OutputPluginDescriptor(
+        plugin_name="DummyHuntOutputPlugin")
+    with test_lib.ConfigOverrider({
+        "Hunt.queue_output_plugin_results": True,
+        "Hunt.output_plugin_max_attempts": 2,
+    }):
+      self._CreateAndRunHunt(
+          num_clients=5,
+          client_mock=hunt_test_lib.SampleHuntMock(failrate=-1),
+          client_rule_set=foreman_rules.ForemanClientRuleSet(),
+          client_rate=0,
+          args=self.GetFileHuntArgs(),
+          output_plugins=[failing_plugin_descriptor, plugin_descriptor])
+
+      with self.assertStatsCounterDelta(
+          5,
+          hunt_output_plugins.HUNT_OUTPUT_PLUGIN_RETRIES,
+          fields=["FailingDummyHuntOutputPlugin"]):
+        hunt_output_plugins.ProcessRequests(
+            self._ReadQueuedOutputPluginRequests())
+      self.assertEqual(hunt_test_lib.DummyHuntOutputPlugin.num_calls, 1)
+
+      # Only the failed plugin is retried, and not before the backoff delay.
+      retries = self._ReadQueuedOutputPluginRequests()
+      self.assertLen(retries, 5)
+      for retry in retries:
+        self.assertEqual(retry.output_plugin_indices, [0])
+        self.assertEqual(retry.attempt, 1)
+        self.assertGreater(retry.delivery_time, rdfvalue.RDFDatetime.Now())
+
+      with self.assertStatsCounterDelta(
+          5,
+          hunt_output_plugins.HUNT_OUTPUT_PLUGIN_DROPPED_RESULTS,
+          fields=["FailingDummyHuntOutputPlugin"]):
+        hunt_output_plugins.ProcessRequests(retries)
+      self.assertEqual(hunt_test_lib.DummyHuntOutputPlugin.num_calls, 1)
+
+    # Results are dropped once all attempts have failed.
+    self.assertEmpty(self._ReadQueuedOutputPluginRequests())
+
+  def testQueuedOutputPluginRequestsAreRetriedIfTheirHuntFails(self):
+    hunt_test_lib.DummyHuntOutputPlugin.num_calls = 0
+
+    plugin_descriptor = rdf_output_plugin.OutputPluginDescriptor(
+        plugin_name="DummyHuntOutputPlugin")
+    with test_lib.ConfigOverrider({"Hunt.queue_output_plugin_results": True}):
+      self._CreateAndRunHunt(
+          num_clients=2,
+          client_mock=hunt_test_lib.SampleHuntMock(failrate=-1),
+          client_rule_set=foreman_rules.ForemanClientRuleSet(),
+          client_rate=0,
+          args=self.GetFileHuntArgs(),
+          output_plugins=[plugin_descriptor])
+
+    requests = self._ReadQueuedOutputPluginRequests()
+    with mock.patch.object(
+        data_store.REL_DB,
+        "ReadHuntOutputPluginsStates",
+        side_effect=RuntimeError("Database is gone.")):
+      hunt_output_plugins.ProcessRequests(requests)
+    self.assertEqual(hunt_test_lib.DummyHuntOutputPlugin.num_calls, 0)
+
+    # Results are not lost but retried later by all output plugins.
+    retries = self._ReadQueuedOutputPluginRequests()
+    self.assertLen(retries, 2)
+    self.assertNotIn(retries[0].request_id, [r.request_id for r in requests])
+    for retry in retries:
+      self.assertEqual(retry.attempt, 1)
+      self.assertEmpty(retry.output_plugin_indices)
+      self.assertGreater(retry.delivery_time, rdfvalue.RDFDatetime.Now())
+
+    hunt_output_plugins.ProcessRequests(retries)
+    self.assertEqual(hunt_test_lib.DummyHuntOutputPlugin.num_calls, 1)
+    self.assertEmpty(self._ReadQueuedOutputPluginRequests())
+
+  def testQueuedOutputPluginResultsAreSplitIntoBoundedRequests(self):
+    hunt_id = self._CreateHunt(
+        client_rule_set=foreman_rules.ForemanClientRuleSet(),
+        args=self.GetFileHuntArgs())
+    results = [
+        rdf_flow_objects.FlowResult(
+            payload=rdf_client.ClientSummary(system_info=rdf_client.Uname(
+                fqdn="%d.example.com" % i))) for i in range(10)
+    ]
+    result_size = max(len(r.SerializeToBytes()) for r in results)
+
+    with mock.patch.object(hunt_output_plugins, "MAX_REQUEST_SIZE",
+                           result_size * 3):
+      hunt_output_plugins.QueueResults(hunt_id, "C.1234567890123456", hunt_id,
+                                       results)
+
+    requests = self._ReadQueuedOutputPluginRequests()
+    self.assertEqual([len(r.results) for r in requests], [3, 3, 3, 1])
+    self.assertEqual([res for r in requests for res in r.results], results)
+
   def _CheckHuntStoppedNotification(self, str_match):
     pending = self.GetUserNotifications(self.token.username)
     self.assertLen(pending, 1)
@@ -1043,6 +1186,112 @@ class HuntTest(stats_test_lib.StatsTestMixin,
       with self.assertRaises(hunt.flow.CanNotStartFlowWithExistingIdError):
         hunt.StartHuntFlowOnClient(client_id, hunt_id)
 
+  def testStartHuntFlowOnClientsStartsFlows(self):
+    client_ids = self.SetupClients(3)
+    hunt_id = self._CreateHunt(args=self.GetFileHuntArgs())
+
+    started, truncated = hunt.StartHuntFlowOnClients(client_ids, hunt_id)
+    self.assertEqual(started, client_ids)
+    self.assertEmpty(truncated)
+
+    for client_id in client_ids:
+      flows = data_store.REL_DB.ReadAllFlowObjects(client_id=client_id)
+      self.assertLen(flows, 1)
+      self.assertEqual(flows[0].parent_hunt_id, hunt_id)
+
+  def testStartHuntFlowOnClientsSkipsClientsWithExistingFlows(self):
+    client_ids = self.SetupClients(3)
+    hunt_id = self._CreateHunt(args=self.GetFileHuntArgs())
+    hunt.StartHuntFlowOnClient(client_ids[1], hunt_id)
+
+    started, _ = hunt.StartHuntFlowOnClients(client_ids, hunt_id)
+    self.assertEqual(started, [client_ids[0], client_ids[2]])
+    self.assertEqual(data_store.REL_DB.CountHuntFlows(hunt_id), 3)
+
+  def testStartHuntFlowOnClientsRespectsClientLimit(self):
+    client_ids = self.SetupClients(10)
+    hunt_id = self._CreateHunt(
+        client_rule_set=foreman_rules.ForemanClientRuleSet(),
+        client_limit=5,
+        args=self.GetFileHuntArgs())
+
+    with mock.patch.object(
+        data_store.REL_DB,
+        "CountHuntFlows",
+        wraps=data_store.REL_DB.CountHuntFlows) as count_mock:
+      started, truncated = hunt.StartHuntFlowOnClients(client_ids, hunt_id)
+    self.assertEqual(started, client_ids[:5])
+    self.assertEqual(truncated, client_ids[5:])
+    # The hunt's clients are counted once per batch.
+    self.assertEqual(count_mock.call_count, 1)
+
+    hunt_obj = data_store.REL_DB.ReadHuntObject(hunt_id)
+    self.assertEqual(hunt_obj.hunt_state,
+                     rdf_hunt_objects.Hunt.HuntState.PAUSED)
+    self.assertEqual(data_store.REL_DB.CountHuntFlows(hunt_id), 5)
+
+  def testForemanStartsHuntOnClientsInBulk(self):
+    client_ids = self.SetupClients(5)
+    hunt_id = self._CreateHunt(
+        client_rule_set=foreman_rules.ForemanClientRuleSet(),
+        client_rate=0,
+        args=self.GetFileHuntArgs())
+
+    foreman.Foreman().AssignTasksToClients(client_ids)
+
+    for client_id in client_ids:
+      flows = data_store.REL_DB.ReadAllFlowObjects(client_id=client_id)
+      self.assertLen(flows, 1)
+      self.assertEqual(flows[0].parent_hunt_id, hunt_id)
+
+    hunt_counters = data_store.REL_DB.ReadHuntCounters(hunt_id)
+    self.assertEqual(hunt_counters.num_clients, 5)
+
+  def testForemanKeepsLastForemanTimeOfClientsOverClientLimit(self):
+    client_ids = self.SetupClients(4)
+    hunt_id = self._CreateHunt(
+        client_rule_set=foreman_rules.ForemanClientRuleSet(),
+        client_limit=2,
+        client_rate=0,
+        args=self.GetFileHuntArgs())
+    rule = data_store.REL_DB.ReadAllForemanRules()[0]
+
+    foreman.Foreman().AssignTasksToClients(client_ids)
+
+    self.assertEqual(data_store.REL_DB.CountHuntFlows(hunt_id), 2)
+    # Clients the hunt wasn't started on are offered the rule again.
+    mds = data_store.REL_DB.MultiReadClientMetadata(client_ids)
+    for client_id in client_ids:
+      flows = data_store.REL_DB.ReadAllFlowObjects(client_id=client_id)
+      if flows:
+        self.assertEqual(mds[client_id].last_foreman_time, rule.creation_time)
+      else:
+        self.assertNotEqual(mds[client_id].last_foreman_time,
+                            rule.creation_time)
+
+  def testCachedForemanRulesOfPausedHuntDoNotStartFlows(self):
+    client_ids = self.SetupClients(3)
+    hunt_id = self._CreateHunt(
+        client_rule_set=foreman_rules.ForemanClientRuleSet(),
+        client_rate=0,
+        args=self.GetFileHuntArgs())
+
+    foreman.RULES_CACHE.Flush()
+    self.addCleanup(foreman.RULES_CACHE.Flush)
+    with test_lib.ConfigOverrider(
+        {"Foreman.rules_cache_ttl": rdfvalue.Duration.From(1, rdfvalue.HOURS)}):
+      foreman_obj = foreman.Foreman()
+      foreman_obj.AssignTasksToClient(client_ids[0])
+
+      # The foreman rule is gone, but still cached.
+      hunt.PauseHunt(hunt_id)
+      foreman_obj.AssignTasksToClient(client_ids[1])
+      foreman_obj.AssignTasksToClients([client_ids[2]])
+
+    self.assertEqual(data_store.REL_DB.CountHuntFlows(hunt_id), 1)
+    self.assertEmpty(data_store.REL_DB.ReadAllFlowObjects(client_ids[1]))
+    self.assertEmpty(data_store.REL_DB.ReadAllFlowObjects(client_ids[2]))
+
 
 def main(argv):
   test_lib.main(argv)
@@ -5,13 +5,20 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import unicode_literals
 
+import atexit
+import collections
+from concurrent import futures
 import functools
+import importlib
+import multiprocessing
 import re
+import threading
 
+from grr_response_core import config
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib.registry import MetaclassRegistry
 from grr_response_core.lib.util import collection
-from grr_response_server import data_store
+from grr_response_core.lib.util import compatibility
 from grr_response_server import export
 
 
@@ -95,6 +102,97 @@ class InstantOutputPlugin(metaclass=MetaclassRegistry):
     """
 
 
+def _InitConversionProcess():
+  """Initializes a conversion worker process."""
+  # Worker processes are not forked, so converters and RDF value classes have
+  # to be registered by importing the modules defining them.
+  # pylint: disable=g-import-not-at-top,unused-import
+  from grr_response_server import server_plugins
+  # pylint: enable=g-import-not-at-top,unused-import
+
+
+def _ConvertBatch(module_names, converter_cls_name, serialized_options,
+                  serialized_metadata, metadata_indices, serialized_values):
+  """Converts a batch of serialized values, called in a worker process.
+
+  Args:
+    module_names: Names of the modules defining the converter and the values,
+      imported in case they are not registered by _InitConversionProcess.
+    converter_cls_name: Name of the ExportConverter class to use.
+    serialized_options: Serialized ExportOptions for the converter.
+    serialized_metadata: A list of serialized ExportedMetadata values.
+    metadata_indices: Index into serialized_metadata for every value.
+    serialized_values: A list of (type name, serialized value) pairs.
+
+  Returns:
+    A list of (type name, serialized value) pairs of converted values.
+  """
+  for module_name in module_names:
+    importlib.import_module(module_name)
+
+  converter_cls = export.ExportConverter.classes[converter_cls_name]
+  converter = converter_cls(
+      export.ExportOptions.FromSerializedBytes(serialized_options))
+
+  metadata_items = [
+      export.ExportedMetadata.FromSerializedBytes(m)
+      for m in serialized_metadata
+  ]
+  values = [
+      rdfvalue.RDFValue.classes[type_name].FromSerializedBytes(value)
+      for type_name, value in serialized_values
+  ]
+  batch_with_metadata = [
+      (metadata_items[i], value) for i, value in zip(metadata_indices, values)
+  ]
+
+  return [(compatibility.GetName(result.__class__), result.SerializeToBytes())
+          for result in converter.BatchConvert(batch_with_metadata)]
+
+
+_conversion_pool = None
+_conversion_pool_lock = threading.Lock()
+
+
+def _GetConversionProcessContext():
+  """Returns a multiprocessing context for conversion worker processes.
+
+  The AdminUI is multi-threaded and holds open datastore connections, so
+  worker processes must not be forked from it: a forked child could inherit
+  locks held by other threads at fork time.
+  """
+  if "forkserver" in multiprocessing.get_all_start_methods():
+    return multiprocessing.get_context("forkserver")
+  return multiprocessing.get_context("spawn")
+
+
+def _GetConversionPool():
+  """Returns the export conversion process pool or None if it's disabled."""
+  global _conversion_pool
+
+  with _conversion_pool_lock:
+    if _conversion_pool is None:
+      num_processes = config.CONFIG["AdminUI.export_conversion_processes"]
+      if not num_processes:
+        return None
+      _conversion_pool = futures.ProcessPoolExecutor(
+          max_workers=num_processes,
+          mp_context=_GetConversionProcessContext(),
+          initializer=_InitConversionProcess)
+      atexit.register(_ShutdownConversionPool)
+    return _conversion_pool
+
+
+def _ShutdownConversionPool():
+  """Shuts down the export conversion process pool if it was started."""
+  global _conversion_pool
+
+  with _conversion_pool_lock:
+    if _conversion_pool is not None:
+      _conversion_pool.shutdown(wait=True)
+      _conversion_pool = None
+
+
 class InstantOutputPluginWithExportConversion(InstantOutputPlugin):
   """Instant output plugin that flattens data before exporting."""
 
@@ -102,42 +200,20 @@ class InstantOutputPluginWithExportConversion(InstantOutputPlugin):
 
   BATCH_SIZE = 5000
 
-  def __init__(self, *args, **kwargs):
-    super().__init__(*args, **kwargs)
-    self._cached_metadata = {}
-
   def _GetMetadataForClients(self, client_urns):
     """Fetches metadata for a given list of clients."""
 
-    result = {}
-    metadata_to_fetch = set()
+    metadata_by_id = export.GetMetadataForClients(
+        urn.Basename() for urn in client_urns)
 
-    for urn in client_urns:
+    result = {}
+    for urn in set(client_urns):
       try:
-        result[urn] = self._cached_metadata[urn]
+        metadata = metadata_by_id[urn.Basename()]
       except KeyError:
-        metadata_to_fetch.add(urn)
-
-    if metadata_to_fetch:
-      client_ids = set(urn.Basename() for urn in metadata_to_fetch)
-      infos = data_store.REL_DB.MultiReadClientFullInfo(client_ids)
-
-      fetched_metadata = [
-          export.GetMetadata(client_id, info)
-          for client_id, info in infos.items()
-      ]
-
-      for metadata in fetched_metadata:
-        metadata.source_urn = self.source_urn
-
-        self._cached_metadata[metadata.client_urn] = metadata
-        result[metadata.client_urn] = metadata
-        metadata_to_fetch.remove(metadata.client_urn)
-
-      for urn in metadata_to_fetch:
-        default_mdata = export.ExportedMetadata(source_urn=self.source_urn)
-        result[urn] = default_mdata
-        self._cached_metadata[urn] = default_mdata
+        metadata = export.ExportedMetadata()
+      metadata.source_urn = self.source_urn
+      result[urn] = metadata
 
     return [result[urn] for urn in client_urns]
 
@@ -229,6 +305,17 @@ class InstantOutputPluginWithExportConversion(InstantOutputPlugin):
     Raises:
       ValueError: if any of the GrrMessage objects doesn't have "source" set.
     """
+    pool = _GetConversionPool()
+    # Converters read file contents from the datastore when exporting them,
+    # which can't be done from the worker processes.
+    reads_datastore = (
+        converter.reads_datastore or converter.options.export_files_contents)
+    if pool is not None and not reads_datastore:
+      for result in self._GenerateConvertedValuesInPool(pool, converter,
+                                                        grr_messages):
+        yield result
+      return
+
     for batch in collection.Batch(grr_messages, self.BATCH_SIZE):
       metadata_items = self._GetMetadataForClients([gm.source for gm in batch])
       batch_with_metadata = zip(metadata_items, [gm.payload for gm in batch])
@@ -236,6 +323,80 @@ class InstantOutputPluginWithExportConversion(InstantOutputPlugin):
       for result in converter.BatchConvert(batch_with_metadata):
         yield result
 
+  def _GenerateConvertedValuesInPool(self, pool, converter, grr_messages):
+    """Generates converted values, converting batches in a process pool.
+
+    Batches are converted concurrently, but converted values are yielded in
+    the same order as with _GenerateConvertedValues. At most two batches per
+    worker process are in flight at any time.
+
+    Args:
+      pool: A ProcessPoolExecutor to convert the batches in.
+      converter: ExportConverter instance.
+      grr_messages: An iterable (a generator is assumed) with GRRMessage values.
+
+    Yields:
+      Values generated by the converter.
+    """
+    converter_cls_name = compatibility.GetName(converter.__class__)
+    converter_module_name = converter.__class__.__module__
+    serialized_options = converter.options.SerializeToBytes()
+    max_pending = 2 * config.CONFIG["AdminUI.export_conversion_processes"]
+
+    pending = collections.deque()
+    for batch in collection.Batch(grr_messages, self.BATCH_SIZE):
+      metadata_items = self._GetMetadataForClients([gm.source for gm in batch])
+      payloads = [gm.payload for gm in batch]
+
+      # Metadata objects are shared by all values of the same client, so each
+      # of them is serialized only once.
+      serialized_metadata = []
+      metadata_indices = []
+      index_by_id = {}
+      for metadata in metadata_items:
+        if id(metadata) not in index_by_id:
+          index_by_id[id(metadata)] = len(serialized_metadata)
+          serialized_metadata.append(metadata.SerializeToBytes())
+        metadata_indices.append(index_by_id[id(metadata)])
+
+      serialized_values = [(compatibility.GetName(p.__class__),
+                            p.SerializeToBytes()) for p in payloads]
+
+      module_names = sorted(
+          set([converter_module_name] +
+              [p.__class__.__module__ for p in payloads]))
+
+      future = pool.submit(_ConvertBatch, module_names, converter_cls_name,
+                           serialized_options, serialized_metadata,
+                           metadata_indices, serialized_values)
+      pending.append((future, metadata_items, payloads))
+
+      while len(pending) >= max_pending:
+        batch_results = self._CollectConvertedBatch(converter,
+                                                    *pending.popleft())
+        for result in batch_results:
+          yield result
+
+    while pending:
+      for result in self._CollectConvertedBatch(converter, *pending.popleft()):
+        yield result
+
+  def _CollectConvertedBatch(self, converter, future, metadata_items, payloads):
+    """Returns values converted by a worker process."""
+    converted = future.result()
+
+    if any(type_name not in rdfvalue.RDFValue.classes
+           for type_name, _ in converted):
+      # Some converters (e.g. DataAgnosticExportConverter) define exported
+      # classes on the fly. Converting the batch here defines them in this
+      # process too.
+      return list(converter.BatchConvert(zip(metadata_items, payloads)))
+
+    return [
+        rdfvalue.RDFValue.classes[type_name].FromSerializedBytes(value)
+        for type_name, value in converted
+    ]
+
   def ProcessValues(self, value_type, values_generator_fn):
     converter_classes = export.ExportConverter.GetConvertersByClass(value_type)
     if not converter_classes:
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# Lint as: python3
+"""Benchmark measuring the throughput of instant output plugin exports."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import time
+
+from absl import app
+from absl import flags
+
+# pylint: disable=unused-import,g-bad-import-order
+from grr_response_server import server_plugins
+# pylint: enable=unused-import,g-bad-import-order
+
+from grr_response_core import config
+from grr_response_core.lib import rdfvalue
+from grr_response_core.lib.rdfvalues import client_fs as rdf_client_fs
+from grr_response_core.lib.rdfvalues import flows as rdf_flows
+from grr_response_core.lib.rdfvalues import paths as rdf_paths
+from grr_response_core.lib.util import compatibility
+from grr_response_core.lib.util import random
+from grr_response_server import access_control
+from grr_response_server import data_store
+from grr_response_server import instant_output_plugin
+from grr_response_server import server_startup
+
+flags.DEFINE_integer(
+    "num_results", default=1000000, help="Number of synthetic hunt results.")
+
+flags.DEFINE_integer(
+    "num_clients",
+    default=1000,
+    help="Number of clients the results are spread across.")
+
+flags.DEFINE_string(
+    "plugin", default="csv-zip", help="Name of the instant output plugin.")
+
+flags.DEFINE_list(
+    "processes",
+    default=["0", "2", "4", "8"],
+    help="Numbers of conversion processes to benchmark.")
+
+
+def _MakeResult(client_id, i):
+  """Returns a hunt result as the export handlers pass it to plugins."""
+  stat_entry = rdf_client_fs.StatEntry(
+      pathspec=rdf_paths.PathSpec.OS(path="/benchmark/dir%d/file%d" %
+                                     (i // 100, i)),
+      st_size=i,
+      st_mode=0o100644,
+      st_mtime=i)
+  return rdf_flows.GrrMessage(source=client_id, payload=stat_entry)
+
+
+def _Export(hunt_id, client_ids):
+  """Exports synthetic hunt results, returns the number of bytes written."""
+  iop_cls = instant_output_plugin.InstantOutputPlugin
+  plugin_cls = iop_cls.GetPluginClassByPluginName(flags.FLAGS.plugin)
+  plugin = plugin_cls(
+      source_urn=rdfvalue.RDFURN("hunts").Add(hunt_id),
+      token=access_control.ACLToken(username="benchmark"))
+
+  def FetchFn(type_name):
+    del type_name  # Unused.
+    for i in range(flags.FLAGS.num_results):
+      yield _MakeResult(client_ids[i % len(client_ids)], i)
+
+  num_bytes = 0
+  for chunk in instant_output_plugin.ApplyPluginToTypedCollection(
+      plugin, [compatibility.GetName(rdf_client_fs.StatEntry)], FetchFn):
+    num_bytes += len(chunk)
+  return num_bytes
+
+
+def main(argv):
+  """Main."""
+  del argv  # Unused.
+
+  server_startup.Init()
+
+  client_ids = []
+  for _ in range(flags.FLAGS.num_clients):
+    client_id = "C.%016x" % random.UInt64()
+    data_store.REL_DB.WriteClientMetadata(client_id, fleetspeak_enabled=False)
+    client_ids.append(client_id)
+
+  hunt_id = "%08X" % random.UInt32()
+
+  print("processes\tresults\ttotal\tresults/sec")
+  for num_processes in flags.FLAGS.processes:
+    # The conversion pool is created on first use and sized from the config,
+    # so a fresh one is needed for every measurement.
+    # pylint: disable=protected-access
+    if instant_output_plugin._conversion_pool is not None:
+      instant_output_plugin._conversion_pool.shutdown()
+      instant_output_plugin._conversion_pool = None
+    # pylint: enable=protected-access
+    config.CONFIG.Set("AdminUI.export_conversion_processes",
+                      int(num_processes))
+
+    start_time = time.time()
+    num_bytes = _Export(hunt_id, client_ids)
+    duration = time.time() - start_time
+
+    print("{processes}\t{results}\t{duration:.2f}s\t{rps:.0f}\t({size} bytes)"
+          .format(
+              processes=num_processes,
+              results=flags.FLAGS.num_results,
+              duration=duration,
+              rps=flags.FLAGS.num_results / duration,
+              size=num_bytes))
+
+
+if __name__ == "__main__":
+  app.run(main)
@@ -8,9 +8,12 @@ from __future__ import unicode_literals
 import io
 
 from absl import app
+import mock
 
 from grr_response_core.lib import rdfvalue
+from grr_response_core.lib.rdfvalues import flows as rdf_flows
 from grr_response_server import export
+from grr_response_server import instant_output_plugin
 from grr_response_server.output_plugins import test_plugins
 from grr.test_lib import test_lib
 
@@ -111,6 +114,49 @@ class InstantOutputPluginWithExportConversionTest(
         "Finish"
     ])  # pyformat: disable
 
+  def testConvertsValuesInProcessPoolPreservingOrder(self):
+    values_by_cls = {
+        DummySrcValue1: [DummySrcValue1("foo%d" % i) for i in range(7)],
+        DummySrcValue2: [DummySrcValue2("bar%d" % i) for i in range(7)],
+    }
+    self.plugin.BATCH_SIZE = 2
+    expected_lines = self.ProcessValuesToLines(values_by_cls)
+
+    with test_lib.ConfigOverrider(
+        {"AdminUI.export_conversion_processes": 2}), mock.patch.object(
+            instant_output_plugin, "_conversion_pool", None):
+      try:
+        lines = self.ProcessValuesToLines(values_by_cls)
+        self.assertIsNotNone(instant_output_plugin._conversion_pool)
+      finally:
+        instant_output_plugin._ShutdownConversionPool()
+      self.assertIsNone(instant_output_plugin._conversion_pool)
+
+    self.assertListEqual(lines, expected_lines)
+
+  def testConvertsValuesReadingDatastoreWithProcessPool(self):
+    # GrrMessageConverter reads client metadata from the datastore.
+    values_by_cls = {
+        rdf_flows.GrrMessage: [
+            rdf_flows.GrrMessage(
+                source=self.client_id, payload=DummySrcValue1("foo%d" % i))
+            for i in range(7)
+        ],
+    }
+    self.plugin.BATCH_SIZE = 2
+    expected_lines = self.ProcessValuesToLines(values_by_cls)
+    self.assertIn("Exported value: exp-foo6", expected_lines)
+
+    with test_lib.ConfigOverrider(
+        {"AdminUI.export_conversion_processes": 2}), mock.patch.object(
+            instant_output_plugin, "_conversion_pool", None):
+      try:
+        lines = self.ProcessValuesToLines(values_by_cls)
+      finally:
+        instant_output_plugin._ShutdownConversionPool()
+
+    self.assertListEqual(lines, expected_lines)
+
 
 def main(argv):
   test_lib.main(argv)
@@ -13,6 +13,11 @@ try:
 except ImportError:
   pass
 
+try:
+  from grr_response_server.output_plugins import parquet_plugin
+except ImportError:
+  pass
+
 from grr_response_server.output_plugins import csv_plugin
 from grr_response_server.output_plugins import email_plugin
 from grr_response_server.output_plugins import splunk_plugin
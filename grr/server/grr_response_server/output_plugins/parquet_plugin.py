@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+# Lint as: python3
+"""Plugin that exports results as Apache Parquet files."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+import collections
+import itertools
+import os
+import zipfile
+
+import pyarrow
+from pyarrow import parquet
+
+from grr_response_core.lib import rdfvalue
+from grr_response_core.lib import utils
+from grr_response_core.lib.rdfvalues import structs as rdf_structs
+from grr_response_core.lib.util import collection
+from grr_response_core.lib.util.compat import yaml
+from grr_response_server import instant_output_plugin
+
+
+class Rdf2ArrowAdapter(object):
+  """An adapter for converting RDF values to typed Arrow columns."""
+
+  class Converter(object):
+
+    def __init__(self, arrow_type, convert_fn):
+      self.arrow_type = arrow_type
+      self.convert_fn = convert_fn
+
+  BYTES_CONVERTER = Converter(pyarrow.binary(), bytes)
+  STR_CONVERTER = Converter(pyarrow.string(), str)
+
+  DEFAULT_CONVERTER = STR_CONVERTER
+
+  INT_CONVERTER = Converter(pyarrow.int64(), int)
+  UINT_CONVERTER = Converter(pyarrow.uint64(), int)
+  BOOL_CONVERTER = Converter(pyarrow.bool_(), bool)
+  DOUBLE_CONVERTER = Converter(pyarrow.float64(), float)
+
+  # Timestamps are stored as microseconds since epoch in UTC, which is what
+  # pandas and DuckDB load natively.
+  TIMESTAMP_TYPE = pyarrow.timestamp("us", tz="UTC")
+
+  # Converters for fields that have a semantic type annotation in their
+  # protobuf definition.
+  SEMANTIC_CONVERTERS = {
+      rdfvalue.RDFString:
+          STR_CONVERTER,
+      rdfvalue.RDFBytes:
+          Converter(pyarrow.binary(), lambda x: x.SerializeToBytes()),
+      rdfvalue.RDFInteger:
+          INT_CONVERTER,
+      bool:
+          BOOL_CONVERTER,
+      rdfvalue.RDFDatetime:
+          Converter(TIMESTAMP_TYPE, lambda x: x.AsMicrosecondsSinceEpoch()),
+      rdfvalue.RDFDatetimeSeconds:
+          Converter(TIMESTAMP_TYPE,
+                    lambda x: x.AsSecondsSinceEpoch() * 1000000),
+      # Parquet has no duration logical type, durations are written as
+      # microseconds like in the SQLite plugin.
+      rdfvalue.DurationSeconds:
+          Converter(pyarrow.int64(), lambda x: x.microseconds),
+  }
+
+  # Converters for fields that do not have a semantic type annotation in their
+  # protobuf definition.
+  NON_SEMANTIC_CONVERTERS = {
+      rdf_structs.ProtoBinary: BYTES_CONVERTER,
+      rdf_structs.ProtoString: STR_CONVERTER,
+      rdf_structs.ProtoEnum: STR_CONVERTER,
+      rdf_structs.ProtoUnsignedInteger: UINT_CONVERTER,
+      rdf_structs.ProtoSignedInteger: INT_CONVERTER,
+      rdf_structs.ProtoFixed32: Converter(pyarrow.uint32(), int),
+      rdf_structs.ProtoFixed64: UINT_CONVERTER,
+      rdf_structs.ProtoFloat: DOUBLE_CONVERTER,
+      rdf_structs.ProtoDouble: DOUBLE_CONVERTER,
+      rdf_structs.ProtoBoolean: BOOL_CONVERTER,
+  }
+
+  @staticmethod
+  def GetConverter(type_info):
+    if type_info.__class__ is rdf_structs.ProtoRDFValue:
+      return Rdf2ArrowAdapter.SEMANTIC_CONVERTERS.get(
+          type_info.type, Rdf2ArrowAdapter.DEFAULT_CONVERTER)
+    else:
+      return Rdf2ArrowAdapter.NON_SEMANTIC_CONVERTERS.get(
+          type_info.__class__, Rdf2ArrowAdapter.DEFAULT_CONVERTER)
+
+
+class _Column(object):
+  """A typed column buffer of a single (possibly nested) field."""
+
+  def __init__(self, name, path, converter):
+    self.name = name
+    self.path = path
+    self.converter = converter
+    self.values = []
+
+  def Append(self, value):
+    """Appends the field of the given struct to the buffer."""
+    for field_name in self.path:
+      if not value.HasField(field_name):
+        self.values.append(None)
+        return
+      value = value.Get(field_name)
+    self.values.append(self.converter.convert_fn(value))
+
+  def Flush(self):
+    """Returns buffered values as an Arrow array and clears the buffer."""
+    array = pyarrow.array(self.values, type=self.converter.arrow_type)
+    self.values = []
+    return array
+
+
+class _ChunkSink(object):
+  """A write-only file object handing out what was written to it in chunks.
+
+  The Parquet writer writes every row group to this object, which keeps it in
+  memory only until the plugin drains it into the output archive.
+  """
+
+  def __init__(self):
+    self._chunks = []
+    self._position = 0
+    self.closed = False
+
+  def write(self, data):  # pylint: disable=invalid-name
+    # Depending on the pyarrow version, data is either bytes or a buffer.
+    data = bytes(data)
+    self._chunks.append(data)
+    self._position += len(data)
+    return len(data)
+
+  def tell(self):  # pylint: disable=invalid-name
+    return self._position
+
+  def flush(self):  # pylint: disable=invalid-name
+    pass
+
+  def close(self):  # pylint: disable=invalid-name
+    self.closed = True
+
+  def writable(self):  # pylint: disable=invalid-name
+    return True
+
+  def Drain(self):
+    """Returns everything written since the last call and forgets it."""
+    chunk = b"".join(self._chunks)
+    self._chunks = []
+    return chunk
+
+
+class ParquetInstantOutputPlugin(
+    instant_output_plugin.InstantOutputPluginWithExportConversion):
+  """Instant output plugin that converts results into Parquet files."""
+
+  plugin_name = "parquet-zip"
+  friendly_name = "Parquet files (zipped)"
+  description = "Output ZIP archive containing Apache Parquet files."
+  output_file_extension = ".zip"
+
+  # Number of rows buffered in memory and written out as a single row group.
+  ROW_GROUP_SIZE = 10000
+  COMPRESSION = "snappy"
+  # Newer pyarrow releases default to newer Parquet format versions, which
+  # e.g. store uint32 columns differently. The version is fixed so that the
+  # files are the same with every supported pyarrow release and readable by
+  # older Parquet readers.
+  FORMAT_VERSION = "1.0"
+
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    self.archive_generator = None  # Created in Start()
+    self.export_counts = {}
+
+  @property
+  def path_prefix(self):
+    prefix, _ = os.path.splitext(self.output_file_name)
+    return prefix
+
+  def Start(self):
+    # Parquet column chunks are already compressed, so the archive itself
+    # doesn't compress them again.
+    self.archive_generator = utils.StreamingZipGenerator(
+        compression=zipfile.ZIP_STORED)
+    self.export_counts = {}
+    return []
+
+  def ProcessSingleTypeExportedValues(self, original_value_type,
+                                      exported_values):
+    first_value = next(exported_values, None)
+    if not first_value:
+      return
+
+    if not isinstance(first_value, rdf_structs.RDFProtoStruct):
+      raise ValueError("The Parquet plugin only supports export-protos")
+    yield self.archive_generator.WriteFileHeader(
+        "%s/%s_from_%s.parquet" %
+        (self.path_prefix, first_value.__class__.__name__,
+         original_value_type.__name__))
+
+    columns = [
+        _Column(name, path, converter) for name, (path, converter) in
+        self._GetArrowSchema(first_value.__class__).items()
+    ]
+    arrow_schema = pyarrow.schema(
+        [pyarrow.field(c.name, c.converter.arrow_type) for c in columns])
+
+    sink = _ChunkSink()
+    writer = parquet.ParquetWriter(
+        sink,
+        arrow_schema,
+        version=self.FORMAT_VERSION,
+        compression=self.COMPRESSION)
+
+    counter = 0
+    for batch in collection.Batch(
+        itertools.chain([first_value], exported_values), self.ROW_GROUP_SIZE):
+      counter += len(batch)
+      for value in batch:
+        for column in columns:
+          column.Append(value)
+
+      table = pyarrow.Table.from_arrays([c.Flush() for c in columns],
+                                        schema=arrow_schema)
+      writer.write_table(table, row_group_size=len(batch))
+      yield self.archive_generator.WriteFileChunk(sink.Drain())
+
+    writer.close()
+    yield self.archive_generator.WriteFileChunk(sink.Drain())
+    yield self.archive_generator.WriteFileFooter()
+
+    counts_for_original_type = self.export_counts.setdefault(
+        original_value_type.__name__, dict())
+    counts_for_original_type[first_value.__class__.__name__] = counter
+
+  def _GetArrowSchema(self, proto_struct_class, prefix=(), name_prefix=""):
+    """Returns a mapping of column names to (field path, Converter) pairs."""
+    schema = collections.OrderedDict()
+    for type_info in proto_struct_class.type_infos:
+      path = prefix + (type_info.name,)
+      if type_info.__class__ is rdf_structs.ProtoEmbedded:
+        schema.update(
+            self._GetArrowSchema(
+                type_info.type,
+                prefix=path,
+                name_prefix="%s%s." % (name_prefix, type_info.name)))
+      else:
+        field_name = name_prefix + type_info.name
+        schema[field_name] = (path, Rdf2ArrowAdapter.GetConverter(type_info))
+    return schema
+
+  def Finish(self):
+    manifest = {"export_stats": self.export_counts}
+    manifest_bytes = yaml.Dump(manifest).encode("utf-8")
+
+    header = self.path_prefix + "/MANIFEST"
+    yield self.archive_generator.WriteFileHeader(header)
+    yield self.archive_generator.WriteFileChunk(manifest_bytes)
+    yield self.archive_generator.WriteFileFooter()
+    yield self.archive_generator.Close()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+# Lint as: python3
+# -*- encoding: utf-8 -*-
+"""Tests for the Parquet instant output plugin."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+import datetime
+import io
+import os
+import unittest
+import zipfile
+
+from absl import app
+import mock
+import yaml
+
+from grr_response_core.lib import rdfvalue
+from grr_response_core.lib import type_info
+from grr_response_core.lib.rdfvalues import client as rdf_client
+from grr_response_core.lib.rdfvalues import client_fs as rdf_client_fs
+from grr_response_core.lib.rdfvalues import paths as rdf_paths
+from grr_response_core.lib.rdfvalues import structs as rdf_structs
+from grr_response_server.output_plugins import test_plugins
+from grr.test_lib import test_lib
+
+try:
+  # pylint: disable=g-import-not-at-top
+  import pyarrow
+  from pyarrow import parquet
+  from grr_response_server.output_plugins import parquet_plugin
+  # pylint: enable=g-import-not-at-top
+except ImportError:
+  raise unittest.SkipTest("`pyarrow` not available")
+
+
+class TestEmbeddedStruct(rdf_structs.RDFProtoStruct):
+  """Custom struct for testing schema generation."""
+
+  type_description = type_info.TypeDescriptorSet(
+      rdf_structs.ProtoString(name="e_string_field", field_number=1),
+      rdf_structs.ProtoDouble(name="e_double_field", field_number=2))
+
+
+class ParquetTestStruct(rdf_structs.RDFProtoStruct):
+  """Custom struct for testing schema generation."""
+
+  type_description = type_info.TypeDescriptorSet(
+      rdf_structs.ProtoString(name="string_field", field_number=1),
+      rdf_structs.ProtoBinary(name="bytes_field", field_number=2),
+      rdf_structs.ProtoUnsignedInteger(name="uint_field", field_number=3),
+      rdf_structs.ProtoSignedInteger(name="int_field", field_number=4),
+      rdf_structs.ProtoFloat(name="float_field", field_number=5),
+      rdf_structs.ProtoDouble(name="double_field", field_number=6),
+      rdf_structs.ProtoEnum(
+          name="enum_field",
+          field_number=7,
+          enum_name="EnumField",
+          enum={
+              "FIRST": 1,
+              "SECOND": 2
+          }), rdf_structs.ProtoBoolean(name="bool_field", field_number=8),
+      rdf_structs.ProtoRDFValue(
+          name="urn_field", field_number=9, rdf_type="RDFURN"),
+      rdf_structs.ProtoRDFValue(
+          name="time_field", field_number=10, rdf_type="RDFDatetime"),
+      rdf_structs.ProtoRDFValue(
+          name="time_field_seconds",
+          field_number=11,
+          rdf_type="RDFDatetimeSeconds"),
+      rdf_structs.ProtoRDFValue(
+          name="duration_field", field_number=12, rdf_type="DurationSeconds"),
+      rdf_structs.ProtoEmbedded(
+          name="embedded_field", field_number=13, nested=TestEmbeddedStruct))
+
+
+class ParquetInstantOutputPluginTest(test_plugins.InstantOutputPluginTestBase):
+  """Tests the Parquet instant output plugin."""
+
+  plugin_cls = parquet_plugin.ParquetInstantOutputPlugin
+
+  STAT_ENTRY_RESPONSES = [
+      rdf_client_fs.StatEntry(
+          pathspec=rdf_paths.PathSpec(path="/foo/bar/%d" % i, pathtype="OS"),
+          st_mode=33184,  # octal = 100640 => u=rw,g=r,o= => -rw-r-----
+          st_ino=1063090,
+          st_dev=64512,
+          st_nlink=1 + i,
+          st_uid=139592,
+          st_gid=5000,
+          st_size=0,
+          st_atime=1493596800,  # Midnight, 01.05.2017 UTC in seconds
+          st_mtime=1493683200,  # Midnight, 01.05.2017 UTC in seconds
+          st_ctime=1493683200) for i in range(10)
+  ]
+
+  def ProcessValuesToZip(self, values_by_cls):
+    fd_path = self.ProcessValues(values_by_cls)
+    file_basename, _ = os.path.splitext(os.path.basename(fd_path))
+    return zipfile.ZipFile(fd_path), file_basename
+
+  def ReadTable(self, zip_fd, path):
+    return parquet.read_table(io.BytesIO(zip_fd.read(path)))
+
+  def testColumnTypeInference(self):
+    schema = self.plugin._GetArrowSchema(ParquetTestStruct)
+    column_types = {k: converter.arrow_type for k, (_, converter)
+                    in schema.items()}
+    timestamp_type = pyarrow.timestamp("us", tz="UTC")
+    self.assertEqual(
+        column_types, {
+            "string_field": pyarrow.string(),
+            "bytes_field": pyarrow.binary(),
+            "uint_field": pyarrow.uint64(),
+            "int_field": pyarrow.int64(),
+            "float_field": pyarrow.float64(),
+            "double_field": pyarrow.float64(),
+            "enum_field": pyarrow.string(),
+            "bool_field": pyarrow.bool_(),
+            "urn_field": pyarrow.string(),
+            "time_field": timestamp_type,
+            "time_field_seconds": timestamp_type,
+            "duration_field": pyarrow.int64(),
+            "embedded_field.e_string_field": pyarrow.string(),
+            "embedded_field.e_double_field": pyarrow.float64()
+        })
+
+  def testConversionOfAllColumnTypes(self):
+    test_struct = ParquetTestStruct(
+        string_field="string_value",
+        bytes_field=b"bytes_value",
+        uint_field=123,
+        int_field=456,
+        float_field=0.5,
+        double_field=0.456,
+        enum_field="SECOND",
+        bool_field=True,
+        urn_field=rdfvalue.RDFURN("www.test.com"),
+        time_field=rdfvalue.RDFDatetime.FromDatetime(
+            datetime.datetime(2017, 5, 1)),
+        time_field_seconds=rdfvalue.RDFDatetimeSeconds.FromDatetime(
+            datetime.datetime(2017, 5, 2)),
+        duration_field=rdfvalue.Duration.From(123, rdfvalue.SECONDS),
+        embedded_field=TestEmbeddedStruct(
+            e_string_field="e_string_value", e_double_field=0.789))
+
+    columns = {}
+    for name, (path, converter) in self.plugin._GetArrowSchema(
+        ParquetTestStruct).items():
+      column = parquet_plugin._Column(name, path, converter)
+      column.Append(test_struct)
+      column.Append(ParquetTestStruct())
+      columns[name] = column.Flush()
+
+    self.assertEqual({k: v.to_pylist()[0] for k, v in columns.items()}, {
+        "string_field": "string_value",
+        "bytes_field": b"bytes_value",
+        "uint_field": 123,
+        "int_field": 456,
+        "float_field": 0.5,
+        "double_field": 0.456,
+        "enum_field": "SECOND",
+        "bool_field": True,
+        "urn_field": "aff4:/www.test.com",
+        "time_field": datetime.datetime(
+            2017, 5, 1, tzinfo=datetime.timezone.utc),
+        "time_field_seconds": datetime.datetime(
+            2017, 5, 2, tzinfo=datetime.timezone.utc),
+        "duration_field": 123000000,
+        "embedded_field.e_string_field": "e_string_value",
+        "embedded_field.e_double_field": 0.789
+    })
+    # Unset fields are written as nulls.
+    for name, column in columns.items():
+      self.assertIsNone(column.to_pylist()[1], name)
+
+  def testExportedFilenamesAndManifestForValuesOfSameType(self):
+    zip_fd, prefix = self.ProcessValuesToZip(
+        {rdf_client_fs.StatEntry: self.STAT_ENTRY_RESPONSES})
+    self.assertEqual(
+        set(zip_fd.namelist()), {
+            "%s/MANIFEST" % prefix,
+            "%s/ExportedFile_from_StatEntry.parquet" % prefix
+        })
+    parsed_manifest = yaml.safe_load(zip_fd.read("%s/MANIFEST" % prefix))
+    self.assertEqual(parsed_manifest,
+                     {"export_stats": {
+                         "StatEntry": {
+                             "ExportedFile": 10
+                         }
+                     }})
+
+  def testExportedRowsForValuesOfSameType(self):
+    zip_fd, prefix = self.ProcessValuesToZip(
+        {rdf_client_fs.StatEntry: self.STAT_ENTRY_RESPONSES})
+    table = self.ReadTable(zip_fd,
+                           "%s/ExportedFile_from_StatEntry.parquet" % prefix)
+
+    self.assertEqual(table.schema.field("st_ino").type, pyarrow.uint64())
+    self.assertEqual(
+        table.schema.field("st_atime").type,
+        pyarrow.timestamp("us", tz="UTC"))
+
+    rows = table.to_pydict()
+    self.assertEqual(table.num_rows, 10)
+    for i in range(10):
+      self.assertEqual(rows["metadata.client_urn"][i],
+                       "aff4:/%s" % self.client_id)
+      self.assertEqual(rows["metadata.source_urn"][i], str(self.results_urn))
+      self.assertEqual(rows["urn"][i],
+                       "aff4:/%s/fs/os/foo/bar/%d" % (self.client_id, i))
+      self.assertEqual(rows["st_mode"][i], "-rw-r-----")
+      self.assertEqual(rows["st_ino"][i], 1063090)
+      self.assertEqual(rows["st_nlink"][i], i + 1)
+      self.assertEqual(rows["st_size"][i], 0)
+      self.assertEqual(
+          rows["st_atime"][i],
+          datetime.datetime(2017, 5, 1, tzinfo=datetime.timezone.utc))
+      self.assertEqual(
+          rows["st_mtime"][i],
+          datetime.datetime(2017, 5, 2, tzinfo=datetime.timezone.utc))
+
+  def testExportedRowsForValuesOfMultipleTypes(self):
+    zip_fd, prefix = self.ProcessValuesToZip({
+        rdf_client_fs.StatEntry: [
+            rdf_client_fs.StatEntry(
+                pathspec=rdf_paths.PathSpec(path="/foo/bar", pathtype="OS"))
+        ],
+        rdf_client.Process: [rdf_client.Process(pid=42)]
+    })
+    self.assertEqual(
+        set(zip_fd.namelist()), {
+            "%s/MANIFEST" % prefix,
+            "%s/ExportedFile_from_StatEntry.parquet" % prefix,
+            "%s/ExportedProcess_from_Process.parquet" % prefix
+        })
+
+    stat_entry_rows = self.ReadTable(
+        zip_fd, "%s/ExportedFile_from_StatEntry.parquet" % prefix).to_pydict()
+    self.assertEqual(stat_entry_rows["urn"],
+                     ["aff4:/%s/fs/os/foo/bar" % self.client_id])
+
+    process_rows = self.ReadTable(
+        zip_fd, "%s/ExportedProcess_from_Process.parquet" % prefix).to_pydict()
+    self.assertEqual(process_rows["metadata.source_urn"],
+                     [str(self.results_urn)])
+    self.assertEqual(process_rows["pid"], [42])
+
+  def testHandlingOfNonAsciiCharacters(self):
+    zip_fd, prefix = self.ProcessValuesToZip({
+        rdf_client_fs.StatEntry: [
+            rdf_client_fs.StatEntry(
+                pathspec=rdf_paths.PathSpec(path="/中国新闻网新闻中", pathtype="OS"))
+        ]
+    })
+    rows = self.ReadTable(
+        zip_fd, "%s/ExportedFile_from_StatEntry.parquet" % prefix).to_pydict()
+    self.assertEqual(rows["urn"],
+                     ["aff4:/%s/fs/os/中国新闻网新闻中" % self.client_id])
+
+  @mock.patch.object(parquet_plugin.ParquetInstantOutputPlugin,
+                     "ROW_GROUP_SIZE", 10)
+  def testWritesOneRowGroupPerBatch(self):
+    num_rows = 10 * 2 + 1
+
+    responses = []
+    for i in range(num_rows):
+      responses.append(
+          rdf_client_fs.StatEntry(
+              pathspec=rdf_paths.PathSpec(
+                  path="/foo/bar/%d" % i, pathtype="OS")))
+
+    zip_fd, prefix = self.ProcessValuesToZip(
+        {rdf_client_fs.StatEntry: responses})
+    path = "%s/ExportedFile_from_StatEntry.parquet" % prefix
+
+    parquet_file = parquet.ParquetFile(io.BytesIO(zip_fd.read(path)))
+    self.assertEqual(parquet_file.num_row_groups, 3)
+
+    rows = parquet_file.read().to_pydict()
+    self.assertEqual(rows["urn"], [
+        "aff4:/%s/fs/os/foo/bar/%d" % (self.client_id, i)
+        for i in range(num_rows)
+    ])
+
+
+  def testWritesFixedFormatVersion(self):
+    zip_fd, prefix = self.ProcessValuesToZip(
+        {rdf_client_fs.StatEntry: self.STAT_ENTRY_RESPONSES})
+    path = "%s/ExportedFile_from_StatEntry.parquet" % prefix
+
+    parquet_file = parquet.ParquetFile(io.BytesIO(zip_fd.read(path)))
+    self.assertEqual(parquet_file.metadata.format_version, "1.0")
+
+
+def main(argv):
+  test_lib.main(argv)
+
+
+if __name__ == "__main__":
+  app.run(main)
@@ -31,6 +31,7 @@ from grr_response_proto import output_plugin_pb2
 from grr_response_server import data_store
 from grr_response_server import export
 from grr_response_server import output_plugin
+from grr_response_server.databases import db
 from grr_response_server.gui.api_plugins import flow as api_flow
 
 HTTP_EVENT_COLLECTOR_PATH = "services/collector/event"
@@ -116,8 +117,10 @@ class SplunkOutputPlugin(output_plugin.OutputPlugin):
     return flow_ids.pop()
 
   def _GetClientMetadata(self, client_id: Text) -> export.ExportedMetadata:
-    info = data_store.REL_DB.ReadClientFullInfo(client_id)
-    metadata = export.GetMetadata(client_id, info)
+    try:
+      metadata = export.GetMetadataForClients([client_id])[client_id]
+    except KeyError:
+      raise db.UnknownClientError(client_id)
     metadata.timestamp = None  # timestamp is sent outside of metadata.
     return metadata
 
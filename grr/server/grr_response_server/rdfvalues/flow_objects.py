@@ -144,6 +144,14 @@ class FlowOutputPluginLogEntry(rdf_structs.RDFProtoStruct):
         summary=self.message, batch_index=0, batch_size=0, status=status)
 
 
+class HuntOutputPluginRequest(rdf_structs.RDFProtoStruct):
+  protobuf = flows_pb2.HuntOutputPluginRequest
+  rdf_deps = [
+      FlowResult,
+      rdfvalue.RDFDatetime,
+  ]
+
+
 class Flow(rdf_structs.RDFProtoStruct):
   """Flow DB object."""
 
@@ -19,6 +19,7 @@ from grr_response_core.lib import config_lib
 from grr_response_core.lib import utils
 from grr_response_core.lib.local import plugins  # pylint: disable=unused-import
 from grr_response_core.lib.parsers import all as all_parsers
+from grr_response_core.lib.rdfvalues import structs as rdf_structs
 from grr_response_core.stats import stats_collector_instance
 
 from grr_response_server import artifact
@@ -87,6 +88,11 @@ def Init():
 
   server_logging.ServerLoggingStartupInit()
 
+  rdf_structs.EnableProtobufBackend(
+      config.CONFIG["Server.protobuf_backend_enabled"])
+  rdf_structs.EnableLazyDecoding(
+      config.CONFIG["Server.lazy_struct_decoding_enabled"])
+
   bs_registry_init.RegisterBlobStores()
   all_decoders.Register()
   all_parsers.Register()
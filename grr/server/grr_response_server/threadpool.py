@@ -14,6 +14,9 @@ ThreadPool, a log entry will be written but execution will continue
 using a smaller pool of workers. In this case, consider reducing the
 --threadpool_size.
 
+Tasks can be given a priority (see PRIORITY_HIGH, PRIORITY_NORMAL and
+PRIORITY_LOW): queued tasks with a higher priority are picked up first.
+
 Example usage:
 >>> def PrintMsg(value):
 >>>   print "Message: %s" % value
@@ -41,6 +44,13 @@ from grr_response_core.stats import metrics
 
 STOP_MESSAGE = "Stop message"
 
+# Task priorities. Queued tasks with lower values are processed first.
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+# Stop messages are only picked up once all queued tasks are processed.
+_PRIORITY_STOP = 1000
+
 THREADPOOL_OUTSTANDING_TASKS = metrics.Gauge(
     "threadpool_outstanding_tasks", int, fields=[("pool_name", str)])
 THREADPOOL_THREADS = metrics.Gauge(
@@ -53,6 +63,12 @@ THREADPOOL_WORKING_TIME = metrics.Event(
     "threadpool_working_time", fields=[("pool_name", str)])
 THREADPOOL_QUEUEING_TIME = metrics.Event(
     "threadpool_queueing_time", fields=[("pool_name", str)])
+THREADPOOL_TASK_WORKING_TIME = metrics.Event(
+    "threadpool_task_working_time",
+    fields=[("pool_name", str), ("task_name", str)])
+THREADPOOL_TASK_QUEUEING_TIME = metrics.Event(
+    "threadpool_task_queueing_time",
+    fields=[("pool_name", str), ("task_name", str)])
 
 
 class Error(Exception):
@@ -81,10 +97,11 @@ class _WorkerThread(threading.Thread):
     This creates a new worker object for the ThreadPool class.
 
     Args:
-      message_queue: A queue.Queue object used by the ThreadPool class to
-        communicate with the workers. When a new task arrives, the ThreadPool
-        notifies the workers by putting a message into this queue that has the
-        format (target, args, name, queueing_time).
+      message_queue: A queue.PriorityQueue object used by the ThreadPool class
+        to communicate with the workers. When a new task arrives, the
+        ThreadPool notifies the workers by putting a message into this queue
+        that has the format (priority, sequence_number, task) where task is
+        (target, args, name, queueing_time).
 
         target - A callable, the function to call.
         args - A tuple of positional arguments to target. Keyword arguments
@@ -116,6 +133,8 @@ class _WorkerThread(threading.Thread):
       time_in_queue = time.time() - queueing_time
       THREADPOOL_QUEUEING_TIME.RecordEvent(
           time_in_queue, fields=[self.pool.name])
+      THREADPOOL_TASK_QUEUEING_TIME.RecordEvent(
+          time_in_queue, fields=[self.pool.name, name])
 
       start_time = time.time()
     try:
@@ -132,6 +151,10 @@ class _WorkerThread(threading.Thread):
     if self.pool.name:
       total_time = time.time() - start_time
       THREADPOOL_WORKING_TIME.RecordEvent(total_time, fields=[self.pool.name])
+      THREADPOOL_TASK_WORKING_TIME.RecordEvent(
+          total_time, fields=[self.pool.name, name])
+
+      self.pool._RecordTaskTimes(time_in_queue, total_time)  # pylint: disable=protected-access
 
   def _RemoveFromPool(self):
     """Remove ourselves from the pool.
@@ -167,7 +190,7 @@ class _WorkerThread(threading.Thread):
       try:
         # Wait 60 seconds for a message, otherwise exit. This ensures that the
         # threadpool will be trimmed down when load is light.
-        task = self._queue.get(timeout=60)
+        _, _, task = self._queue.get(timeout=60)
 
         if self.pool.name:
           self.idle = False
@@ -193,6 +216,11 @@ class _WorkerThread(threading.Thread):
       if time.time() - self.started > 600 and self._RemoveFromPool():
         return
 
+      # Leave the pool if the process is CPU bound while tasks do not have to
+      # wait for a worker: additional threads only add switching overhead then.
+      if self.pool._ShouldShrink() and self._RemoveFromPool():  # pylint: disable=protected-access
+        return
+
 
 THREADPOOL = None
 
@@ -201,15 +229,19 @@ class ThreadPool(object):
   """A thread pool implementation.
 
   The thread pool starts with the minimum number of threads. As tasks are added,
-  they are added to a queue and once this is full, more threads are added until
-  we reach max_threads or this process's CPU utilization approaches 100%. Since
-  Python uses a global lock (GIL) it is not possible for the interpreter to use
-  more than 100% of a single core. Any additional threads actually reduce
-  performance due to thread switching overheads. Therefore we ensure that the
-  thread pool is not too loaded at any one time.
+  they are added to a queue. More threads are added when a new task would not
+  find an idle worker, or when tasks recently had to wait in the queue for
+  longer than QUEUEING_TIME_TARGET seconds, until we reach max_threads or this
+  process's CPU utilization approaches 100%. Since Python uses a global lock
+  (GIL) it is not possible for the interpreter to use more than 100% of a
+  single core. Any additional threads actually reduce performance due to thread
+  switching overheads. Therefore we ensure that the thread pool is not too
+  loaded at any one time.
 
   When threads are idle longer than 60 seconds they automatically exit. This
-  ensures that our memory footprint is reduced when load is light.
+  ensures that our memory footprint is reduced when load is light. Threads also
+  exit when the process is CPU bound while tasks do not have to wait in the
+  queue.
 
   Note that this class should not be instantiated directly, but the Factory
   should be used.
@@ -220,6 +252,16 @@ class ThreadPool(object):
 
   JOIN_TIMEOUT_DECISECONDS = 600
 
+  # If tasks wait longer than this (in seconds, on average) for a worker, the
+  # pool grows.
+  QUEUEING_TIME_TARGET = 0.1
+  # The pool does not grow above this process CPU utilization (in percent).
+  MAX_CPU_PERCENT = 90.0
+  # Weight of the most recent task in the average queueing and working times.
+  TIMES_SMOOTHING_FACTOR = 0.2
+  # Minimum interval in seconds between two CPU utilization measurements.
+  CPU_SAMPLING_INTERVAL = 1.0
+
   @classmethod
   def Factory(cls, name, min_threads, max_threads=None):
     """Creates a new thread pool with the given name.
@@ -265,11 +307,24 @@ class ThreadPool(object):
       max_threads = min_threads
 
     self.max_threads = max_threads
-    self._queue = queue.Queue(maxsize=max_threads)
+    self._queue = queue.PriorityQueue(maxsize=max_threads)
+    self._sequence = itertools.count()
     self.name = name
     self.started = False
     self.process = psutil.Process()
 
+    # Moving averages of the time tasks spend in the queue and in the worker.
+    self.average_queueing_time = 0.0
+    self.average_working_time = 0.0
+    self._times_lock = threading.Lock()
+
+    # CPUUsage() measures the usage since its previous call, so concurrent
+    # samples would measure tiny intervals. All callers, including the CPU
+    # usage metric, read the sample taken by _RecentCPUUsage().
+    self._cpu_lock = threading.Lock()
+    self._cpu_usage = 0.0
+    self._cpu_usage_sampled = 0
+
     # A reference for all our workers. Keys are thread names, and values are the
     # _WorkerThread instance.
     self._workers = {}
@@ -287,7 +342,9 @@ class ThreadPool(object):
     THREADPOOL_OUTSTANDING_TASKS.SetCallback(
         self._queue.qsize, fields=[self.name])
     THREADPOOL_THREADS.SetCallback(lambda: len(self), fields=[self.name])
-    THREADPOOL_CPU_USE.SetCallback(self.CPUUsage, fields=[self.name])
+    # The metric reads the same sample as the scaling logic, since every
+    # CPUUsage() call resets the measurement window of the next one.
+    THREADPOOL_CPU_USE.SetCallback(self._RecentCPUUsage, fields=[self.name])
 
   def __del__(self):
     if self.started:
@@ -349,7 +406,7 @@ class ThreadPool(object):
         stop_messages_needed += 1
 
     for _ in range(stop_messages_needed):
-      self._queue.put(STOP_MESSAGE)
+      self._queue.put((_PRIORITY_STOP, next(self._sequence), STOP_MESSAGE))
 
     self.started = False
     self.Join()
@@ -360,18 +417,58 @@ class ThreadPool(object):
       if worker.isAlive():
         raise RuntimeError("Threadpool worker did not finish in time.")
 
+  def _RecordTaskTimes(self, queueing_time, working_time):
+    """Updates the moving averages of task queueing and working times."""
+    alpha = self.TIMES_SMOOTHING_FACTOR
+    with self._times_lock:
+      self.average_queueing_time += alpha * (
+          queueing_time - self.average_queueing_time)
+      self.average_working_time += alpha * (
+          working_time - self.average_working_time)
+
+  def _RecentCPUUsage(self):
+    """Returns the CPU usage, sampled at most every CPU_SAMPLING_INTERVAL."""
+    with self._cpu_lock:
+      now = time.time()
+      if now - self._cpu_usage_sampled >= self.CPU_SAMPLING_INTERVAL:
+        self._cpu_usage = self.CPUUsage()
+        self._cpu_usage_sampled = now
+      return self._cpu_usage
+
+  def _ShouldGrow(self):
+    """Decides if a worker should be added for a task that is being queued."""
+    if len(self) >= self.max_threads:
+      return False
+
+    if self._RecentCPUUsage() >= self.MAX_CPU_PERCENT:
+      return False
+
+    # The new task will not find an idle worker.
+    idle_threads = len(self) - self.busy_threads
+    if self._queue.qsize() >= idle_threads:
+      return True
+
+    return self.average_queueing_time > self.QUEUEING_TIME_TARGET
+
+  def _ShouldShrink(self):
+    """Decides if a worker that just finished a task should exit."""
+    return (self._RecentCPUUsage() >= self.MAX_CPU_PERCENT and
+            self.average_queueing_time <= self.QUEUEING_TIME_TARGET)
+
   def AddTask(self,
               target,
               args=(),
               name="Unnamed task",
               blocking=True,
-              inline=True):
+              inline=True,
+              priority=PRIORITY_NORMAL):
     """Adds a task to be processed later.
 
     Args:
       target: A callable which should be processed by one of the workers.
       args: A tuple of arguments to target.
-      name: The name of this task. Used to identify tasks in the log.
+      name: The name of this task. Used to identify tasks in the log and in the
+        per task exported stats, so it should not be unique per task.
       blocking: If True we block until the task is finished, otherwise we raise
         queue.Full
       inline: If set, process the task inline when the queue is full. This
@@ -379,6 +476,8 @@ class ThreadPool(object):
         blocked because it still ensures some progress is made. However, this
         can generally block the calling thread even after the threadpool is
         available again and therefore decrease efficiency.
+      priority: The priority of this task. Queued tasks with a lower value
+        (e.g. PRIORITY_HIGH) are picked up by workers first.
 
     Raises:
       ThreadPoolNotStartedError: if the pool was not started yet.
@@ -402,7 +501,7 @@ class ThreadPool(object):
         # a fresh threadpool is created (say, with min_threads=1 and
         # max_threads=10) and 2 long-running tasks are added. The code below
         # will spawn a new worker for a second long-running task.
-        if len(self) < self.max_threads:
+        if self._ShouldGrow():
           try:
             self._AddWorker()
           except (RuntimeError, threading.ThreadError) as e:
@@ -410,16 +509,19 @@ class ThreadPool(object):
                 "Threadpool exception: "
                 "Could not spawn worker threads: %s", e)
 
+        task = (priority, next(self._sequence),
+                (target, args, name, time.time()))
         try:
           # Push the task on the queue but raise if unsuccessful.
-          self._queue.put((target, args, name, time.time()), block=False)
+          self._queue.put(task, block=False)
           return
         except queue.Full:
           # We increase the number of active threads if we do not exceed the
           # maximum _and_ our process CPU utilization is not too high. This
           # ensures that if the workers are waiting on IO we add more workers,
           # but we do not waste workers when tasks are CPU bound.
-          if len(self) < self.max_threads:
+          if (len(self) < self.max_threads and
+              self._RecentCPUUsage() < self.MAX_CPU_PERCENT):
             try:
               self._AddWorker()
               continue
@@ -438,9 +540,7 @@ class ThreadPool(object):
           # We should block and try again soon.
           elif blocking:
             try:
-              self._queue.put((target, args, name, time.time()),
-                              block=True,
-                              timeout=1)
+              self._queue.put(task, block=True, timeout=1)
               return
             except queue.Full:
               continue
@@ -475,8 +575,9 @@ class MockThreadPool(object):
     _ = max_threads
     self.ignore_errors = ignore_errors
 
-  def AddTask(self, target, args, name="Unnamed task"):
+  def AddTask(self, target, args, name="Unnamed task", priority=None):
     _ = name
+    _ = priority
     try:
       target(*args)
       # The real threadpool can not raise from a task. We emulate this here.
@@ -572,7 +673,7 @@ class BatchConverter(object):
         pool.AddTask(
             target=self.ConvertBatch,
             args=(batch,),
-            name="batch_%d" % batch_index,
+            name="ConvertBatch",
             inline=False)
 
     finally:
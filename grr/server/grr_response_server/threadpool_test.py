@@ -319,6 +319,138 @@ class ThreadPoolTest(stats_test_lib.StatsTestMixin, test_lib.GRRBaseTest):
       wait_event.set()
       pool.Stop()
 
+  def testTasksAreProcessedByPriority(self):
+    done_event = threading.Event()
+    res = []
+
+    def Block(done):
+      done.wait()
+
+    with utils.MultiStubber((self.test_pool, "_ShouldGrow", lambda: False),
+                            (self.test_pool, "CPUUsage", lambda: 100)):
+      self.test_pool.AddTask(Block, (done_event,), inline=False)
+      self.WaitUntil(lambda: self.test_pool.busy_threads == 1)
+
+      for priority in [
+          threadpool.PRIORITY_LOW, threadpool.PRIORITY_NORMAL,
+          threadpool.PRIORITY_HIGH, threadpool.PRIORITY_LOW,
+          threadpool.PRIORITY_HIGH
+      ]:
+        self.test_pool.AddTask(
+            res.append, (priority,), inline=False, priority=priority)
+
+      self.assertLen(self.test_pool, 1)
+      done_event.set()
+      self.test_pool.Join()
+
+    self.assertEqual(res, [
+        threadpool.PRIORITY_HIGH, threadpool.PRIORITY_HIGH,
+        threadpool.PRIORITY_NORMAL, threadpool.PRIORITY_LOW,
+        threadpool.PRIORITY_LOW
+    ])
+
+  def testPoolDoesNotGrowWhenCPUBound(self):
+    done_event = threading.Event()
+
+    def Block(done):
+      done.wait()
+
+    with utils.Stubber(self.test_pool, "CPUUsage", lambda: 100):
+      try:
+        for _ in range(5):
+          self.test_pool.AddTask(Block, (done_event,), inline=False)
+
+        self.assertLen(self.test_pool, self.NUMBER_OF_THREADS)
+      finally:
+        done_event.set()
+        self.test_pool.Join()
+
+  def testPoolGrowsWhenQueueingTimeIsHigh(self):
+    with utils.Stubber(self.test_pool, "CPUUsage", lambda: 0):
+      self.test_pool.AddTask(lambda: None, (), inline=False)
+      self.test_pool.Join()
+      self.assertLen(self.test_pool, self.NUMBER_OF_THREADS)
+
+      self.test_pool.average_queueing_time = (
+          self.test_pool.QUEUEING_TIME_TARGET * 10)
+      self.test_pool.AddTask(lambda: None, (), inline=False)
+      self.test_pool.Join()
+      self.assertLen(self.test_pool, self.NUMBER_OF_THREADS + 1)
+
+  def testWorkersExitWhenCPUBound(self):
+    done_event = threading.Event()
+
+    def Block(done):
+      done.wait()
+
+    with utils.Stubber(self.test_pool, "CPUUsage", lambda: 0):
+      for _ in range(5):
+        self.test_pool.AddTask(Block, (done_event,), inline=False)
+      self.WaitUntil(lambda: self.test_pool.busy_threads == 5)
+
+    with utils.Stubber(self.test_pool, "CPUUsage", lambda: 100):
+      self.test_pool.CPU_SAMPLING_INTERVAL = 0
+      done_event.set()
+      self.WaitUntil(lambda: len(self.test_pool) == self.NUMBER_OF_THREADS)
+
+  def testCPUUsageIsSampledOncePerIntervalByConcurrentCallers(self):
+    samples = []
+
+    def CPUUsage():
+      samples.append(None)
+      # Gives other callers a chance to sample concurrently.
+      time.sleep(0.05)
+      return 50.0
+
+    self.test_pool.CPU_SAMPLING_INTERVAL = 3600
+    self.test_pool._cpu_usage_sampled = 0
+    with utils.Stubber(self.test_pool, "CPUUsage", CPUUsage):
+      threads = [
+          threading.Thread(target=self.test_pool._RecentCPUUsage)
+          for _ in range(10)
+      ]
+      for thread in threads:
+        thread.start()
+      for thread in threads:
+        thread.join()
+
+    self.assertLen(samples, 1)
+    self.assertEqual(self.test_pool._RecentCPUUsage(), 50.0)
+
+  def testCPUUsageMetricDoesNotResetScalingSample(self):
+    samples = []
+
+    def CPUUsage():
+      samples.append(None)
+      return 50.0
+
+    self.test_pool.CPU_SAMPLING_INTERVAL = 3600
+    self.test_pool._cpu_usage_sampled = 0
+    with utils.Stubber(self.test_pool, "CPUUsage", CPUUsage):
+      self.test_pool._RecentCPUUsage()
+      for _ in range(3):
+        self.assertEqual(
+            threadpool.THREADPOOL_CPU_USE.GetValue(
+                fields=[self.test_pool.name]), 50.0)
+
+    self.assertLen(samples, 1)
+
+  def testPerTaskTimesAreExported(self):
+    fields = [self.test_pool.name, "SomeTask"]
+    working_time = threadpool.THREADPOOL_TASK_WORKING_TIME
+    queueing_time = threadpool.THREADPOOL_TASK_QUEUEING_TIME
+    working_count = working_time.GetValue(fields=fields).count
+    queueing_count = queueing_time.GetValue(fields=fields).count
+
+    for _ in range(3):
+      self.test_pool.AddTask(lambda: None, (), name="SomeTask", inline=False)
+    self.test_pool.Join()
+
+    self.assertEqual(
+        working_time.GetValue(fields=fields).count, working_count + 3)
+    self.assertEqual(
+        queueing_time.GetValue(fields=fields).count, queueing_count + 3)
+
   def testDuplicateNameError(self):
     """Tests that creating two pools with the same name fails."""
 
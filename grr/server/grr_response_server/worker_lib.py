@@ -6,16 +6,20 @@ from __future__ import division
 from __future__ import unicode_literals
 
 import logging
+import threading
 import time
 
 
+from grr_response_core import config
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib import registry
+from grr_response_core.lib.rdfvalues import flows as rdf_flows
 from grr_response_core.lib.util import collection
 from grr_response_core.stats import metrics
 from grr_response_server import data_store
 from grr_response_server import flow_base
 from grr_response_server import handler_registry
+from grr_response_server import hunt_output_plugins
 # pylint: disable=unused-import
 from grr_response_server import server_stubs
 # pylint: enable=unused-import
@@ -23,6 +27,15 @@ from grr_response_server.databases import db
 
 WELL_KNOWN_FLOW_REQUESTS = metrics.Counter(
     "well_known_flow_requests", fields=[("flow", str)])
+FLOW_PROCESSING_CYCLES = metrics.Counter("flow_processing_cycles")
+FLOW_PROCESSING_COALESCED_REQUESTS = metrics.Counter(
+    "flow_processing_coalesced_requests")
+FLOW_PROCESSING_SAVED_DB_ROUND_TRIPS = metrics.Counter(
+    "flow_processing_saved_db_round_trips")
+
+# Every flow processing cycle leases the flow, reads its ready requests and
+# releases it.
+_DB_ROUND_TRIPS_PER_CYCLE = 3
 
 
 class Error(Exception):
@@ -66,9 +79,15 @@ class GRRWorker(object):
     """Constructor."""
     logging.info("Started GRR worker.")
 
+    # Maps (client_id, flow_id) of flows being processed by this worker to the
+    # number of processing requests received for them in the meantime.
+    self._flows_in_progress = {}
+    self._flows_in_progress_lock = threading.Lock()
+
   def Shutdown(self):
     data_store.REL_DB.UnregisterMessageHandler()
     data_store.REL_DB.UnregisterFlowProcessingHandler()
+    data_store.REL_DB.UnregisterHuntOutputPluginRequestHandler()
 
   def Run(self):
     """Event loop."""
@@ -77,6 +96,10 @@ class GRRWorker(object):
         self.message_handler_lease_time,
         limit=100)
     data_store.REL_DB.RegisterFlowProcessingHandler(self.ProcessFlow)
+    data_store.REL_DB.RegisterHuntOutputPluginRequestHandler(
+        hunt_output_plugins.ProcessRequests,
+        config.CONFIG["Hunt.output_plugin_lease_time"],
+        limit=100)
 
     try:
       # The main thread just keeps sleeping and listens to keyboard interrupt
@@ -99,13 +122,85 @@ class GRRWorker(object):
     return data_store.REL_DB.ReleaseProcessedFlow(rdf_flow)
 
   def ProcessFlow(self, flow_processing_request):
-    """The callback for the flow processing queue."""
+    """The callback for the flow processing queue.
 
+    Processing requests for a flow that this worker is already processing are
+    coalesced: they are acknowledged right away and the thread that processes
+    the flow runs one more processing cycle once it is done, instead of every
+    request running its own lease/process/release cycle. If a cycle fails while
+    requests are coalesced, a single new processing request is written for them.
+
+    Args:
+      flow_processing_request: A `FlowProcessingRequest` to process.
+    """
     client_id = flow_processing_request.client_id
     flow_id = flow_processing_request.flow_id
+    key = (client_id, flow_id)
 
     data_store.REL_DB.AckFlowProcessingRequests([flow_processing_request])
 
+    with self._flows_in_progress_lock:
+      if key in self._flows_in_progress:
+        self._flows_in_progress[key] += 1
+        FLOW_PROCESSING_COALESCED_REQUESTS.Increment()
+        return
+      self._flows_in_progress[key] = 0
+
+    done = False
+    try:
+      self._ProcessFlowCycle(client_id, flow_id, require_progress=True)
+
+      while True:
+        with self._flows_in_progress_lock:
+          coalesced = self._flows_in_progress[key]
+          if not coalesced:
+            del self._flows_in_progress[key]
+            done = True
+            return
+          self._flows_in_progress[key] = 0
+
+        # However many requests were coalesced, a single cycle handles all the
+        # responses that arrived in the meantime.
+        FLOW_PROCESSING_SAVED_DB_ROUND_TRIPS.Increment(
+            delta=(coalesced - 1) * _DB_ROUND_TRIPS_PER_CYCLE)
+        self._ProcessFlowCycle(client_id, flow_id, require_progress=False)
+    finally:
+      if not done:
+        with self._flows_in_progress_lock:
+          coalesced = self._flows_in_progress.pop(key)
+        # The coalesced requests are acknowledged already, so they have to be
+        # requeued to not get lost.
+        if coalesced:
+          self._RequeueCoalescedRequests(client_id, flow_id, coalesced)
+
+  def _RequeueCoalescedRequests(self, client_id, flow_id, coalesced):
+    """Writes a processing request replacing requests of a failed flow."""
+    logging.info("Requeueing %d coalesced processing requests of flow %s/%s.",
+                 coalesced, client_id, flow_id)
+    try:
+      data_store.REL_DB.WriteFlowProcessingRequests([
+          rdf_flows.FlowProcessingRequest(client_id=client_id, flow_id=flow_id)
+      ])
+    except Exception:  # pylint: disable=broad-except
+      logging.exception(
+          "Failed to requeue coalesced processing requests of flow %s/%s.",
+          client_id, flow_id)
+
+  def _ProcessFlowCycle(self, client_id, flow_id, require_progress):
+    """Leases the flow, processes all its ready requests and releases it.
+
+    Args:
+      client_id: The client id of the flow to process.
+      flow_id: The id of the flow to process.
+      require_progress: If True, an error is raised if the flow has no requests
+        ready for processing.
+
+    Raises:
+      ValueError: No request could be processed, although require_progress is
+        set or the database reported that there are requests to process.
+    """
+    FLOW_PROCESSING_CYCLES.Increment()
+
     try:
       rdf_flow = data_store.REL_DB.LeaseFlowForProcessing(
           client_id,
@@ -129,7 +224,7 @@ class GRRWorker(object):
       return
 
     processed = flow_obj.ProcessAllReadyRequests()
-    if processed == 0:
+    if processed == 0 and require_progress:
       raise ValueError(
           "Unable to process any requests for flow %s on client %s." %
           (flow_id, client_id))
@@ -224,6 +224,9 @@ setup_args = dict(
         # TODO(user): Find a way to use the latest mysqlclient version
         # in GRR server DEB.
         "mysqldatastore": ["mysqlclient==1.3.10"],
+        # This is an optional component. Install to get the Parquet instant
+        # output plugin: pip install grr-response-server[parquet]
+        "parquet": ["pyarrow>=1.0.1,<27"],
     },
     data_files=data_files)
 